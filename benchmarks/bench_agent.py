@@ -0,0 +1,16 @@
+import pytest
+from e2e import CONVERSATIONS, PHASES, load_conversation, run_conversation
+
+from nube_agent.standin import StoreData
+
+CONVERSATION_FILES = sorted(CONVERSATIONS.glob("*.json"))
+
+
+@pytest.mark.parametrize("path", CONVERSATION_FILES, ids=lambda p: p.stem)
+def test_conversation(benchmark, serve, path):
+    serve(StoreData())
+    conversation = load_conversation(path)
+    turns = benchmark.pedantic(run_conversation, args=(conversation,), rounds=5, iterations=1)
+    for i, turn in enumerate(turns, start=1):
+        for phase in PHASES:
+            benchmark.extra_info[f"turn{i}_{phase}_ms"] = round(turn[phase] * 1000, 2)
@@ -0,0 +1,20 @@
+from nube_agent.api import request
+
+
+def test_request_store(benchmark, api_base):
+    result = benchmark(request, "GET", "/store")
+    assert isinstance(result, dict)
+
+
+def test_request_product(benchmark, api_base, standin):
+    product_id = next(iter(standin.data.collections["products"]))
+    result = benchmark(request, "GET", f"/products/{product_id}")
+    assert result["id"] == product_id
+
+
+def test_request_update_variant(benchmark, api_base, standin):
+    product_id, variants = next(iter(standin.data.nested["variants"].items()))
+    variant_id = next(iter(variants))
+    path = f"/products/{product_id}/variants/{variant_id}"
+    result = benchmark(request, "PUT", path, json_body={"stock": 10})
+    assert result["stock"] == 10
@@ -0,0 +1,20 @@
+import json
+
+import pytest
+
+from nube_agent.standin import StoreData
+from nube_agent.tools.variants import bulk_update_stock_price
+
+
+@pytest.mark.parametrize("count", [10, 100, 1000])
+def test_bulk_update_stock_price(benchmark, serve, count):
+    data = StoreData(products=1, variants_per_product=count, orders=0, customers=0)
+    product_id, variants = next(iter(data.nested["variants"].items()))
+    updates = json.dumps([{"variant_id": vid, "stock": 5} for vid in variants])
+    serve(data)
+
+    rounds = 3 if count >= 1000 else 10
+    result = benchmark.pedantic(
+        bulk_update_stock_price, args=(product_id, updates), rounds=rounds, iterations=1
+    )
+    assert len(json.loads(result)) == count
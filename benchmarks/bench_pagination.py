@@ -0,0 +1,37 @@
+import json
+
+import pytest
+
+from nube_agent.tools.customers import list_customers
+from nube_agent.tools.orders import list_orders
+from nube_agent.tools.products import list_products
+
+
+def _page_through(list_tool, per_page: int) -> int:
+    total = 0
+    page = 1
+    while True:
+        raw = list_tool(page=page, per_page=per_page)
+        if raw.startswith("API error 404"):
+            return total
+        rows = json.loads(raw)
+        total += len(rows)
+        if len(rows) < per_page:
+            return total
+        page += 1
+
+
+@pytest.mark.parametrize("per_page", [50, 200])
+def test_page_through_products(benchmark, api_base, standin, per_page):
+    total = benchmark.pedantic(_page_through, args=(list_products, per_page), rounds=3)
+    assert total == len(standin.data.collections["products"])
+
+
+def test_page_through_orders(benchmark, api_base, standin):
+    total = benchmark.pedantic(_page_through, args=(list_orders, 200), rounds=3)
+    assert total == len(standin.data.collections["orders"])
+
+
+def test_page_through_customers(benchmark, api_base, standin):
+    total = benchmark.pedantic(_page_through, args=(list_customers, 200), rounds=3)
+    assert total == len(standin.data.collections["customers"])
@@ -0,0 +1,25 @@
+import pytest
+
+from nube_agent.api import parse_json, to_json
+from nube_agent.standin import StoreData, _product_view
+
+SIZES = [10, 200, 2000]
+
+
+def _products(count: int) -> list[dict]:
+    data = StoreData(products=count, variants_per_product=3, orders=0, customers=0)
+    return [_product_view(data, p) for p in data.collections["products"].values()]
+
+
+@pytest.mark.parametrize("count", SIZES)
+def test_to_json_products(benchmark, count):
+    payload = _products(count)
+    result = benchmark(to_json, payload)
+    assert result.startswith("[")
+
+
+@pytest.mark.parametrize("count", SIZES)
+def test_parse_json_products(benchmark, count):
+    raw = to_json(_products(count))
+    result = benchmark(parse_json, raw, "products")
+    assert len(result) == count
@@ -0,0 +1,15 @@
+import pytest
+
+pytest.importorskip("uvicorn")
+
+from load_server import run_load  # noqa: E402
+
+
+@pytest.mark.parametrize("sessions", [1, 10, 50])
+@pytest.mark.parametrize("cache_ttl", [0.0, 30.0], ids=["nocache", "cache"])
+def test_concurrent_sessions(benchmark, sessions, cache_ttl):
+    result = benchmark.pedantic(
+        run_load, args=(sessions,), kwargs={"cache_ttl": cache_ttl, "api_latency": 0.02},
+        rounds=3, iterations=1,
+    )
+    benchmark.extra_info.update({k: round(v, 2) for k, v in result.items()})
@@ -0,0 +1,17 @@
+import os
+import subprocess
+import sys
+
+
+def _run(code: str) -> None:
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    subprocess.run([sys.executable, "-c", code], check=True, env=env)
+
+
+def test_import_main(benchmark):
+    benchmark.pedantic(_run, args=("import nube_agent.main",), rounds=5, iterations=1)
+
+
+def test_build_agent(benchmark):
+    code = "from nube_agent.agent import build_agent; build_agent()"
+    benchmark.pedantic(_run, args=(code,), rounds=3, iterations=1)
@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+# Set benchmark defaults for required environment variables
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench-key")
+os.environ.setdefault("TIENDANUBE_ACCESS_TOKEN", "bench-token")
+os.environ.setdefault("TIENDANUBE_STORE_ID", "1")
+
+from nube_agent import api  # noqa: E402
+from nube_agent.api import StoreClient  # noqa: E402
+from nube_agent.standin import StandinServer, StoreData  # noqa: E402
+
+# Large enough that the stand-in never answers 429: these benchmarks measure
+# client overhead, not the rate limiter.
+UNLIMITED = 10**9
+
+
+@pytest.fixture(scope="session")
+def standin():
+    """A stand-in store sized for the pagination and serialization benchmarks."""
+    data = StoreData(products=2000, variants_per_product=3, orders=2000, customers=500)
+    with StandinServer(data, rate_limit=UNLIMITED) as server:
+        yield server
+
+
+def _point_at(server: StandinServer) -> None:
+    """Make the stand-in the default store of the API layer."""
+    previous = api.set_default_store(StoreClient("1", "bench-token", base_url=server.base_url))
+    if previous is not None:
+        previous.close()
+
+
+@pytest.fixture
+def api_base(standin):
+    """Point the API layer at the stand-in server for one benchmark."""
+    _point_at(standin)
+    yield standin.base_url
+    api.set_default_store(None)
+
+
+@pytest.fixture
+def serve():
+    """Start a stand-in server for custom store data and point the API layer at it."""
+    servers = []
+
+    def start(data: StoreData) -> StandinServer:
+        server = StandinServer(data, rate_limit=UNLIMITED).start()
+        servers.append(server)
+        _point_at(server)
+        return server
+
+    yield start
+    api.set_default_store(None)
+    for server in servers:
+        server.stop()
@@ -0,0 +1,187 @@
+"""End-to-end agent latency harness.
+
+Runs canned conversations (``conversations/*.json``) through ``build_agent()``
+with the scripted model and the stand-in store, rendering every turn with
+``main.stream_response`` exactly as the CLI does, and reports where the time
+of each turn goes:
+
+- model:     time inside model calls (only scripted latency, if any)
+- tools:     time inside store tools (subagent ``task`` calls excluded)
+- render:    time spent in ``stream_response`` outside the agent stream
+- overhead:  everything else inside the agent stream (deepagents, LangGraph,
+             middleware, subagent dispatch, skills loading)
+
+    python benchmarks/e2e.py benchmarks/conversations/*.json --repeat 5
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench-key")
+os.environ.setdefault("TIENDANUBE_ACCESS_TOKEN", "bench-token")
+os.environ.setdefault("TIENDANUBE_STORE_ID", "1")
+
+from langchain_core.callbacks import BaseCallbackHandler  # noqa: E402
+
+from nube_agent import api  # noqa: E402
+from nube_agent.agent import build_agent  # noqa: E402
+from nube_agent.fake_model import ScriptedChatModel  # noqa: E402
+from nube_agent.main import stream_response  # noqa: E402
+from nube_agent.standin import StandinServer, StoreData  # noqa: E402
+
+CONVERSATIONS = Path(__file__).parent / "conversations"
+PHASES = ("total", "model", "tools", "render", "overhead")
+
+
+def _covered(intervals: list[tuple[float, float]]) -> float:
+    """Wall-clock time covered by possibly overlapping intervals."""
+    total, end = 0.0, float("-inf")
+    for start, stop in sorted(intervals):
+        if stop > end:
+            total += stop - max(start, end)
+            end = stop
+    return total
+
+
+class TurnTimer(BaseCallbackHandler):
+    """Wall-clock time spent in model calls and (leaf) tool calls.
+
+    Subagents dispatched in parallel overlap, so time is measured as the
+    union of call intervals: ``model`` is the time any model call was
+    running, and ``tools`` the extra time some tool was running while no
+    model call was.
+    """
+
+    def __init__(self) -> None:
+        self._model: list[tuple[float, float]] = []
+        self._tools: list[tuple[float, float]] = []
+        self._starts: dict = {}
+        self._lock = threading.Lock()
+
+    @property
+    def model(self) -> float:
+        return _covered(self._model)
+
+    @property
+    def tools(self) -> float:
+        return _covered(self._model + self._tools) - self.model
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._starts[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        started = self._starts.pop(run_id, None)
+        if started is not None:
+            with self._lock:
+                self._model.append((started, time.perf_counter()))
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        if serialized.get("name") != "task":
+            self._starts[run_id] = time.perf_counter()
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        started = self._starts.pop(run_id, None)
+        if started is not None:
+            with self._lock:
+                self._tools.append((started, time.perf_counter()))
+
+
+class TimedAgent:
+    """Proxy that measures time spent producing stream chunks."""
+
+    def __init__(self, agent) -> None:
+        self._agent = agent
+        self.streaming = 0.0
+
+    def stream(self, *args, **kwargs):
+        iterator = iter(self._agent.stream(*args, **kwargs))
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.streaming += time.perf_counter() - started
+                return
+            self.streaming += time.perf_counter() - started
+            yield item
+
+    def __getattr__(self, name):
+        return getattr(self._agent, name)
+
+
+def run_conversation(conversation: dict, *, thread_id: str = "bench") -> list[dict[str, float]]:
+    """Run every turn of ``conversation`` and return a timing breakdown per turn."""
+    model = ScriptedChatModel(latency=conversation.get("latency", 0.0))
+    agent = build_agent(model=model)
+    results = []
+    for turn in conversation["turns"]:
+        model.load(turn["responses"])
+        timer = TurnTimer()
+        timed = TimedAgent(agent)
+        config = {"configurable": {"thread_id": thread_id}, "callbacks": [timer]}
+        input_value = {"messages": [{"role": "user", "content": turn["user"]}]}
+
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            stream_response(timed, input_value, config)
+        total = time.perf_counter() - started
+
+        results.append({
+            "total": total,
+            "model": timer.model,
+            "tools": timer.tools,
+            "render": total - timed.streaming,
+            "overhead": timed.streaming - timer.model - timer.tools,
+        })
+        leftover = model.pending()
+        if leftover:
+            raise RuntimeError(f"Turn {turn['user']!r} left unused responses: {leftover}")
+    return results
+
+
+def load_conversation(path: str | Path) -> dict:
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("conversations", nargs="*", help="Conversation JSON files")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0, help="Stand-in API latency (s)")
+    parser.add_argument("--json", action="store_true", help="Print raw results as JSON")
+    args = parser.parse_args()
+
+    paths = args.conversations or sorted(CONVERSATIONS.glob("*.json"))
+    report = {}
+    with StandinServer(StoreData(), latency=args.latency, rate_limit=10**9) as server:
+        api.set_default_store(api.StoreClient("1", "bench-token", base_url=server.base_url))
+        for path in paths:
+            conversation = load_conversation(path)
+            runs = [run_conversation(conversation, thread_id=f"bench-{i}")
+                    for i in range(args.repeat)]
+            report[conversation.get("name", str(path))] = [
+                {phase: statistics.median(run[t][phase] for run in runs) for phase in PHASES}
+                for t in range(len(conversation["turns"]))
+            ]
+
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+        return
+
+    print(f"{'conversation':<16}{'turn':>5}" + "".join(f"{p + ' ms':>12}" for p in PHASES))
+    for name, turns in report.items():
+        for i, turn in enumerate(turns, start=1):
+            print(f"{name:<16}{i:>5}" + "".join(f"{turn[p] * 1000:>12.1f}" for p in PHASES))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Accuracy and latency of the local intent router on a labelled prompt set.
+
+Each line of ``routing/prompts.jsonl`` has a ``prompt``, the ``expected``
+decision (a subagent name, or ``supervisor`` when the supervisor should pick)
+and optionally the listing slash command run just before (``history``).
+
+    python benchmarks/eval_router.py [--prompts FILE] [--json]
+
+Reports overall accuracy, precision of the routed decisions (a wrong route
+costs a wrong answer, a fallback only costs the supervisor call the router
+tried to save), the share of supervisor calls saved, the misses, and the
+per-prompt classification time.
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from nube_agent.router import COMMAND_DOMAINS, SUPERVISOR, Router
+
+PROMPTS = Path(__file__).parent / "routing" / "prompts.jsonl"
+REPEAT = 200
+
+
+def load(path: Path) -> list[dict]:
+    with open(path, encoding="utf-8") as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+def evaluate(cases: list[dict], router: Router | None = None) -> dict:
+    """Classify every case and return the accuracy and latency report."""
+    router = router or Router()
+    misses, timings = [], []
+    correct = routed = routed_correct = routable = 0
+    for case in cases:
+        history = COMMAND_DOMAINS.get(case.get("history", ""))
+        started = time.perf_counter()
+        for _ in range(REPEAT):
+            decision = router.classify(case["prompt"], history)
+        timings.append((time.perf_counter() - started) / REPEAT * 1_000_000)
+        decision = decision or SUPERVISOR
+        expected = case["expected"]
+        routable += expected != SUPERVISOR
+        if decision != SUPERVISOR:
+            routed += 1
+            routed_correct += decision == expected
+        if decision == expected:
+            correct += 1
+        else:
+            misses.append({"prompt": case["prompt"], "expected": expected, "got": decision})
+    timings.sort()
+    return {
+        "prompts": len(cases),
+        "accuracy": correct / len(cases),
+        "routed": routed,
+        "routed_precision": routed_correct / routed if routed else 1.0,
+        "routable_recall": routed_correct / routable if routable else 1.0,
+        "supervisor_calls_saved": routed_correct / len(cases),
+        "p50_us": statistics.median(timings),
+        "p95_us": timings[min(len(timings) - 1, round(0.95 * (len(timings) - 1)))],
+        "misses": misses,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--prompts", type=Path, default=PROMPTS)
+    parser.add_argument("--json", action="store_true", help="Print the raw report as JSON")
+    args = parser.parse_args()
+
+    report = evaluate(load(args.prompts))
+    if args.json:
+        json.dump(report, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+        return
+    print(f"prompts            {report['prompts']}")
+    print(f"accuracy           {report['accuracy']:.1%}")
+    print(f"routed             {report['routed']} "
+          f"(precision {report['routed_precision']:.1%}, "
+          f"recall {report['routable_recall']:.1%})")
+    print(f"supervisor saved   {report['supervisor_calls_saved']:.1%} of turns")
+    print(f"latency            p50 {report['p50_us']:.1f}µs  p95 {report['p95_us']:.1f}µs")
+    for miss in report["misses"]:
+        print(f"  miss  {miss['expected']:<18} -> {miss['got']:<18} {miss['prompt']}")
+
+
+if __name__ == "__main__":
+    main()
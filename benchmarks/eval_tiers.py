@@ -0,0 +1,145 @@
+"""Latency and cost per model tier on a typical mix of requests.
+
+Runs the same workload twice against the stand-in store: once with every
+agent on the large model, and once with the subagents on the small tier
+(``tiers.py``).  The models answer from the conversation state, so an
+escalated call gets the same answer from the large model.  Each model call
+takes the latency and token counts given on the command line, priced with
+``usage.PRICES``, so the report shows how calls, time and cost move between
+tiers; ``/usage`` shows the measured numbers of a real session.
+
+    python benchmarks/eval_tiers.py --large-latency 0.8 --small-latency 0.3
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Any
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench-key")
+os.environ.setdefault("TIENDANUBE_ACCESS_TOKEN", "bench-token")
+os.environ.setdefault("TIENDANUBE_STORE_ID", "1")
+
+from langchain_core.language_models import BaseChatModel  # noqa: E402
+from langchain_core.messages import AIMessage, HumanMessage  # noqa: E402
+from langchain_core.outputs import ChatGeneration, ChatResult  # noqa: E402
+
+from nube_agent import api  # noqa: E402
+from nube_agent.agent import build_agent  # noqa: E402
+from nube_agent.standin import StandinServer, StoreData  # noqa: E402
+from nube_agent.telemetry import SUPERVISOR, agent_name  # noqa: E402
+from nube_agent.usage import UsageTracker  # noqa: E402
+
+# prompt -> (subagent, tool, args); IDs exist in the default StoreData.
+WORKLOAD: dict[str, tuple[str, str, dict]] = {
+    "Which orders are pending payment?": (
+        "order-manager", "list_orders", {"payment_status": "pending"}),
+    "Show me order 1261": ("order-manager", "get_order", {"order_id": 1261}),
+    "List my products": ("catalog-manager", "list_products", {"per_page": 20}),
+    "Show the variants of product 1061": (
+        "catalog-manager", "list_variants", {"product_id": 1061}),
+    "List my customers": ("customer-manager", "list_customers", {}),
+    "Which coupons are active?": ("marketing-manager", "list_coupons", {"valid": "true"}),
+    "List the content pages": ("content-manager", "list_pages", {}),
+    "Add a note to order 1262": ("order-manager", "update_order", {
+        "order_id": 1262, "updates_json": '{"owner_note": "pick up"}'}),
+    "Set stock of variant 1062 to 5": ("catalog-manager", "update_variant", {
+        "product_id": 1061, "variant_id": 1062, "updates_json": '{"stock": 5}'}),
+}
+
+
+class PlanModel(BaseChatModel):
+    """Model that follows ``WORKLOAD``: delegate, call the tool, then answer."""
+
+    model_name: str = "gpt-4o"
+    latency: float = 0.0
+    input_tokens: int = 2500
+    output_tokens: int = 120
+
+    @property
+    def _llm_type(self) -> str:
+        return "plan"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "PlanModel":
+        return self
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        name = agent_name(run_manager.metadata if run_manager else None)
+        prompt = next(m.content for m in reversed(messages) if isinstance(m, HumanMessage))
+        subagent, tool, args = WORKLOAD[prompt]
+        calls = []
+        if isinstance(messages[-1], HumanMessage):
+            if name == SUPERVISOR:
+                tool, args = "task", {"subagent_type": subagent, "description": prompt}
+            calls = [{"name": tool, "args": args, "id": f"call_{time.perf_counter_ns()}",
+                      "type": "tool_call"}]
+        message = AIMessage(
+            content="" if calls else "Done.",
+            tool_calls=calls,
+            usage_metadata={
+                "input_tokens": self.input_tokens,
+                "output_tokens": self.output_tokens,
+                "total_tokens": self.input_tokens + self.output_tokens,
+            },
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def run_workload(tiered: bool, *, large_latency: float, small_latency: float) -> dict:
+    """Run every ``WORKLOAD`` prompt once and return totals per model."""
+    large = PlanModel(model_name="gpt-4o", latency=large_latency)
+    small = PlanModel(model_name="gpt-4o-mini", latency=small_latency) if tiered else None
+    tracker = UsageTracker()
+    turns = []
+    with StandinServer(StoreData(), rate_limit=10**9) as standin:
+        store = api.StoreClient("1", "bench-token", base_url=standin.base_url)
+        api.set_default_store(store)
+        agent = build_agent(model=large, small_model=small)
+        for i, prompt in enumerate(WORKLOAD):
+            config = {"configurable": {"thread_id": f"tiers-{i}"}, "callbacks": [tracker]}
+            started = time.perf_counter()
+            agent.invoke({"messages": [{"role": "user", "content": prompt}]}, config)
+            turns.append(time.perf_counter() - started)
+        store.close()
+    total = tracker.session.total()
+    return {
+        "turn_p50_ms": statistics.median(turns) * 1000,
+        "cost": total["cost"],
+        "models": {
+            model: {"calls": b["calls"], "avg_ms": b["ms"] / b["calls"], "cost": b["cost"]}
+            for model, b in tracker.session.models.items()
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--large-latency", type=float, default=0.0, help="Seconds per call")
+    parser.add_argument("--small-latency", type=float, default=0.0, help="Seconds per call")
+    parser.add_argument("--json", action="store_true", help="Print raw results as JSON")
+    args = parser.parse_args()
+
+    latencies = {"large_latency": args.large_latency, "small_latency": args.small_latency}
+    report = {
+        "single": run_workload(False, **latencies),
+        "tiered": run_workload(True, **latencies),
+    }
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+        return
+    print(f"{'setup':<8}{'model':<14}{'calls':>6}{'avg ms':>9}{'cost $':>10}")
+    for setup, result in report.items():
+        for model, b in result["models"].items():
+            print(f"{setup:<8}{model:<14}{b['calls']:>6}{b['avg_ms']:>9.1f}{b['cost']:>10.4f}")
+        print(f"{setup:<8}{'total':<14}{'':>6}{'':>9}{result['cost']:>10.4f}"
+              f"   turn p50 {result['turn_p50_ms']:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
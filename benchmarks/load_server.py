@@ -0,0 +1,171 @@
+"""Load test for ``nube-agent serve``.
+
+Starts the stand-in store and the ASGI server (uvicorn, in a thread) with a
+deterministic model, then opens N sessions that each send one message at the
+same time and read the SSE stream to the end.  Every turn dispatches to the
+catalog manager, which lists products, so with the GET cache on most
+sessions are answered without reaching the store.
+
+    python benchmarks/load_server.py --sessions 1 10 50 --api-latency 0.05
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from typing import Any
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench-key")
+os.environ.setdefault("TIENDANUBE_ACCESS_TOKEN", "bench-token")
+os.environ.setdefault("TIENDANUBE_STORE_ID", "1")
+
+import httpx  # noqa: E402
+from langchain_core.language_models import BaseChatModel  # noqa: E402
+from langchain_core.messages import AIMessage, HumanMessage  # noqa: E402
+from langchain_core.outputs import ChatGeneration, ChatResult  # noqa: E402
+
+from nube_agent import api  # noqa: E402
+from nube_agent.agent import build_agent  # noqa: E402
+from nube_agent.server import AgentServer  # noqa: E402
+from nube_agent.standin import StandinServer, StoreData  # noqa: E402
+from nube_agent.telemetry import agent_name  # noqa: E402
+
+# First call of each agent in a turn: (tool, args).  The second call answers.
+CALLS = {
+    "supervisor": ("task", {"subagent_type": "catalog-manager", "description": "List products"}),
+    "catalog-manager": ("list_products", {"per_page": 20}),
+}
+
+
+class ReplyModel(BaseChatModel):
+    """Model that answers from the conversation state instead of a queue.
+
+    ``ScriptedChatModel`` queues are shared by every thread, so concurrent
+    sessions would take each other's responses; this model calls the agent's
+    tool when the last message is from the user and answers otherwise.
+    """
+
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "reply"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "ReplyModel":
+        return self
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        name = agent_name(run_manager.metadata if run_manager else None)
+        if isinstance(messages[-1], HumanMessage) and name in CALLS:
+            tool, args = CALLS[name]
+            message = AIMessage(
+                content="",
+                tool_calls=[{"name": tool, "args": args, "id": f"call_{time.perf_counter_ns()}",
+                             "type": "tool_call"}],
+            )
+        else:
+            message = AIMessage(content="You have 20 products on the first page.")
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def _serve(app) -> tuple[Any, threading.Thread, str]:
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, thread, f"http://127.0.0.1:{port}"
+
+
+def _session(base: str, index: int, barrier: threading.Barrier, out: list) -> None:
+    with httpx.Client(base_url=base, timeout=120) as client:
+        thread_id = client.post("/sessions", json={"thread_id": f"load-{index}"}).json()[
+            "thread_id"
+        ]
+        barrier.wait()
+        started = time.perf_counter()
+        first = None
+        with client.stream(
+            "POST", f"/sessions/{thread_id}/messages", json={"content": "List my products"}
+        ) as resp:
+            for line in resp.iter_lines():
+                if line.startswith("event:"):
+                    first = first or time.perf_counter() - started
+        out.append({"total": time.perf_counter() - started, "first": first or 0.0})
+
+
+def run_load(
+    sessions: int, *, cache_ttl: float = 30.0, latency: float = 0.0, api_latency: float = 0.0
+) -> dict[str, float]:
+    """Run ``sessions`` concurrent turns against a fresh server and stand-in."""
+    with StandinServer(StoreData(), latency=api_latency, rate_limit=10**9) as standin:
+        store = api.StoreClient("1", "bench-token", base_url=standin.base_url, cache_ttl=cache_ttl)
+        api.set_default_store(store)
+        app = AgentServer(build_agent(model=ReplyModel(latency=latency)), workers=sessions)
+        server, thread, base = _serve(app)
+        try:
+            results: list[dict] = []
+            barrier = threading.Barrier(sessions + 1)
+            clients = [
+                threading.Thread(target=_session, args=(base, i, barrier, results))
+                for i in range(sessions)
+            ]
+            for client in clients:
+                client.start()
+            barrier.wait()
+            started = time.perf_counter()
+            for client in clients:
+                client.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            server.should_exit = True
+            thread.join()
+            store.close()
+        totals = sorted(r["total"] for r in results)
+        return {
+            "sessions": sessions,
+            "elapsed_s": elapsed,
+            "turns_per_s": len(results) / elapsed,
+            "p50_ms": statistics.median(totals) * 1000,
+            "p95_ms": totals[min(len(totals) - 1, round(0.95 * (len(totals) - 1)))] * 1000,
+            "first_event_p50_ms": statistics.median(r["first"] for r in results) * 1000,
+            "api_requests": standin.requests,
+            "cache_hits": store.cache.hits,
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--cache-ttl", type=float, default=30.0)
+    parser.add_argument("--latency", type=float, default=0.0, help="Model latency per call (s)")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="Stand-in latency (s)")
+    parser.add_argument("--json", action="store_true", help="Print raw results as JSON")
+    args = parser.parse_args()
+
+    report = [
+        run_load(n, cache_ttl=args.cache_ttl, latency=args.latency, api_latency=args.api_latency)
+        for n in args.sessions
+    ]
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+        return
+    columns = ("sessions", "turns_per_s", "p50_ms", "p95_ms", "first_event_p50_ms",
+               "api_requests", "cache_hits")
+    print("".join(f"{c:>20}" for c in columns))
+    for row in report:
+        print("".join(f"{row[c]:>20.1f}" if isinstance(row[c], float) else f"{row[c]:>20}"
+                      for c in columns))
+
+
+if __name__ == "__main__":
+    main()
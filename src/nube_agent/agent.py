@@ -2,10 +2,61 @@ from deepagents import create_deep_agent
 from deepagents.backends import CompositeBackend, StateBackend, StoreBackend
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.store.memory import InMemoryStore
-from nube_agent.config import MODEL
-from nube_agent.prompts import load_system_prompt
-from nube_agent.subagents import SUBAGENTS
+
+from nube_agent.approvals import ApprovalPolicy
+from nube_agent.coalesce import CoalesceWritesMiddleware
+from nube_agent.config import (
+    ANSWER_CACHE_TTL,
+    AUTO_APPROVE,
+    COALESCE_WRITES,
+    MODEL,
+    ROUTER,
+    SMALL_MODEL,
+)
+from nube_agent.prompts import StablePromptMiddleware, load_system_prompt
+from nube_agent.telemetry import SUPERVISOR
+from nube_agent.tiers import subagent_specs
+from nube_agent.tools.digest import get_daily_digest
+from nube_agent.tools.export import export_data
 from nube_agent.tools.store import get_store_info
+from nube_agent.tools.stores import query_stores
+from nube_agent.tools.undo import undo
+
+
+def load_model(spec: str | None = None):
+    """Resolve a model spec from config.
+
+    ``fake:<script.json>`` selects the offline scripted model.  OpenAI models
+    use the Responses API (as deepagents does) with usage reporting on streamed
+    responses, so every call carries ``usage_metadata`` for ``/usage``.  Any
+    other spec is passed through for deepagents to resolve.
+    """
+    spec = spec or MODEL
+    if spec.startswith("fake:"):
+        from nube_agent.fake_model import ScriptedChatModel
+
+        return ScriptedChatModel.from_file(spec.removeprefix("fake:"))
+    if spec.startswith("openai:"):
+        from langchain.chat_models import init_chat_model
+
+        return init_chat_model(spec, use_responses_api=True, stream_usage=True)
+    return spec
+
+
+def resolve_model(model):
+    """A chat model instance for ``model``, a spec string or an instance.
+
+    Specs go through :func:`load_model`; those it passes through are built
+    with ``init_chat_model``.
+    """
+    if isinstance(model, str):
+        model = load_model(model)
+    if isinstance(model, str):
+        from langchain.chat_models import init_chat_model
+
+        return init_chat_model(model)
+    return model
+
 
 def _make_backend(runtime):
     """Create a CompositeBackend that routes /memories/ to the store."""
@@ -15,23 +66,78 @@ def _make_backend(runtime):
     )
 
 
-def build_agent():
+def build_agent(
+    model=None,
+    *,
+    small_model=None,
+    router: bool | None = None,
+    answer_ttl: float | None = None,
+    approvals: ApprovalPolicy | None = None,
+):
     """Create and return the deep agent with sub-agents, HITL, and memory.
 
+    ``model`` overrides ``config.MODEL`` (a spec string or a chat model
+    instance, e.g. a ``ScriptedChatModel`` in benchmarks) and ``small_model``
+    overrides ``config.SMALL_MODEL``, the tier for routine subagent work (see
+    ``tiers.py``).  When ``model`` is given without ``small_model``, every
+    agent uses ``model``.  With ``router`` (default: ``config.ROUTER``) the
+    agent is wrapped in a :class:`~nube_agent.router.RoutedAgent` that sends
+    obvious requests straight to a subagent.  A positive ``answer_ttl``
+    (default: ``config.ANSWER_CACHE_TTL``) adds an
+    :class:`~nube_agent.answers.CachedAgent` that replays answers to repeated
+    read-only questions.  Every agent's prompt is kept in a cache-friendly
+    order by :class:`~nube_agent.prompts.StablePromptMiddleware`, and with
+    ``config.COALESCE_WRITES`` each subagent merges the writes of a step with
+    :class:`~nube_agent.coalesce.CoalesceWritesMiddleware`.  Gated tool calls
+    that ``approvals`` (default: rules from ``config.AUTO_APPROVE``) approves
+    run without pausing for confirmation.
+
     Both the store and checkpointer are in-memory: all state and memories are
     lost when the CLI process exits.  See "What's Next" in the blog post for
     the plan to swap these for persistent backends.
     """
     store = InMemoryStore()
     checkpointer = MemorySaver()
+    if approvals is None:
+        approvals = ApprovalPolicy.parse(AUTO_APPROVE)
+    if small_model is None and model is None and SMALL_MODEL not in ("", MODEL):
+        small_model = load_model(SMALL_MODEL)
+    model = resolve_model(load_model() if model is None else model)
+    small = model if small_model is None else resolve_model(small_model)
+    specs = []
+    for spec in subagent_specs(model, small):
+        middleware = [*spec["middleware"], StablePromptMiddleware(spec["name"])]
+        if COALESCE_WRITES:
+            middleware.insert(0, CoalesceWritesMiddleware(spec["name"]))
+        spec = {**spec, "middleware": middleware}
+        if spec.get("interrupt_on"):
+            spec["interrupt_on"] = approvals.interrupt_on(spec["interrupt_on"])
+        specs.append(spec)
     agent = create_deep_agent(
-        model=MODEL,
-        tools=[get_store_info],
+        model=model,
+        tools=[get_store_info, query_stores, export_data, undo, get_daily_digest],
         system_prompt=load_system_prompt(),
         skills=["skills/store-overview/", "skills/troubleshooting/"],
-        subagents=SUBAGENTS,
+        subagents=specs,
+        middleware=[StablePromptMiddleware(SUPERVISOR)],
+        interrupt_on=approvals.interrupt_on({"undo": True}),
         backend=_make_backend,
         store=store,
         checkpointer=checkpointer,
     )
+    if router is None:
+        router = ROUTER
+    if router:
+        from nube_agent.router import RoutedAgent, build_subagent_graphs
+
+        subagents = build_subagent_graphs(
+            specs, model, backend=_make_backend, store=store, checkpointer=checkpointer
+        )
+        agent = RoutedAgent(agent, subagents)
+    if answer_ttl is None:
+        answer_ttl = ANSWER_CACHE_TTL
+    if answer_ttl > 0:
+        from nube_agent.answers import AnswerCache, CachedAgent
+
+        agent = CachedAgent(agent, AnswerCache(answer_ttl))
     return agent
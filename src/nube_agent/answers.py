@@ -0,0 +1,173 @@
+"""Answer cache for repeated questions.
+
+Staff ask the same read-only questions again and again ("how many orders
+are pending payment?").  :class:`CachedAgent` keeps the final answer of each
+turn under a normalized form of the prompt, together with the version stamp
+of every resource family the turn read (``api.RequestLog``).  When the same
+question comes back on the same store and day, and none of those families has
+been written to since, the answer is replayed without any model call.
+
+An answer is only kept when the turn made no writes and no failed requests,
+ended without pending approvals, and the prompt does not lean on the conversation ("cancel *that*
+one").  Changes made outside this process (orders placed in the shop, edits
+in the admin) do not bump version stamps, so entries also expire after
+``NUBE_AGENT_ANSWER_CACHE_TTL`` seconds.
+"""
+
+import datetime
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterator
+from typing import Any
+
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+
+from nube_agent import api, telemetry
+from nube_agent.router import words
+
+# Words dropped from prompts before comparing them.
+FILLER = frozenset({
+    "please", "pls", "hey", "hi", "hello", "can", "could", "would", "you", "me", "tell",
+    "show", "give", "the", "a", "an", "my", "i", "do", "have", "there", "are", "is",
+    "por", "favor", "hola", "podes", "podrias", "puedes", "decime", "dime", "mostrame",
+    "muestrame", "dame", "el", "la", "los", "las", "un", "una", "mis", "mi", "tengo", "hay",
+    "voce", "pode", "mostre", "meus", "minhas", "o", "os", "as",
+})
+# Words that point back into the conversation: such prompts are never cached.
+CONTEXT_WORDS = frozenset({
+    "it", "that", "this", "those", "these", "them", "one", "ones", "same", "again", "previous",
+    "above", "ese", "esa", "eso", "esos", "esas", "este", "esta", "esto", "mismo",
+    "anterior", "isso", "esse", "essa", "aquele", "aquela",
+})
+
+
+def normalize(prompt: str) -> str | None:
+    """Comparable form of ``prompt``, or None when it depends on the conversation."""
+    tokens = words(prompt)
+    if not tokens or CONTEXT_WORDS.intersection(tokens):
+        return None
+    return " ".join(t for t in tokens if t not in FILLER) or None
+
+
+class AnswerCache:
+    """Answers by (store, day, normalized prompt), valid while their reads are current."""
+
+    def __init__(self, ttl: float, max_entries: int = 256) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, tuple[float, dict, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(prompt: str, store_id: str) -> tuple | None:
+        normalized = normalize(prompt)
+        if normalized is None:
+            return None
+        return store_id, datetime.date.today().isoformat(), normalized
+
+    def get(self, key: tuple) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] >= time.monotonic() and api.is_current(entry[1]):
+            with self._lock:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return entry[2]
+        with self._lock:
+            self._entries.pop(key, None)
+            self.misses += 1
+        return None
+
+    def put(self, key: tuple, answer: str, reads: dict) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, dict(reads), answer)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+def _prompt(value: Any) -> str | None:
+    if not isinstance(value, dict) or len(value.get("messages") or []) != 1:
+        return None
+    message = value["messages"][0]
+    if isinstance(message, dict) and message.get("role") == "user":
+        content = message.get("content")
+    elif isinstance(message, HumanMessage):
+        content = message.content
+    else:
+        return None
+    return content if isinstance(content, str) else None
+
+
+class CachedAgent:
+    """An agent (graph or ``RoutedAgent``) that replays cached answers.
+
+    Exposes the same ``stream``, ``invoke`` and ``get_state`` interface.  A
+    replayed answer is streamed as one message chunk (``stream_mode="messages"``
+    only) and appended to the thread like any other turn.
+    """
+
+    def __init__(self, agent, cache: AnswerCache) -> None:
+        self.agent = agent
+        self.cache = cache
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.agent, name)
+
+    def _lookup(self, value: Any, config: dict) -> tuple[tuple | None, str | None]:
+        prompt = _prompt(value)
+        if prompt is None:
+            return None, None
+        key = AnswerCache.key(prompt, api.current_store().store_id)
+        if key is None:
+            return None, None
+        started = time.perf_counter()
+        answer = self.cache.get(key)
+        telemetry.TRACER.record(telemetry.make_span(
+            "cache", "answer hit" if answer is not None else "answer miss", started
+        ))
+        if answer is not None:
+            self.agent.update_state(
+                config, {"messages": [HumanMessage(prompt), AIMessage(answer)]}
+            )
+        return key, answer
+
+    def _store(self, key: tuple | None, log: api.RequestLog, config: dict) -> None:
+        if key is None or log.writes or log.errors:
+            return
+        state = self.agent.get_state(config)
+        messages = state.values.get("messages") or []
+        if state.interrupts or not messages or not isinstance(messages[-1], AIMessage):
+            return
+        answer = telemetry.output_text(messages[-1])
+        if answer and not messages[-1].tool_calls:
+            self.cache.put(key, answer, log.reads)
+
+    def stream(self, value: Any, config: dict, **kwargs: Any) -> Iterator[Any]:
+        if kwargs.get("stream_mode") != "messages":
+            yield from self.agent.stream(value, config=config, **kwargs)
+            return
+        key, answer = self._lookup(value, config)
+        if answer is not None:
+            yield AIMessageChunk(content=answer), {"langgraph_node": "answer_cache"}
+            return
+        with api.track_requests() as log:
+            yield from self.agent.stream(value, config=config, **kwargs)
+        self._store(key, log, config)
+
+    def invoke(self, value: Any, config: dict, **kwargs: Any) -> dict:
+        key, answer = self._lookup(value, config)
+        if answer is not None:
+            return self.agent.get_state(config).values
+        with api.track_requests() as log:
+            result = self.agent.invoke(value, config, **kwargs)
+        self._store(key, log, config)
+        return result
@@ -1,19 +1,959 @@
+"""Tiendanube API access.
+
+Every request goes through a :class:`StoreClient`, which owns one store's
+credentials, pooled HTTP connections, rate limiting, circuit breakers, GET
+cache and store info.  The client used by ``request()`` (and so by every tool) is chosen per
+context with :func:`use_store`, so sessions and threads working on different
+stores never share state.  Without a selection the default store from
+``TIENDANUBE_STORE_ID``/``TIENDANUBE_ACCESS_TOKEN`` is used.
+
+When an endpoint family keeps timing out or failing with 5xx, its
+:class:`CircuitBreaker` opens and requests to it fail at once instead of each
+waiting for the timeout.  Meanwhile reads are answered with the last
+response seen for them, which :func:`to_json` marks as stale.
+
+Inside :func:`buffer_writes` (set per tool call by ``coalesce.py``), PUT
+requests are held in a :class:`WriteBuffer` and sent once per resource when
+the batch of tool calls ends; :func:`write_through` opts a block out.
+"""
+
+import contextlib
+import contextvars
+import copy
 import json
+import random
+import threading
 import time
-from functools import lru_cache
-from typing import Any
+import uuid
+from collections import OrderedDict
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, TypeVar
 
 import httpx
 
-from nube_agent.config import BASE_URL, TIENDANUBE_ACCESS_TOKEN, USER_AGENT
+from nube_agent import telemetry
+from nube_agent.config import (
+    API_VERSION_URL,
+    BASE_URL,
+    BREAKER_COOLDOWN,
+    BREAKER_THRESHOLD,
+    CACHE_TTL,
+    CONNECT_TIMEOUT,
+    DEGRADED_READS,
+    FANOUT_WORKERS,
+    HTTP_POOL_SIZE,
+    READ_TIMEOUT,
+    RETRIES,
+    RETRY_BACKOFF,
+    STORES_FILE,
+    TIENDANUBE_ACCESS_TOKEN,
+    TIENDANUBE_STORE_ID,
+    USER_AGENT,
+)
+from nube_agent.journal import (
+    DONE,
+    FAILED,
+    PENDING,
+    CallSequence,
+    WriteJournal,
+    get_journal,
+    idempotency_key,
+)
+
+T = TypeVar("T")
+
+# Transport errors raised before the request reached the store.
+_UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+# Resources a WriteBuffer sends at once when it flushes.
+FLUSH_WORKERS = 4
+
+# Journal scopes of undo runs; their writes are not snapshotted themselves.
+UNDO_SCOPE = "undo:"
+
+# Separates a stale result's JSON from the note about its age (see to_json).
+STALE_NOTE = "\n\nNote: the Tiendanube API is not responding; this is cached data from "
+
+
+def resource_family(path: str) -> str:
+    """First path segment, e.g. ``products`` for ``/products/1/variants``."""
+    return path.strip("/").split("/", 1)[0]
+
+
+class ResponseCache:
+    """TTL cache for successful GET responses of one store.
+
+    Keys are the path and query parameters.  Expired entries stay until they
+    are evicted, for :meth:`stale` lookups while the API is down.  A successful write to a path
+    drops all cached responses of the same resource family, so a session
+    never reads back stale data after its own (or another session's) change.
+    Each invalidation also bumps the family's version stamp, which answers
+    built from that family (see ``answers.py``) are checked against.
+    ``ttls`` overrides ``ttl`` per family, e.g. longer for families kept
+    fresh by webhooks (see ``webhooks.py``).
+    """
+
+    def __init__(self, ttl: float = 0.0, max_entries: int = 1024) -> None:
+        self.ttl = ttl
+        self.ttls: dict[str, float] = {}
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, tuple[float, float, str, Any]] = OrderedDict()
+        self._versions: dict[str, int] = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def version(self, family: str) -> tuple[int, int]:
+        """Stamp that changes whenever ``family`` is written to or the cache is cleared."""
+        with self._lock:
+            return self._epoch, self._versions.get(family, 0)
+
+    def ttl_for(self, path: str) -> float:
+        return self.ttls.get(resource_family(path), self.ttl)
+
+    @staticmethod
+    def key(path: str, params: dict[str, Any] | None) -> tuple:
+        return path, tuple(sorted((k, str(v)) for k, v in (params or {}).items()))
+
+    def get(self, key: tuple) -> Any | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            value = entry[3]
+        return copy.deepcopy(value)
+
+    def stale(self, key: tuple) -> tuple[float, Any] | None:
+        """The last response stored for ``key``, however old, and its age in seconds."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            age, value = time.monotonic() - entry[1], entry[3]
+        return age, copy.deepcopy(value)
+
+    def put(self, key: tuple, value: Any) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = (
+                now + self.ttl_for(key[0]), now, resource_family(key[0]), copy.deepcopy(value)
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, family: str, path: str | None = None) -> int:
+        """Drop the cached responses of ``family``; returns how many were dropped.
+
+        With ``path`` (``/products/12``) only that resource, what is nested
+        under it and the family's listings are dropped; other resources of
+        the family stay cached.
+        """
+
+        def affected(key_path: str) -> bool:
+            if path is None or key_path == path or key_path.startswith(f"{path}/"):
+                return True
+            parts = key_path.strip("/").split("/")
+            return len(parts) < 2 or not parts[1].isdigit()
+
+        with self._lock:
+            self._versions[family] = self._versions.get(family, 0) + 1
+            keys = [k for k, entry in self._entries.items()
+                    if entry[2] == family and affected(k[0])]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._epoch += 1
+            self.hits = self.misses = 0
+
+
+class RequestLog:
+    """Requests made while it is active (see :func:`track_requests`).
+
+    ``reads`` maps ``(store_id, family)`` to the family's version stamp at the
+    first read, so a result built from those reads can later be checked for
+    staleness with :func:`is_current`; ``writes`` and ``errors`` count the
+    other requests and the failed ones.
+    """
+
+    def __init__(self) -> None:
+        self.reads: dict[tuple[str, str], tuple[int, int]] = {}
+        self.writes = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def record(self, client: "StoreClient", method: str, path: str) -> None:
+        family = resource_family(path)
+        with self._lock:
+            if method != "GET":
+                self.writes += 1
+            elif (client.store_id, family) not in self.reads:
+                self.reads[(client.store_id, family)] = client.cache.version(family)
+
+    def failed(self) -> None:
+        with self._lock:
+            self.errors += 1
+
+
+def _merge(base: dict, update: dict, prefix: str = "") -> tuple[dict, str | None]:
+    """``update`` merged into ``base`` (nested objects field by field).
+
+    Returns the merged body and the first field set to two different values,
+    if any.
+    """
+    merged = dict(base)
+    for field, value in update.items():
+        name = f"{prefix}{field}"
+        if field not in merged:
+            merged[field] = value
+        elif isinstance(merged[field], dict) and isinstance(value, dict):
+            merged[field], conflict = _merge(merged[field], value, f"{name}.")
+            if conflict:
+                return base, conflict
+        elif merged[field] != value:
+            return base, name
+    return merged, None
+
+
+def _overlaps(pending: str, path: str) -> bool:
+    """Whether a request to ``path`` reads or changes the resource at ``pending``."""
+    pending, path = pending.rstrip("/"), path.rstrip("/")
+    return pending == path or pending.startswith(f"{path}/") or path.startswith(f"{pending}/")
+
+
+class WriteBuffer:
+    """PUT requests held back during one batch of tool calls, merged per resource.
+
+    Each queued body is merged into the pending body for the same store and
+    path, and :meth:`flush` sends one PUT per resource.  Two bodies setting
+    the same field to different values conflict: the second one is refused
+    instead of letting the order of concurrent tool calls pick the winner.
+    Any other request to a resource with pending writes (a read, a delete, a
+    nested create) flushes them first, so it sees or builds on the update.
+    Results are kept per caller (``owner``), the tool call that queued it.
+    """
+
+    def __init__(self) -> None:
+        self.results: dict[str, Any] = {}
+        self.merged = 0
+        self._pending: dict[tuple[str, str], dict] = {}
+        self._lock = threading.Lock()
+
+    def queue(self, client: "StoreClient", path: str, body: dict, owner: str) -> dict | str:
+        """Add a PUT body to the pending write for ``path``. Returns a receipt or an error."""
+        with self._lock:
+            entry = self._pending.get((client.store_id, path))
+            if entry is None:
+                entry = self._pending[(client.store_id, path)] = {
+                    "client": client, "body": {}, "owners": [],
+                }
+            entry["body"], conflict = _merge(entry["body"], body)
+            if conflict:
+                return (
+                    f"Error: conflicting update to {path}: '{conflict}' is set to a different "
+                    "value by another call in this step. Send it once, with the value you want."
+                )
+            self.merged += bool(entry["owners"])
+            entry["owners"].append(owner)
+        return {
+            "status": "queued",
+            "message": "Saved together with the other updates to this resource "
+            "when this step's tool calls finish.",
+        }
+
+    def pending(self) -> int:
+        """Number of resources with writes waiting to be sent."""
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self, client: "StoreClient | None" = None, path: str | None = None) -> dict:
+        """Send the pending writes, or only those overlapping ``path`` on ``client``.
+
+        Returns the results of every write sent so far, by owner.
+        """
+        with self._lock:
+            keys = [
+                key for key in self._pending
+                if path is None or (key[0] == client.store_id and _overlaps(key[1], path))
+            ]
+            entries = [(key[1], self._pending.pop(key)) for key in keys]
+
+        def send(path: str, entry: dict) -> Any:
+            with write_through():
+                return entry["client"].request("PUT", path, json_body=entry["body"])
+
+        if len(entries) == 1:
+            results = [send(*entries[0])]
+        elif entries:
+            with ThreadPoolExecutor(max_workers=min(FLUSH_WORKERS, len(entries))) as pool:
+                futures = [pool.submit(contextvars.copy_context().run, send, *e) for e in entries]
+                results = [future.result() for future in futures]
+        else:
+            results = []
+        with self._lock:
+            for (_, entry), result in zip(entries, results, strict=True):
+                for owner in entry["owners"]:
+                    self.results[owner] = result
+            return dict(self.results)
+
+
+class CircuitBreaker:
+    """Fails fast while one endpoint family of a store is down.
+
+    After ``threshold`` consecutive failures (connection errors, timeouts,
+    5xx responses) the circuit opens: requests fail at once for ``cooldown``
+    seconds instead of each waiting for its timeout.  Then a single request
+    goes out as a trial; success closes the circuit, failure opens it for
+    another ``cooldown``.
+    """
+
+    def __init__(
+        self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN
+    ) -> None:
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened = 0
+        self._open_until: float | None = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._open_until is not None
+
+    def retry_in(self) -> float:
+        """Seconds until requests go out again; 0 means send this one."""
+        with self._lock:
+            if self._open_until is None:
+                return 0.0
+            remaining = self._open_until - time.monotonic()
+            if remaining > 0:
+                return remaining
+            if self._trial:
+                # Another request is the trial; wait for its outcome.
+                return 1.0
+            self._trial = True
+            return 0.0
+
+    def release(self) -> None:
+        """Give back the trial slot of a request that was not sent after all."""
+        with self._lock:
+            self._trial = False
+
+    def record(self, ok: bool) -> bool:
+        """Count a request's outcome. Returns True if this failure opened the circuit."""
+        with self._lock:
+            if ok:
+                self.failures = 0
+                self._open_until = None
+                self._trial = False
+                return False
+            self.failures += 1
+            trial, self._trial = self._trial, False
+            if trial or (self._open_until is None and self.failures >= self.threshold):
+                self._open_until = time.monotonic() + self.cooldown
+                self.opened += 1
+                return True
+            return False
+
+
+class RateLimiter:
+    """Paces requests to one store from the ``x-rate-limit-*`` response headers.
+
+    The API drains each store's bucket at a fixed rate and answers 429 when it
+    is full.  When a response reports ``reserve`` or fewer free slots, the
+    next requests wait until enough slots have drained instead of hitting the
+    limit.  Responses without the headers never cause a wait.
+    """
+
+    def __init__(self, reserve: int = 1) -> None:
+        self.reserve = reserve
+        self.waited = 0.0
+        self._ready_at = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self._lock:
+            delay = self._ready_at - time.monotonic()
+        if delay > 0:
+            self.waited += delay
+            time.sleep(delay)
+
+    def update(self, headers: httpx.Headers) -> None:
+        try:
+            limit = int(headers["x-rate-limit-limit"])
+            remaining = int(headers["x-rate-limit-remaining"])
+            reset_ms = int(headers["x-rate-limit-reset"])
+        except (KeyError, ValueError):
+            return
+        if remaining > self.reserve or limit <= 0:
+            return
+        # reset_ms drains the whole used bucket; wait for the slots we need.
+        per_slot = reset_ms / 1000 / max(1, limit - remaining)
+        with self._lock:
+            self._ready_at = max(
+                self._ready_at, time.monotonic() + per_slot * (self.reserve + 1 - remaining)
+            )
+
+
+class StoreClient:
+    """API client for one store: credentials, connection pool, limiter and caches."""
+
+    def __init__(
+        self,
+        store_id: str,
+        access_token: str,
+        *,
+        base_url: str | None = None,
+        pool_size: int = HTTP_POOL_SIZE,
+        cache_ttl: float = CACHE_TTL,
+        user_agent: str = USER_AGENT,
+        connect_timeout: float = CONNECT_TIMEOUT,
+        read_timeout: float = READ_TIMEOUT,
+        degraded_reads: bool = DEGRADED_READS,
+        retries: int = RETRIES,
+        backoff: float = RETRY_BACKOFF,
+        journal: WriteJournal | None = None,
+    ) -> None:
+        self.store_id = str(store_id)
+        self.base_url = base_url or f"{API_VERSION_URL}/{self.store_id}"
+        self.pool_size = pool_size
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.degraded_reads = degraded_reads
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.journal = journal
+        self.cache = ResponseCache(cache_ttl)
+        self.limiter = RateLimiter()
+        self.breakers: dict[str, CircuitBreaker] = {}
+        self._headers = {
+            "Authentication": f"bearer {access_token}",
+            "User-Agent": user_agent,
+            "Content-Type": "application/json",
+        }
+        self._client: httpx.Client | None = None
+        self._info: dict | None = None
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"StoreClient({self.store_id!r}, base_url={self.base_url!r})"
+
+    def http(self) -> httpx.Client:
+        """This store's pooled HTTP client (created on first use)."""
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(
+                    timeout=self.timeout,
+                    limits=httpx.Limits(
+                        max_connections=self.pool_size,
+                        max_keepalive_connections=self.pool_size,
+                    ),
+                )
+            return self._client
+
+    def close(self) -> None:
+        """Close the connection pool; the next request opens a new one."""
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    def reset(self) -> None:
+        """Forget the cached store info, GET responses and endpoint failures."""
+        with self._lock:
+            self._info = None
+            self.breakers.clear()
+        self.cache.clear()
+
+    def breaker(self, family: str) -> CircuitBreaker:
+        """The circuit breaker for one endpoint family (``products``, ``orders``, ...)."""
+        with self._lock:
+            if family not in self.breakers:
+                self.breakers[family] = CircuitBreaker()
+            return self.breakers[family]
+
+    def _unavailable(self, family: str, cache_key: tuple | None, error: str) -> Any:
+        """The stale response for ``cache_key`` while ``family`` is down, else ``error``."""
+        stale = self.cache.stale(cache_key) if cache_key is not None else None
+        if stale is None:
+            return error
+        age, value = stale
+        if isinstance(value, dict):
+            value = StaleDict(value)
+        elif isinstance(value, list):
+            value = StaleList(value)
+        else:
+            return error
+        value.stale_age = age
+        return value
+
+    def info(self) -> dict:
+        """The store info from ``/store``, fetched once."""
+        if self._info is None:
+            raw = self.request("GET", "/store")
+            if not isinstance(raw, dict):
+                return {}
+            with self._lock:
+                self._info = raw
+        return self._info
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        *,
+        params: dict[str, Any] | None = None,
+        json_body: dict[str, Any] | None = None,
+    ) -> dict[str, Any] | list[Any] | str:
+        """Make an HTTP request to this store. See :func:`request`."""
+        buffered = _write_buffer.get()
+        if buffered is not None:
+            buffer, owner = buffered
+            if method == "PUT" and json_body:
+                log = _request_log.get()
+                if log is not None:
+                    log.record(self, method, path)
+                return buffer.queue(self, path, json_body, owner)
+            buffer.flush(self, path)
+        url = f"{self.base_url}{path}"
+        started = time.perf_counter()
+        status = 0
+        nbytes = 0
+        retries = 0
+        stale = replayed = False
+        cache = self.cache
+        log = _request_log.get()
+        if log is not None:
+            log.record(self, method, path)
+        cache_key = None
+        ttl = cache.ttl_for(path)
+        if method == "GET" and (ttl > 0 or self.degraded_reads):
+            cache_key = ResponseCache.key(path, params)
+        if cache_key is not None and ttl > 0:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                telemetry.record_http(
+                    method, path, started, status=200, nbytes=0, retries=0, cache_hit=True
+                )
+                return cached
+
+        family = resource_family(path)
+        breaker = self.breaker(family)
+
+        def failed(error: str) -> Any:
+            nonlocal stale
+            if breaker.record(False):
+                telemetry.TRACER.record(telemetry.make_span(
+                    "breaker", f"open {family}", started, store=self.store_id,
+                    failures=breaker.failures, cooldown_s=breaker.cooldown,
+                ))
+            if not breaker.is_open():
+                return error
+            result = self._unavailable(family, cache_key, error)
+            stale = result is not error
+            return result
 
+        journal = None
+        outcome, applied = FAILED, None
+        headers = self._headers
+        snapshot = False
+        before = None
+        call = None
+        if method != "GET":
+            scope = _journal_scope.get()
+            if scope is None:
+                key = uuid.uuid4().hex
+            else:
+                base = idempotency_key(scope, self.store_id, method, path, json_body)
+                calls = _journal_calls.get()
+                call = (calls, base, calls.start(base)) if calls is not None else None
+                seq = call[2] if call is not None else 0
+                key = idempotency_key(scope, self.store_id, method, path, json_body, seq)
+                journal = self.journal or get_journal()
+                snapshot = not scope.startswith(UNDO_SCOPE)
+            headers = {**headers, "Idempotency-Key": key}
+        # POSTs are not idempotent: only retried when the store cannot have applied them.
+        safe = method != "POST"
+        maybe_applied = False
 
-def _headers() -> dict[str, str]:
-    return {
-        "Authentication": f"bearer {TIENDANUBE_ACCESS_TOKEN}",
-        "User-Agent": USER_AGENT,
-        "Content-Type": "application/json",
-    }
+        try:
+            wait = breaker.retry_in()
+            if wait > 0:
+                journal = None
+                result = self._unavailable(family, cache_key, (
+                    f"API error: the {family} endpoints are not responding. "
+                    f"Not retrying for {wait:.0f}s; try again later."
+                ))
+                stale = not isinstance(result, str)
+                return result
+
+            if journal is not None:
+                seen = journal.begin(key, scope, self.store_id, method, path)
+                if seen is not None:
+                    # Nothing goes out, so this cannot be the half-open trial.
+                    journal = None
+                    breaker.release()
+                    if seen[0] == "replay":
+                        status, replayed = 200, True
+                        return seen[1]
+                    return (
+                        f"Error: an earlier attempt of {method} {path} may have been applied. "
+                        "Check the store before sending it again; the same request sent "
+                        "again will go through."
+                    )
+                if snapshot and method in ("PUT", "DELETE"):
+                    # The pre-image for undo; served from the cache when fresh.
+                    before = self.request("GET", path)
+                    if isinstance(before, str) or getattr(before, "stale_age", None):
+                        before = None
+
+            for attempt in range(self.retries + 1):
+                retries = attempt
+                last = attempt == self.retries
+                self.limiter.wait()
+                try:
+                    resp = self.http().request(
+                        method,
+                        url,
+                        headers=headers,
+                        params=params,
+                        json=json_body,
+                    )
+                except httpx.TransportError as e:
+                    # Connection failures never reached the store; others may have.
+                    sent = not isinstance(e, _UNSENT_ERRORS)
+                    maybe_applied = maybe_applied or sent
+                    if not last and (safe or not sent):
+                        self._backoff(attempt)
+                        continue
+                    if sent and not safe:
+                        outcome = PENDING
+                        return failed(
+                            f"HTTP error: {e}. The request may have been applied; "
+                            "check the store before sending it again."
+                        )
+                    return failed(f"HTTP error: {e}")
+
+                status = resp.status_code
+                nbytes = len(resp.content)
+                self.limiter.update(resp.headers)
+
+                if resp.status_code == 429 and not last:
+                    try:
+                        wait = float(resp.headers.get("Retry-After", "1"))
+                    except (ValueError, TypeError):
+                        wait = 1.0
+                    time.sleep(wait)
+                    continue
+
+                if resp.status_code >= 500:
+                    # 503 means the store did not process the request.
+                    if not last and (safe or resp.status_code == 503):
+                        maybe_applied = maybe_applied or resp.status_code != 503
+                        self._backoff(attempt)
+                        continue
+                    if not safe and resp.status_code != 503:
+                        outcome = PENDING
+                    try:
+                        detail = resp.json()
+                    except Exception:
+                        detail = resp.text
+                    return failed(f"API error {resp.status_code}: {detail}")
+                breaker.record(True)
+
+                if method != "GET" and resp.status_code < 400:
+                    cache.invalidate(family)
+
+                if resp.status_code == 204 or (
+                    method == "DELETE" and resp.status_code == 404 and maybe_applied
+                ):
+                    # A 404 after a retried delete: the first attempt deleted it.
+                    if resp.status_code == 404:
+                        cache.invalidate(family)
+                    outcome = DONE
+                    applied = {"status": "success", "message": "Resource deleted"}
+                    return applied
+
+                if resp.status_code >= 400:
+                    try:
+                        detail = resp.json()
+                    except Exception:
+                        detail = resp.text
+                    return f"API error {resp.status_code}: {detail}"
+
+                try:
+                    result = resp.json()
+                except Exception:
+                    result = resp.text
+                outcome, applied = DONE, result
+                if cache_key is not None and not isinstance(result, str):
+                    cache.put(cache_key, result)
+                return result
+
+            return "Request failed after retry"
+        finally:
+            if call is not None:
+                calls, base, seq = call
+                calls.finish(base, seq, outcome == DONE or replayed)
+            if journal is not None:
+                journal.finish(key, outcome, applied)
+                if snapshot and outcome == DONE:
+                    journal.snapshot(
+                        scope, self.store_id, method, path, json_body, before, applied
+                    )
+            if log is not None and (status == 0 or status >= 400):
+                log.failed()
+            telemetry.record_http(
+                method, path, started, status=status, nbytes=nbytes, retries=retries,
+                stale=stale, replayed=replayed,
+            )
+
+    def _backoff(self, attempt: int) -> None:
+        if self.backoff > 0:
+            time.sleep(self.backoff * 2**attempt * random.uniform(0.5, 1.0))
+
+
+class StaleDict(dict):
+    """A dict response served from the cache while its endpoints are down."""
+
+    stale_age = 0.0
+
+
+class StaleList(list):
+    """A list response served from the cache while its endpoints are down."""
+
+    stale_age = 0.0
+
+
+STORE_OPTIONS = ("base_url", "cache_ttl", "pool_size", "connect_timeout", "read_timeout")
+
+_default: StoreClient | None = None
+_stores: dict[str, StoreClient] = {}
+_registry_lock = threading.Lock()
+_current_store: contextvars.ContextVar[StoreClient | None] = contextvars.ContextVar(
+    "nube_agent_store", default=None
+)
+_request_log: contextvars.ContextVar[RequestLog | None] = contextvars.ContextVar(
+    "nube_agent_request_log", default=None
+)
+_write_buffer: contextvars.ContextVar[tuple[WriteBuffer, str] | None] = contextvars.ContextVar(
+    "nube_agent_write_buffer", default=None
+)
+_journal_scope: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "nube_agent_journal_scope", default=None
+)
+_journal_calls: contextvars.ContextVar[CallSequence | None] = contextvars.ContextVar(
+    "nube_agent_journal_calls", default=None
+)
+
+
+def default_store() -> StoreClient:
+    """The store configured by ``TIENDANUBE_STORE_ID``/``TIENDANUBE_ACCESS_TOKEN``."""
+    global _default
+    with _registry_lock:
+        if _default is None:
+            _default = StoreClient(TIENDANUBE_STORE_ID, TIENDANUBE_ACCESS_TOKEN, base_url=BASE_URL)
+        return _default
+
+
+def set_default_store(client: StoreClient | None) -> StoreClient | None:
+    """Replace the default store (None rebuilds it from config). Returns the old one."""
+    global _default
+    with _registry_lock:
+        previous, _default = _default, client
+    return previous
+
+
+def register_store(client: StoreClient) -> StoreClient:
+    """Add a store to the registry, replacing (and closing) one with the same id."""
+    with _registry_lock:
+        previous = _stores.get(client.store_id)
+        _stores[client.store_id] = client
+    if previous is not None and previous is not client:
+        previous.close()
+    return client
+
+
+def remove_store(store_id: str | int) -> StoreClient | None:
+    """Drop a store from the registry and close its connections."""
+    with _registry_lock:
+        client = _stores.pop(str(store_id), None)
+    if client is not None:
+        client.close()
+    return client
+
+
+def load_stores(path: str | Path) -> list[StoreClient]:
+    """Register the stores listed in a JSON file.
+
+    The file holds a list of ``{"store_id", "access_token"}`` objects, with
+    optional ``base_url``, ``cache_ttl``, ``pool_size``, ``connect_timeout``
+    and ``read_timeout``.
+    """
+    entries = json.loads(Path(path).read_text(encoding="utf-8"))
+    clients = []
+    for entry in entries:
+        options = {k: entry[k] for k in STORE_OPTIONS if k in entry}
+        clients.append(
+            register_store(StoreClient(entry["store_id"], entry["access_token"], **options))
+        )
+    return clients
+
+
+def get_store(store_id: str | int | None = None) -> StoreClient:
+    """Look up a store by id; None (or the default store's id) is the default store.
+
+    Raises KeyError for ids that are not registered.
+    """
+    if STORES_FILE and not _stores:
+        load_stores(STORES_FILE)
+    if store_id is None:
+        return default_store()
+    store_id = str(store_id)
+    with _registry_lock:
+        client = _stores.get(store_id)
+    if client is not None:
+        return client
+    if store_id == TIENDANUBE_STORE_ID:
+        return default_store()
+    raise KeyError(f"Unknown store: {store_id}")
+
+
+def stores() -> list[StoreClient]:
+    """All registered stores (the default store first, when configured)."""
+    if STORES_FILE and not _stores:
+        load_stores(STORES_FILE)
+    with _registry_lock:
+        registered = list(_stores.values())
+    if TIENDANUBE_STORE_ID and TIENDANUBE_STORE_ID not in _stores:
+        registered.insert(0, default_store())
+    return registered
+
+
+def current_store() -> StoreClient:
+    """The store selected for this context, or the default store."""
+    return _current_store.get() or default_store()
+
+
+@contextlib.contextmanager
+def use_store(client: StoreClient) -> Iterator[StoreClient]:
+    """Route ``request()`` in this context (and tool calls started from it) to ``client``."""
+    token = _current_store.set(client)
+    try:
+        yield client
+    finally:
+        _current_store.reset(token)
+
+
+@contextlib.contextmanager
+def track_requests() -> Iterator[RequestLog]:
+    """Log the requests made in this context (and tool calls started from it)."""
+    log = RequestLog()
+    token = _request_log.set(log)
+    try:
+        yield log
+    finally:
+        _request_log.reset(token)
+
+
+@contextlib.contextmanager
+def buffer_writes(buffer: WriteBuffer, owner: str) -> Iterator[WriteBuffer]:
+    """Queue PUT requests in this context into ``buffer``, on behalf of ``owner``."""
+    token = _write_buffer.set((buffer, owner))
+    try:
+        yield buffer
+    finally:
+        _write_buffer.reset(token)
+
+
+@contextlib.contextmanager
+def write_through() -> Iterator[None]:
+    """Send writes in this context right away, even inside :func:`buffer_writes`.
+
+    For operations that depend on the order of their writes or read their
+    responses (several writes from one tool call, bulk updates).
+    """
+    token = _write_buffer.set(None)
+    try:
+        yield
+    finally:
+        _write_buffer.reset(token)
+
+
+@contextlib.contextmanager
+def journal_scope(scope: str) -> Iterator[str]:
+    """Journal the writes made in this context under ``scope`` (see ``journal.py``).
+
+    Use one scope per unit of work that may be repeated or resumed: a turn,
+    a batch item.  A write that already succeeded in an earlier run of the
+    scope is not sent again; identical writes within one run all are.
+    """
+    token = _journal_scope.set(scope)
+    calls = _journal_calls.set(CallSequence())
+    try:
+        yield scope
+    finally:
+        _journal_calls.reset(calls)
+        _journal_scope.reset(token)
+
+
+def current_journal_scope() -> str | None:
+    """The journal scope of this context, or None outside :func:`journal_scope`."""
+    return _journal_scope.get()
+
+
+def is_current(reads: dict[tuple[str, str], tuple[int, int]]) -> bool:
+    """Whether no family in ``reads`` (from a :class:`RequestLog`) has changed since."""
+    clients = {c.store_id: c for c in (*stores(), current_store())}
+    for (store_id, family), version in reads.items():
+        client = clients.get(store_id)
+        if client is None or client.cache.version(family) != version:
+            return False
+    return True
+
+
+def fan_out(
+    fn: Callable[[StoreClient], T], clients: list[StoreClient], max_workers: int = FANOUT_WORKERS
+) -> dict[str, T | Exception]:
+    """Call ``fn(client)`` for every store concurrently, each under ``use_store``.
+
+    Each store is handled by a single worker, so its own rate limiter still
+    paces it; at most ``max_workers`` stores run at once.  Returns results by
+    store id, with the exception instead of a result for stores that failed.
+    """
+
+    def run(client: StoreClient) -> T:
+        with use_store(client):
+            return fn(client)
+
+    results: dict[str, T | Exception] = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(clients) or 1))) as pool:
+        futures = {pool.submit(contextvars.copy_context().run, run, c): c for c in clients}
+        for future, client in futures.items():
+            try:
+                results[client.store_id] = future.result()
+            except Exception as e:
+                results[client.store_id] = e
+    return results
+
+
+def close() -> None:
+    """Close every store's connection pool."""
+    with _registry_lock:
+        clients = [c for c in (_default, *_stores.values()) if c is not None]
+    for client in clients:
+        client.close()
 
 
 def request(
@@ -23,79 +963,57 @@ def request(
     params: dict[str, Any] | None = None,
     json_body: dict[str, Any] | None = None,
 ) -> dict[str, Any] | list[Any] | str:
-    """Make an HTTP request to the Tiendanube API.
+    """Make an HTTP request to the Tiendanube API for the current store.
 
     Returns parsed JSON on success, or a descriptive error string on failure.
-    Retries once on 429 (rate limited).
+    Retries on 429 (rate limited), and with backoff on timeouts, connection
+    errors and 5xx responses; POSTs only when the store cannot have applied
+    them.  Writes carry an ``Idempotency-Key`` and are journaled inside
+    :func:`journal_scope`.  Each store has its own pooled client
+    and rate limiter; GET responses are served from its cache when enabled,
+    and writes invalidate it.  While an endpoint family's circuit is open,
+    requests to it fail fast and reads may return a stale cached response.
     """
-    url = f"{BASE_URL}{path}"
-
-    for attempt in range(2):
-        try:
-            resp = httpx.request(
-                method,
-                url,
-                headers=_headers(),
-                params=params,
-                json=json_body,
-                timeout=30.0,
-            )
-        except httpx.TransportError as e:
-            return f"HTTP error: {e}"
-
-        if resp.status_code == 429 and attempt == 0:
-            try:
-                wait = float(resp.headers.get("Retry-After", "1"))
-            except (ValueError, TypeError):
-                wait = 1.0
-            time.sleep(wait)
-            continue
-
-        if resp.status_code == 204:
-            return {"status": "success", "message": "Resource deleted"}
+    return current_store().request(method, path, params=params, json_body=json_body)
 
-        if resp.status_code >= 400:
-            try:
-                detail = resp.json()
-            except Exception:
-                detail = resp.text
-            return f"API error {resp.status_code}: {detail}"
-
-        try:
-            return resp.json()
-        except Exception:
-            return resp.text
 
-    return "Request failed after retry"
+def _age(seconds: float) -> str:
+    if seconds < 90:
+        return f"{seconds:.0f}s"
+    if seconds < 90 * 60:
+        return f"{seconds / 60:.0f} min"
+    return f"{seconds / 3600:.1f} h"
 
 
 def to_json(result: Any) -> str:
     """Convert an API result to a JSON string for the LLM.
 
-    Returns proper JSON for dicts/lists, or the raw string otherwise.
+    Returns proper JSON for dicts/lists, or the raw string otherwise.  Stale
+    results get a note after the JSON (starting with ``STALE_NOTE``) saying
+    how old they are.
     """
     if isinstance(result, (dict, list)):
-        return json.dumps(result, ensure_ascii=False)
+        text = json.dumps(result, ensure_ascii=False)
+        age = getattr(result, "stale_age", None)
+        if age is not None:
+            text += f"{STALE_NOTE}{_age(age)} ago and may be out of date."
+        return text
     return str(result)
 
 
-@lru_cache(maxsize=1)
-def _store_info() -> dict:
-    """Fetch and cache the store info from the API."""
-    raw = request("GET", "/store")
-    if isinstance(raw, dict):
-        return raw
-    return {}
+def strip_stale_note(raw: str) -> str:
+    """``raw`` (a :func:`to_json` result) without its stale-data note, if any."""
+    return raw.split(STALE_NOTE, 1)[0]
 
 
 def store_language() -> str:
     """Return the store's main language code (e.g. 'es', 'pt', 'en')."""
-    return _store_info().get("main_language", "es")
+    return current_store().info().get("main_language", "es")
 
 
 def store_locale() -> str:
     """Return the store's i18n locale key (e.g. 'es_AR', 'pt_BR')."""
-    info = _store_info()
+    info = current_store().info()
     lang = info.get("main_language", "es")
     country = info.get("country", "")
     return f"{lang}_{country}" if country else lang
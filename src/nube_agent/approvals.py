@@ -0,0 +1,136 @@
+"""Approval policies for gated tool calls (deletes, cancels, undo).
+
+A policy is a list of rules; a gated call that matches a rule runs without
+asking.  A rule is a tool name, optionally with ``*`` wildcards, followed by
+``:arg=value`` conditions that must all hold:
+
+    close_order                       every close_order call
+    delete_variant:product_id=123     deleting variants of product 123 only
+    cancel_order:restock=true         cancels that restock the items
+    delete_*                          every delete
+
+Rules are separated by commas.  ``all`` approves everything and ``none`` (or
+an empty string) nothing.  ``NUBE_AGENT_AUTO_APPROVE`` sets the rules of the
+agent, and the CLI adds a rule for a tool when "always" is answered in an
+approval prompt; batch runs use the same syntax for ``--approve``.
+
+The agent's approval middleware asks :meth:`ApprovalPolicy.should_ask` before
+pausing for a call, so approved calls never interrupt the run.  Tools whose
+config has a ``when`` predicate of its own (``import_catalog`` pauses only
+for real imports, not dry runs) consult the policy only when it holds.  Its answer
+is kept per tool call: a rule added while calls wait for approval does not
+change the calls already asked about, whose decisions must line up with
+them when the run resumes.  Calls approved by a rule are recorded as
+``approval`` spans.
+"""
+
+import fnmatch
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterable
+from typing import Any
+
+from nube_agent import telemetry
+
+# Answers kept per tool call id (see ApprovalPolicy.should_ask).
+MAX_REMEMBERED = 10_000
+# Decisions a gated call accepts, as with ``interrupt_on={"tool": True}``.
+ALL_DECISIONS = ["approve", "edit", "reject", "respond"]
+
+
+def parse_rule(rule: str) -> tuple[str, dict[str, str]]:
+    """Split ``tool:arg=value:...`` into the tool pattern and its conditions."""
+    pattern, *conditions = rule.strip().split(":")
+    args = {}
+    for condition in conditions:
+        name, sep, value = condition.partition("=")
+        if not sep or not name.strip():
+            raise ValueError(f"invalid approval rule {rule!r}: expected tool:arg=value")
+        args[name.strip()] = value.strip().lower()
+    if not pattern:
+        raise ValueError(f"invalid approval rule {rule!r}: missing tool name")
+    return pattern, args
+
+
+def _text(value: Any) -> str:
+    return str(value).lower() if not isinstance(value, bool) else ("true" if value else "false")
+
+
+class ApprovalPolicy:
+    """Rules that approve gated tool calls without asking. Safe to share between threads."""
+
+    def __init__(self, rules: Iterable[str] = ()) -> None:
+        self.rules: list[str] = []
+        self._parsed: list[tuple[str, dict[str, str]]] = []
+        self._asked: OrderedDict[str, bool] = OrderedDict()
+        self._lock = threading.Lock()
+        for rule in rules:
+            self.add(rule)
+
+    @classmethod
+    def parse(cls, spec: str) -> "ApprovalPolicy":
+        """A policy from ``all``, ``none`` or comma-separated rules."""
+        spec = spec.strip()
+        if spec in ("", "none"):
+            return cls()
+        if spec == "all":
+            return cls(["*"])
+        return cls(rule for rule in spec.split(",") if rule.strip())
+
+    def add(self, rule: str) -> None:
+        parsed = parse_rule(rule)
+        with self._lock:
+            if rule.strip() not in self.rules:
+                self.rules.append(rule.strip())
+                self._parsed.append(parsed)
+
+    def rule_for(self, tool: str, args: dict | None = None) -> str | None:
+        """The first rule that approves calling ``tool`` with ``args``, if any."""
+        args = args or {}
+        with self._lock:
+            rules = list(zip(self.rules, self._parsed, strict=True))
+        for rule, (pattern, conditions) in rules:
+            if fnmatch.fnmatchcase(tool, pattern) and all(
+                name in args and _text(args[name]) == value for name, value in conditions.items()
+            ):
+                return rule
+        return None
+
+    def approves(self, tool: str, args: dict | None = None) -> bool:
+        return self.rule_for(tool, args) is not None
+
+    def should_ask(self, request) -> bool:
+        """``when`` predicate for the approval middleware: True pauses for the call."""
+        call = request.tool_call
+        with self._lock:
+            if call["id"] in self._asked:
+                return self._asked[call["id"]]
+        started = time.perf_counter()
+        rule = self.rule_for(call["name"], call.get("args"))
+        with self._lock:
+            ask = self._asked.setdefault(call["id"], rule is None)
+            while len(self._asked) > MAX_REMEMBERED:
+                self._asked.popitem(last=False)
+        if rule is not None and not ask:
+            telemetry.TRACER.record(
+                telemetry.make_span("approval", f"auto {call['name']}", started, rule=rule)
+            )
+        return ask
+
+    def _asks(self, when):
+        """``should_ask``, consulted only for calls ``when`` (if given) would pause for."""
+        if when is None:
+            return self.should_ask
+        return lambda request: when(request) and self.should_ask(request)
+
+    def interrupt_on(self, tools: dict[str, Any]) -> dict[str, Any]:
+        """``interrupt_on`` configs for ``tools`` that consult this policy first."""
+        configs = {}
+        for name, config in tools.items():
+            if config is True:
+                config = {"allowed_decisions": ALL_DECISIONS}
+            if isinstance(config, dict):
+                config = {**config, "when": self._asks(config.get("when"))}
+            configs[name] = config
+        return configs
@@ -0,0 +1,337 @@
+"""Non-interactive batch runs.
+
+``nube-agent batch`` reads one item per line from a JSONL file (or stdin) and
+writes one JSON result per line.  An item is either a prompt for the agent or
+a direct tool invocation that skips the model entirely:
+
+    {"id": "restock-1", "prompt": "Set stock of SKU RM-001 to 50"}
+    {"id": "price-2", "tool": "update_variant",
+     "args": {"product_id": 1, "variant_id": 2, "updates_json": "{\\"price\\": \\"1999.00\\"}"}}
+
+Plain-text lines are taken as prompts; blank lines and ``#`` comments are
+skipped.  An item may name a ``store_id`` from ``NUBE_AGENT_STORES_FILE``;
+otherwise it runs on the default store.  Each item runs in its own thread,
+so items never see each other's conversation, and up to ``--concurrency``
+items run at once.  Actions that would stop for confirmation in the CLI
+(deletes, cancels) are decided by the approval policy: ``none`` rejects them
+all, ``all`` approves them all, and comma-separated rules approve only the
+calls they match (tool names, optionally with ``:arg=value`` conditions; see
+``approvals.py``).
+
+Writes are journaled per item under the batch's run id (see ``journal.py``).
+Running a file again with ``--run-id`` of an interrupted run resumes it:
+writes that already went through are not sent again.
+"""
+
+import argparse
+import json
+import sys
+import time
+import uuid
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Any, TextIO
+
+from langgraph.types import Command
+
+from nube_agent import api, telemetry
+from nube_agent.approvals import ApprovalPolicy
+from nube_agent.subagents import SUBAGENTS
+from nube_agent.tools.export import export_data
+from nube_agent.tools.store import get_store_info
+from nube_agent.tools.stores import query_stores
+from nube_agent.tools.undo import undo
+from nube_agent.usage import UsageTracker
+
+DEFAULT_CONCURRENCY = 4
+# Upper bound on approval rounds per item, in case a model keeps retrying.
+MAX_RESUMES = 10
+
+TOOLS: dict[str, Callable[..., str]] = {
+    fn.__name__: fn for sub in SUBAGENTS for fn in sub["tools"]
+} | {fn.__name__: fn for fn in (get_store_info, query_stores, export_data, undo)}
+
+INTERRUPT_ON: dict[str, Any] = {
+    name: config for sub in SUBAGENTS for name, config in sub.get("interrupt_on", {}).items()
+} | {"undo": True}
+
+
+def gated(tool: str, args: dict) -> bool:
+    """Whether calling ``tool`` with ``args`` needs approval, as in the agent."""
+    config = INTERRUPT_ON.get(tool)
+    if not isinstance(config, dict):
+        return bool(config)
+    when = config.get("when")
+    return when is None or when(SimpleNamespace(tool_call={"name": tool, "args": args, "id": ""}))
+
+
+def approves(policy: str, tool: str, args: dict | None = None) -> bool:
+    """Whether ``policy`` (``none``, ``all`` or rules) approves calling ``tool`` with ``args``."""
+    return ApprovalPolicy.parse(policy).approves(tool, args)
+
+
+def parse_items(lines: Iterable[str]) -> Iterator[dict[str, Any]]:
+    """Parse input lines into items with ``index`` and ``id``.
+
+    Lines that cannot be parsed become items with an ``error`` so they are
+    reported in the output instead of aborting the run.  So does an item
+    whose id is already taken: ids key the journal scope a resumed run
+    replays from, so each must name one item.
+    """
+    index = 0
+    seen: dict[str, int] = {}
+    for raw in lines:
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+        index += 1
+        if not line.startswith("{"):
+            item: dict[str, Any] = {"prompt": line}
+        else:
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                item = {"error": f"Invalid JSON: {e}"}
+            else:
+                if not isinstance(item.get("prompt"), str) and not isinstance(
+                    item.get("tool"), str
+                ):
+                    item = {"error": "Error: each item needs a 'prompt' or a 'tool'."}
+                elif "tool" in item and item["tool"] not in TOOLS:
+                    item = {**item, "error": f"Error: unknown tool '{item['tool']}'."}
+                elif not isinstance(item.get("args", {}), dict):
+                    item = {**item, "error": "Error: 'args' must be an object."}
+        item["index"] = index
+        item.setdefault("id", str(index))
+        first = seen.setdefault(str(item["id"]), index)
+        if first != index and "error" not in item:
+            item["error"] = f"Error: duplicate id '{item['id']}' (first used by item {first})."
+        yield item
+
+
+def _status(output: str) -> str:
+    return "error" if output.startswith(telemetry.ERROR_PREFIXES) else "ok"
+
+
+def run_tool(item: dict[str, Any], policy: str) -> dict[str, Any]:
+    """Call a tool directly, applying the approval policy to gated tools."""
+    name, args = item["tool"], item.get("args", {})
+    result: dict[str, Any] = {"kind": "tool", "decisions": []}
+    if gated(name, args):
+        approved = approves(policy, name, args)
+        result["decisions"].append(
+            {"tool": name, "args": args, "decision": "approve" if approved else "reject"}
+        )
+        if not approved:
+            return {**result, "status": "rejected", "output": "Rejected by approval policy."}
+    try:
+        output = TOOLS[name](**args)
+    except TypeError as e:
+        output = f"Error: {e}"
+    return {**result, "status": _status(output), "output": output}
+
+
+def _decide(agent, config: dict, policy: str, log: list[dict]) -> Command | None:
+    """Build the resume command for pending interrupts, or None if there are none."""
+    response = {}
+    for intr in agent.get_state(config).interrupts:
+        value = intr.value if isinstance(intr.value, dict) else {}
+        decisions = []
+        for action in value.get("action_requests", []):
+            tool = action.get("name", "unknown")
+            approved = approves(policy, tool, action.get("args"))
+            log.append({
+                "tool": tool,
+                "args": action.get("args", {}),
+                "decision": "approve" if approved else "reject",
+            })
+            decisions.append(
+                {"type": "approve"} if approved
+                else {"type": "reject", "message": "Rejected by the batch approval policy."}
+            )
+        if decisions:
+            response[intr.id] = {"decisions": decisions}
+    return Command(resume=response) if response else None
+
+
+def _final_text(state: dict) -> str:
+    messages = state.get("messages") or []
+    return telemetry.output_text(messages[-1]) if messages else ""
+
+
+def run_prompt(agent, item: dict[str, Any], policy: str, thread_id: str) -> dict[str, Any]:
+    """Run one prompt in its own thread, resuming through approval interrupts."""
+    usage = UsageTracker()
+    config = {
+        "configurable": {"thread_id": thread_id},
+        "callbacks": [telemetry.TelemetryCallbackHandler(), usage],
+    }
+    decisions: list[dict] = []
+    state = agent.invoke({"messages": [{"role": "user", "content": item["prompt"]}]}, config)
+    for _ in range(MAX_RESUMES):
+        resume = _decide(agent, config, policy, decisions)
+        if resume is None:
+            break
+        state = agent.invoke(resume, config)
+    output = _final_text(state)
+    if agent.get_state(config).interrupts:
+        output = f"Error: still waiting for approval after {MAX_RESUMES} resumes."
+    status = _status(output)
+    if status == "ok" and any(d["decision"] == "reject" for d in decisions):
+        status = "rejected"
+    total = usage.session.total()
+    return {
+        "kind": "prompt",
+        "status": status,
+        "output": output,
+        "decisions": decisions,
+        "tokens": {"input": total["input"], "output": total["output"], "cost": total["cost"]},
+    }
+
+
+def run_item(agent, item: dict[str, Any], policy: str, run_id: str) -> dict[str, Any]:
+    """Run one parsed item on its store and return its result record. Never raises."""
+    started = time.perf_counter()
+    head = {"id": item["id"], "index": item["index"]}
+    if "error" in item:
+        result = {"kind": "invalid", "status": "error", "output": item["error"], "decisions": []}
+    else:
+        try:
+            with (
+                api.use_store(api.get_store(item.get("store_id"))) as store,
+                api.journal_scope(f"batch:{run_id}:{item['id']}"),
+            ):
+                head["store_id"] = store.store_id
+                if "tool" in item:
+                    result = run_tool(item, policy)
+                else:
+                    thread_id = f"batch-{run_id}-{item['index']}"
+                    result = run_prompt(agent, item, policy, thread_id)
+        except KeyError as e:
+            result = {"kind": "invalid", "status": "error", "output": f"Error: {e.args[0]}",
+                      "decisions": []}
+        except Exception as e:
+            result = {
+                "kind": "tool" if "tool" in item else "prompt",
+                "status": "error",
+                "output": f"Error: {e}",
+                "decisions": [],
+            }
+    return {**head, **result, "duration_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+
+def run_batch(
+    items: Iterable[dict[str, Any]],
+    out: TextIO,
+    *,
+    agent=None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    policy: str = "none",
+    run_id: str | None = None,
+) -> dict[str, Any]:
+    """Run ``items`` and write one JSON result per line to ``out``, in input order.
+
+    The agent is only built when there are prompts to run, so batches of
+    direct tool calls never load a model.  Pass the ``run_id`` of an earlier
+    run to resume it.  Returns the throughput summary.
+    """
+    run_id = run_id or uuid.uuid4().hex[:8]
+    items = list(items)
+    if agent is None and any("prompt" in item and "error" not in item for item in items):
+        from nube_agent.agent import build_agent
+
+        agent = build_agent()
+
+    started = time.perf_counter()
+    durations: list[float] = []
+    counts = {"ok": 0, "error": 0, "rejected": 0}
+    tokens = {"input": 0, "output": 0, "cost": 0.0}
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        results = pool.map(lambda item: run_item(agent, item, policy, run_id), items)
+        for result in results:
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            counts[result["status"]] += 1
+            durations.append(result["duration_ms"])
+            for key in tokens:
+                tokens[key] += result.get("tokens", {}).get(key, 0)
+    elapsed = time.perf_counter() - started
+
+    durations.sort()
+
+    def pct(q: float) -> float:
+        return durations[min(len(durations) - 1, round(q / 100 * (len(durations) - 1)))]
+
+    return {
+        "run_id": run_id,
+        "items": len(durations),
+        **counts,
+        "elapsed_s": round(elapsed, 3),
+        "items_per_s": round(len(durations) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": pct(50) if durations else 0.0,
+        "p95_ms": pct(95) if durations else 0.0,
+        "tokens": tokens,
+    }
+
+
+def format_summary(summary: dict[str, Any]) -> str:
+    tokens = summary["tokens"]
+    return (
+        f"{summary['items']} items in {summary['elapsed_s']:.1f}s "
+        f"({summary['items_per_s']:.2f} items/s) · {summary['ok']} ok, "
+        f"{summary['error']} error, {summary['rejected']} rejected · "
+        f"p50 {summary['p50_ms']:.0f}ms p95 {summary['p95_ms']:.0f}ms · "
+        f"{tokens['input'] + tokens['output']:,} tokens ${tokens['cost']:.4f} · "
+        f"run {summary['run_id']}"
+    )
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "input", nargs="?", default="-", help="JSONL file of items (default: stdin)"
+    )
+    parser.add_argument(
+        "-o", "--output", default="-", help="Where to write JSONL results (default: stdout)"
+    )
+    parser.add_argument(
+        "-c", "--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+        help=f"Items to run at once (default: {DEFAULT_CONCURRENCY})",
+    )
+    parser.add_argument(
+        "--approve", default="none", metavar="POLICY",
+        help="Approval policy for gated actions: none, all, or rules separated by commas, "
+             "e.g. close_order,delete_variant:product_id=123 (default: none)",
+    )
+    parser.add_argument(
+        "--run-id", help="Resume the run with this id: writes it already made are not repeated"
+    )
+    parser.add_argument(
+        "--summary", metavar="PATH", help="Also write the throughput summary as JSON"
+    )
+
+
+def run(args: argparse.Namespace) -> int:
+    """Entry point for ``nube-agent batch``. Returns the process exit code."""
+    try:
+        ApprovalPolicy.parse(args.approve)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        summary = run_batch(
+            parse_items(source), out, concurrency=args.concurrency, policy=args.approve,
+            run_id=args.run_id,
+        )
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+    print(format_summary(summary), file=sys.stderr)
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as fh:
+            json.dump(summary, fh, indent=2)
+    return 1 if summary["error"] else 0
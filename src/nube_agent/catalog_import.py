@@ -0,0 +1,523 @@
+"""Bulk catalog import from CSV or JSONL.
+
+``nube-agent import-catalog FILE`` (and the catalog manager's
+``import_catalog`` tool) loads a catalog without going through the model one
+product at a time.  Each row is one variant:
+
+    handle,name,attributes,values,sku,price,stock
+    remera-basica,Remera básica,Talla|Color,S|Rojo,RB-S-R,4500.00,10
+    remera-basica,,,M|Rojo,RB-M-R,4500.00,8
+
+Consecutive rows with the same ``handle`` are one product (a row without a
+handle is a product of its own); ``name``, ``description``, ``published`` and
+``attributes`` are read from the first row that has them.  In JSONL files
+``attributes`` and ``values`` may be lists and ``"stock": null`` means
+unlimited stock.  Rows are checked with the rules of ``create_variant``:
+as many values as the product has attributes (at most 3), decimal prices and
+dimensions, whole non-negative stock, and SKUs that are unique in the file.
+
+The file is diffed against the store by SKU (then by handle): new products
+are created with all their variants in one request, new SKUs of an existing
+product are added as variants, and existing products and variants are
+updated with only the fields that changed.  Products are written by
+``--concurrency`` workers while the file is still being read, so memory is
+bounded by the store's SKU index.  Each imported product is appended to a
+checkpoint file; running the same import again skips them, and the file is
+removed once an import finishes with no failed or invalid products.  The
+writes of an import are journaled together, so ``/undo`` reverts it.
+"""
+
+import argparse
+import contextvars
+import csv
+import json
+import sys
+import threading
+import time
+import uuid
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+from typing import Any
+
+from nube_agent import api
+
+DEFAULT_CONCURRENCY = 4
+# Products read ahead of the writers, per worker.
+READ_AHEAD = 2
+PAGE_SIZE = 200
+# Products have at most this many attributes (variant options).
+MAX_ATTRIBUTES = 3
+# Separator of attribute and value lists in CSV cells.
+LIST_SEPARATOR = "|"
+# Errors kept in the summary; the rest are only counted.
+MAX_ERRORS = 50
+
+DECIMAL_FIELDS = ("price", "weight", "width", "height", "depth")
+PRODUCT_FIELDS = ("name", "description", "published")
+TRUE = frozenset({"true", "yes", "1", "si", "sí", "sim"})
+FALSE = frozenset({"false", "no", "0", "nao", "não"})
+
+
+def detect_format(path: str) -> str:
+    """``csv`` or ``jsonl``, from the file extension."""
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def read_rows(source: Iterable[str], fmt: str) -> Iterator[tuple[int, dict | str]]:
+    """Yield ``(line, row)`` for every data row, with an error string for bad lines."""
+    if fmt == "csv":
+        reader = csv.DictReader(source)
+        for row in reader:
+            yield reader.line_num, {
+                key.strip().lower(): value.strip() if isinstance(value, str) else value
+                for key, value in row.items() if key
+            }
+        return
+    for line_no, raw in enumerate(source, 1):
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_no, f"Invalid JSON: {e}"
+            continue
+        yield line_no, row if isinstance(row, dict) else "Error: each line must be an object."
+
+
+def is_dry_run(value: Any) -> bool:
+    """Whether an import's ``dry_run`` argument asks for a dry run.
+
+    Only a clear yes counts; anything else is a real import, so the approval
+    gate and the import itself never disagree about writing.
+    """
+    return str(value).strip().lower() in TRUE
+
+
+def _list(value: Any) -> list[str]:
+    if isinstance(value, list):
+        return [str(v).strip() for v in value]
+    text = str(value or "").strip()
+    return [part.strip() for part in text.split(LIST_SEPARATOR)] if text else []
+
+
+def _given(row: dict, field: str) -> bool:
+    return field in row and row[field] not in (None, "")
+
+
+def parse_row(row: dict) -> dict | str:
+    """Check one row's fields; returns the normalized row or an error message."""
+    sku = str(row.get("sku") or "").strip()
+    if not sku:
+        return "Error: missing sku."
+    variant: dict[str, Any] = {"sku": sku}
+    for field in DECIMAL_FIELDS:
+        if not _given(row, field):
+            continue
+        try:
+            number = Decimal(str(row[field]).strip())
+        except InvalidOperation:
+            return f"Error: {field} must be a number, got {row[field]!r}."
+        if not number.is_finite():
+            return f"Error: {field} must be a number, got {row[field]!r}."
+        if number < 0:
+            return f"Error: {field} must not be negative, got {row[field]!r}."
+        variant[field] = str(row[field]).strip()
+    if "stock" in row and row["stock"] is None:
+        variant["stock"] = None
+    elif _given(row, "stock"):
+        try:
+            stock = int(str(row["stock"]).strip())
+        except ValueError:
+            return f"Error: stock must be a whole number, got {row['stock']!r}."
+        if stock < 0:
+            return f"Error: stock must not be negative, got {stock}."
+        variant["stock"] = stock
+
+    product: dict[str, Any] = {}
+    for field in ("name", "description"):
+        if _given(row, field):
+            product[field] = str(row[field]).strip()
+    if _given(row, "published"):
+        published = row["published"]
+        if not isinstance(published, bool):
+            text = str(published).strip().lower()
+            if text not in TRUE | FALSE:
+                return f"Error: published must be true or false, got {published!r}."
+            published = text in TRUE
+        product["published"] = published
+    attributes = _list(row.get("attributes"))
+    if len(attributes) > MAX_ATTRIBUTES:
+        return f"Error: at most {MAX_ATTRIBUTES} attributes, got {len(attributes)}."
+    return {
+        "handle": str(row.get("handle") or "").strip(),
+        "product": product,
+        "attributes": attributes,
+        "values": _list(row.get("values")) if _given(row, "values") else None,
+        "variant": variant,
+    }
+
+
+def group_products(
+    rows: Iterable[tuple[int, dict | str]],
+) -> Iterator[dict[str, Any]]:
+    """Group consecutive rows into products.
+
+    Each product is ``{"key", "line", "handle", "product", "attributes",
+    "variants": [(line, values, variant)], "errors"}``; rows that fail
+    :func:`parse_row` become errors of their product (or products of their own).
+    """
+    seen: set[str] = set()
+    group: dict[str, Any] | None = None
+    for line, raw in rows:
+        row = raw if isinstance(raw, str) else parse_row(raw)
+        if isinstance(row, str):
+            if group is not None and isinstance(raw, dict) and raw.get("handle") and (
+                str(raw["handle"]).strip() == group["handle"]
+            ):
+                group["errors"].append(f"line {line}: {row}")
+                continue
+            if group is not None:
+                yield group
+                group = None
+            yield {"key": f"line:{line}", "line": line, "handle": "", "product": {},
+                   "attributes": [], "variants": [], "errors": [f"line {line}: {row}"]}
+            continue
+        sku = row["variant"]["sku"]
+        if group is None or not row["handle"] or row["handle"] != group["handle"]:
+            if group is not None:
+                yield group
+            group = {"key": row["handle"] or f"sku:{sku}", "line": line, "handle": row["handle"],
+                     "product": {}, "attributes": [], "variants": [], "errors": []}
+        for field, value in row["product"].items():
+            group["product"].setdefault(field, value)
+        if row["attributes"] and not group["attributes"]:
+            group["attributes"] = row["attributes"]
+        if sku in seen:
+            group["errors"].append(f"line {line}: Error: duplicate sku {sku!r}.")
+        seen.add(sku)
+        group["variants"].append((line, row["values"], row["variant"]))
+    if group is not None:
+        yield group
+
+
+def _text(value: Any, lang: str) -> str:
+    if isinstance(value, dict):
+        return str(value.get(lang) or next((v for v in value.values() if v), "") or "")
+    return "" if value is None else str(value)
+
+
+class CatalogIndex:
+    """The store's products by ID, variants by SKU and products by handle."""
+
+    def __init__(self, lang: str) -> None:
+        self.lang = lang
+        self.products: dict[int, dict] = {}
+        self.skus: dict[str, tuple[int, dict]] = {}
+        self.handles: dict[str, int] = {}
+
+    def add(self, product: dict) -> None:
+        pid = product["id"]
+        self.products[pid] = {
+            **{k: product.get(k) for k in ("id", *PRODUCT_FIELDS)},
+            "attributes": [_text(a, self.lang) for a in product.get("attributes") or []],
+        }
+        handle = _text(product.get("handle"), self.lang)
+        if handle:
+            self.handles.setdefault(handle, pid)
+        for variant in product.get("variants") or []:
+            if variant.get("sku"):
+                self.skus[str(variant["sku"])] = (pid, variant)
+
+
+def load_index() -> CatalogIndex | str:
+    """Index every product of the current store, or an API error string."""
+    index = CatalogIndex(api.store_language())
+    page = 1
+    while True:
+        result = api.request("GET", "/products", params={"page": page, "per_page": PAGE_SIZE})
+        if isinstance(result, str):
+            # Past the last page the API answers 404 "Last page is N".
+            if page > 1 and result.startswith("API error 404"):
+                return index
+            return result
+        for product in result:
+            index.add(product)
+        if len(result) < PAGE_SIZE:
+            return index
+        page += 1
+
+
+def _same(field: str, new: Any, old: Any) -> bool:
+    if field in DECIMAL_FIELDS and new is not None and old is not None:
+        try:
+            return Decimal(str(new)) == Decimal(str(old))
+        except InvalidOperation:
+            return False
+    return new == old
+
+
+def plan(group: dict[str, Any], index: CatalogIndex) -> list[tuple[str, str, dict, str]] | str:
+    """The writes that bring the store in line with ``group``, or why it can't be imported.
+
+    Each write is ``(method, path, body, counter)``; an empty list means the
+    product is already up to date.
+    """
+    if group["errors"]:
+        return "; ".join(group["errors"])
+    lang = index.lang
+    owners = {index.skus[v["sku"]][0] for _, _, v in group["variants"] if v["sku"] in index.skus}
+    if len(owners) > 1:
+        return f"line {group['line']}: Error: SKUs belong to products {sorted(owners)}."
+    pid = owners.pop() if owners else index.handles.get(group["handle"])
+    existing = index.products.get(pid) if pid is not None else None
+    attributes = group["attributes"]
+    if existing is not None:
+        if attributes and attributes != existing["attributes"]:
+            return (
+                f"line {group['line']}: Error: attributes {attributes} differ from "
+                f"{existing['attributes']} on product {pid}; change them on the product first."
+            )
+        attributes = existing["attributes"]
+
+    for line, values, variant in group["variants"]:
+        creating = variant["sku"] not in index.skus
+        if (creating or values is not None) and len(values or []) != len(attributes):
+            return (
+                f"line {line}: Error: {len(values or [])} values for {len(attributes)} "
+                f"attributes {attributes}; the number of values must match the attributes."
+            )
+    combinations = [tuple(values) for _, values, _ in group["variants"] if values]
+    if len(combinations) != len(set(combinations)):
+        return f"line {group['line']}: Error: repeated option values in one product."
+
+    def body(values: list[str] | None, variant: dict) -> dict:
+        fields = dict(variant)
+        if values is not None:
+            fields["values"] = [{lang: value} for value in values]
+        return fields
+
+    if existing is None:
+        if "name" not in group["product"]:
+            return f"line {group['line']}: Error: a new product needs a name."
+        product: dict[str, Any] = {
+            "name": {lang: group["product"]["name"]},
+            "published": group["product"].get("published", True),
+            "attributes": [{lang: a} for a in attributes],
+            "variants": [body(values, variant) for _, values, variant in group["variants"]],
+        }
+        if "description" in group["product"]:
+            product["description"] = {lang: group["product"]["description"]}
+        if group["handle"]:
+            product["handle"] = {lang: group["handle"]}
+        return [("POST", "/products", product, "created_products")]
+
+    writes = []
+    changes = {}
+    for field, value in group["product"].items():
+        if field == "published":
+            if value != existing.get(field):
+                changes[field] = value
+        elif value != _text(existing.get(field), lang):
+            changes[field] = {lang: value}
+    if changes:
+        writes.append(("PUT", f"/products/{pid}", changes, "updated_products"))
+    for _, values, variant in group["variants"]:
+        if variant["sku"] not in index.skus:
+            writes.append(
+                ("POST", f"/products/{pid}/variants", body(values, variant), "created_variants")
+            )
+            continue
+        _, current = index.skus[variant["sku"]]
+        update = {
+            field: value for field, value in body(values, variant).items()
+            if field != "sku" and not _same(field, value, current.get(field))
+        }
+        if update:
+            writes.append((
+                "PUT", f"/products/{pid}/variants/{current['id']}", update, "updated_variants"
+            ))
+    return writes
+
+
+class Checkpoint:
+    """Products already imported into a store, as JSON lines, so an import can resume."""
+
+    def __init__(self, path: str | Path, store_id: str) -> None:
+        self.path = Path(path)
+        self.store_id = store_id
+        self.done: set[str] = set()
+        self._lock = threading.Lock()
+        if self.path.exists():
+            for line in self.path.read_text(encoding="utf-8").splitlines():
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # a line cut short by an interrupted run
+                if entry.get("store_id") == store_id:
+                    self.done.add(entry["key"])
+
+    def mark(self, key: str) -> None:
+        with self._lock, self.path.open("a", encoding="utf-8") as fh:
+            fh.write(json.dumps({"store_id": self.store_id, "key": key}) + "\n")
+
+    def remove(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+def apply(group: dict[str, Any], index: CatalogIndex, dry_run: bool = False) -> dict[str, Any]:
+    """Plan and run the writes for one product. Never raises."""
+    result: dict[str, Any] = {"key": group["key"], "line": group["line"], "counts": {}}
+    try:
+        writes = plan(group, index)
+        if isinstance(writes, str):
+            return {**result, "status": "invalid", "error": writes}
+        counts = result["counts"]
+        for method, path, body, counter in writes:
+            if not dry_run:
+                response = api.request(method, path, json_body=body)
+                if isinstance(response, str):
+                    return {**result, "status": "failed", "error": f"{method} {path}: {response}"}
+            counts[counter] = counts.get(counter, 0) + 1
+            if counter == "created_products":
+                counts["created_variants"] = len(body["variants"])
+        written = counts.get("created_variants", 0) + counts.get("updated_variants", 0)
+        counts["unchanged"] = len(group["variants"]) - written
+        return {**result, "status": "ok"}
+    except Exception as e:
+        return {**result, "status": "failed", "error": f"Error: {e}"}
+
+
+def import_rows(
+    rows: Iterable[tuple[int, dict | str]],
+    *,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    checkpoint: Checkpoint | None = None,
+    dry_run: bool = False,
+) -> dict[str, Any]:
+    """Import parsed rows into the current store and return the summary."""
+    started = time.perf_counter()
+    summary: dict[str, Any] = {
+        "dry_run": dry_run, "products": 0, "created_products": 0, "created_variants": 0,
+        "updated_products": 0, "updated_variants": 0, "unchanged": 0, "resumed": 0,
+        "invalid": 0, "failed": 0, "errors": [],
+    }
+    index = load_index()
+    if isinstance(index, str):
+        return {**summary, "failed": 1, "errors": [{"error": index}]}
+
+    def collect(result: dict[str, Any]) -> None:
+        summary["products"] += 1
+        if result["status"] == "ok":
+            for counter, n in result["counts"].items():
+                summary[counter] += n
+            if checkpoint is not None and not dry_run:
+                checkpoint.mark(result["key"])
+            return
+        summary[result["status"]] += 1
+        if len(summary["errors"]) < MAX_ERRORS:
+            summary["errors"].append({k: result[k] for k in ("key", "line", "error")})
+
+    workers = max(1, concurrency)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending: set[Future] = set()
+        for group in group_products(rows):
+            if checkpoint is not None and group["key"] in checkpoint.done:
+                summary["resumed"] += 1
+                continue
+            context = contextvars.copy_context()
+            pending.add(pool.submit(context.run, apply, group, index, dry_run))
+            if len(pending) >= workers * READ_AHEAD:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future.result())
+        for future in pending:
+            collect(future.result())
+    summary["elapsed_s"] = round(time.perf_counter() - started, 3)
+    if checkpoint is not None and not dry_run and not summary["failed"] + summary["invalid"]:
+        checkpoint.remove()
+    return summary
+
+
+def import_file(
+    path: str,
+    *,
+    fmt: str | None = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    checkpoint: str | None = None,
+    dry_run: bool = False,
+) -> dict[str, Any]:
+    """Import a CSV or JSONL file into the current store.
+
+    ``checkpoint`` defaults to ``<path>.checkpoint.jsonl``; an empty string
+    turns checkpoints off.
+    """
+    if checkpoint is None:
+        checkpoint = f"{path}.checkpoint.jsonl"
+    progress = Checkpoint(checkpoint, api.current_store().store_id) if checkpoint else None
+    with open(path, encoding="utf-8-sig", newline="") as source:
+        return import_rows(
+            read_rows(source, fmt or detect_format(path)),
+            concurrency=concurrency,
+            checkpoint=progress,
+            dry_run=dry_run,
+        )
+
+
+def format_summary(summary: dict[str, Any]) -> str:
+    mode = "would import" if summary["dry_run"] else "imported"
+    return (
+        f"{summary['products']} products {mode} in {summary.get('elapsed_s', 0):.1f}s · "
+        f"{summary['created_products']} new products, {summary['created_variants']} new "
+        f"variants, {summary['updated_products']} product and {summary['updated_variants']} "
+        f"variant updates, {summary['unchanged']} unchanged · {summary['resumed']} resumed, "
+        f"{summary['invalid']} invalid, {summary['failed']} failed"
+    )
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("input", help="CSV or JSONL file, one variant per row")
+    parser.add_argument(
+        "--format", choices=("csv", "jsonl"), help="Input format (default: from the extension)"
+    )
+    parser.add_argument(
+        "-c", "--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+        help=f"Products written at once (default: {DEFAULT_CONCURRENCY})",
+    )
+    parser.add_argument(
+        "--checkpoint", metavar="PATH",
+        help="Progress file for resuming (default: INPUT.checkpoint.jsonl; '' turns it off)",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Validate and diff only; write nothing"
+    )
+    parser.add_argument("--summary", metavar="PATH", help="Also write the summary as JSON")
+
+
+def run(args: argparse.Namespace) -> int:
+    """Entry point for ``nube-agent import-catalog``. Returns the process exit code."""
+    run_id = uuid.uuid4().hex[:8]
+    try:
+        # One journal scope per run, so ``/undo <run-id>`` can revert the whole import.
+        with api.journal_scope(f"import:{run_id}"):
+            summary = import_file(
+                args.input,
+                fmt=args.format,
+                concurrency=args.concurrency,
+                checkpoint=args.checkpoint,
+                dry_run=args.dry_run,
+            )
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    for error in summary["errors"]:
+        print(json.dumps(error, ensure_ascii=False), file=sys.stderr)
+    print(format_summary(summary), file=sys.stderr)
+    if not args.dry_run:
+        print(f"Run id {run_id}; /undo {run_id} reverts this import.", file=sys.stderr)
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as fh:
+            json.dump(summary, fh, indent=2)
+    return 1 if summary["invalid"] or summary["failed"] else 0
@@ -0,0 +1,108 @@
+"""Write coalescing for the tool calls of one model step.
+
+Models often split one edit into several calls to the same resource in a
+single step (``update_product`` for the name, then the description, then
+``published``).  :class:`CoalesceWritesMiddleware` gives each batch of tool
+calls an :class:`~nube_agent.api.WriteBuffer`: their PUT requests are queued
+and merged per resource, and the buffer is flushed before the agent's next
+model call (or when the run ends), one request per resource.  Each queued
+tool result is then replaced with the response of the request that carried
+it, so the model sees the real outcome.
+
+Conflicting values for the same field are refused, requests that touch a
+resource with pending writes flush them first, and tools that depend on the
+order of their own writes (bulk updates, ``set_variant_matrix``, imports)
+run under :func:`~nube_agent.api.write_through`.  Flushes are recorded as
+``coalesce`` spans.  Set ``NUBE_AGENT_COALESCE_WRITES=0`` to send every
+write right away.
+"""
+
+import threading
+import time
+
+from langchain.agents.middleware.types import AgentMiddleware
+from langchain_core.messages import AIMessage, ToolMessage
+
+from nube_agent import telemetry
+from nube_agent.api import WriteBuffer, buffer_writes, to_json
+
+
+def _batch_id(messages: list, call_id: str | None = None) -> str | None:
+    """Id of the AI message whose tool calls are running (the one with ``call_id``)."""
+    for message in reversed(messages):
+        if not isinstance(message, AIMessage) or not message.tool_calls:
+            continue
+        if call_id is None or any(call["id"] == call_id for call in message.tool_calls):
+            return message.id
+    return None
+
+
+class CoalesceWritesMiddleware(AgentMiddleware):
+    """Merge the PUT requests of each batch of tool calls of one agent."""
+
+    def __init__(self, name: str) -> None:
+        super().__init__()
+        self.agent = name
+        self._buffers: dict[str, WriteBuffer] = {}
+        self._lock = threading.Lock()
+
+    def buffer(self, request) -> WriteBuffer | None:
+        batch = _batch_id(request.state.get("messages", []), request.tool_call["id"])
+        if batch is None:
+            return None
+        with self._lock:
+            return self._buffers.setdefault(batch, WriteBuffer())
+
+    def flush(self, messages: list) -> dict | None:
+        """Send the writes of the last batch and put their results in its tool messages."""
+        batch = _batch_id(messages)
+        with self._lock:
+            buffer = self._buffers.pop(batch, None)
+        if buffer is None or not (buffer.pending() or buffer.results):
+            return None
+        started = time.perf_counter()
+        sent = buffer.pending()
+        results = buffer.flush()
+        if sent:
+            telemetry.TRACER.record(telemetry.make_span(
+                "coalesce", f"flush {self.agent}", started,
+                writes=len(results), requests=sent, merged=buffer.merged,
+            ))
+        updates = [
+            ToolMessage(
+                content=to_json(results[m.tool_call_id]),
+                tool_call_id=m.tool_call_id,
+                name=m.name,
+                id=m.id,
+                status="error" if isinstance(results[m.tool_call_id], str) else "success",
+            )
+            for m in messages
+            if isinstance(m, ToolMessage) and m.tool_call_id in results
+        ]
+        return {"messages": updates} if updates else None
+
+    def wrap_tool_call(self, request, handler):
+        buffer = self.buffer(request)
+        if buffer is None:
+            return handler(request)
+        with buffer_writes(buffer, request.tool_call["id"]):
+            return handler(request)
+
+    async def awrap_tool_call(self, request, handler):
+        buffer = self.buffer(request)
+        if buffer is None:
+            return await handler(request)
+        with buffer_writes(buffer, request.tool_call["id"]):
+            return await handler(request)
+
+    def before_model(self, state, runtime):
+        return self.flush(state["messages"])
+
+    async def abefore_model(self, state, runtime):
+        return self.flush(state["messages"])
+
+    def after_agent(self, state, runtime):
+        return self.flush(state["messages"])
+
+    async def aafter_agent(self, state, runtime):
+        return self.flush(state["messages"])
@@ -7,16 +7,86 @@ load_dotenv()
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "")
 TIENDANUBE_ACCESS_TOKEN = os.environ.get("TIENDANUBE_ACCESS_TOKEN", "")
 TIENDANUBE_STORE_ID = os.environ.get("TIENDANUBE_STORE_ID", "")
+# The app's client secret; Tiendanube signs webhook deliveries with it.
+TIENDANUBE_CLIENT_SECRET = os.environ.get("TIENDANUBE_CLIENT_SECRET", "")
 
-MODEL = "openai:gpt-4o"
+MODEL = os.environ.get("NUBE_AGENT_MODEL", "openai:gpt-4o")
+# Model for routine subagent work (listings, lookups, summaries); edits and
+# escalations use MODEL.  Empty uses MODEL everywhere.
+SMALL_MODEL = os.environ.get(
+    "NUBE_AGENT_SMALL_MODEL", "openai:gpt-4o-mini" if MODEL.startswith("openai:") else ""
+)
 USER_AGENT = os.environ.get("USER_AGENT", "Nube Agent")
-BASE_URL = f"https://api.tiendanube.com/2025-03/{TIENDANUBE_STORE_ID}"
+API_VERSION_URL = "https://api.tiendanube.com/2025-03"
+BASE_URL = os.environ.get("TIENDANUBE_BASE_URL") or f"{API_VERSION_URL}/{TIENDANUBE_STORE_ID}"
+
+# Optional JSON file listing more stores (store_id, access_token, base_url)
+# that server and batch sessions can select by id.
+STORES_FILE = os.environ.get("NUBE_AGENT_STORES_FILE", "")
+# Stores queried at once by the cross-store query_stores tool.
+FANOUT_WORKERS = int(os.environ.get("NUBE_AGENT_FANOUT_WORKERS", "8"))
+
+# Shared HTTP connection pool size, and how long GET responses are cached
+# (seconds, 0 disables the cache).  ``nube-agent serve`` turns the cache on.
+HTTP_POOL_SIZE = int(os.environ.get("NUBE_AGENT_HTTP_POOL_SIZE", "20"))
+CACHE_TTL = float(os.environ.get("NUBE_AGENT_CACHE_TTL", "0"))
+
+# API timeouts (seconds): opening a connection, and waiting for a response.
+CONNECT_TIMEOUT = float(os.environ.get("NUBE_AGENT_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.environ.get("NUBE_AGENT_READ_TIMEOUT", "30"))
+# Consecutive failures (timeouts, connection errors, 5xx) after which requests
+# to an endpoint family fail fast, and seconds until one is tried again.
+BREAKER_THRESHOLD = int(os.environ.get("NUBE_AGENT_BREAKER_THRESHOLD", "3"))
+BREAKER_COOLDOWN = float(os.environ.get("NUBE_AGENT_BREAKER_COOLDOWN", "30"))
+# While an endpoint family fails fast, answer reads with the last response
+# seen for them, marked as stale.  Set to 0 to return the error instead.
+DEGRADED_READS = os.environ.get("NUBE_AGENT_DEGRADED_READS", "1") == "1"
+
+# Retries after a timeout, connection error or 5xx response, with
+# exponential backoff from RETRY_BACKOFF seconds.  POSTs are only retried
+# when the store cannot have applied them (see api.py).
+RETRIES = int(os.environ.get("NUBE_AGENT_RETRIES", "2"))
+RETRY_BACKOFF = float(os.environ.get("NUBE_AGENT_RETRY_BACKOFF", "0.5"))
+# SQLite journal of the writes made by each turn and batch item, used to
+# de-duplicate repeated writes (see journal.py).  Empty turns it off.
+JOURNAL_PATH = os.environ.get("NUBE_AGENT_JOURNAL", "~/.nube-agent/journal.sqlite")
+# Log of received webhook events, for replays and catching up (see
+# webhooks.py).  Empty keeps the recent events in memory only.
+WEBHOOK_LOG = os.environ.get("NUBE_AGENT_WEBHOOK_LOG", "~/.nube-agent/webhooks.jsonl")
+# Cache TTL (seconds) for the families webhooks keep fresh in server mode.
+WEBHOOK_CACHE_TTL = float(os.environ.get("NUBE_AGENT_WEBHOOK_CACHE_TTL", "600"))
+
+# Directory of the precomputed daily digests, one JSON file per store (see
+# digest.py).  Empty keeps them in memory only.
+DIGEST_DIR = os.environ.get("NUBE_AGENT_DIGEST_DIR", "~/.nube-agent/digests")
+# Variants with this much stock or less are listed as low stock in the digest.
+DIGEST_LOW_STOCK = int(os.environ.get("NUBE_AGENT_DIGEST_LOW_STOCK", "5"))
+
+# How long answers to repeated read-only questions are replayed without a
+# model call (seconds, 0 disables; see answers.py).
+ANSWER_CACHE_TTL = float(os.environ.get("NUBE_AGENT_ANSWER_CACHE_TTL", "0"))
+
+# Merge the PUT requests each batch of tool calls makes to the same resource
+# into one request (see coalesce.py).  Set to 0 to send every write at once.
+COALESCE_WRITES = os.environ.get("NUBE_AGENT_COALESCE_WRITES", "1") == "1"
+
+# Gated tool calls (deletes, cancels) that run without asking: comma-separated
+# rules like "close_order,delete_variant:product_id=123" (see approvals.py).
+AUTO_APPROVE = os.environ.get("NUBE_AGENT_AUTO_APPROVE", "")
+
+# Route obvious requests straight to a subagent without a supervisor model
+# call (see router.py).  Set to 1 to turn on.
+ROUTER = os.environ.get("NUBE_AGENT_ROUTER", "0") == "1"
+
+# Optional span export for /stats tracing: "jsonl" or "otlp" (OTLP/JSON lines).
+TRACE_FILE = os.environ.get("NUBE_AGENT_TRACE_FILE", "")
+TRACE_FORMAT = os.environ.get("NUBE_AGENT_TRACE_FORMAT", "jsonl")
 
 
 def validate() -> None:
     """Validate that all required environment variables are set."""
     missing = []
-    if not OPENAI_API_KEY:
+    if (MODEL.startswith("openai:") or SMALL_MODEL.startswith("openai:")) and not OPENAI_API_KEY:
         missing.append("OPENAI_API_KEY")
     if not TIENDANUBE_ACCESS_TOKEN:
         missing.append("TIENDANUBE_ACCESS_TOKEN")
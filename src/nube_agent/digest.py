@@ -0,0 +1,364 @@
+"""Precomputed daily store digest.
+
+Staff start every day with the same questions: how did yesterday go, what
+has to be shipped, what is running out, which carts were abandoned.
+Answering them through the agent takes several subagent runs; the digest
+answers them ahead of time.  For each store it fetches, concurrently:
+
+- ``sales``: yesterday's paid orders (cancelled ones left out), counted and
+  summed per currency;
+- ``to_ship``: open paid orders not shipped yet, the oldest first;
+- ``low_stock``: variants with ``DIGEST_LOW_STOCK`` units or fewer (variants
+  without stock tracking are left out), the lowest first;
+- ``abandoned``: checkouts abandoned yesterday, counted and summed.
+
+"Yesterday" is the previous calendar day in the local time zone; shipping
+and stock are as of when the digest was computed.  A section that cannot
+be fetched carries its error instead, and the rest of the digest is kept.
+
+``nube-agent digest`` computes the digest of the store (or of every store
+with ``--all-stores``) and is meant to run from cron before the day starts;
+``nube-agent serve --digest-at HH:MM`` does the same every day at that time.
+Digests are saved as ``<store id>.json`` in ``NUBE_AGENT_DIGEST_DIR``, and
+``/digest`` in the CLI and the supervisor's ``get_daily_digest`` tool read
+them without any API request.  They compute it first when the saved digest
+is not yesterday's.  Each computation is recorded as a ``digest`` span.
+"""
+
+import argparse
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+from typing import Any
+
+from nube_agent import api, telemetry
+from nube_agent.config import DIGEST_DIR, DIGEST_LOW_STOCK
+from nube_agent.export import fetch_pages
+
+# Rows listed in the to_ship and low_stock sections.
+DIGEST_ROWS = 10
+# Shipping statuses of paid orders still to be shipped.
+TO_SHIP = ("unpacked", "unfulfilled")
+# Timestamps in API filters, as the API writes them.
+API_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S+0000"
+
+
+def yesterday(now: datetime | None = None) -> date:
+    return ((now or datetime.now()).date()) - timedelta(days=1)
+
+
+def _window(day: date) -> dict[str, str]:
+    """``created_at`` filters covering ``day`` in the local time zone."""
+    start = datetime.combine(day, datetime.min.time()).astimezone(timezone.utc)
+    end = start + timedelta(days=1, seconds=-1)
+    return {
+        "created_at_min": start.strftime(API_TIME_FORMAT),
+        "created_at_max": end.strftime(API_TIME_FORMAT),
+    }
+
+
+def _name(value: Any) -> str:
+    """The store-language text of a multilingual ``{lang: text}`` field."""
+    if not isinstance(value, dict):
+        return "" if value is None else str(value)
+    return str(value.get(api.store_language()) or next((v for v in value.values() if v), ""))
+
+
+def _rows(path: str, params: dict[str, Any]) -> list[dict]:
+    return [row for _, rows in fetch_pages(path, params) for row in rows if isinstance(row, dict)]
+
+
+def _totals(rows: list[dict]) -> dict[str, str]:
+    sums: dict[str, Decimal] = {}
+    for row in rows:
+        try:
+            amount = Decimal(str(row.get("total") or 0))
+        except InvalidOperation:
+            amount = Decimal(0)
+        currency = row.get("currency") or ""
+        sums[currency] = sums.get(currency, Decimal(0)) + amount
+    return {currency: str(value) for currency, value in sums.items()}
+
+
+def _sales(day: date, _threshold: int) -> dict[str, Any]:
+    orders = [
+        order for order in _rows("/orders", {**_window(day), "payment_status": "paid"})
+        if order.get("status") != "cancelled"
+    ]
+    return {"orders": len(orders), "total": _totals(orders)}
+
+
+def _to_ship(_day: date, _threshold: int) -> dict[str, Any]:
+    orders = [
+        order for order in _rows("/orders", {"status": "open", "payment_status": "paid"})
+        if order.get("shipping_status") in TO_SHIP
+    ]
+    orders.sort(key=lambda order: order.get("created_at") or "")
+    return {
+        "orders": len(orders),
+        "oldest": [
+            {
+                "id": order.get("id"),
+                "number": order.get("number"),
+                "customer": (order.get("customer") or {}).get("name")
+                or order.get("contact_name"),
+                "created_at": order.get("created_at"),
+                "shipping_status": order.get("shipping_status"),
+            }
+            for order in orders[:DIGEST_ROWS]
+        ],
+    }
+
+
+def _low_stock(_day: date, threshold: int) -> dict[str, Any]:
+    low = []
+    for product in _rows("/products", {}):
+        for variant in product.get("variants") or []:
+            stock = variant.get("stock")
+            if stock is not None and int(stock) <= threshold:
+                low.append({
+                    "product_id": product.get("id"),
+                    "variant_id": variant.get("id"),
+                    "name": _name(product.get("name")),
+                    "sku": variant.get("sku"),
+                    "stock": int(stock),
+                })
+    low.sort(key=lambda row: row["stock"])
+    return {
+        "variants": len(low),
+        "out_of_stock": sum(1 for row in low if row["stock"] <= 0),
+        "lowest": low[:DIGEST_ROWS],
+    }
+
+
+def _abandoned(day: date, _threshold: int) -> dict[str, Any]:
+    checkouts = _rows("/checkouts", _window(day))
+    return {"checkouts": len(checkouts), "total": _totals(checkouts)}
+
+
+SECTIONS: dict[str, Callable[[date, int], dict[str, Any]]] = {
+    "sales": _sales,
+    "to_ship": _to_ship,
+    "low_stock": _low_stock,
+    "abandoned": _abandoned,
+}
+
+
+def compute(day: date | None = None, *, low_stock: int = DIGEST_LOW_STOCK) -> dict[str, Any]:
+    """Fetch and aggregate the digest of the current store for ``day`` (default: yesterday)."""
+    day = day or yesterday()
+    store_id = api.current_store().store_id
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(SECTIONS), thread_name_prefix="digest") as pool:
+        futures = {
+            name: pool.submit(contextvars.copy_context().run, section, day, low_stock)
+            for name, section in SECTIONS.items()
+        }
+        sections: dict[str, Any] = {}
+        for name, future in futures.items():
+            try:
+                sections[name] = future.result()
+            except RuntimeError as e:
+                sections[name] = {"error": str(e)}
+    errors = [name for name, section in sections.items() if "error" in section]
+    telemetry.TRACER.record(telemetry.make_span(
+        "digest", f"digest {store_id}", started, status="error" if errors else "ok",
+        store=store_id, day=day.isoformat(), errors=len(errors),
+    ))
+    return {
+        "store_id": store_id,
+        "day": day.isoformat(),
+        "computed_at": datetime.now().astimezone().isoformat(timespec="seconds"),
+        "low_stock_threshold": low_stock,
+        **sections,
+    }
+
+
+class DigestStore:
+    """The last digest of each store, kept in memory and saved in ``directory``."""
+
+    def __init__(self, directory: str = DIGEST_DIR) -> None:
+        self.directory = Path(directory).expanduser() if directory else None
+        self._digests: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def get(self, store_id: str) -> dict | None:
+        with self._lock:
+            if store_id in self._digests:
+                return self._digests[store_id]
+        if self.directory is None:
+            return None
+        try:
+            digest = json.loads((self.directory / f"{store_id}.json").read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            return None
+        with self._lock:
+            return self._digests.setdefault(store_id, digest)
+
+    def put(self, digest: dict) -> None:
+        with self._lock:
+            self._digests[digest["store_id"]] = digest
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self.directory / f"{digest['store_id']}.json"
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(digest, indent=2, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, path)
+
+
+DIGESTS = DigestStore()
+
+
+def is_current(digest: dict | None, now: datetime | None = None) -> bool:
+    """Whether ``digest`` is the digest of yesterday."""
+    return digest is not None and digest.get("day") == yesterday(now).isoformat()
+
+
+def current(*, refresh: bool = False, digests: DigestStore | None = None) -> dict[str, Any]:
+    """The current store's digest of yesterday, computed and saved when missing or old."""
+    digests = digests or DIGESTS
+    digest = digests.get(api.current_store().store_id)
+    if refresh or not is_current(digest):
+        digest = compute()
+        digests.put(digest)
+    return digest
+
+
+def refresh_all(
+    clients: list[api.StoreClient] | None = None, *, digests: DigestStore | None = None
+) -> dict[str, dict | Exception]:
+    """Compute and save the digest of every store (default: all configured) concurrently."""
+    digests = digests or DIGESTS
+
+    def run(_client: api.StoreClient) -> dict:
+        digest = compute()
+        digests.put(digest)
+        return digest
+
+    return api.fan_out(run, api.stores() if clients is None else clients)
+
+
+def parse_time(value: str) -> tuple[int, int]:
+    """``HH:MM`` as ``(hour, minute)``. Raises ValueError."""
+    hour, sep, minute = value.strip().partition(":")
+    if not sep or not (hour.isdigit() and minute.isdigit()):
+        raise ValueError(f"invalid time {value!r}: expected HH:MM")
+    if not (0 <= int(hour) < 24 and 0 <= int(minute) < 60):
+        raise ValueError(f"invalid time {value!r}: expected HH:MM")
+    return int(hour), int(minute)
+
+
+class DigestScheduler:
+    """Background thread refreshing every store's digest daily at ``at`` (local ``HH:MM``).
+
+    On start, stores without yesterday's digest get it right away.
+    """
+
+    def __init__(self, at: str, *, digests: DigestStore | None = None) -> None:
+        self.hour, self.minute = parse_time(at)
+        self.digests = digests or DIGESTS
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def next_run(self, now: datetime | None = None) -> datetime:
+        now = now or datetime.now()
+        run_at = now.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+        return run_at if run_at > now else run_at + timedelta(days=1)
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="digest", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _refresh(self, clients: list[api.StoreClient]) -> None:
+        for store_id, outcome in refresh_all(clients, digests=self.digests).items():
+            if isinstance(outcome, Exception):
+                print(f"Digest for store {store_id} failed: {outcome}", file=sys.stderr)
+
+    def _loop(self) -> None:
+        stale = [c for c in api.stores() if not is_current(self.digests.get(c.store_id))]
+        if stale:
+            self._refresh(stale)
+        while not self._stop.wait((self.next_run() - datetime.now()).total_seconds()):
+            self._refresh(api.stores())
+
+
+def format_lines(digest: dict[str, Any]) -> list[str]:
+    """The digest as short plain-text lines, one per section plus listed rows."""
+
+    def money(totals: dict[str, str]) -> str:
+        return ", ".join(f"{value} {currency}".strip() for currency, value in totals.items())
+
+    sections = {name: digest.get(name) or {} for name in SECTIONS}
+    lines = []
+    sales = sections["sales"]
+    lines.append(
+        f"Sales {digest['day']}: error: {sales['error']}" if "error" in sales else
+        f"Sales {digest['day']}: {sales['orders']} paid orders"
+        + (f", {money(sales['total'])}" if sales["total"] else "")
+    )
+    to_ship = sections["to_ship"]
+    if "error" in to_ship:
+        lines.append(f"To ship: error: {to_ship['error']}")
+    else:
+        lines.append(f"To ship: {to_ship['orders']} orders")
+        for order in to_ship["oldest"]:
+            lines.append(f"  #{order['number']} {order['customer'] or ''} "
+                         f"({order['shipping_status']}, {order['created_at']})")
+    low = sections["low_stock"]
+    if "error" in low:
+        lines.append(f"Low stock: error: {low['error']}")
+    else:
+        lines.append(f"Low stock (≤{digest['low_stock_threshold']}): {low['variants']} variants, "
+                     f"{low['out_of_stock']} out of stock")
+        for row in low["lowest"]:
+            sku = f" [{row['sku']}]" if row["sku"] else ""
+            lines.append(f"  {row['stock']:>4}  {row['name']}{sku}")
+    abandoned = sections["abandoned"]
+    lines.append(
+        f"Abandoned carts: error: {abandoned['error']}" if "error" in abandoned else
+        f"Abandoned carts: {abandoned['checkouts']}"
+        + (f", {money(abandoned['total'])}" if abandoned["total"] else "")
+    )
+    return lines
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--all-stores", action="store_true",
+        help="Compute the digest of every store in NUBE_AGENT_STORES_FILE",
+    )
+    parser.add_argument(
+        "--quiet", action="store_true", help="Only save the digests, do not print them"
+    )
+
+
+def run(args: argparse.Namespace) -> int:
+    """Entry point for ``nube-agent digest``. Returns the process exit code."""
+    clients = api.stores() if args.all_stores else [api.current_store()]
+    failed = 0
+    for store_id, outcome in refresh_all(clients).items():
+        if isinstance(outcome, Exception):
+            failed += 1
+            print(f"Digest for store {store_id} failed: {outcome}", file=sys.stderr)
+            continue
+        errors = [name for name in SECTIONS if "error" in outcome[name]]
+        failed += bool(errors)
+        if not args.quiet:
+            print(f"Store {store_id}")
+            for line in format_lines(outcome):
+                print(f"  {line}")
+    return 1 if failed else 0
@@ -0,0 +1,439 @@
+"""Streaming export of store data to CSV or Parquet.
+
+``nube-agent export`` (and the supervisor's ``export_data`` tool) writes
+products (one row per variant), orders (one row per line item), customers and
+abandoned checkouts to ``<dir>/<resource>.csv`` or, with ``--format parquet``,
+to a ``<dir>/<resource>/`` directory of Parquet part files.  Pages of 200 are
+fetched up to ``--prefetch`` at a time ahead of the writer and written as
+soon as they are next in order, so memory stays constant however large the
+store is.
+
+Progress is kept in ``<dir>/export-progress.json`` after every CSV page and
+every finished Parquet part (``PAGES_PER_PART`` pages; Parquet files cannot
+be appended to).  Exporting again into the same directory continues after
+the last saved page and skips finished resources; ``--restart`` starts
+over.  Rows created while an export runs can shift pages, so a resumed
+export of a busy store may repeat or miss a few rows.  Parquet needs pyarrow
+(``pip install 'nube-agent[parquet]'``).
+
+Only files an export wrote are ever replaced: an existing CSV file with other
+columns, or a directory without the ``.nube-agent-export`` marker, is left
+alone and that resource fails.
+"""
+
+import argparse
+import contextvars
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+
+from nube_agent import api
+
+PAGE_SIZE = 200
+DEFAULT_PREFETCH = 4
+PAGES_PER_PART = 25
+PROGRESS_FILE = "export-progress.json"
+# Marks a Parquet directory as written by an export; readers skip dot files.
+EXPORT_MARKER = ".nube-agent-export"
+FORMATS = ("csv", "parquet")
+
+
+def _text(value: Any, lang: str) -> Any:
+    if isinstance(value, dict) and value and all(isinstance(v, str | None) for v in value.values()):
+        return value.get(lang) or next((v for v in value.values() if v), "")
+    return value
+
+
+def _product_rows(product: dict, lang: str) -> Iterator[dict]:
+    base = {
+        "product_id": product.get("id"),
+        "handle": _text(product.get("handle"), lang),
+        "name": _text(product.get("name"), lang),
+        "published": product.get("published"),
+        "brand": product.get("brand"),
+        "tags": product.get("tags"),
+        "attributes": [_text(a, lang) for a in product.get("attributes") or []],
+        "created_at": product.get("created_at"),
+        "updated_at": product.get("updated_at"),
+    }
+    for variant in product.get("variants") or [{}]:
+        yield {
+            **base,
+            "variant_id": variant.get("id"),
+            "sku": variant.get("sku"),
+            "values": [_text(v, lang) for v in variant.get("values") or []],
+            **{f: variant.get(f) for f in ("price", "promotional_price", "stock", "weight",
+                                           "width", "height", "depth")},
+        }
+
+
+def _order_rows(order: dict, lang: str) -> Iterator[dict]:
+    customer = order.get("customer") or {}
+    base = {
+        "order_id": order.get("id"),
+        "number": order.get("number"),
+        "created_at": order.get("created_at"),
+        "status": order.get("status"),
+        "payment_status": order.get("payment_status"),
+        "shipping_status": order.get("shipping_status"),
+        "customer_id": customer.get("id"),
+        "customer_name": customer.get("name") or order.get("contact_name"),
+        "customer_email": customer.get("email") or order.get("contact_email"),
+        "currency": order.get("currency"),
+        "total": order.get("total"),
+    }
+    for line in order.get("products") or [{}]:
+        yield {
+            **base,
+            "product_id": line.get("product_id"),
+            "variant_id": line.get("variant_id"),
+            "sku": line.get("sku"),
+            "item_name": _text(line.get("name"), lang),
+            "price": line.get("price"),
+            "quantity": line.get("quantity"),
+        }
+
+
+def _plain_rows(columns: tuple[str, ...]) -> Callable[[dict, str], Iterator[dict]]:
+    def rows(record: dict, lang: str) -> Iterator[dict]:
+        yield {column: _text(record.get(column), lang) for column in columns}
+
+    return rows
+
+
+_CUSTOMER_COLUMNS = (
+    "id", "name", "email", "phone", "identification", "total_spent", "total_spent_currency",
+    "last_order_id", "accepts_marketing", "note", "created_at", "updated_at",
+)
+_CHECKOUT_COLUMNS = (
+    "id", "contact_name", "contact_email", "contact_phone", "total", "currency",
+    "abandoned_checkout_url", "created_at", "updated_at",
+)
+
+RESOURCES: dict[str, dict[str, Any]] = {
+    "products": {
+        "path": "/products",
+        "rows": _product_rows,
+        "columns": (
+            "product_id", "handle", "name", "published", "brand", "tags", "attributes",
+            "variant_id", "sku", "values", "price", "promotional_price", "stock", "weight",
+            "width", "height", "depth", "created_at", "updated_at",
+        ),
+    },
+    "orders": {
+        "path": "/orders",
+        "rows": _order_rows,
+        "columns": (
+            "order_id", "number", "created_at", "status", "payment_status", "shipping_status",
+            "customer_id", "customer_name", "customer_email", "currency", "total",
+            "product_id", "variant_id", "sku", "item_name", "price", "quantity",
+        ),
+    },
+    "customers": {
+        "path": "/customers", "rows": _plain_rows(_CUSTOMER_COLUMNS), "columns": _CUSTOMER_COLUMNS,
+    },
+    "checkouts": {
+        "path": "/checkouts", "rows": _plain_rows(_CHECKOUT_COLUMNS), "columns": _CHECKOUT_COLUMNS,
+    },
+}
+
+
+def cell(value: Any) -> str:
+    """One exported value as text: JSON for lists and objects, empty for null."""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, dict | list):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def fetch_pages(
+    path: str, params: dict[str, Any], *, start: int = 1, prefetch: int = DEFAULT_PREFETCH
+) -> Iterator[tuple[int, list]]:
+    """Yield ``(page, rows)`` from ``start`` on, in order, fetching ``prefetch`` pages ahead.
+
+    Raises RuntimeError with the API error when a page cannot be read.
+    """
+    prefetch = max(1, prefetch)
+    with ThreadPoolExecutor(max_workers=prefetch) as pool:
+        pending: deque = deque()
+
+        def submit(page: int) -> None:
+            query = {**params, "page": page, "per_page": PAGE_SIZE}
+            context = contextvars.copy_context()
+            pending.append((page, pool.submit(context.run, api.request, "GET", path,
+                                              params=query)))
+
+        for page in range(start, start + prefetch):
+            submit(page)
+        try:
+            while pending:
+                page, future = pending.popleft()
+                result = future.result()
+                if isinstance(result, str):
+                    # Past the last page the API answers 404 "Last page is N".
+                    if result.startswith("API error 404"):
+                        return
+                    raise RuntimeError(result)
+                if not isinstance(result, list):
+                    raise RuntimeError(f"Unexpected response for {path}: {str(result)[:200]}")
+                yield page, result
+                if len(result) < PAGE_SIZE:
+                    return
+                submit(page + prefetch)
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+
+class Progress:
+    """Per-resource export progress, saved to ``export-progress.json`` in the output dir."""
+
+    def __init__(self, directory: Path) -> None:
+        self.path = directory / PROGRESS_FILE
+        try:
+            self.entries: dict[str, dict] = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            self.entries = {}
+
+    def get(self, resource: str, key: dict) -> dict | None:
+        """Saved progress of ``resource`` if it was exported with the same ``key``."""
+        entry = self.entries.get(resource)
+        return entry if entry and entry.get("key") == key else None
+
+    def save(self, resource: str, entry: dict) -> None:
+        self.entries[resource] = entry
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.entries, indent=2), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+
+class CsvSink:
+    """Appends rows to one CSV file; ``offset`` is the byte size to resume from."""
+
+    def __init__(self, path: Path, columns: tuple[str, ...], offset: int = 0) -> None:
+        self.path = path
+        if offset and path.exists():
+            os.truncate(path, offset)
+            self._fh = path.open("a", encoding="utf-8", newline="")
+            self._writer = csv.writer(self._fh)
+        else:
+            if path.exists() and not self._is_export(path, columns):
+                raise RuntimeError(f"{path} exists and is not an export of this resource")
+            self._fh = path.open("w", encoding="utf-8", newline="")
+            self._writer = csv.writer(self._fh)
+            self._writer.writerow(columns)
+        self.columns = columns
+
+    @staticmethod
+    def _is_export(path: Path, columns: tuple[str, ...]) -> bool:
+        try:
+            with path.open(encoding="utf-8", newline="") as fh:
+                return next(csv.reader(fh), None) == list(columns)
+        except (OSError, UnicodeDecodeError, csv.Error):
+            return False
+
+    def write(self, rows: list[dict]) -> None:
+        self._writer.writerows([cell(row.get(c)) for c in self.columns] for row in rows)
+
+    def checkpoint(self, page: int) -> dict | None:
+        self._fh.flush()
+        return {"offset": os.fstat(self._fh.fileno()).st_size}
+
+    def close(self) -> dict:
+        self._fh.close()
+        return {"offset": self.path.stat().st_size}
+
+
+class ParquetSink:
+    """Writes rows to Parquet part files of ``PAGES_PER_PART`` pages under one directory."""
+
+    def __init__(self, path: Path, columns: tuple[str, ...], parts: int = 0) -> None:
+        if (parts == 0 and path.exists() and not (path / EXPORT_MARKER).exists()
+                and any(path.iterdir())):
+            raise RuntimeError(f"{path} exists and was not written by an export")
+        import pyarrow as pa
+
+        self.path = path
+        self.columns = columns
+        self.parts = parts
+        self._pa = pa
+        self._schema = pa.schema([(c, pa.string()) for c in columns])
+        self._writer = None
+        path.mkdir(parents=True, exist_ok=True)
+        (path / EXPORT_MARKER).touch()
+        for stale in path.glob("part-*.parquet"):
+            if int(stale.stem.removeprefix("part-")) >= parts:
+                stale.unlink()
+
+    def write(self, rows: list[dict]) -> None:
+        import pyarrow.parquet as pq
+
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path / f"part-{self.parts:05d}.parquet",
+                                            self._schema)
+        table = self._pa.table(
+            {c: [cell(row.get(c)) if row.get(c) is not None else None for row in rows]
+             for c in self.columns},
+            schema=self._schema,
+        )
+        self._writer.write_table(table)
+
+    def _finish_part(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            self.parts += 1
+
+    def checkpoint(self, page: int) -> dict | None:
+        if page % PAGES_PER_PART:
+            return None
+        self._finish_part()
+        return {"parts": self.parts}
+
+    def close(self) -> dict:
+        self._finish_part()
+        return {"parts": self.parts}
+
+
+def export_resource(
+    resource: str,
+    directory: Path,
+    *,
+    fmt: str = "csv",
+    params: dict[str, Any] | None = None,
+    prefetch: int = DEFAULT_PREFETCH,
+    progress: Progress | None = None,
+) -> dict[str, Any]:
+    """Export one resource of the current store. Never raises."""
+    spec = RESOURCES[resource]
+    params = dict(params or {})
+    target = directory / (f"{resource}.csv" if fmt == "csv" else resource)
+    key = {"format": fmt, "params": params, "store_id": api.current_store().store_id}
+    saved = progress.get(resource, key) if progress is not None else None
+    result: dict[str, Any] = {"resource": resource, "file": str(target), "rows": 0, "pages": 0}
+    if saved and saved.get("done"):
+        return {**result, "rows": saved["rows"], "pages": saved["pages"], "resumed": True}
+    pages, rows = (saved["pages"], saved["rows"]) if saved else (0, 0)
+    result["resumed"] = bool(saved)
+    started = time.perf_counter()
+    try:
+        lang = api.store_language()
+        if fmt == "csv":
+            sink: CsvSink | ParquetSink = CsvSink(
+                target, spec["columns"], saved["offset"] if saved else 0
+            )
+        else:
+            sink = ParquetSink(target, spec["columns"], saved["parts"] if saved else 0)
+    except ImportError:
+        return {**result, "error": "Parquet export needs pyarrow: "
+                                   "pip install 'nube-agent[parquet]'"}
+    except (OSError, RuntimeError) as e:
+        return {**result, "error": f"Error: {e}"}
+
+    done = False
+    try:
+        for page, records in fetch_pages(spec["path"], params, start=pages + 1,
+                                         prefetch=prefetch):
+            batch = [row for record in records for row in spec["rows"](record, lang)]
+            sink.write(batch)
+            pages, rows = page, rows + len(batch)
+            state = sink.checkpoint(page)
+            if state is not None and progress is not None:
+                progress.save(resource, {"key": key, "pages": pages, "rows": rows, **state})
+        done = True
+    except Exception as e:
+        result["error"] = f"Error: {e}"
+    finally:
+        state = sink.close()
+    if done and progress is not None:
+        progress.save(resource, {"key": key, "pages": pages, "rows": rows, "done": True,
+                                 **state})
+    return {**result, "rows": rows, "pages": pages,
+            "elapsed_s": round(time.perf_counter() - started, 3)}
+
+
+def export_store(
+    resources: Iterable[str],
+    directory: str | Path,
+    *,
+    fmt: str = "csv",
+    since: str = "",
+    prefetch: int = DEFAULT_PREFETCH,
+    restart: bool = False,
+) -> dict[str, Any]:
+    """Export ``resources`` of the current store into ``directory``, one after another."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    if restart:
+        (directory / PROGRESS_FILE).unlink(missing_ok=True)
+    progress = Progress(directory)
+    params = {"created_at_min": since} if since else {}
+    started = time.perf_counter()
+    results = [
+        export_resource(r, directory, fmt=fmt, params=params, prefetch=prefetch,
+                        progress=progress)
+        for r in resources
+    ]
+    return {
+        "directory": str(directory),
+        "format": fmt,
+        "resources": results,
+        "elapsed_s": round(time.perf_counter() - started, 3),
+    }
+
+
+def format_summary(summary: dict[str, Any]) -> str:
+    parts = []
+    for r in summary["resources"]:
+        note = " (resumed)" if r.get("resumed") else ""
+        note += f" FAILED: {r['error']}" if "error" in r else ""
+        parts.append(f"{r['resource']} {r['rows']:,} rows{note}")
+    return f"Exported to {summary['directory']} in {summary['elapsed_s']:.1f}s · " + ", ".join(
+        parts
+    )
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "resources", nargs="*", metavar="RESOURCE",
+        help=f"What to export: {', '.join(RESOURCES)} (default: all)",
+    )
+    parser.add_argument("-o", "--output", default="export", help="Output directory")
+    parser.add_argument("--format", choices=FORMATS, default="csv", help="csv or parquet")
+    parser.add_argument("--since", default="", help="Only records created after this date")
+    parser.add_argument(
+        "--prefetch", type=int, default=DEFAULT_PREFETCH,
+        help=f"Pages fetched ahead of the writer (default: {DEFAULT_PREFETCH})",
+    )
+    parser.add_argument(
+        "--restart", action="store_true", help="Ignore saved progress and export everything"
+    )
+
+
+def run(args: argparse.Namespace) -> int:
+    """Entry point for ``nube-agent export``. Returns the process exit code."""
+    unknown = [r for r in args.resources if r not in RESOURCES]
+    if unknown:
+        print(f"Unknown resource: {', '.join(unknown)}. Choose from {', '.join(RESOURCES)}.",
+              file=sys.stderr)
+        return 2
+    summary = export_store(
+        args.resources or list(RESOURCES),
+        args.output,
+        fmt=args.format,
+        since=args.since,
+        prefetch=args.prefetch,
+        restart=args.restart,
+    )
+    print(format_summary(summary), file=sys.stderr)
+    return 1 if any("error" in r for r in summary["resources"]) else 0
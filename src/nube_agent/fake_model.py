@@ -0,0 +1,153 @@
+"""Scripted chat model for offline runs and benchmarks.
+
+Select it with ``NUBE_AGENT_MODEL=fake:path/to/script.json``.  A script maps
+each agent name (``"supervisor"`` for the main agent, or a subagent name from
+``SUBAGENTS``) to the list of responses that agent should produce, in order:
+
+    {
+      "latency": 0.0,
+      "responses": {
+        "supervisor": [
+          {"tool_calls": [{"name": "task", "args": {"subagent_type": "catalog-manager",
+                                                   "description": "List the products"}}]},
+          {"content": "You have 3 products."}
+        ],
+        "catalog-manager": [
+          {"tool_calls": [{"name": "list_products", "args": {"per_page": 20}}]},
+          {"content": "Remera 1, Remera 2, Remera 3"}
+        ]
+      }
+    }
+
+Conversation files used by the benchmarks (``{"turns": [{"user": ...,
+"responses": {...}}]}``) are accepted too; their turns are queued in order.
+Scripts can be recorded from a real session with :class:`ScriptRecorder`.
+"""
+
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import Any
+
+from langchain_core.callbacks import BaseCallbackHandler, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult, LLMResult
+from pydantic import PrivateAttr
+
+from nube_agent.telemetry import SUPERVISOR, agent_name
+
+
+def _to_message(response: dict[str, Any]) -> AIMessage:
+    tool_calls = [
+        {
+            "name": call["name"],
+            "args": call.get("args", {}),
+            "id": call.get("id") or f"call_{uuid.uuid4().hex[:12]}",
+            "type": "tool_call",
+        }
+        for call in response.get("tool_calls", [])
+    ]
+    return AIMessage(
+        content=response.get("content", ""),
+        tool_calls=tool_calls,
+        usage_metadata=response.get("usage"),
+    )
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Chat model that replays scripted responses per agent.
+
+    Each agent has its own queue so subagents running concurrently still get
+    their own responses in order.  ``latency`` (per script, or ``"latency"``
+    on a single response) simulates model time with a sleep.
+    """
+
+    latency: float = 0.0
+    # Reported as ``ls_model_name``, so usage is attributed per model.
+    model_name: str = "scripted"
+    exhausted_reply: str = "(scripted model: no more responses)"
+    _queues: dict[str, deque] = PrivateAttr(default_factory=dict)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    @classmethod
+    def from_file(cls, path: str | Path) -> "ScriptedChatModel":
+        script = json.loads(Path(path).read_text(encoding="utf-8"))
+        model = cls(latency=script.get("latency", 0.0))
+        if "turns" in script:
+            for turn in script["turns"]:
+                model.load(turn.get("responses", {}))
+        else:
+            model.load(script.get("responses", {}))
+        return model
+
+    def load(self, responses: dict[str, list[dict]]) -> None:
+        """Queue more responses, keyed by agent name."""
+        with self._lock:
+            for name, items in responses.items():
+                self._queues.setdefault(name, deque()).extend(items)
+
+    def pending(self) -> dict[str, int]:
+        """Number of queued responses left per agent."""
+        with self._lock:
+            return {name: len(queue) for name, queue in self._queues.items() if queue}
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "ScriptedChatModel":
+        return self
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        name = agent_name(run_manager.metadata if run_manager else None)
+        with self._lock:
+            queue = self._queues.get(name)
+            response = queue.popleft() if queue else {"content": self.exhausted_reply}
+        delay = response.get("latency", self.latency)
+        if delay:
+            time.sleep(delay)
+        return ChatResult(generations=[ChatGeneration(message=_to_message(response))])
+
+
+class ScriptRecorder(BaseCallbackHandler):
+    """Callback handler that records every model response as a replay script.
+
+    Pass it in the run config's ``callbacks`` and call :meth:`dump` at the end
+    of the session to write a script ``ScriptedChatModel.from_file`` can load.
+    """
+
+    def __init__(self) -> None:
+        self.responses: dict[str, list[dict]] = {}
+        self._agents: dict[uuid.UUID, str] = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        self._agents[run_id] = agent_name(metadata)
+
+    def on_llm_end(self, response: LLMResult, *, run_id, **kwargs) -> None:
+        name = self._agents.pop(run_id, SUPERVISOR)
+        message = response.generations[0][0].message
+        entry: dict[str, Any] = {}
+        if message.text:
+            entry["content"] = message.text
+        if getattr(message, "tool_calls", None):
+            entry["tool_calls"] = [
+                {"name": call["name"], "args": call["args"]} for call in message.tool_calls
+            ]
+        with self._lock:
+            self.responses.setdefault(name, []).append(entry)
+
+    def dump(self, path: str | Path) -> None:
+        with self._lock:
+            script = {"responses": self.responses}
+        Path(path).write_text(json.dumps(script, ensure_ascii=False, indent=2), encoding="utf-8")
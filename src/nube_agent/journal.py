@@ -0,0 +1,257 @@
+"""Local journal of API writes, for safe retries and resumed runs.
+
+Writes made inside :func:`~nube_agent.api.journal_scope` (a CLI or server
+turn, a batch item) are recorded in a SQLite file under an idempotency key:
+a hash of the scope, store, method, path and body, also sent as the
+``Idempotency-Key`` header.  Identical writes made on purpose in one run of
+a scope (two identical coupons) are told apart by a sequence number in the
+key (see :class:`CallSequence`); repeating a write whose last attempt did
+not succeed keeps its number.  Before a write goes out, its key is looked up:
+
+- ``done``: the same write already succeeded in an earlier run of this
+  scope.  Its response is returned again instead of sending it twice (a
+  resumed batch or turn).
+- ``pending``: an earlier attempt (a POST) failed in a way that may have
+  reached the store, e.g. a read timeout.  The first repeat gets an error
+  asking to check the store; a second repeat is sent.
+- anything else (``failed``, not found): the write is sent.
+
+Applied writes in a scope that does not start with ``undo:`` also get a
+snapshot: the resource before the write (from the cache or a GET), the body
+sent and the response, which :mod:`nube_agent.undo` uses to revert the last
+operation or batch.
+
+Entries older than ``RETENTION_DAYS`` are dropped when the journal opens.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from nube_agent.config import JOURNAL_PATH
+
+RETENTION_DAYS = 7
+
+DONE = "done"
+PENDING = "pending"
+WARNED = "warned"
+FAILED = "failed"
+
+APPLIED = "applied"
+UNDONE = "undone"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS writes (
+    key TEXT PRIMARY KEY,
+    scope TEXT NOT NULL,
+    store_id TEXT NOT NULL,
+    method TEXT NOT NULL,
+    path TEXT NOT NULL,
+    resource TEXT NOT NULL,
+    status TEXT NOT NULL,
+    response TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS writes_resource ON writes (scope, store_id, resource, updated);
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    scope TEXT NOT NULL,
+    store_id TEXT NOT NULL,
+    method TEXT NOT NULL,
+    path TEXT NOT NULL,
+    body TEXT,
+    before TEXT,
+    after TEXT,
+    status TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS snapshots_scope ON snapshots (store_id, scope, status);
+"""
+
+
+def resource(path: str) -> str:
+    """The resource a write changes: ``/orders/1`` for ``/orders/1/close``."""
+    return "/" + "/".join(path.strip("/").split("/")[:2])
+
+
+def idempotency_key(
+    scope: str, store_id: str, method: str, path: str, body: Any, seq: int = 0
+) -> str:
+    parts = [scope, store_id, method, path, body, *([seq] if seq else [])]
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+class CallSequence:
+    """Numbers the identical writes of one run of a journal scope. Thread-safe.
+
+    Each identical write (same base key) started in the run gets the next
+    number, so concurrent or repeated identical writes are all sent.  A write
+    whose earlier identical call ended without succeeding takes over that
+    call's number instead: it is a retry, and the journal decides whether to
+    send it.  A resumed run starts again from 0 and meets the keys of the
+    interrupted run in the same order.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[str, list[str]] = {}
+        self._lock = threading.Lock()
+
+    def start(self, base: str) -> int:
+        with self._lock:
+            calls = self._calls.setdefault(base, [])
+            seq = calls.index("open") if "open" in calls else len(calls)
+            calls[seq:seq + 1] = ["running"]
+            return seq
+
+    def finish(self, base: str, seq: int, succeeded: bool) -> None:
+        with self._lock:
+            self._calls[base][seq] = "done" if succeeded else "open"
+
+
+class WriteJournal:
+    """SQLite journal of writes by idempotency key. Safe to share between threads."""
+
+    def __init__(self, path: str | Path, retention_days: float = RETENTION_DAYS) -> None:
+        self.path = str(path)
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            if self.path != ":memory:":
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(_SCHEMA)
+            cutoff = time.time() - retention_days * 86400
+            self._db.execute("DELETE FROM writes WHERE updated < ?", (cutoff,))
+            self._db.execute("DELETE FROM snapshots WHERE created < ?", (cutoff,))
+
+    def begin(
+        self, key: str, scope: str, store_id: str, method: str, path: str
+    ) -> tuple[str, Any] | None:
+        """Look up a write before sending it.
+
+        Returns ``("replay", response)`` for a write that already succeeded,
+        ``("ambiguous", None)`` the first time a possibly applied write is
+        repeated, and None (after marking it pending) when it should be sent.
+        """
+        now = time.time()
+        target = resource(path)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status, response FROM writes WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and row[0] == DONE:
+                return "replay", json.loads(row[1])
+            if row is not None and row[0] == PENDING:
+                self._db.execute(
+                    "UPDATE writes SET status = ?, updated = ? WHERE key = ?", (WARNED, now, key)
+                )
+                return "ambiguous", None
+            self._db.execute(
+                "INSERT INTO writes (key, scope, store_id, method, path, resource, status,"
+                " attempts, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?, 1, ?, ?)"
+                " ON CONFLICT (key) DO UPDATE SET status = excluded.status,"
+                " attempts = attempts + 1, updated = excluded.updated",
+                (key, scope, store_id, method, path, target, PENDING, now, now),
+            )
+        return None
+
+    def finish(self, key: str, status: str, response: Any = None) -> None:
+        """Record the outcome of a sent write (``done``, ``failed`` or ``pending``)."""
+        body = json.dumps(response, ensure_ascii=False) if status == DONE else None
+        with self._lock:
+            self._db.execute(
+                "UPDATE writes SET status = ?, response = ?, updated = ? WHERE key = ?",
+                (status, body, time.time(), key),
+            )
+
+    def entries(self, scope: str | None = None) -> list[dict]:
+        """Journaled writes, oldest first (only ``scope``'s when given)."""
+        query = "SELECT key, scope, store_id, method, path, status, attempts FROM writes"
+        args: tuple = ()
+        if scope is not None:
+            query, args = f"{query} WHERE scope = ?", (scope,)
+        with self._lock:
+            rows = self._db.execute(f"{query} ORDER BY created", args).fetchall()
+        columns = ("key", "scope", "store_id", "method", "path", "status", "attempts")
+        return [dict(zip(columns, row, strict=True)) for row in rows]
+
+    def snapshot(
+        self, scope: str, store_id: str, method: str, path: str,
+        body: Any, before: Any, after: Any,
+    ) -> None:
+        """Record an applied write with the resource as it was before it."""
+        values = [json.dumps(v, ensure_ascii=False) for v in (body, before, after)]
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO snapshots (scope, store_id, method, path, body, before, after,"
+                " status, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (scope, store_id, method, path, *values, APPLIED, time.time()),
+            )
+
+    def last_scope(self, store_id: str, prefix: str = "") -> str | None:
+        """The scope of the most recent write to ``store_id`` that can still be
+        undone, among the scopes starting with ``prefix``."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT scope FROM snapshots WHERE store_id = ? AND status = ?"
+                " AND substr(scope, 1, ?) = ? ORDER BY id DESC LIMIT 1",
+                (store_id, APPLIED, len(prefix), prefix),
+            ).fetchone()
+        return row[0] if row else None
+
+    def snapshots(self, store_id: str, scope: str) -> list[dict]:
+        """Applied snapshots of ``scope`` in write order; a scope ending in ``:``
+        matches every scope under it (e.g. all the items of a batch run)."""
+        if scope.endswith(":"):
+            pattern = scope.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            match, arg = "scope LIKE ? ESCAPE '\\'", pattern + "%"
+        else:
+            match, arg = "scope = ?", scope
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, scope, method, path, body, before, after FROM snapshots"
+                f" WHERE store_id = ? AND status = ? AND {match} ORDER BY id",
+                (store_id, APPLIED, arg),
+            ).fetchall()
+        return [
+            {
+                "id": row[0], "scope": row[1], "method": row[2], "path": row[3],
+                "body": json.loads(row[4]), "before": json.loads(row[5]),
+                "after": json.loads(row[6]),
+            }
+            for row in rows
+        ]
+
+    def mark_undone(self, ids: list[int]) -> None:
+        with self._lock:
+            self._db.executemany(
+                "UPDATE snapshots SET status = ? WHERE id = ?", [(UNDONE, i) for i in ids]
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+_journals: dict[str, WriteJournal] = {}
+_journals_lock = threading.Lock()
+
+
+def get_journal(path: str = JOURNAL_PATH) -> WriteJournal | None:
+    """The shared journal at ``path``, opened on first use; None when ``path`` is empty."""
+    if not path:
+        return None
+    path = str(Path(path).expanduser()) if path != ":memory:" else path
+    with _journals_lock:
+        if path not in _journals:
+            _journals[path] = WriteJournal(path)
+        return _journals[path]
@@ -0,0 +1,224 @@
+"""Direct tool listings for slash commands.
+
+Slash commands such as ``/products`` or ``/orders`` only need to show a page
+of resources, so they call the tool functions directly and format the result
+as a compact table instead of going through the agent and the model.
+"""
+
+import json
+from collections.abc import Callable
+from typing import Any
+
+from nube_agent.api import store_language, store_locale, strip_stale_note
+from nube_agent.tools.abandoned_checkouts import list_abandoned_checkouts
+from nube_agent.tools.categories import list_categories
+from nube_agent.tools.coupons import list_coupons
+from nube_agent.tools.customers import list_customers
+from nube_agent.tools.orders import list_orders
+from nube_agent.tools.pages import list_pages
+from nube_agent.tools.products import list_products
+from nube_agent.tools.store import get_store_info
+from nube_agent.tools.variants import list_variants
+
+PAGE_SIZE = 20
+
+
+def localized(value: Any) -> str:
+    """Pick the store-language text from a multilingual ``{lang: text}`` field."""
+    if not isinstance(value, dict):
+        return "" if value is None else str(value)
+    for key in (store_language(), store_locale()):
+        if value.get(key):
+            return str(value[key])
+    return next((str(v) for v in value.values() if v), "")
+
+
+def _stock(product: dict) -> str:
+    variants = product.get("variants") or []
+    if any(v.get("stock") is None for v in variants):
+        return "∞"
+    return str(sum(int(v.get("stock") or 0) for v in variants))
+
+
+def _price(product: dict) -> str:
+    variants = product.get("variants") or []
+    return str(variants[0].get("price") or "") if variants else ""
+
+
+def _customer_name(order: dict) -> str:
+    customer = order.get("customer") or {}
+    return customer.get("name") or order.get("contact_name") or ""
+
+
+def _yes_no(value: Any) -> str:
+    return "yes" if value else "no"
+
+
+def _values(variant: dict) -> str:
+    return " / ".join(localized(v) for v in variant.get("values") or []) or "-"
+
+
+Column = tuple[str, Callable[[dict], Any]]
+
+LISTINGS: dict[str, dict[str, Any]] = {
+    "/products": {
+        "title": "Products",
+        "fetch": lambda page, _arg: list_products(page=page, per_page=PAGE_SIZE),
+        "columns": [
+            ("ID", lambda p: p.get("id")),
+            ("Name", lambda p: localized(p.get("name"))),
+            ("Price", _price),
+            ("Stock", _stock),
+            ("Published", lambda p: _yes_no(p.get("published"))),
+        ],
+    },
+    "/categories": {
+        "title": "Categories",
+        "fetch": lambda page, _arg: list_categories(page=page, per_page=PAGE_SIZE),
+        "columns": [
+            ("ID", lambda c: c.get("id")),
+            ("Name", lambda c: localized(c.get("name"))),
+            ("Parent", lambda c: c.get("parent") or "-"),
+            ("Subcategories", lambda c: len(c.get("subcategories") or [])),
+        ],
+    },
+    "/orders": {
+        "title": "Orders",
+        "fetch": lambda page, _arg: list_orders(page=page, per_page=PAGE_SIZE),
+        "columns": [
+            ("Number", lambda o: o.get("number")),
+            ("Customer", _customer_name),
+            ("Total", lambda o: f"{o.get('total', '')} {o.get('currency', '')}".strip()),
+            ("Status", lambda o: o.get("status")),
+            ("Payment", lambda o: o.get("payment_status")),
+            ("Shipping", lambda o: o.get("shipping_status")),
+        ],
+    },
+    "/customers": {
+        "title": "Customers",
+        "fetch": lambda page, _arg: list_customers(page=page, per_page=PAGE_SIZE),
+        "columns": [
+            ("ID", lambda c: c.get("id")),
+            ("Name", lambda c: c.get("name")),
+            ("Email", lambda c: c.get("email")),
+            ("Total spent", lambda c: c.get("total_spent")),
+        ],
+    },
+    "/coupons": {
+        "title": "Coupons",
+        "fetch": lambda page, _arg: list_coupons(page=page, per_page=PAGE_SIZE),
+        "columns": [
+            ("ID", lambda c: c.get("id")),
+            ("Code", lambda c: c.get("code")),
+            ("Type", lambda c: c.get("type")),
+            ("Value", lambda c: c.get("value")),
+            ("Valid", lambda c: _yes_no(c.get("valid"))),
+            ("Used", lambda c: c.get("used")),
+        ],
+    },
+    "/abandoned": {
+        "title": "Abandoned checkouts",
+        "fetch": lambda page, _arg: list_abandoned_checkouts(page=page, per_page=PAGE_SIZE),
+        "columns": [
+            ("ID", lambda c: c.get("id")),
+            ("Contact", lambda c: c.get("contact_name")),
+            ("Email", lambda c: c.get("contact_email")),
+            ("Total", lambda c: c.get("total")),
+            ("Created", lambda c: (c.get("created_at") or "")[:10]),
+        ],
+    },
+    "/pages": {
+        "title": "Pages",
+        "fetch": lambda page, _arg: list_pages(page=page, per_page=PAGE_SIZE),
+        "columns": [
+            ("ID", lambda p: p.get("id")),
+            ("Title", lambda p: localized(p.get("name") or p.get("title"))),
+            ("Handle", lambda p: localized(p.get("handle"))),
+            ("Published", lambda p: _yes_no(p.get("publish", p.get("published")))),
+        ],
+    },
+    "/variants": {
+        "title": "Variants",
+        "requires_arg": "product_id",
+        "paged": False,
+        "fetch": lambda _page, arg: list_variants(int(arg)),
+        "columns": [
+            ("ID", lambda v: v.get("id")),
+            ("Values", _values),
+            ("Price", lambda v: v.get("price")),
+            ("Stock", lambda v: "∞" if v.get("stock") is None else v.get("stock")),
+            ("SKU", lambda v: v.get("sku") or "-"),
+        ],
+    },
+}
+
+STORE_FIELDS: list[Column] = [
+    ("Name", lambda s: localized(s.get("name"))),
+    ("Domain", lambda s: s.get("original_domain")),
+    ("Email", lambda s: s.get("email")),
+    ("Country", lambda s: s.get("country")),
+    ("Language", lambda s: s.get("main_language")),
+    ("Currency", lambda s: s.get("main_currency")),
+    ("Plan", lambda s: s.get("plan_name")),
+]
+
+
+def fetch_rows(cmd: str, page: int = 1, arg: str = "") -> list[dict] | str:
+    """Call the tool behind a listing command and return its rows.
+
+    Returns the list of resources on success, or a descriptive error string.
+    An empty page past the end of the collection is returned as an empty list.
+    """
+    raw = strip_stale_note(LISTINGS[cmd]["fetch"](page, arg))
+    try:
+        data = json.loads(raw)
+    except json.JSONDecodeError:
+        if page > 1 and raw.startswith("API error 404"):
+            return []
+        return raw
+    if not isinstance(data, list):
+        return f"Unexpected response: {raw[:200]}"
+    return data
+
+
+def fetch_store() -> dict | str:
+    """Fetch the store info for ``/store``, or a descriptive error string."""
+    raw = strip_stale_note(get_store_info())
+    try:
+        data = json.loads(raw)
+    except json.JSONDecodeError:
+        return raw
+    return data if isinstance(data, dict) else f"Unexpected response: {raw[:200]}"
+
+
+def _cell(value: Any) -> str:
+    text = "" if value is None else str(value)
+    return " ".join(text.split())
+
+
+def table_lines(rows: list[dict], columns: list[Column], width: int) -> list[str]:
+    """Format rows as a plain-text table that fits in ``width`` characters.
+
+    The widest column is shrunk (with an ellipsis) until the table fits.
+    The first line is the header and the second a separator.
+    """
+    headers = [name for name, _ in columns]
+    cells = [[_cell(get(row)) for _, get in columns] for row in rows]
+    widths = [max([len(h)] + [len(r[i]) for r in cells]) for i, h in enumerate(headers)]
+
+    gap = 2
+    while sum(widths) + gap * (len(widths) - 1) > width:
+        widest = max(range(len(widths)), key=widths.__getitem__)
+        if widths[widest] <= len(headers[widest]) or widths[widest] <= 4:
+            break
+        widths[widest] -= 1
+
+    def fit(text: str, w: int) -> str:
+        return text if len(text) <= w else text[: w - 1] + "…"
+
+    def line(values: list[str]) -> str:
+        return (" " * gap).join(fit(v, w).ljust(w) for v, w in zip(values, widths)).rstrip()
+
+    lines = [line(headers), line(["─" * w for w in widths])]
+    lines.extend(line(r) for r in cells)
+    return lines
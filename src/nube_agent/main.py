@@ -12,8 +12,20 @@ from importlib.metadata import version
 from langchain_core.messages import AIMessageChunk, ToolMessage
 from langgraph.types import Command
 
+from nube_agent import api, batch, catalog_import, digest, export, server, telemetry, undo
 from nube_agent.agent import build_agent
-from nube_agent.config import MODEL, validate
+from nube_agent.approvals import ApprovalPolicy
+from nube_agent.config import AUTO_APPROVE, MODEL, validate
+from nube_agent.listings import (
+    LISTINGS,
+    PAGE_SIZE,
+    STORE_FIELDS,
+    fetch_rows,
+    fetch_store,
+    table_lines,
+)
+from nube_agent.router import Router
+from nube_agent.usage import UsageTotals, UsageTracker, cached_ratio
 
 VERSION = version("nube-agent")
 
@@ -31,6 +43,11 @@ GREEN = "\033[38;2;76;175;80m"
 RED = "\033[38;2;244;67;54m"
 GRAY = "\033[38;2;130;130;130m"
 
+# Answers that approve an action.
+YES = ("y", "yes", "s", "si")
+# Arguments shown per tool in a summarized approval.
+APPROVAL_PREVIEW = 5
+
 
 class Spinner:
     """Animated spinner for background work."""
@@ -121,6 +138,9 @@ def print_banner(store_name: str, store_domain: str, store_currency: str) -> Non
         ("/categories", "List categories"),
         ("/abandoned", "Abandoned carts"),
         ("/pages", "Content pages"),
+        ("/digest", "Daily digest"),
+        ("/stats", "Latency stats"),
+        ("/usage", "Token usage"),
         ("/debug", "Toggle debug"),
         ("/help", "All commands"),
         ("/exit", "Exit"),
@@ -146,6 +166,10 @@ def print_help() -> None:
         ("/variants <id>", "List variants for a product"),
         ("/abandoned", "List abandoned checkouts"),
         ("/pages", "List content pages"),
+        ("/digest [refresh]", "Yesterday's sales, orders to ship, low stock, abandoned carts"),
+        ("/stats [filter]", "Latency stats (/stats export <file> [otlp])"),
+        ("/undo [run-id]", "Revert the last change, or a batch or import run"),
+        ("/usage", "Token usage and cost for the last turn and session"),
         ("/debug", "Toggle debug mode on/off"),
         ("/clear", "Clear the screen"),
         ("/help", "Show this help message"),
@@ -183,21 +207,238 @@ def fetch_store_summary() -> tuple[str, str, str]:
     return "Unknown", "unknown", "?"
 
 
-SHORTCUTS: dict[str, str] = {
-    "/store": "Show me the store information",
-    "/products": "List all my products with a summary",
-    "/categories": "List all categories",
-    "/orders": "List my recent orders with a summary",
-    "/customers": "List my recent customers",
-    "/coupons": "List all my discount coupons",
-    "/abandoned": "List abandoned checkouts",
-    "/pages": "List all content pages",
-}
+def _print_table(title: str, rows: list[dict], columns, page: int | None) -> None:
+    w = term_width()
+    suffix = f" {DIM}· page {page}{RESET}" if page is not None else ""
+    print(f"\n{BLUE}{BOLD}{title}{RESET}{suffix}")
+    if not rows:
+        print(f"  {DIM}No results.{RESET}")
+        return
+    header, separator, *body = table_lines(rows, columns, w - 2)
+    print(f"  {WHITE}{header}{RESET}")
+    print(f"  {BLUE}{separator}{RESET}")
+    for line in body:
+        print(f"  {line}")
+
+
+def show_store() -> None:
+    """Render ``/store`` as a key-value block without calling the agent."""
+    info = fetch_store()
+    if isinstance(info, str):
+        print(f"  {RED}{info}{RESET}")
+        return
+    print(f"\n{BLUE}{BOLD}Store{RESET}")
+    for label, get in STORE_FIELDS:
+        value = get(info)
+        if value:
+            print(f"  {WHITE}{label:<10}{RESET}{value}")
+    print()
+
+
+def show_listing(cmd: str, arg: str = "") -> None:
+    """Render a listing command as a paged table without calling the agent.
+
+    After each page the user can press ``n`` for the next page, ``p`` for the
+    previous one, or Enter to go back to the prompt.
+    """
+    listing = LISTINGS[cmd]
+    paged = listing.get("paged", True)
+    page = 1
+    while True:
+        spinner = Spinner("Loading")
+        spinner.start()
+        try:
+            rows = fetch_rows(cmd, page, arg)
+        finally:
+            spinner.stop()
+
+        if isinstance(rows, str):
+            print(f"  {RED}{rows}{RESET}\n")
+            return
+
+        _print_table(listing["title"], rows, listing["columns"], page if paged else None)
+        has_next = paged and len(rows) >= PAGE_SIZE
+        has_prev = paged and page > 1
+        if not (has_next or has_prev):
+            print()
+            return
+
+        keys = []
+        if has_next:
+            keys.append("(n)ext")
+        if has_prev:
+            keys.append("(p)rev")
+        try:
+            answer = input(f"  {DIM}{' / '.join(keys)} / Enter to exit: {RESET}").strip().lower()
+        except (KeyboardInterrupt, EOFError):
+            answer = ""
+        if answer in ("n", "next") and has_next:
+            page += 1
+        elif answer in ("p", "prev") and has_prev:
+            page -= 1
+        else:
+            print()
+            return
+
+
+def show_stats(args: str = "") -> None:
+    """Print latency histograms from the tracer, or export its spans.
+
+    ``/stats`` shows a summary per operation, ``/stats <filter>`` adds a
+    bucket histogram for matching operations, ``/stats export <file> [otlp]``
+    writes the retained spans, and ``/stats clear`` resets everything.
+    """
+    words = args.split()
+    if words and words[0] == "clear":
+        telemetry.TRACER.clear()
+        print(f"  {DIM}Stats cleared.{RESET}\n")
+        return
+    if words and words[0] == "export":
+        if len(words) < 2:
+            print(f"  {DIM}Usage: /stats export <file> [jsonl|otlp]{RESET}")
+            return
+        fmt = words[2] if len(words) > 2 else "jsonl"
+        count = telemetry.TRACER.export(words[1], fmt)
+        print(f"  {DIM}Wrote {count} spans to {words[1]} ({fmt}).{RESET}\n")
+        return
+
+    histograms = telemetry.TRACER.snapshot()
+    if args:
+        histograms = {k: h for k, h in histograms.items() if args.lower() in " ".join(k).lower()}
+    if not histograms:
+        print(f"  {DIM}No calls recorded yet.{RESET}\n")
+        return
+
+    print(f"\n{BLUE}{BOLD}Latency{RESET} {DIM}(ms){RESET}")
+    header = f"{'kind':<6}{'operation':<34}{'n':>5}{'err':>5}{'p50':>8}{'p95':>8}{'max':>8}"
+    print(f"  {WHITE}{header}{RESET}")
+    for (kind, name), hist in sorted(histograms.items()):
+        stats = hist.summary()
+        label = name if len(name) <= 33 else name[:32] + "…"
+        print(
+            f"  {DIM}{kind:<6}{RESET}{label:<34}{stats['count']:>5}{stats['errors']:>5}"
+            f"{stats['p50_ms']:>8.0f}{stats['p95_ms']:>8.0f}{stats['max_ms']:>8.0f}"
+        )
+        if args:
+            peak = max(hist.buckets) or 1
+            bounds = [*telemetry.BUCKETS_MS, None]
+            for bound, count in zip(bounds, hist.buckets):
+                if count:
+                    bar = "█" * max(1, round(count / peak * 30))
+                    edge = f"≤{bound}" if bound is not None else f">{telemetry.BUCKETS_MS[-1]}"
+                    print(f"        {DIM}{edge:>7}{RESET} {BLUE}{bar}{RESET} {count}")
+    print()
+
+
+def show_undo(run_id: str = "", session: str = "") -> None:
+    """Preview the writes ``/undo`` would revert and revert them once confirmed."""
+    target = undo.plan(run_id, session)
+    if isinstance(target, str):
+        print(f"  {DIM}{target.removeprefix('Error: ')}{RESET}\n")
+        return
+    print(f"\n{BLUE}{BOLD}Undo{RESET} {DIM}{target['scope']}{RESET}")
+    for snapshot in reversed(target["snapshots"]):
+        step = undo.inverse(snapshot)
+        write = f"{snapshot['method']} {snapshot['path']}"
+        if isinstance(step, str):
+            print(f"  {DIM}{write:<40} skipped: {step}{RESET}")
+        else:
+            print(f"  {WHITE}{write:<40}{RESET}{DIM}→ {step[0]} {step[1]}{RESET}")
+    try:
+        answer = input(f"  {YELLOW}Revert these writes? (y)es / (n)o: {RESET}").strip().lower()
+    except (KeyboardInterrupt, EOFError):
+        answer = "n"
+    if answer not in YES:
+        print(f"  {DIM}Nothing reverted.{RESET}\n")
+        return
+    summary = undo.undo(run_id, session)
+    if isinstance(summary, str):
+        print(f"  {RED}{summary}{RESET}\n")
+        return
+    for outcome in summary["writes"]:
+        if outcome["status"] == "failed":
+            print(f"  {RED}{outcome['write']}: {outcome['error']}{RESET}")
+    print(f"  {DIM}{undo.format_summary(summary)}{RESET}\n")
+
+
+def show_digest(args: str = "") -> None:
+    """Print the saved daily digest, computing it first when it is missing or old.
+
+    ``/digest refresh`` computes it again even when yesterday's is saved.
+    """
+    refresh = args.strip().lower() == "refresh"
+    saved = digest.DIGESTS.get(api.current_store().store_id)
+    if refresh or not digest.is_current(saved):
+        spinner = Spinner("Computing digest")
+        spinner.start()
+        try:
+            summary = digest.current(refresh=refresh)
+        except Exception as e:
+            print(f"  {RED}Error: {e}{RESET}\n")
+            return
+        finally:
+            spinner.stop()
+    else:
+        summary = saved
+    print(f"\n{BLUE}{BOLD}Digest{RESET} {DIM}computed {summary['computed_at']}{RESET}")
+    for line in digest.format_lines(summary):
+        color = RED if "error:" in line else (DIM if line.startswith("  ") else WHITE)
+        print(f"  {color}{line}{RESET}")
+    print()
+
+
+def _print_usage(title: str, totals: UsageTotals) -> None:
+    total = totals.total()
+    print(
+        f"\n{BLUE}{BOLD}{title}{RESET} {DIM}{total['calls']} model calls · "
+        f"{total['input']:,} in ({total['cached']:,} cached) · {total['output']:,} out · "
+        f"${total['cost']:.4f}{RESET}"
+    )
+    for heading, group in (("agent", totals.agents), ("model", totals.models)):
+        if not group:
+            continue
+        print(f"  {WHITE}{heading:<28}{'calls':>6}{'input':>10}{'cached':>9}{'cache %':>8}"
+              f"{'output':>9}{'cost $':>10}{'avg ms':>8}{RESET}")
+        for name, b in sorted(group.items(), key=lambda item: -item[1]["input"]):
+            name = name if len(name) <= 27 else name[:26] + "…"
+            print(f"  {name:<28}{b['calls']:>6}{b['input']:>10,}{b['cached']:>9,}"
+                  f"{cached_ratio(b['input'], b['cached']):>8.0%}{b['output']:>9,}"
+                  f"{b['cost']:>10.4f}{b['ms'] / max(b['calls'], 1):>8.0f}")
+    if totals.tools:
+        print(f"  {WHITE}{'tool output':<28}{'calls':>6}{'chars':>10}{'~tokens':>9}{RESET}")
+        for name, t in sorted(totals.tools.items(), key=lambda item: -item[1]["chars"]):
+            print(f"  {name:<28}{t['calls']:>6}{t['chars']:>10,}{t['tokens']:>9,}")
+
+
+def show_usage(tracker: UsageTracker) -> None:
+    """Print token usage for the last turn and for the whole session."""
+    _print_usage("Last turn", tracker.turn)
+    _print_usage("Session", tracker.session)
+    print()
+
+
+def print_turn_usage(tracker: UsageTracker) -> None:
+    """One-line usage summary printed after each turn in debug mode."""
+    total = tracker.turn.total()
+    agents = ", ".join(
+        f"{name} {b['input'] + b['output']:,}" for name, b in tracker.turn.agents.items()
+    )
+    print(
+        f"  {GRAY}tokens: {total['input']:,} in ({total['cached']:,} cached) / "
+        f"{total['output']:,} out · ${total['cost']:.4f}"
+        f"{f' · {agents}' if agents else ''}{RESET}"
+    )
+    if tracker.turn.calls:
+        calls = ", ".join(f"{c['agent']} {c['ratio']:.0%}" for c in tracker.turn.calls)
+        print(f"  {GRAY}cached per call: {calls}{RESET}")
+
 
+def handle_slash(user_input: str, thread_id: str = "") -> str | None:
+    """Handle slash commands. Returns a sentinel for the main loop,
+    or None if the command was handled locally.
 
-def handle_slash(user_input: str) -> str | None:
-    """Handle slash commands. Returns a prompt to send to the agent,
-    or None if the command was handled locally."""
+    Listing commands call the tools directly and never reach the agent.
+    """
     cmd = user_input.split()[0].lower()
     args = user_input[len(cmd):].strip()
 
@@ -211,17 +452,33 @@ def handle_slash(user_input: str) -> str | None:
         return None
     if cmd == "/debug":
         return "__TOGGLE_DEBUG__"
-    if cmd == "/variants":
-        if args:
-            return f"List all variants for product ID {args}"
-        return "List variants for all my products"
+    if cmd == "/usage":
+        return "__USAGE__"
+    if cmd == "/store":
+        show_store()
+        return None
+    if cmd == "/stats":
+        show_stats(args)
+        return None
+    if cmd == "/undo":
+        show_undo(args, f"cli:{thread_id}:" if thread_id else "")
+        return None
+    if cmd == "/digest":
+        show_digest(args)
+        return None
 
-    if cmd in SHORTCUTS:
-        return SHORTCUTS[cmd]
+    if cmd in LISTINGS:
+        required = LISTINGS[cmd].get("requires_arg")
+        if required and not args.isdigit():
+            print(f"  {DIM}Usage: {cmd} <{required}>{RESET}")
+            return None
+        show_listing(cmd, args)
+        return None
 
     print(f"  {DIM}Unknown command: {cmd}. Type /help for available commands.{RESET}")
     return None
 
+
 def stream_response(agent, input_value, config, *, debug=False):
     """Stream agent response chunks to stdout.
 
@@ -310,44 +567,101 @@ def stream_response(agent, input_value, config, *, debug=False):
         return False
 
 
-def _prompt_decisions(action_requests):
-    """Prompt the user for approve/reject on each action request."""
-    decisions = []
-    for action in action_requests:
-        tool_name = action.get("name", "unknown")
-        tool_args = action.get("args", {})
-
-        print(f"\n  {YELLOW}Destructive action requested:{RESET}")
-        print(f"  {WHITE}{tool_name}{RESET}")
-        if tool_args:
-            args_str = json.dumps(tool_args, ensure_ascii=False, indent=2)
-            for line in args_str.split("\n"):
-                print(f"    {DIM}{line}{RESET}")
-
-        try:
-            answer = input(
-                f"  {YELLOW}Approve? (y)es / (n)o: {RESET}"
-            ).strip().lower()
-        except (KeyboardInterrupt, EOFError):
-            answer = "n"
-
-        if answer in ("y", "yes", "s", "si"):
-            decisions.append({"type": "approve"})
-        else:
-            decisions.append({
-                "type": "reject",
-                "message": "User rejected this action.",
-            })
-    return decisions
+def _ask(question: str) -> str:
+    try:
+        return input(f"  {YELLOW}{question}: {RESET}").strip().lower()
+    except (KeyboardInterrupt, EOFError):
+        return "n"
+
+
+def _print_action(action: dict) -> None:
+    print(f"\n  {YELLOW}Destructive action requested:{RESET}")
+    print(f"  {WHITE}{action.get('name', 'unknown')}{RESET}")
+    tool_args = action.get("args", {})
+    if tool_args:
+        args_str = json.dumps(tool_args, ensure_ascii=False, indent=2)
+        for line in args_str.split("\n"):
+            print(f"    {DIM}{line}{RESET}")
+
+
+def _print_summary(action_requests, kinds: dict[str, list[int]]) -> None:
+    total = sum(len(indices) for indices in kinds.values())
+    print(f"\n  {YELLOW}{total} destructive actions requested:{RESET}")
+    width = term_width() - 8
+    for name, indices in kinds.items():
+        print(f"  {WHITE}{name}{RESET} {DIM}× {len(indices)}{RESET}")
+        for i in indices[:APPROVAL_PREVIEW]:
+            line = json.dumps(action_requests[i].get("args", {}), ensure_ascii=False)
+            print(f"    {DIM}{line if len(line) <= width else line[:width - 1] + '…'}{RESET}")
+        if len(indices) > APPROVAL_PREVIEW:
+            print(f"    {DIM}… and {len(indices) - APPROVAL_PREVIEW} more{RESET}")
+
+
+def _review(action_requests, indices: list[int], approved: dict, policy) -> None:
+    """Ask about the actions at ``indices``: one question for all of them,
+    then by tool and one by one if the user asks to review."""
+    kinds: dict[str, list[int]] = {}
+    for i in indices:
+        kinds.setdefault(action_requests[i].get("name", "unknown"), []).append(i)
+    if len(indices) == 1:
+        _print_action(action_requests[indices[0]])
+        name = next(iter(kinds))
+        answer = _ask(f"Approve? (y)es / (n)o / (a)lways for {name}")
+    else:
+        _print_summary(action_requests, kinds)
+        answer = _ask("Approve all? (y)es / (n)o / (r)eview / (a)lways for these tools")
+        if answer in ("r", "review"):
+            groups = list(kinds.values()) if len(kinds) > 1 else [[i] for i in indices]
+            for group in groups:
+                _review(action_requests, group, approved, policy)
+            return
+    if answer in ("a", "always") and policy is not None:
+        for name in kinds:
+            policy.add(name)
+        print(f"  {DIM}Approving {', '.join(kinds)} without asking for the rest of "
+              f"this session.{RESET}")
+    ok = answer in (*YES, "a", "always")
+    for i in indices:
+        approved[i] = ok
+
+
+def _prompt_decisions(action_requests, policy=None):
+    """Collect approve/reject decisions for action requests, asking as little as possible.
+
+    Actions that ``policy`` approves are not asked about.  A single action is
+    shown in full; several get one summarized question that approves or
+    rejects them all, reviews them by tool and then one by one, or approves
+    their tools for the rest of the session ("always").
+    """
+    approved: dict[int, bool] = {}
+    auto: dict[str, int] = {}
+    for i, action in enumerate(action_requests):
+        name = action.get("name", "unknown")
+        if policy is not None and policy.approves(name, action.get("args")):
+            approved[i] = True
+            auto[name] = auto.get(name, 0) + 1
+    if auto:
+        counts = ", ".join(f"{name} × {count}" for name, count in auto.items())
+        print(f"  {DIM}Approved by rule: {counts}{RESET}")
+    pending = [i for i in range(len(action_requests)) if i not in approved]
+    if pending:
+        _review(action_requests, pending, approved, policy)
+    return [
+        {"type": "approve"} if approved[i]
+        else {"type": "reject", "message": "User rejected this action."}
+        for i in range(len(action_requests))
+    ]
 
 
-def handle_interrupts(agent, config, *, debug=False):
+def handle_interrupts(agent, config, *, debug=False, policy=None):
     """Check for pending HITL interrupts and prompt the user for decisions.
 
     The HITL middleware sends an HITLRequest with ``action_requests`` (list of
     ActionRequest dicts, each with ``name``, ``args``, and optional
-    ``description``).  We display each action and collect approve/reject
-    decisions, then resume the graph with ``Command(resume=...)``.
+    ``description``).  The actions of every pending interrupt are reviewed
+    together (see :func:`_prompt_decisions`), so a step that deletes 40
+    variants asks once, and the graph is resumed once with all decisions;
+    the approved tool calls of a step then run concurrently.
 
     When multiple interrupts are pending (e.g. from different sub-agents),
     we key the resume dict by interrupt ID — required by LangGraph when
@@ -361,48 +675,113 @@ def handle_interrupts(agent, config, *, debug=False):
 
     # Collect decisions keyed by interrupt ID (official deepagents pattern).
     # Each interrupt maps to {"decisions": [...]}.
-    hitl_response = {}
+    pending = {}
     for intr in state.interrupts:
         request_data = intr.value
         if not isinstance(request_data, dict):
             continue
-
         action_requests = request_data.get("action_requests", [])
-        if not action_requests:
-            continue
-
-        decisions = _prompt_decisions(action_requests)
-        if decisions:
-            hitl_response[intr.id] = {"decisions": decisions}
-
-    if not hitl_response:
+        if action_requests:
+            pending[intr.id] = action_requests
+    if not pending:
         return False
 
+    decisions = iter(_prompt_decisions(
+        [action for actions in pending.values() for action in actions], policy
+    ))
+    hitl_response = {
+        intr_id: {"decisions": [next(decisions) for _ in actions]}
+        for intr_id, actions in pending.items()
+    }
+
     resume_value = Command(resume=hitl_response)
     stream_response(agent, resume_value, config, debug=debug)
 
     # Check for further interrupts (in case of chained destructive calls)
-    handle_interrupts(agent, config, debug=debug)
+    handle_interrupts(agent, config, debug=debug, policy=policy)
     return True
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Nube Agent - Tiendanube Store Manager")
     parser.add_argument("--debug", action="store_true", help="Start with debug mode on")
+    parser.add_argument(
+        "--record",
+        metavar="PATH",
+        help="Record model responses to a replay script for NUBE_AGENT_MODEL=fake:PATH",
+    )
+    parser.add_argument(
+        "--store",
+        metavar="ID",
+        help="Work on this store from NUBE_AGENT_STORES_FILE instead of TIENDANUBE_STORE_ID",
+    )
+    commands = parser.add_subparsers(dest="command")
+    batch_parser = commands.add_parser(
+        "batch", help="Run prompts or tool calls from a JSONL file without the prompt loop"
+    )
+    batch.add_arguments(batch_parser)
+    serve_parser = commands.add_parser(
+        "serve", help="Serve the agent to several users over HTTP (server-sent events)"
+    )
+    server.add_arguments(serve_parser)
+    import_parser = commands.add_parser(
+        "import-catalog", help="Create or update products from a CSV or JSONL file"
+    )
+    catalog_import.add_arguments(import_parser)
+    export_parser = commands.add_parser(
+        "export", help="Write products, orders, customers and checkouts to CSV or Parquet"
+    )
+    export.add_arguments(export_parser)
+    digest_parser = commands.add_parser(
+        "digest", help="Compute and save the daily digest (run it from cron each morning)"
+    )
+    digest.add_arguments(digest_parser)
     args = parser.parse_args()
     debug = args.debug
 
     validate()
+    if args.store:
+        try:
+            api.set_default_store(api.get_store(args.store))
+        except KeyError as e:
+            raise SystemExit(f"{e.args[0]}. Add it to NUBE_AGENT_STORES_FILE.") from None
+
+    if args.command == "batch":
+        sys.exit(batch.run(args))
+    if args.command == "serve":
+        sys.exit(server.run(args))
+    if args.command == "import-catalog":
+        sys.exit(catalog_import.run(args))
+    if args.command == "export":
+        sys.exit(export.run(args))
+    if args.command == "digest":
+        sys.exit(digest.run(args))
+
+    try:
+        approvals = ApprovalPolicy.parse(AUTO_APPROVE)
+    except ValueError as e:
+        raise SystemExit(f"NUBE_AGENT_AUTO_APPROVE: {e}") from None
 
     # Fetch store info for banner before building agent
     spinner = Spinner("Connecting to store")
     spinner.start()
     store_name, store_domain, store_currency = fetch_store_summary()
-    agent = build_agent()
+    agent = build_agent(approvals=approvals)
     spinner.stop()
 
     thread_id = str(uuid.uuid4())
-    config = {"configurable": {"thread_id": thread_id}}
+    turn = 0
+    usage = UsageTracker()
+    config = {
+        "configurable": {"thread_id": thread_id},
+        "callbacks": [telemetry.TelemetryCallbackHandler(), usage],
+    }
+    recorder = None
+    if args.record:
+        from nube_agent.fake_model import ScriptRecorder
+
+        recorder = ScriptRecorder()
+        config["callbacks"].append(recorder)
 
     print_banner(store_name, store_domain, store_currency)
     if debug:
@@ -422,7 +801,10 @@ def main() -> None:
 
         # Handle slash commands
         if user_input.startswith("/"):
-            result = handle_slash(user_input)
+            router = getattr(agent, "router", None)
+            if isinstance(router, Router):
+                router.note_command(user_input, thread_id)
+            result = handle_slash(user_input, thread_id)
             if result is None:
                 continue
             if result == "__EXIT__":
@@ -433,8 +815,9 @@ def main() -> None:
                 state = "on" if debug else "off"
                 print(f"  {YELLOW}debug mode {state}{RESET}\n")
                 continue
-            # Replace input with the expanded prompt
-            user_input = result
+            if result == "__USAGE__":
+                show_usage(usage)
+                continue
 
         # Handle plain exit/quit
         if user_input.lower() in ("exit", "quit"):
@@ -442,13 +825,23 @@ def main() -> None:
             break
 
         input_value = {"messages": [{"role": "user", "content": user_input}]}
-        completed = stream_response(agent, input_value, config, debug=debug)
+        usage.start_turn()
+        turn += 1
+        with api.journal_scope(f"cli:{thread_id}:{turn}"):
+            completed = stream_response(agent, input_value, config, debug=debug)
 
-        if completed:
-            handle_interrupts(agent, config, debug=debug)
+            if completed:
+                handle_interrupts(agent, config, debug=debug, policy=approvals)
+        if debug:
+            print()
+            print_turn_usage(usage)
 
         print()
 
+    if recorder:
+        recorder.dump(args.record)
+        print(f"{DIM}Recorded model responses to {args.record}{RESET}")
+
 
 if __name__ == "__main__":
     main()
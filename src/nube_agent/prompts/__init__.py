@@ -1,9 +1,99 @@
-"""System prompt loader for the Nube Agent."""
+"""System prompt loader for the Nube Agent.
 
+Providers cache the longest prompt prefix they have already seen (tools,
+then system prompt, then messages), so every model call should start with
+the same bytes.  :class:`StablePromptMiddleware` is the innermost middleware
+of every agent and puts the request in a fixed order: tool schemas sorted by
+name, then the static sections of the system prompt (the agent's own
+instructions and the todo, filesystem and subagent tool sections), then the
+sections that depend on the session (``DYNAMIC_SECTIONS``, e.g. the skills
+found in the backend).  OpenAI calls also get a ``prompt_cache_key`` per
+agent, so repeated prompts land on the same cache.
+
+The cached share of each call's input tokens is recorded on its ``model``
+span (``cached_ratio``) and summed per agent and model in ``/usage``.
+"""
+
+import functools
 from pathlib import Path
+from typing import Any
+
+from langchain.agents.middleware.types import AgentMiddleware
+from langchain_core.messages import SystemMessage
 
+# Headings of system prompt sections whose text changes between sessions.
+DYNAMIC_SECTIONS = ("## Skills System",)
 
+CACHE_KEY_PREFIX = "nube-agent"
+
+
+@functools.cache
 def load_system_prompt() -> str:
-    """Load the system prompt from the text file."""
+    """Load the system prompt from the text file (read once per process)."""
     prompt_path = Path(__file__).parent / "system_prompt.txt"
     return prompt_path.read_text(encoding="utf-8")
+
+
+def _tool_name(tool: Any) -> str:
+    return getattr(tool, "name", None) or tool.get("name") or ""
+
+
+def _is_dynamic(block: Any) -> bool:
+    text = block.get("text", "") if isinstance(block, dict) else str(block)
+    return any(heading in text for heading in DYNAMIC_SECTIONS)
+
+
+def stable_system_message(message: SystemMessage | None) -> SystemMessage | None:
+    """``message`` with its dynamic sections moved after the static ones."""
+    if message is None or not isinstance(message.content, list):
+        return message
+    static = [b for b in message.content if not _is_dynamic(b)]
+    dynamic = [b for b in message.content if _is_dynamic(b)]
+    if not dynamic or message.content == [*static, *dynamic]:
+        return message
+    return SystemMessage(content=[*static, *dynamic])
+
+
+def _is_openai(model: Any) -> bool:
+    try:
+        from langchain_openai.chat_models.base import BaseChatOpenAI
+    except ImportError:
+        return False
+    return isinstance(model, BaseChatOpenAI)
+
+
+class StablePromptMiddleware(AgentMiddleware):
+    """Give every model call of one agent a byte-stable, static-first prefix."""
+
+    def __init__(self, name: str) -> None:
+        super().__init__()
+        self.agent = name
+        self.cache_key = f"{CACHE_KEY_PREFIX}:{name}"
+
+    def before_agent(self, state, runtime):
+        # Skills are listed in backend order; sort them so the section is stable.
+        skills = state.get("skills_metadata")
+        if not skills:
+            return None
+        ordered = sorted(skills, key=lambda skill: skill["name"])
+        return None if ordered == skills else {"skills_metadata": ordered}
+
+    async def abefore_agent(self, state, runtime):
+        return self.before_agent(state, runtime)
+
+    def order(self, request):
+        """``request`` with its tools, system prompt and settings in cache order."""
+        settings = request.model_settings
+        if _is_openai(request.model) and "prompt_cache_key" not in settings:
+            settings = {**settings, "prompt_cache_key": self.cache_key}
+        return request.override(
+            tools=sorted(request.tools or [], key=_tool_name),
+            system_message=stable_system_message(request.system_message),
+            model_settings=settings,
+        )
+
+    def wrap_model_call(self, request, handler):
+        return handler(self.order(request))
+
+    async def awrap_model_call(self, request, handler):
+        return await handler(self.order(request))
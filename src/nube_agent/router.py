@@ -0,0 +1,337 @@
+"""Local intent routing.
+
+Every turn normally starts with a supervisor model call whose only job, for
+most requests, is to pick one of the subagents in ``SUBAGENTS``.  The
+:class:`Router` makes that choice on the CPU for the obvious cases: it scores
+a prompt against keywords taken from each subagent's description (the "Use
+when the user asks about ..." clause) plus Spanish and Portuguese terms, and
+picks a subagent only when exactly one domain clearly wins.  Prompts that
+touch several domains, ask about the store itself or several stores, or match
+nothing go to the supervisor as before.  The last listing slash command
+(``/orders``, ``/products`` ...) counts as one keyword for its domain for a
+few turns, so "cancel the second one" after ``/orders`` routes to orders.
+
+:class:`RoutedAgent` wraps the supervisor graph with the same ``stream``,
+``invoke`` and ``get_state`` interface.  A routed turn runs the subagent
+directly, seeded with the conversation so far, and the exchange is then
+appended to the supervisor thread so later turns keep their context.
+
+    python benchmarks/eval_router.py    # accuracy and latency on a labelled set
+"""
+
+import re
+import threading
+import unicodedata
+import uuid
+from collections.abc import Iterator
+from typing import Any
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.types import Command
+
+from nube_agent.subagents import SUBAGENTS
+from nube_agent.telemetry import output_text
+
+SUPERVISOR = "supervisor"
+
+# Terms beyond each description, as accent-free stems matched against the
+# start of a word ("pedido" matches "pedidos").
+EXTRA_KEYWORDS: dict[str, tuple[str, ...]] = {
+    "catalog-manager": (
+        "product", "producto", "produto", "catalog", "catalogo", "variant", "variante",
+        "sku", "inventor", "estoque", "precio", "preco", "categor", "imagen", "imagem",
+        "foto", "photo", "talle", "size", "color", "cor",
+    ),
+    "order-manager": (
+        "order", "pedido", "orden", "venta", "vendi", "sold", "sale", "shipping", "shipped",
+        "envio", "envia", "tracking", "seguimiento", "rastreio", "fulfill", "refund",
+        "reembols", "cancel", "archiv", "reabr", "reopen",
+    ),
+    "customer-manager": (
+        "customer", "cliente", "contact", "contacto", "contato", "buyer", "comprador",
+        "shopper",
+    ),
+    "marketing-manager": (
+        "coupon", "cupon", "cupom", "discount", "descuento", "desconto", "promo", "abandon",
+        "checkout", "carrito", "carrinho", "cart",
+    ),
+    "content-manager": (
+        "page", "pagina", "content", "contenido", "conteudo", "faq", "about", "nosotros",
+        "sobre", "terms", "terminos", "termos", "policy", "politica",
+    ),
+}
+
+# Requests the supervisor answers itself (store info, skills, every store, exports)
+# rather than a single subagent.
+SUPERVISOR_KEYWORDS = (
+    "store", "tienda", "loja", "plan", "domain", "dominio", "currenc", "moneda", "moeda",
+    "language", "idioma", "overview", "resumen", "resumo", "summar", "troubleshoot",
+    "problem", "error", "erro", "memor", "remember", "recorda", "lembr", "export", "csv",
+    "parquet", "spreadsheet", "planilla", "planilha",
+)
+
+# Listing slash commands and the subagent that owns their resources.
+COMMAND_DOMAINS = {
+    "/products": "catalog-manager",
+    "/categories": "catalog-manager",
+    "/variants": "catalog-manager",
+    "/orders": "order-manager",
+    "/customers": "customer-manager",
+    "/coupons": "marketing-manager",
+    "/abandoned": "marketing-manager",
+    "/pages": "content-manager",
+}
+
+# A prompt is routed when its best domain scores at least MIN_SCORE and
+# beats the runner-up by MARGIN.
+MIN_SCORE = 1.0
+MARGIN = 1.0
+# Weight of the last listing command's domain, and for how many prompts it lasts.
+HISTORY_WEIGHT = 1.0
+HISTORY_TURNS = 3
+# Conversation messages (user and final answers) handed to a routed subagent.
+CONTEXT_MESSAGES = 10
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_ABOUT_RE = re.compile(r"asks about (.+?)\.?$")
+
+
+def words(text: str) -> list[str]:
+    """Lowercase, accent-free words of ``text``."""
+    plain = unicodedata.normalize("NFKD", text.lower())
+    return _WORD_RE.findall("".join(c for c in plain if not unicodedata.combining(c)))
+
+
+def description_keywords(description: str) -> tuple[str, ...]:
+    """Stems from the "Use when the user asks about a, b, or c" clause."""
+    match = _ABOUT_RE.search(description)
+    if not match:
+        return ()
+    stems = []
+    for word in words(match.group(1)):
+        if word not in ("or", "and"):
+            stems.append(word[:-1] if word.endswith("s") and len(word) > 4 else word)
+    return tuple(stems)
+
+
+def _keywords() -> dict[str, tuple[str, ...]]:
+    table = {
+        sub["name"]: description_keywords(sub["description"])
+        + EXTRA_KEYWORDS.get(sub["name"], ())
+        for sub in SUBAGENTS
+    }
+    table[SUPERVISOR] = SUPERVISOR_KEYWORDS
+    return table
+
+
+class Router:
+    """Keyword classifier that maps a prompt to a subagent name or None."""
+
+    def __init__(self, keywords: dict[str, tuple[str, ...]] | None = None) -> None:
+        self.keywords = keywords or _keywords()
+        # Per conversation: (domain of the last listing command, prompts left).
+        self._history: dict[str, tuple[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def note_command(self, command: str, thread: str = "") -> None:
+        """Remember a listing slash command as context for the next prompts."""
+        domain = COMMAND_DOMAINS.get(command.split()[0].lower()) if command.strip() else None
+        if domain:
+            with self._lock:
+                self._history[thread] = (domain, HISTORY_TURNS)
+
+    def scores(self, text: str, history: str | None = None) -> dict[str, float]:
+        """Keyword hits per domain, plus the history weight for ``history``."""
+        tokens = words(text)
+        result = {}
+        for domain, stems in self.keywords.items():
+            hits = sum(1 for token in tokens if any(token.startswith(s) for s in stems))
+            result[domain] = float(hits)
+        if history in result:
+            result[history] += HISTORY_WEIGHT
+        return result
+
+    def classify(self, text: str, history: str | None = None) -> str | None:
+        """The subagent for ``text``, or None when the supervisor should decide."""
+        scores = self.scores(text, history)
+        if scores.pop(SUPERVISOR, 0.0):
+            return None
+        ranked = sorted(scores.items(), key=lambda item: -item[1])
+        (best, top), (_, second) = ranked[0], ranked[1]
+        if top >= MIN_SCORE and top - second >= MARGIN:
+            return best
+        return None
+
+    def route(self, text: str, thread: str = "") -> str | None:
+        """Classify ``text`` using the thread's slash-command history, and age it."""
+        with self._lock:
+            history, left = self._history.pop(thread, (None, 0))
+            if left > 1:
+                self._history[thread] = (history, left - 1)
+        return self.classify(text, history)
+
+
+def build_subagent_graphs(specs, model, *, backend, store, checkpointer) -> dict[str, Any]:
+    """Compile each subagent spec as a standalone graph for routed turns.
+
+    Uses the middleware stack deepagents gives subagents under the supervisor
+    (todos, filesystem, summarization, prompt caching, patched tool calls,
+    skills, approvals), and the subagent's name so telemetry and usage keep
+    attributing its calls to it.  deepagents has no public API for building a
+    subagent on its own, so the stack is copied here; the deepagents version
+    is pinned and ``test_router`` checks both stacks match.
+    """
+    from deepagents.middleware.filesystem import FilesystemMiddleware
+    from deepagents.middleware.patch_tool_calls import PatchToolCallsMiddleware
+    from deepagents.middleware.skills import SkillsMiddleware
+    from deepagents.middleware.summarization import create_summarization_middleware
+    from langchain.agents import create_agent
+    from langchain.agents.middleware import HumanInTheLoopMiddleware, TodoListMiddleware
+    from langchain_anthropic.middleware import AnthropicPromptCachingMiddleware
+
+    from nube_agent.agent import resolve_model
+
+    graphs = {}
+    for spec in specs:
+        sub_model = resolve_model(spec.get("model", model))
+        middleware = [
+            TodoListMiddleware(),
+            FilesystemMiddleware(backend=backend),
+            create_summarization_middleware(sub_model, backend),
+            AnthropicPromptCachingMiddleware(unsupported_model_behavior="ignore"),
+            PatchToolCallsMiddleware(),
+        ]
+        if spec.get("skills"):
+            middleware.append(SkillsMiddleware(backend=backend, sources=spec["skills"]))
+        middleware.extend(spec.get("middleware", []))
+        if spec.get("interrupt_on"):
+            middleware.append(HumanInTheLoopMiddleware(interrupt_on=spec["interrupt_on"]))
+        graphs[spec["name"]] = create_agent(
+            sub_model,
+            system_prompt=spec["system_prompt"],
+            tools=spec["tools"],
+            middleware=middleware,
+            name=spec["name"],
+            store=store,
+            checkpointer=checkpointer,
+        )
+    return graphs
+
+
+def _user_text(value: Any) -> str | None:
+    """The text of a single new user message, or None for any other input."""
+    if not isinstance(value, dict):
+        return None
+    messages = value.get("messages") or []
+    if len(messages) != 1:
+        return None
+    message = messages[0]
+    if isinstance(message, dict) and message.get("role") == "user":
+        content = message.get("content")
+    elif isinstance(message, HumanMessage):
+        content = message.content
+    else:
+        return None
+    return content if isinstance(content, str) else None
+
+
+def _context(messages: list) -> list:
+    """User prompts and final answers from a supervisor thread, most recent last."""
+    kept = [
+        m for m in messages
+        if isinstance(m, HumanMessage) or (isinstance(m, AIMessage) and not m.tool_calls)
+    ]
+    return [type(m)(content=output_text(m)) for m in kept[-CONTEXT_MESSAGES:]]
+
+
+class RoutedAgent:
+    """The supervisor graph, with obvious requests sent straight to a subagent.
+
+    Routed turns run on a thread of their own (``<thread>:<subagent>:<id>``)
+    until they finish, including approval interrupts, so ``get_state`` and
+    ``Command(resume=...)`` reach the subagent while it waits for a decision.
+    """
+
+    def __init__(self, supervisor, subagents: dict[str, Any], router: Router | None = None):
+        self.supervisor = supervisor
+        self.subagents = subagents
+        self.router = router or Router()
+        self.routed = 0
+        self._pending: dict[str, tuple[str, dict, str]] = {}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.supervisor, name)
+
+    def _thread(self, config: dict) -> str:
+        return str(config["configurable"]["thread_id"])
+
+    def _target(self, value: Any, config: dict) -> tuple[Any, Any, dict]:
+        """The graph, input and config for this call."""
+        thread = self._thread(config)
+        with self._lock:
+            pending = self._pending.get(thread)
+        if pending is not None:
+            if isinstance(value, Command):
+                name, sub_config, _ = pending
+                return self.subagents[name], value, sub_config
+            # A new message abandons the routed turn that was waiting.
+            with self._lock:
+                self._pending.pop(thread, None)
+        text = _user_text(value)
+        name = self.router.route(text, thread) if text is not None else None
+        if name not in self.subagents:
+            return self.supervisor, value, config
+        history = self.supervisor.get_state(config).values.get("messages") or []
+        sub_config = {
+            **config,
+            "configurable": {
+                **config["configurable"],
+                "thread_id": f"{thread}:{name}:{uuid.uuid4().hex[:8]}",
+            },
+        }
+        with self._lock:
+            self._pending[thread] = (name, sub_config, text)
+            self.routed += 1
+        messages = [*_context(history), HumanMessage(text)]
+        return self.subagents[name], {"messages": messages}, sub_config
+
+    def _finish(self, config: dict) -> None:
+        """Copy a finished routed turn into the supervisor thread."""
+        thread = self._thread(config)
+        with self._lock:
+            pending = self._pending.get(thread)
+        if pending is None:
+            return
+        name, sub_config, text = pending
+        state = self.subagents[name].get_state(sub_config)
+        if state.interrupts:
+            return
+        with self._lock:
+            self._pending.pop(thread, None)
+        messages = state.values.get("messages") or []
+        answer = output_text(messages[-1]) if messages else ""
+        self.supervisor.update_state(
+            config, {"messages": [HumanMessage(text), AIMessage(answer, name=name)]}
+        )
+
+    def stream(self, value: Any, config: dict, **kwargs: Any) -> Iterator[Any]:
+        graph, value, target_config = self._target(value, config)
+        yield from graph.stream(value, config=target_config, **kwargs)
+        if graph is not self.supervisor:
+            self._finish(config)
+
+    def invoke(self, value: Any, config: dict, **kwargs: Any) -> dict:
+        graph, value, target_config = self._target(value, config)
+        result = graph.invoke(value, target_config, **kwargs)
+        if graph is not self.supervisor:
+            self._finish(config)
+        return result
+
+    def get_state(self, config: dict, **kwargs: Any):
+        with self._lock:
+            pending = self._pending.get(self._thread(config))
+        if pending is not None:
+            name, sub_config, _ = pending
+            return self.subagents[name].get_state(sub_config, **kwargs)
+        return self.supervisor.get_state(config, **kwargs)
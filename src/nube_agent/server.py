@@ -0,0 +1,466 @@
+"""HTTP server mode.
+
+``nube-agent serve`` hosts one compiled agent graph for several users at
+once.  Each session is a conversation thread keyed by ``thread_id``; turns of
+different sessions run concurrently on a worker pool.  Replies stream as
+server-sent events.
+
+    POST   /sessions                         {"thread_id", "store_id": optional}
+    GET    /sessions/{thread_id}             pending approvals and turn count
+    DELETE /sessions/{thread_id}
+    POST   /sessions/{thread_id}/messages    {"content": "..."}        -> SSE
+    POST   /sessions/{thread_id}/decisions   {"decisions": {...}}      -> SSE
+    GET    /stats                            latency histograms, per-store cache and circuit state
+    GET    /health
+    POST   /webhooks                         Tiendanube webhook deliveries (see webhooks.py)
+
+SSE events are ``token`` (``{"text"}``), ``tool`` (``{"name", "agent"}``),
+``interrupt`` (``{"id", "actions"}``, one per pending approval), ``error``
+and a final ``done`` (``{"pending", "usage"}``).  Answer an interrupt by
+posting decisions keyed by its id, in the same format the CLI resumes with:
+
+    {"decisions": {"<interrupt id>": [{"type": "approve"}]}}
+
+A bare list of decisions is accepted when exactly one interrupt is pending.
+
+A session works on the store whose ``store_id`` it was created with (one of
+``NUBE_AGENT_STORES_FILE``; by default the configured store).  Sessions on
+the same store share its connection pool, rate limiter and GET cache.  The
+server is a plain ASGI app; run it with uvicorn
+(``pip install 'nube-agent[server]'``).  With ``--digest-at HH:MM`` a
+background thread also computes every store's daily digest at that time
+(see digest.py).
+"""
+
+import argparse
+import asyncio
+import hmac
+import json
+import re
+import sys
+import time
+import uuid
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from langchain_core.messages import AIMessage, ToolMessage
+from langgraph.types import Command
+
+from nube_agent import api, telemetry
+from nube_agent.config import ANSWER_CACHE_TTL, WEBHOOK_CACHE_TTL, WEBHOOK_LOG
+from nube_agent.usage import UsageTracker
+
+MAX_BODY_BYTES = 1_000_000
+DEFAULT_WORKERS = 16
+DEFAULT_CACHE_TTL = 30.0
+
+_SESSION_RE = re.compile(r"^/sessions/([\w.:-]+)(/messages|/decisions)?$")
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Session:
+    """One conversation thread served over HTTP."""
+
+    def __init__(self, thread_id: str, store: api.StoreClient) -> None:
+        self.thread_id = thread_id
+        self.store = store
+        # thread_id comes from the client and turns restart at 0: the nonce
+        # keeps a recreated session from replaying an old one's journaled writes.
+        self.nonce = uuid.uuid4().hex[:8]
+        self.created = time.time()
+        self.turns = 0
+        self.busy = False
+        self.usage = UsageTracker()
+
+    def config(self) -> dict:
+        return {
+            "configurable": {"thread_id": self.thread_id},
+            "callbacks": [telemetry.TelemetryCallbackHandler(), self.usage],
+        }
+
+
+def pending_interrupts(agent, config: dict) -> list[dict]:
+    """Pending approval requests for a thread, as ``{"id", "actions"}`` dicts."""
+    pending = []
+    for intr in agent.get_state(config).interrupts:
+        value = intr.value if isinstance(intr.value, dict) else {}
+        actions = value.get("action_requests", [])
+        if actions:
+            pending.append({"id": intr.id, "actions": actions})
+    return pending
+
+
+def resume_command(pending: list[dict], decisions: Any) -> Command:
+    """Validate client decisions against the pending interrupts.
+
+    Raises :class:`HTTPError` (400) when an id is unknown or the number of
+    decisions does not match the number of actions.
+    """
+    if isinstance(decisions, list):
+        if len(pending) != 1:
+            raise HTTPError(400, "Decisions must be keyed by interrupt id.")
+        decisions = {pending[0]["id"]: decisions}
+    if not isinstance(decisions, dict) or not decisions:
+        raise HTTPError(400, "Body must contain 'decisions'.")
+    by_id = {p["id"]: p for p in pending}
+    response = {}
+    for intr_id, items in decisions.items():
+        if intr_id not in by_id:
+            raise HTTPError(400, f"Unknown interrupt id: {intr_id}")
+        if not isinstance(items, list) or len(items) != len(by_id[intr_id]["actions"]):
+            raise HTTPError(400, f"Expected one decision per action for {intr_id}.")
+        for item in items:
+            if not isinstance(item, dict) or item.get("type") not in ("approve", "reject"):
+                raise HTTPError(400, "Each decision must have type 'approve' or 'reject'.")
+        response[intr_id] = {"decisions": items}
+    return Command(resume=response)
+
+
+class AgentServer:
+    """ASGI application serving one agent graph to many sessions.
+
+    ``token``, when set, is required as ``Authorization: Bearer <token>``.
+    Requests under ``/webhooks`` go to ``webhooks``, a
+    :class:`~nube_agent.webhooks.WebhookReceiver`, when one is given.
+    """
+
+    def __init__(
+        self, agent, *, token: str = "", workers: int = DEFAULT_WORKERS, webhooks=None
+    ) -> None:
+        self.agent = agent
+        self.token = token
+        self.webhooks = webhooks
+        self.sessions: dict[str, Session] = {}
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="session")
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        try:
+            await self._dispatch(scope, receive, send)
+        except HTTPError as e:
+            await self._json(send, e.status, {"error": e.message})
+
+    async def _lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                if self.webhooks is not None:
+                    self.webhooks.close()
+                api.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    # -- helpers ---------------------------------------------------------
+
+    async def _run(self, fn: Callable, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    @staticmethod
+    async def _json(send, status: int, body: Any) -> None:
+        payload = json.dumps(body, ensure_ascii=False, default=str).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(payload)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": payload})
+
+    @staticmethod
+    async def _body(receive) -> dict:
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > MAX_BODY_BYTES:
+                raise HTTPError(413, "Request body too large.")
+            chunks.append(chunk)
+            if not message.get("more_body"):
+                break
+        raw = b"".join(chunks)
+        if not raw:
+            return {}
+        try:
+            body = json.loads(raw)
+        except json.JSONDecodeError as e:
+            raise HTTPError(400, f"Invalid JSON: {e}") from None
+        if not isinstance(body, dict):
+            raise HTTPError(400, "Body must be a JSON object.")
+        return body
+
+    def _authorized(self, scope) -> bool:
+        if not self.token:
+            return True
+        headers = dict(scope.get("headers") or [])
+        supplied = headers.get(b"authorization", b"")
+        return hmac.compare_digest(supplied, f"Bearer {self.token}".encode())
+
+    def _session(self, thread_id: str) -> Session:
+        session = self.sessions.get(thread_id)
+        if session is None:
+            raise HTTPError(404, f"Unknown session: {thread_id}")
+        return session
+
+    # -- routing ---------------------------------------------------------
+
+    async def _dispatch(self, scope, receive, send) -> None:
+        method, path = scope["method"], scope["path"].rstrip("/") or "/"
+        if path == "/health" and method == "GET":
+            await self._json(send, 200, {"status": "ok", "sessions": len(self.sessions)})
+            return
+        if self.webhooks is not None and (path == "/webhooks" or path.startswith("/webhooks/")):
+            # Deliveries are signed instead; the receiver checks the token itself.
+            await self.webhooks(scope, receive, send)
+            return
+        if not self._authorized(scope):
+            raise HTTPError(401, "Missing or invalid bearer token.")
+
+        if path == "/stats" and method == "GET":
+            await self._json(send, 200, self.stats())
+            return
+        if path == "/sessions" and method == "POST":
+            body = await self._body(receive)
+            thread_id = str(body.get("thread_id") or uuid.uuid4())
+            if not _SESSION_RE.match(f"/sessions/{thread_id}"):
+                raise HTTPError(400, "thread_id may only contain letters, digits, . : _ -")
+            if thread_id in self.sessions:
+                raise HTTPError(409, f"Session already exists: {thread_id}")
+            try:
+                store = api.get_store(body.get("store_id"))
+            except KeyError as e:
+                raise HTTPError(400, str(e.args[0])) from None
+            self.sessions[thread_id] = Session(thread_id, store)
+            await self._json(send, 201, {"thread_id": thread_id, "store_id": store.store_id})
+            return
+
+        match = _SESSION_RE.match(path)
+        if not match:
+            raise HTTPError(404, f"Not found: {path}")
+        session = self._session(match.group(1))
+        action = match.group(2)
+
+        if action is None and method == "GET":
+            pending = await self._run(pending_interrupts, self.agent, session.config())
+            await self._json(send, 200, {
+                "thread_id": session.thread_id,
+                "store_id": session.store.store_id,
+                "turns": session.turns,
+                "busy": session.busy,
+                "pending": pending,
+                "usage": session.usage.session.total(),
+            })
+        elif action is None and method == "DELETE":
+            if session.busy:
+                raise HTTPError(409, "A turn is running for this session.")
+            del self.sessions[session.thread_id]
+            checkpointer = getattr(self.agent, "checkpointer", None)
+            if checkpointer is not None and hasattr(checkpointer, "delete_thread"):
+                checkpointer.delete_thread(session.thread_id)
+            await self._json(send, 200, {"deleted": session.thread_id})
+        elif action == "/messages" and method == "POST":
+            body = await self._body(receive)
+            content = body.get("content")
+            if not isinstance(content, str) or not content.strip():
+                raise HTTPError(400, "Body must contain a non-empty 'content' string.")
+            value = {"messages": [{"role": "user", "content": content}]}
+            await self._turn(send, session, value)
+        elif action == "/decisions" and method == "POST":
+            body = await self._body(receive)
+            if session.busy:
+                raise HTTPError(409, "A turn is running for this session.")
+            pending = await self._run(pending_interrupts, self.agent, session.config())
+            if not pending:
+                raise HTTPError(409, "No approvals are pending for this session.")
+            await self._turn(send, session, resume_command(pending, body.get("decisions")))
+        else:
+            raise HTTPError(405, f"Method not allowed: {method} {path}")
+
+    # -- streaming turns -------------------------------------------------
+
+    def _stream(self, session: Session, value: Any, emit: Callable[[str, dict], None]) -> None:
+        """Run one turn in a worker thread, emitting SSE events as it goes."""
+        config = session.config()
+        session.usage.start_turn()
+        try:
+            scope = f"server:{session.thread_id}:{session.nonce}:{session.turns}"
+            with api.use_store(session.store), api.journal_scope(scope):
+                stream = self.agent.stream(value, config=config, stream_mode="messages")
+                for chunk, metadata in stream:
+                    if isinstance(chunk, ToolMessage):
+                        agent = telemetry.agent_name(metadata)
+                        emit("tool", {"name": chunk.name, "agent": agent})
+                    elif isinstance(chunk, AIMessage) and chunk.text:
+                        # Chunks from streaming models; whole messages from the others.
+                        emit("token", {"text": chunk.text})
+            pending = pending_interrupts(self.agent, config)
+        except Exception as e:
+            emit("error", {"message": str(e)})
+            pending = []
+        for intr in pending:
+            emit("interrupt", intr)
+        emit("done", {"pending": len(pending), "usage": session.usage.turn.total()})
+
+    async def _turn(self, send, session: Session, value: Any) -> None:
+        if session.busy:
+            raise HTTPError(409, "A turn is already running for this session.")
+        session.busy = True
+        session.turns += 1
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue[tuple[str, dict] | None] = asyncio.Queue()
+
+        def emit(event: str, data: dict) -> None:
+            loop.call_soon_threadsafe(queue.put_nowait, (event, data))
+
+        def work() -> None:
+            try:
+                self._stream(session, value, emit)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+            ],
+        })
+        future = loop.run_in_executor(self.executor, work)
+        try:
+            while (item := await queue.get()) is not None:
+                event, data = item
+                payload = json.dumps(data, ensure_ascii=False, default=str)
+                await send({
+                    "type": "http.response.body",
+                    "body": f"event: {event}\ndata: {payload}\n\n".encode(),
+                    "more_body": True,
+                })
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            # If the client went away the turn still runs to completion.
+            await future
+            session.busy = False
+
+    def stats(self) -> dict:
+        webhooks = {"webhooks": self.webhooks.stats()} if self.webhooks is not None else {}
+        return {
+            "sessions": len(self.sessions),
+            "busy": sum(s.busy for s in self.sessions.values()),
+            "stores": {
+                store.store_id: {
+                    "sessions": sum(s.store is store for s in self.sessions.values()),
+                    "cache_ttl": store.cache.ttl,
+                    "cache_hits": store.cache.hits,
+                    "cache_misses": store.cache.misses,
+                    "rate_limit_wait_s": round(store.limiter.waited, 3),
+                    "open_circuits": sorted(
+                        family for family, b in store.breakers.items() if b.is_open()
+                    ),
+                }
+                for store in {s.store.store_id: s.store for s in self.sessions.values()}.values()
+            },
+            "latency": {
+                f"{kind} {name}": hist.summary()
+                for (kind, name), hist in sorted(telemetry.TRACER.snapshot().items())
+            },
+            **webhooks,
+        }
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="Port (default: 8000)")
+    parser.add_argument(
+        "--workers", type=int, default=DEFAULT_WORKERS,
+        help=f"Turns that can run at once (default: {DEFAULT_WORKERS})",
+    )
+    parser.add_argument(
+        "--cache-ttl", type=float, default=DEFAULT_CACHE_TTL,
+        help=f"Seconds to cache API GET responses, 0 to disable (default: {DEFAULT_CACHE_TTL:g})",
+    )
+    parser.add_argument(
+        "--answer-ttl", type=float, default=ANSWER_CACHE_TTL,
+        help="Seconds to replay answers to repeated read-only questions, 0 to disable "
+             f"(default: {ANSWER_CACHE_TTL:g})",
+    )
+    parser.add_argument(
+        "--token", default="", help="Require this bearer token on every request except /health"
+    )
+    parser.add_argument(
+        "--webhook-url", metavar="URL",
+        help="Public URL of this server's /webhooks: subscribe every store to product, "
+             "category, order and customer events there and cache those longer",
+    )
+    parser.add_argument(
+        "--webhook-refresh", action="store_true",
+        help="Fetch resources changed by a webhook again right away, so reads stay local",
+    )
+    parser.add_argument(
+        "--digest-at", metavar="HH:MM",
+        help="Compute every store's daily digest at this local time (and now if missing)",
+    )
+    parser.add_argument(
+        "--webhook-log", default=WEBHOOK_LOG, metavar="PATH",
+        help="Log of received webhook events for replays ('' keeps them in memory only)",
+    )
+
+
+def run(args: argparse.Namespace) -> int:
+    """Entry point for ``nube-agent serve``. Returns the process exit code."""
+    try:
+        import uvicorn
+    except ImportError:
+        print("nube-agent serve needs uvicorn: pip install 'nube-agent[server]'", file=sys.stderr)
+        return 1
+    from nube_agent.agent import build_agent
+    from nube_agent.digest import DigestScheduler
+    from nube_agent.webhooks import EVENTS, EventLog, WebhookReceiver, register
+
+    try:
+        scheduler = DigestScheduler(args.digest_at) if args.digest_at else None
+    except ValueError as e:
+        print(f"--digest-at: {e}", file=sys.stderr)
+        return 2
+    for store in api.stores():
+        store.cache.ttl = args.cache_ttl
+        if args.webhook_url:
+            with api.use_store(store):
+                summary = register(args.webhook_url)
+            print(
+                f"Webhooks for store {store.store_id}: {len(summary['registered'])} registered, "
+                f"{len(summary['existing'])} already registered", file=sys.stderr,
+            )
+            for error in summary["errors"]:
+                print(f"  {error}", file=sys.stderr)
+            if not summary["errors"]:
+                store.cache.ttls.update({family: WEBHOOK_CACHE_TTL for family in EVENTS})
+    webhooks = WebhookReceiver(
+        token=args.token, log=EventLog(args.webhook_log), refresh=args.webhook_refresh
+    )
+    agent = build_agent(answer_ttl=args.answer_ttl)
+    app = AgentServer(agent, token=args.token, workers=args.workers, webhooks=webhooks)
+    if scheduler is not None:
+        scheduler.start()
+    try:
+        uvicorn.run(app, host=args.host, port=args.port, log_level="info")
+    finally:
+        if scheduler is not None:
+            scheduler.stop()
+    return 0
@@ -0,0 +1,620 @@
+"""Offline stand-in for the Tiendanube API.
+
+A small threaded HTTP server that serves a generated store (products with
+variants and images, categories, orders, customers, coupons, pages and
+abandoned checkouts) with the same pagination, error and rate-limit behavior
+as the real API.  Point ``TIENDANUBE_BASE_URL`` at it to run the agent, the
+tools or the benchmarks without a real store:
+
+    python -m nube_agent.standin --products 2000 --latency 0.05
+
+Only the standard library is used so it can run anywhere the agent runs.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qs, urlsplit
+
+API_VERSION = "2025-03"
+MAX_PER_PAGE = 200
+
+_COLLECTIONS = ("products", "categories", "orders", "customers", "coupons", "pages", "checkouts")
+_NESTED = ("variants", "images")
+_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+_FIRST_NAMES = ["Ana", "Juan", "Maria", "Pedro", "Lucia", "Diego", "Sofia", "Martin"]
+_LAST_NAMES = ["Garcia", "Lopez", "Martinez", "Perez", "Gomez", "Fernandez", "Diaz"]
+_PRODUCT_NAMES = ["Remera", "Pantalon", "Buzo", "Campera", "Gorra", "Medias", "Short", "Vestido"]
+_SIZES = ["S", "M", "L", "XL"]
+
+
+def _ts(offset: timedelta) -> str:
+    return (_EPOCH + offset).strftime("%Y-%m-%dT%H:%M:%S+0000")
+
+
+class StoreData:
+    """Deterministic in-memory store contents.
+
+    Every collection is a dict keyed by ID so lookups stay O(1) for large
+    stores; list endpoints return items in ID order.
+    """
+
+    def __init__(
+        self,
+        *,
+        products: int = 50,
+        variants_per_product: int = 3,
+        orders: int = 100,
+        customers: int = 50,
+        categories: int = 10,
+        coupons: int = 10,
+        pages: int = 5,
+        checkouts: int = 20,
+        language: str = "es",
+        seed: int = 0,
+    ):
+        self.language = language
+        self.lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._next_id = 1000
+        self.store: dict[str, Any] = {
+            "id": 1,
+            "name": {language: "Tienda de Prueba"},
+            "original_domain": "tienda-de-prueba.mitiendanube.com",
+            "email": "admin@tienda-de-prueba.com",
+            "country": "AR",
+            "main_language": language,
+            "main_currency": "ARS",
+            "plan_name": "standin",
+        }
+        self.collections: dict[str, dict[int, dict]] = {name: {} for name in _COLLECTIONS}
+        self.nested: dict[str, dict[int, dict[int, dict]]] = {name: {} for name in _NESTED}
+
+        for i in range(categories):
+            self._add("categories", {"name": self._text(f"Categoria {i + 1}"), "parent": None,
+                                     "subcategories": []})
+        for i in range(customers):
+            self._add("customers", self._customer(i))
+        for i in range(products):
+            self._add_product(i, variants_per_product)
+        customer_list = list(self.collections["customers"].values())
+        product_list = list(self.collections["products"].values())
+        for i in range(orders):
+            self._add("orders", self._order(i, customer_list, product_list))
+        for i in range(coupons):
+            self._add("coupons", {
+                "code": f"PROMO{i + 1}",
+                "type": ("percentage", "absolute", "shipping")[i % 3],
+                "value": "10.00" if i % 3 != 2 else None,
+                "valid": i % 4 != 0,
+                "used": self._rng.randint(0, 50),
+                "max_uses": None,
+            })
+        for i in range(pages):
+            self._add("pages", {"name": self._text(f"Pagina {i + 1}"),
+                                "handle": self._text(f"pagina-{i + 1}"),
+                                "content": self._text("<p>Contenido</p>"), "publish": True})
+        for i in range(checkouts):
+            customer = self._rng.choice(customer_list or [{}])
+            self._add("checkouts", {
+                "contact_name": customer.get("name", ""),
+                "contact_email": customer.get("email", ""),
+                "total": f"{self._rng.randint(1000, 50000)}.00",
+                "abandoned_checkout_url": f"https://tienda-de-prueba.mitiendanube.com/checkout/{i}",
+                "created_at": _ts(timedelta(hours=i * 7)),
+            })
+
+    def _text(self, value: str) -> dict[str, str]:
+        return {self.language: value}
+
+    def new_id(self) -> int:
+        self._next_id += 1
+        return self._next_id
+
+    def _add(self, collection: str, item: dict) -> dict:
+        item = {"id": self.new_id(), **item}
+        item.setdefault("created_at", _ts(timedelta(minutes=item["id"])))
+        item.setdefault("updated_at", item["created_at"])
+        self.collections[collection][item["id"]] = item
+        return item
+
+    def _customer(self, i: int) -> dict:
+        first = _FIRST_NAMES[i % len(_FIRST_NAMES)]
+        last = _LAST_NAMES[(i // len(_FIRST_NAMES)) % len(_LAST_NAMES)]
+        return {
+            "name": f"{first} {last}",
+            "email": f"{first.lower()}.{last.lower()}{i}@example.com",
+            "phone": f"+54911{i:08d}",
+            "total_spent": f"{self._rng.randint(0, 200000)}.00",
+            "note": None,
+        }
+
+    def _add_product(self, i: int, variants_per_product: int) -> None:
+        name = f"{_PRODUCT_NAMES[i % len(_PRODUCT_NAMES)]} {i + 1}"
+        product = self._add("products", {
+            "name": self._text(name),
+            "description": self._text(f"<p>{name}</p>"),
+            "handle": self._text(name.lower().replace(" ", "-")),
+            "published": i % 10 != 0,
+            "attributes": [self._text("Talla")] if variants_per_product > 1 else [],
+            "categories": [],
+            "tags": "",
+            "brand": None,
+        })
+        variants: dict[int, dict] = {}
+        for j in range(variants_per_product):
+            vid = self.new_id()
+            variants[vid] = {
+                "id": vid,
+                "product_id": product["id"],
+                "price": f"{self._rng.randint(10, 500) * 100}.00",
+                "stock": self._rng.randint(0, 40),
+                "sku": f"SKU-{product['id']}-{j + 1}",
+                "values": [self._text(_SIZES[j % len(_SIZES)])] if variants_per_product > 1 else [],
+            }
+        self.nested["variants"][product["id"]] = variants
+        self.nested["images"][product["id"]] = {}
+
+    def _order(self, i: int, customers: list[dict], products: list[dict]) -> dict:
+        customer = customers[i % len(customers)] if customers else {"id": 0, "name": "Guest"}
+        lines = []
+        for product in self._rng.sample(products, k=min(len(products), 2)):
+            variant = next(iter(self.nested["variants"][product["id"]].values()), {})
+            lines.append({
+                "product_id": product["id"],
+                "variant_id": variant.get("id"),
+                "name": product["name"][self.language],
+                "price": variant.get("price", "0.00"),
+                "quantity": self._rng.randint(1, 3),
+                "sku": variant.get("sku"),
+            })
+        total = sum(float(line["price"]) * line["quantity"] for line in lines)
+        return {
+            "number": 100 + i,
+            "customer": {"id": customer["id"], "name": customer["name"],
+                         "email": customer.get("email")},
+            "contact_name": customer["name"],
+            "products": lines,
+            "total": f"{total:.2f}",
+            "currency": "ARS",
+            "status": ("open", "open", "closed", "cancelled")[i % 4],
+            "payment_status": ("paid", "pending", "paid", "authorized")[i % 4],
+            "shipping_status": ("unpacked", "fulfilled", "unfulfilled")[i % 3],
+            "owner_note": None,
+            "created_at": _ts(timedelta(hours=i * 3)),
+        }
+
+    def variants_of(self, product_id: int) -> list[dict]:
+        return list(self.nested["variants"].get(product_id, {}).values())
+
+
+class RateLimiter:
+    """Leaky bucket matching Tiendanube's limits (40 requests, 2 per second).
+
+    ``acquire`` returns ``(allowed, remaining, reset_ms)`` so the handler can
+    emit the ``x-rate-limit-*`` headers the real API sends.
+    """
+
+    def __init__(self, capacity: int = 40, leak_rate: float = 2.0):
+        self.capacity = capacity
+        self.leak_rate = leak_rate
+        self._level = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> tuple[bool, int, int]:
+        with self._lock:
+            now = time.monotonic()
+            self._level = max(0.0, self._level - (now - self._updated) * self.leak_rate)
+            self._updated = now
+            allowed = self._level + 1 <= self.capacity
+            if allowed:
+                self._level += 1
+            remaining = int(self.capacity - self._level)
+            reset_ms = int(self._level / self.leak_rate * 1000) if self.leak_rate else 0
+            return allowed, remaining, reset_ms
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "StandinServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        pass
+
+    def do_GET(self) -> None:  # noqa: N802
+        self._dispatch("GET")
+
+    def do_POST(self) -> None:  # noqa: N802
+        self._dispatch("POST")
+
+    def do_PUT(self) -> None:  # noqa: N802
+        self._dispatch("PUT")
+
+    def do_DELETE(self) -> None:  # noqa: N802
+        self._dispatch("DELETE")
+
+    def _send(self, status: int, body: Any, headers: dict[str, str] | None = None) -> None:
+        payload = json.dumps(body, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _dispatch(self, method: str) -> None:
+        server = self.server
+        length = int(self.headers.get("Content-Length") or 0)
+        raw_body = self.rfile.read(length) if length else b""
+        server.count_request()
+
+        if server.latency:
+            time.sleep(server.latency + server.jitter * random.random())
+
+        allowed, remaining, reset_ms = server.limiter.acquire()
+        limit_headers = {
+            "x-rate-limit-limit": str(server.limiter.capacity),
+            "x-rate-limit-remaining": str(remaining),
+            "x-rate-limit-reset": str(reset_ms),
+        }
+        if not allowed:
+            limit_headers["Retry-After"] = str(max(1, round(reset_ms / 1000)))
+            self._send(429, {"code": 429, "message": "Too Many Requests",
+                             "description": "Rate limit exceeded"}, limit_headers)
+            return
+
+        token = self.headers.get("Authentication", "")
+        if not token.lower().startswith("bearer ") or (
+            server.access_token and token[7:] != server.access_token
+        ):
+            self._send(401, {"code": 401, "message": "Unauthorized",
+                             "description": "Invalid access token"}, limit_headers)
+            return
+
+        url = urlsplit(self.path)
+        path = url.path
+        if path.startswith(server.prefix):
+            path = path[len(server.prefix):]
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            body = json.loads(raw_body) if raw_body else {}
+        except json.JSONDecodeError:
+            self._send(400, {"code": 400, "message": "Bad Request",
+                             "description": "Invalid JSON"}, limit_headers)
+            return
+
+        with server.data.lock:
+            status, payload, extra = route(server.data, method, path, query, body)
+        self._send(status, payload, {**limit_headers, **extra})
+
+
+def _not_found(description: str = "Not Found") -> tuple[int, dict, dict]:
+    return 404, {"code": 404, "message": "Not Found", "description": description}, {}
+
+
+def _matches(item: dict, query: dict[str, str]) -> bool:
+    for key in ("status", "payment_status", "shipping_status"):
+        if query.get(key) and item.get(key) != query[key]:
+            return False
+    if "valid" in query and str(item.get("valid", "")).lower() != query["valid"].lower():
+        return False
+    created = item.get("created_at", "")
+    if query.get("created_at_min") and created < query["created_at_min"]:
+        return False
+    if query.get("created_at_max") and created > query["created_at_max"]:
+        return False
+    q = query.get("q", "").lower()
+    if q:
+        haystack = json.dumps(
+            [item.get("name"), item.get("email"), item.get("number"), item.get("contact_name"),
+             item.get("customer")],
+            ensure_ascii=False,
+        ).lower()
+        if q not in haystack:
+            return False
+    return True
+
+
+def _paginate(items: list[dict], query: dict[str, str]) -> tuple[int, Any, dict]:
+    try:
+        page = max(1, int(query.get("page", 1)))
+        per_page = max(1, min(int(query.get("per_page", 30)), MAX_PER_PAGE))
+    except ValueError:
+        return 422, {"code": 422, "message": "Unprocessable Entity",
+                     "description": "Invalid pagination"}, {}
+    last = max(1, -(-len(items) // per_page))
+    if page > last and items:
+        return _not_found(f"Last page is {last}")
+    chunk = items[(page - 1) * per_page: page * per_page]
+    headers = {"x-total-count": str(len(items))}
+    links = []
+    if page < last:
+        links.append(f'<?page={page + 1}&per_page={per_page}>; rel="next"')
+        links.append(f'<?page={last}&per_page={per_page}>; rel="last"')
+    if links:
+        headers["Link"] = ", ".join(links)
+    return 200, chunk, headers
+
+
+def _product_view(data: StoreData, product: dict) -> dict:
+    return {
+        **product,
+        "variants": data.variants_of(product["id"]),
+        "images": list(data.nested["images"].get(product["id"], {}).values()),
+    }
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S+0000")
+
+
+def route(
+    data: StoreData, method: str, path: str, query: dict[str, str], body: Any
+) -> tuple[int, Any, dict]:
+    """Resolve one API call against ``data``.
+
+    Returns ``(status, json_body, extra_headers)``.  Kept independent from the
+    HTTP handler so it can be exercised directly in tests.
+    """
+    parts = [p for p in path.split("/") if p]
+
+    if parts == ["store"] and method == "GET":
+        return 200, data.store, {}
+
+    if not parts or parts[0] not in _COLLECTIONS:
+        return _not_found()
+    name = parts[0]
+    items = data.collections[name]
+
+    if len(parts) == 1:
+        if method == "GET":
+            listing = [i for i in items.values() if _matches(i, query)]
+            if name == "products":
+                listing = [_product_view(data, p) for p in listing]
+            return _paginate(listing, query)
+        if method == "POST":
+            return _create(data, name, body)
+        return 405, {"code": 405, "message": "Method Not Allowed"}, {}
+
+    if not parts[1].isdigit():
+        return _not_found()
+    item_id = int(parts[1])
+    item = items.get(item_id)
+    if item is None:
+        return _not_found()
+
+    if len(parts) == 2:
+        if method == "GET":
+            return 200, _product_view(data, item) if name == "products" else item, {}
+        if method == "PUT":
+            item.update({k: v for k, v in body.items() if k != "id"})
+            item["updated_at"] = _now()
+            return 200, _product_view(data, item) if name == "products" else item, {}
+        if method == "DELETE":
+            if name == "customers" and any(
+                o.get("customer", {}).get("id") == item_id
+                for o in data.collections["orders"].values()
+            ):
+                return 422, {"code": 422, "message": "Unprocessable Entity",
+                             "description": "Customer has orders"}, {}
+            del items[item_id]
+            for nested in data.nested.values():
+                nested.pop(item_id, None)
+            return 200, {}, {}
+        return 405, {"code": 405, "message": "Method Not Allowed"}, {}
+
+    if name == "orders" and len(parts) == 3 and method == "POST":
+        action = parts[2]
+        states = {"close": "closed", "open": "open", "cancel": "cancelled"}
+        if action not in states:
+            return _not_found()
+        item["status"] = states[action]
+        if action == "cancel":
+            item["cancel_reason"] = (body or {}).get("reason", "other")
+        item["updated_at"] = _now()
+        return 200, item, {}
+
+    if name == "products" and parts[2] in _NESTED:
+        return _nested(data, parts[2], item, parts[3:], method, query, body)
+
+    return _not_found()
+
+
+def _create(data: StoreData, name: str, body: Any) -> tuple[int, Any, dict]:
+    if not isinstance(body, dict):
+        return 422, {"code": 422, "message": "Unprocessable Entity"}, {}
+    if name in ("orders", "checkouts"):
+        return 405, {"code": 405, "message": "Method Not Allowed"}, {}
+    if name == "customers" and any(
+        c.get("email") == body.get("email") for c in data.collections["customers"].values()
+    ):
+        return 422, {"code": 422, "message": "Unprocessable Entity",
+                     "description": {"email": ["has already been taken"]}}, {}
+    fields = {k: v for k, v in body.items() if k not in ("id", "variants")}
+    item = data._add(name, fields)
+    if name == "products":
+        attributes = item.setdefault("attributes", [])
+        data.nested["variants"][item["id"]] = {}
+        data.nested["images"][item["id"]] = {}
+        for variant in body.get("variants") or [{}]:
+            status, created, _ = _create_variant(data, item, variant)
+            if status != 201:
+                del data.collections["products"][item["id"]]
+                for nested in data.nested.values():
+                    nested.pop(item["id"], None)
+                return status, created, {}
+        item.setdefault("published", True)
+        item["attributes"] = attributes
+        return 201, _product_view(data, item), {}
+    return 201, item, {}
+
+
+def _create_variant(data: StoreData, product: dict, body: dict) -> tuple[int, Any, dict]:
+    values = body.get("values") or []
+    if len(values) != len(product.get("attributes") or []):
+        return 422, {"code": 422, "message": "Unprocessable Entity",
+                     "description": "Variant values should match product attributes"}, {}
+    vid = data.new_id()
+    variant = {"id": vid, "product_id": product["id"], "price": "0.00", "stock": None,
+               "sku": None, "values": values,
+               **{k: v for k, v in body.items() if k not in ("id", "product_id", "values")}}
+    data.nested["variants"][product["id"]][vid] = variant
+    return 201, variant, {}
+
+
+def _nested(
+    data: StoreData, kind: str, product: dict, rest: list[str], method: str,
+    query: dict[str, str], body: Any,
+) -> tuple[int, Any, dict]:
+    children = data.nested[kind].setdefault(product["id"], {})
+    if not rest:
+        if method == "GET":
+            return 200, list(children.values()), {}
+        if method == "POST":
+            if kind == "variants":
+                return _create_variant(data, product, body or {})
+            iid = data.new_id()
+            children[iid] = {"id": iid, "product_id": product["id"], **(body or {})}
+            return 201, children[iid], {}
+        return 405, {"code": 405, "message": "Method Not Allowed"}, {}
+
+    if not rest[0].isdigit() or int(rest[0]) not in children:
+        return _not_found()
+    child = children[int(rest[0])]
+    if method == "GET":
+        return 200, child, {}
+    if method == "PUT":
+        values = (body or {}).get("values")
+        if kind == "variants" and values is not None and len(values) != len(
+            product.get("attributes") or []
+        ):
+            return 422, {"code": 422, "message": "Unprocessable Entity",
+                         "description": "Variant values should match product attributes"}, {}
+        child.update({k: v for k, v in (body or {}).items() if k not in ("id", "product_id")})
+        return 200, child, {}
+    if method == "DELETE":
+        if kind == "variants" and len(children) == 1:
+            return 422, {"code": 422, "message": "Unprocessable Entity",
+                         "description": "A product must have at least one variant"}, {}
+        del children[int(rest[0])]
+        return 200, {}, {}
+    return 405, {"code": 405, "message": "Method Not Allowed"}, {}
+
+
+class StandinServer(ThreadingHTTPServer):
+    """Threaded HTTP server hosting a :class:`StoreData`.
+
+    Use as a context manager to serve in a background thread:
+
+        with StandinServer(StoreData(products=500)) as server:
+            os.environ["TIENDANUBE_BASE_URL"] = server.base_url
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        data: StoreData | None = None,
+        *,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        store_id: str = "1",
+        access_token: str = "",
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        rate_limit: int = 40,
+        leak_rate: float = 2.0,
+    ):
+        super().__init__((host, port), _Handler)
+        self.data = data or StoreData()
+        self.prefix = f"/{API_VERSION}/{store_id}"
+        self.access_token = access_token
+        self.latency = latency
+        self.jitter = jitter
+        self.limiter = RateLimiter(rate_limit, leak_rate)
+        self.requests = 0
+        self._count_lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{self.prefix}"
+
+    def count_request(self) -> None:
+        with self._count_lock:
+            self.requests += 1
+
+    def start(self) -> "StandinServer":
+        self._thread = threading.Thread(
+            target=self.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self) -> "StandinServer":
+        return self.start()
+
+    def __exit__(self, *exc: object) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline Tiendanube stand-in server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--store-id", default="1")
+    parser.add_argument("--products", type=int, default=50)
+    parser.add_argument("--variants", type=int, default=3, help="Variants per product")
+    parser.add_argument("--orders", type=int, default=100)
+    parser.add_argument("--customers", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added per request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra seconds (max)")
+    parser.add_argument("--rate-limit", type=int, default=40, help="Bucket size (requests)")
+    parser.add_argument("--leak-rate", type=float, default=2.0, help="Requests drained per second")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    data = StoreData(
+        products=args.products,
+        variants_per_product=args.variants,
+        orders=args.orders,
+        customers=args.customers,
+        seed=args.seed,
+    )
+    server = StandinServer(
+        data,
+        host=args.host,
+        port=args.port,
+        store_id=args.store_id,
+        latency=args.latency,
+        jitter=args.jitter,
+        rate_limit=args.rate_limit,
+        leak_rate=args.leak_rate,
+    )
+    print(f"Serving stand-in store at {server.base_url}")
+    print(f"  export TIENDANUBE_BASE_URL={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+from nube_agent.approvals import ALL_DECISIONS
+from nube_agent.catalog_import import is_dry_run
 from nube_agent.tools.abandoned_checkouts import (
     get_abandoned_checkout,
     list_abandoned_checkouts,
@@ -42,6 +44,7 @@ from nube_agent.tools.products import (
     create_product,
     delete_product,
     get_product,
+    import_catalog,
     list_products,
     update_product,
 )
@@ -51,6 +54,7 @@ from nube_agent.tools.variants import (
     delete_variant,
     get_variant,
     list_variants,
+    set_variant_matrix,
     update_variant,
 )
 
@@ -72,11 +76,22 @@ Operational rules:
 - Before updating or deleting a resource by name, always look it up first \
 (list or get) to find the correct ID. Never guess or fabricate IDs.
 - Only perform the exact action the user requested. Do not carry over, \
-queue, or repeat actions from previous messages."""
+queue, or repeat actions from previous messages.
+- To change or delete several resources, make all the calls in one response \
+instead of one per step: gated actions are confirmed together and the calls \
+run at once."""
 
+def _writes_catalog(request) -> bool:
+    """``when`` predicate for import_catalog: dry runs write nothing and never pause."""
+    return not is_dry_run(request.tool_call["args"].get("dry_run", True))
+
+
+# "tier" is the model a subagent needs for edits (see tiers.py): "large" for
+# multi-step catalog changes, "small" where every action is a single call.
 SUBAGENTS = [
     {
         "name": "catalog-manager",
+        "tier": "large",
         "description": (
             "Manages the product catalog via the Tiendanube API: list, view, create, "
             "update, and delete products, categories, variants, and images. "
@@ -87,8 +102,11 @@ SUBAGENTS = [
             "Key rules:\n"
             "- Prices and stock are on VARIANTS, not on products.\n"
             "- When creating products, remind the user about variant pricing.\n"
-            "- Adding options to an existing product is a 3-step process: "
-            "add attributes, update existing variant values, then create new variants.\n"
+            "- To add, change or remove options (size, color...) on a product, use "
+            "set_variant_matrix with the full list of values per attribute; it updates "
+            "the attributes and creates, updates and deletes variants in one call.\n"
+            "- To load many products from a CSV or JSONL file, use import_catalog: "
+            "dry run first, then import; the import itself is gated by the system.\n"
             "- When listing products or categories, show a short summary per item "
             "(name, price, stock, status). Do not include full descriptions, "
             "image URLs, or variant details unless asked.\n"
@@ -97,16 +115,19 @@ SUBAGENTS = [
         ),
         "tools": [
             list_products, get_product, create_product, update_product, delete_product,
+            import_catalog,
             list_categories, get_category, create_category, update_category, delete_category,
             list_variants, get_variant, create_variant, update_variant, delete_variant,
-            bulk_update_stock_price,
+            bulk_update_stock_price, set_variant_matrix,
             list_images, add_image, update_image, delete_image,
         ],
         "interrupt_on": {
             "delete_product": True,
             "delete_category": True,
             "delete_variant": True,
+            "set_variant_matrix": True,
             "delete_image": True,
+            "import_catalog": {"allowed_decisions": ALL_DECISIONS, "when": _writes_catalog},
         },
         "skills": [
             "skills/product-management/",
@@ -116,6 +137,7 @@ SUBAGENTS = [
     },
     {
         "name": "order-manager",
+        "tier": "small",
         "description": (
             "Manages orders via the Tiendanube API: list, view, update notes, close, "
             "reopen, and cancel orders. Use when the user asks about orders, sales, "
@@ -139,6 +161,7 @@ SUBAGENTS = [
     },
     {
         "name": "customer-manager",
+        "tier": "small",
         "description": (
             "Manages customers via the Tiendanube API: list, search, view, create, and "
             "update customer profiles. Use when the user asks about customers or contacts."
@@ -159,6 +182,7 @@ SUBAGENTS = [
     },
     {
         "name": "marketing-manager",
+        "tier": "small",
         "description": (
             "Manages marketing via the Tiendanube API: discount coupons (create, update, "
             "delete) and abandoned checkout recovery. Use when the user asks about "
@@ -188,6 +212,7 @@ SUBAGENTS = [
     },
     {
         "name": "content-manager",
+        "tier": "small",
         "description": (
             "Manages content pages via the Tiendanube API: list, view, create, update, "
             "and delete static pages (About Us, FAQ, Terms, etc.). Use when the user "
@@ -0,0 +1,374 @@
+"""Tracing and latency histograms.
+
+Every API request, tool call and model call is recorded as a span (a plain
+dict with name, kind, timing and attributes).  Spans are aggregated into
+per-operation latency histograms for ``/stats`` and can be streamed to a
+local file as JSON lines or OTLP/JSON spans (one ``resourceSpans`` object per
+line, the OpenTelemetry file exporter format):
+
+    NUBE_AGENT_TRACE_FILE=trace.jsonl NUBE_AGENT_TRACE_FORMAT=otlp nube-agent
+"""
+
+import bisect
+import contextvars
+import json
+import re
+import secrets
+import threading
+import time
+from collections import deque
+from typing import Any
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from nube_agent.config import TRACE_FILE, TRACE_FORMAT
+
+# Histogram bucket upper bounds in milliseconds (the last bucket is open).
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+MAX_SAMPLES = 5000
+MAX_SPANS = 10000
+
+SUPERVISOR = "supervisor"
+
+# Prefixes of the error strings tools return instead of raising.
+ERROR_PREFIXES = ("API error", "HTTP error", "Invalid JSON", "Error:", "Request failed")
+
+_ID_SEGMENT_RE = re.compile(r"/\d+(?=/|$)")
+
+# Span of the tool currently running in this context, so API requests made
+# by the tool are recorded as its children.
+_current_span: contextvars.ContextVar[dict | None] = contextvars.ContextVar(
+    "nube_agent_span", default=None
+)
+
+
+def path_template(path: str) -> str:
+    """Replace numeric path segments with ``{id}`` (``/products/1/variants/2``
+    becomes ``/products/{id}/variants/{id}``)."""
+    return _ID_SEGMENT_RE.sub("/{id}", path)
+
+
+def agent_name(metadata: dict | None) -> str:
+    """Name of the agent a model or tool call belongs to, from callback metadata."""
+    return (metadata or {}).get("lc_agent_name") or SUPERVISOR
+
+
+def output_text(output: Any) -> str:
+    """Text a tool call hands back to the model.
+
+    Tools return a string or a ``ToolMessage``; the subagent ``task`` tool
+    returns a ``Command`` whose update carries the ``ToolMessage``.
+    """
+    update = getattr(output, "update", None)
+    if isinstance(update, dict) and update.get("messages"):
+        return "".join(output_text(m) for m in update["messages"])
+    content = getattr(output, "content", output)
+    return content if isinstance(content, str) else str(content)
+
+
+def _new_id(nbytes: int = 8) -> str:
+    return secrets.token_hex(nbytes)
+
+
+class Histogram:
+    """Latency distribution for one operation."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.errors = 0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self._samples: deque[float] = deque(maxlen=MAX_SAMPLES)
+
+    def add(self, duration_ms: float, *, error: bool = False) -> None:
+        self.count += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        self.errors += int(error)
+        self.buckets[bisect.bisect_left(BUCKETS_MS, duration_ms)] += 1
+        self._samples.append(duration_ms)
+
+    def percentile(self, q: float) -> float:
+        """Percentile ``q`` (0-100) over the most recent samples."""
+        if not self._samples:
+            return 0.0
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def summary(self) -> dict[str, float]:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean_ms": self.total_ms / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "max_ms": self.max_ms,
+        }
+
+
+class Tracer:
+    """Collects spans, aggregates histograms and exports to a file."""
+
+    def __init__(self, export_path: str = "", export_format: str = "jsonl") -> None:
+        self.spans: deque[dict] = deque(maxlen=MAX_SPANS)
+        self.histograms: dict[tuple[str, str], Histogram] = {}
+        self._lock = threading.Lock()
+        self.export_path = export_path
+        self.export_format = export_format
+
+    def record(self, span: dict) -> None:
+        key = (span["kind"], span["name"])
+        with self._lock:
+            self.spans.append(span)
+            self.histograms.setdefault(key, Histogram()).add(
+                span["duration_ms"], error=span.get("status") == "error"
+            )
+            if self.export_path:
+                with open(self.export_path, "a", encoding="utf-8") as fh:
+                    fh.write(format_span(span, self.export_format) + "\n")
+
+    def clear(self) -> None:
+        with self._lock:
+            self.spans.clear()
+            self.histograms.clear()
+
+    def snapshot(self) -> dict[tuple[str, str], Histogram]:
+        with self._lock:
+            return dict(self.histograms)
+
+    def export(self, path: str, fmt: str = "jsonl") -> int:
+        """Write all retained spans to ``path``. Returns the number written."""
+        with self._lock:
+            spans = list(self.spans)
+        with open(path, "w", encoding="utf-8") as fh:
+            for span in spans:
+                fh.write(format_span(span, fmt) + "\n")
+        return len(spans)
+
+
+TRACER = Tracer(TRACE_FILE, TRACE_FORMAT)
+
+
+def make_span(
+    kind: str,
+    name: str,
+    started: float,
+    *,
+    status: str = "ok",
+    parent: dict | None = None,
+    span_id: str | None = None,
+    **attrs: Any,
+) -> dict:
+    """Build a finished span that started at ``started`` (``time.perf_counter``)."""
+    duration = time.perf_counter() - started
+    end = time.time()
+    return {
+        "trace_id": parent["trace_id"] if parent else _new_id(16),
+        "span_id": span_id or _new_id(),
+        "parent_id": parent["span_id"] if parent else None,
+        "kind": kind,
+        "name": name,
+        "start": end - duration,
+        "duration_ms": duration * 1000,
+        "status": status,
+        "attrs": attrs,
+    }
+
+
+def record_http(
+    method: str,
+    path: str,
+    started: float,
+    *,
+    status: int,
+    nbytes: int,
+    retries: int,
+    cache_hit: bool = False,
+    stale: bool = False,
+    replayed: bool = False,
+) -> None:
+    """Record one ``api.request`` call."""
+    template = path_template(path)
+    TRACER.record(make_span(
+        "http",
+        f"{method} {template}",
+        started,
+        status="error" if status == 0 or status >= 400 else "ok",
+        parent=_current_span.get(),
+        method=method,
+        path=template,
+        status_code=status,
+        bytes=nbytes,
+        retries=retries,
+        cache_hit=cache_hit,
+        stale=stale,
+        replayed=replayed,
+    ))
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def format_span(span: dict, fmt: str = "jsonl") -> str:
+    """Serialize a span as a JSON line, or as an OTLP/JSON ``resourceSpans`` line."""
+    if fmt != "otlp":
+        return json.dumps(span, ensure_ascii=False)
+    start_ns = int(span["start"] * 1e9)
+    otlp_span = {
+        "traceId": span["trace_id"],
+        "spanId": span["span_id"],
+        "name": span["name"],
+        "kind": 3 if span["kind"] == "http" else 1,  # CLIENT / INTERNAL
+        "startTimeUnixNano": str(start_ns),
+        "endTimeUnixNano": str(start_ns + int(span["duration_ms"] * 1e6)),
+        "attributes": [
+            {"key": f"nube.{key}", "value": _otlp_value(value)}
+            for key, value in [("kind", span["kind"]), *span["attrs"].items()]
+            if value is not None
+        ],
+        "status": {"code": 2 if span["status"] == "error" else 1},
+    }
+    if span["parent_id"]:
+        otlp_span["parentSpanId"] = span["parent_id"]
+    payload = {
+        "resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": "nube-agent"}},
+            ]},
+            "scopeSpans": [{"scope": {"name": "nube_agent.telemetry"}, "spans": [otlp_span]}],
+        }]
+    }
+    return json.dumps(payload, ensure_ascii=False)
+
+
+class TelemetryCallbackHandler(BaseCallbackHandler):
+    """LangChain callback handler that records tool and model calls as spans.
+
+    Pass it in the run config's ``callbacks``.  Spans are linked through
+    LangChain's ``run_id``/``parent_run_id`` so a trace covers the whole turn,
+    and API requests made inside a tool become children of the tool span.
+    """
+
+    def __init__(self, tracer: Tracer = TRACER) -> None:
+        self.tracer = tracer
+        self._runs: dict[Any, dict] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id, parent_run_id, **info: Any) -> dict:
+        with self._lock:
+            parent = self._runs.get(parent_run_id)
+            # Chains are not exported, so link to the nearest recorded ancestor.
+            if parent is not None and parent["kind"] == "chain":
+                parent = parent["parent"]
+            run = {
+                "started": time.perf_counter(),
+                "span_id": run_id.hex[-16:],
+                "trace_id": self._runs[parent_run_id]["trace_id"]
+                if parent_run_id in self._runs else run_id.hex,
+                "parent": parent,
+                "kind": "run",
+                **info,
+            }
+            self._runs[run_id] = run
+        return run
+
+    def _finish(self, run_id, kind: str, status: str, **attrs: Any) -> dict | None:
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return None
+        parent = run["parent"]
+        span = make_span(
+            kind,
+            run["name"],
+            run["started"],
+            status=status,
+            parent={"trace_id": run["trace_id"], "span_id": parent["span_id"]} if parent else None,
+            span_id=run["span_id"],
+            agent=run["agent"],
+            **attrs,
+        )
+        span["trace_id"] = run["trace_id"]  # also for root spans
+        self.tracer.record(span)
+        return span
+
+    # Chains are only tracked to link tools and models into one trace.
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, kind="chain")
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        with self._lock:
+            self._runs.pop(run_id, None)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self.on_chain_end(None, run_id=run_id)
+
+    def on_chat_model_start(
+        self, serialized, messages, *, run_id, parent_run_id=None, metadata=None, **kwargs
+    ):
+        metadata = metadata or {}
+        model = metadata.get("ls_model_name") or (serialized or {}).get("name") or "model"
+        self._start(run_id, parent_run_id, name=agent_name(metadata), agent=agent_name(metadata),
+                    model=model)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            run = self._runs.get(run_id)
+        usage = {}
+        try:
+            usage = response.generations[0][0].message.usage_metadata or {}
+        except (AttributeError, IndexError):
+            pass
+        input_tokens = usage.get("input_tokens")
+        cached = (usage.get("input_token_details") or {}).get("cache_read")
+        self._finish(
+            run_id,
+            "model",
+            "ok",
+            model=run["model"] if run else None,
+            input_tokens=input_tokens,
+            output_tokens=usage.get("output_tokens"),
+            cached_tokens=cached,
+            cached_ratio=round((cached or 0) / input_tokens, 3) if input_tokens else None,
+        )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, "model", "error", error=str(error)[:200])
+
+    def on_tool_start(
+        self, serialized, input_str, *, run_id, parent_run_id=None, metadata=None, **kwargs
+    ):
+        run = self._start(run_id, parent_run_id, name=(serialized or {}).get("name", "tool"),
+                          agent=agent_name(metadata))
+        run["token"] = _current_span.set(
+            {"trace_id": run["trace_id"], "span_id": run["span_id"]}
+        )
+
+    def _end_tool(self, run_id, status: str, **attrs: Any) -> None:
+        with self._lock:
+            run = self._runs.get(run_id)
+        if run and "token" in run:
+            try:
+                _current_span.reset(run["token"])
+            except ValueError:
+                # Ended from a different context than it started in.
+                _current_span.set(None)
+        self._finish(run_id, "tool", status, **attrs)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        text = output_text(output)
+        error = text.startswith(ERROR_PREFIXES)
+        self._end_tool(run_id, "error" if error else "ok", bytes=len(text.encode()))
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end_tool(run_id, "error", error=str(error)[:200])
@@ -0,0 +1,146 @@
+"""Model tiers for subagent work.
+
+Each subagent in ``SUBAGENTS`` has a ``tier``: the model it needs for edits.
+Every subagent run starts on the small model (``config.SMALL_MODEL``), which
+handles listings, lookups and summaries.  :class:`ModelTierMiddleware` moves
+the run to the large model (``config.MODEL``) when:
+
+- the small model asks for a write tool (create, update, delete, ...) in a
+  subagent whose tier is ``large``; the call is redone on the large model
+  before anything is written, and the rest of the run stays there;
+- the small model returns a malformed or unknown tool call, which is retried
+  on the large model right away;
+- a tool call earlier in the run failed (an ``API error``, ``Error: ...``),
+  so the large model handles the recovery.
+
+Escalations are recorded as ``tier`` spans (see ``/stats tier``).  Latency
+and cost per model are in ``/usage``.
+"""
+
+import time
+from typing import Any
+
+from langchain.agents.middleware.types import AgentMiddleware
+from langchain_core.messages import AIMessage, ToolMessage
+
+from nube_agent import telemetry
+from nube_agent.subagents import SUBAGENTS
+
+SMALL = "small"
+LARGE = "large"
+
+READ_PREFIXES = ("list_", "get_")
+
+
+def write_tools(spec: dict) -> frozenset[str]:
+    """Names of the spec's tools that change store data."""
+    return frozenset(
+        fn.__name__ for fn in spec.get("tools", []) if not fn.__name__.startswith(READ_PREFIXES)
+    )
+
+
+def _failed(message: Any) -> bool:
+    if not isinstance(message, ToolMessage):
+        return False
+    return message.status == "error" or telemetry.output_text(message).startswith(
+        telemetry.ERROR_PREFIXES
+    )
+
+
+def _response_message(response: Any) -> AIMessage | None:
+    if isinstance(response, AIMessage):
+        return response
+    result = getattr(response, "result", None) or []
+    return next((m for m in reversed(result) if isinstance(m, AIMessage)), None)
+
+
+class ModelTierMiddleware(AgentMiddleware):
+    """Pick the small or large model for each model call of one subagent."""
+
+    def __init__(self, name: str, small, large, *, tier: str = LARGE,
+                 writes: frozenset[str] = frozenset()) -> None:
+        super().__init__()
+        self.agent = name
+        self.small = small
+        self.large = large
+        self.tier = tier
+        self.writes = writes
+
+    def choose(self, messages: list) -> str:
+        """The tier for the next call, from what already happened in the run."""
+        for message in messages:
+            if _failed(message):
+                return LARGE
+            if (
+                self.tier == LARGE
+                and isinstance(message, AIMessage)
+                and any(call["name"] in self.writes for call in message.tool_calls)
+            ):
+                return LARGE
+        return SMALL
+
+    def escalation(self, message: AIMessage | None, tools: list) -> str | None:
+        """Why a small-model answer must be redone on the large model, if it must."""
+        if message is None:
+            return None
+        if message.invalid_tool_calls:
+            return "invalid tool call"
+        known = {getattr(t, "name", None) or t.get("name") for t in tools}
+        for call in message.tool_calls:
+            if call["name"] not in known:
+                return f"unknown tool {call['name']}"
+            if self.tier == LARGE and call["name"] in self.writes:
+                return f"write {call['name']}"
+        return None
+
+    def _record(self, reason: str, started: float) -> None:
+        telemetry.TRACER.record(
+            telemetry.make_span("tier", f"escalate {self.agent}", started, reason=reason)
+        )
+
+    def wrap_model_call(self, request, handler):
+        if self.small is self.large:
+            return handler(request)
+        if self.choose(request.messages) == LARGE:
+            return handler(request.override(model=self.large))
+        started = time.perf_counter()
+        response = handler(request.override(model=self.small))
+        reason = self.escalation(_response_message(response), request.tools or [])
+        if reason is None:
+            return response
+        self._record(reason, started)
+        return handler(request.override(model=self.large))
+
+    async def awrap_model_call(self, request, handler):
+        if self.small is self.large:
+            return await handler(request)
+        if self.choose(request.messages) == LARGE:
+            return await handler(request.override(model=self.large))
+        started = time.perf_counter()
+        response = await handler(request.override(model=self.small))
+        reason = self.escalation(_response_message(response), request.tools or [])
+        if reason is None:
+            return response
+        self._record(reason, started)
+        return await handler(request.override(model=self.large))
+
+
+def subagent_specs(large, small) -> list[dict]:
+    """``SUBAGENTS`` with each spec's model and tier middleware filled in.
+
+    A subagent whose tier is ``small`` never needs the large model except to
+    recover from a failed call, so its base model (also used to summarize
+    long runs) is the small one.
+    """
+    specs = []
+    for spec in SUBAGENTS:
+        tier = spec.get("tier", LARGE)
+        middleware = ModelTierMiddleware(
+            spec["name"], small, large, tier=tier, writes=write_tools(spec)
+        )
+        specs.append({
+            **{key: value for key, value in spec.items() if key != "tier"},
+            "model": small if tier == SMALL else large,
+            "middleware": [*spec.get("middleware", []), middleware],
+        })
+    return specs
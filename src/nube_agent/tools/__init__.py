@@ -22,6 +22,8 @@ from nube_agent.tools.customers import (
     list_customers,
     update_customer,
 )
+from nube_agent.tools.digest import get_daily_digest
+from nube_agent.tools.export import export_data
 from nube_agent.tools.images import (
     add_image,
     delete_image,
@@ -47,28 +49,37 @@ from nube_agent.tools.products import (
     create_product,
     delete_product,
     get_product,
+    import_catalog,
     list_products,
     update_product,
 )
 from nube_agent.tools.store import get_store_info
+from nube_agent.tools.stores import query_stores
+from nube_agent.tools.undo import undo
 from nube_agent.tools.variants import (
     bulk_update_stock_price,
     create_variant,
     delete_variant,
     get_variant,
     list_variants,
+    set_variant_matrix,
     update_variant,
 )
 
 ALL_TOOLS = [
     # Store
     get_store_info,
+    query_stores,
+    export_data,
+    undo,
+    get_daily_digest,
     # Products
     list_products,
     get_product,
     create_product,
     update_product,
     delete_product,
+    import_catalog,
     # Categories
     list_categories,
     get_category,
@@ -82,6 +93,7 @@ ALL_TOOLS = [
     update_variant,
     delete_variant,
     bulk_update_stock_price,
+    set_variant_matrix,
     # Images
     list_images,
     add_image,
@@ -0,0 +1,20 @@
+from nube_agent.api import to_json
+from nube_agent.digest import current
+
+
+def get_daily_digest(refresh: bool = False) -> str:
+    """Read the precomputed daily digest of the store.
+
+    Use first for the usual start-of-day questions: yesterday's sales, paid
+    orders waiting to be shipped, low-stock variants and abandoned carts.
+    The digest is computed ahead of time, so this answers at once instead of
+    asking the subagents; it is computed now if yesterday's is missing.
+
+    Args:
+        refresh: Compute it again now, e.g. when the user wants stock or
+            pending shipments as of this moment.
+
+    Returns a JSON object with the day summarized, when it was computed and
+    the sales, to_ship, low_stock and abandoned sections.
+    """
+    return to_json(current(refresh=refresh))
@@ -0,0 +1,29 @@
+from nube_agent.api import to_json
+from nube_agent.export import FORMATS, RESOURCES, export_store
+
+
+def export_data(
+    resources: str = "", fmt: str = "csv", output_dir: str = "export", since: str = ""
+) -> str:
+    """Export store data to CSV or Parquet files on this computer.
+
+    Use when the user wants data in a file or spreadsheet rather than in the
+    chat. Products are written one row per variant and orders one row per line
+    item. Exporting again into the same directory resumes an interrupted export.
+
+    Args:
+        resources: Comma-separated: products, orders, customers, checkouts
+            (default: all of them).
+        fmt: "csv" (default) or "parquet".
+        output_dir: Directory for the files (default "export").
+        since: Only records created on or after this date, e.g. "2025-06-01".
+
+    Returns a JSON summary with the file and row count of each resource.
+    """
+    names = [r.strip() for r in resources.split(",") if r.strip()] or list(RESOURCES)
+    unknown = [r for r in names if r not in RESOURCES]
+    if unknown:
+        return f"Error: unknown resource {', '.join(unknown)}; use {', '.join(RESOURCES)}."
+    if fmt not in FORMATS:
+        return f"Error: fmt must be one of {', '.join(FORMATS)}."
+    return to_json(export_store(names, output_dir, fmt=fmt, since=since))
@@ -1,4 +1,5 @@
-from nube_agent.api import parse_json, request, store_language, to_json
+from nube_agent.api import parse_json, request, store_language, to_json, write_through
+from nube_agent.catalog_import import import_file, is_dry_run
 
 
 def list_products(page: int = 1, per_page: int = 10) -> str:
@@ -111,3 +112,36 @@ def delete_product(product_id: int) -> str:
     """
     result = request("DELETE", f"/products/{product_id}")
     return to_json(result)
+
+
+def import_catalog(file_path: str, dry_run: bool = True, concurrency: int = 4) -> str:
+    """Create or update many products at once from a local CSV or JSONL file.
+
+    Each row is one variant with: handle (groups the rows of one product),
+    name, description, published, attributes and values (lists, "|"-separated
+    in CSV, e.g. "Talla|Color" and "L|Rojo"), sku (required), price, stock,
+    weight, width, height, depth. Existing products are matched by SKU, then
+    by handle, and only changed fields are written. Rows follow the
+    create_variant rules: as many values as attributes.
+
+    Always run with dry_run=true first and show the user the plan and any
+    invalid rows, then run with dry_run=false; the import itself asks the
+    user for approval. An interrupted import resumes where it stopped when
+    run again.
+
+    Args:
+        file_path: Path of the CSV or JSONL file on this computer.
+        dry_run: Only validate and diff the file, without writing (default true).
+        concurrency: Products written at once (default 4).
+
+    Returns a JSON summary with counts of created, updated and unchanged
+    products and variants, and the first errors with their line numbers.
+    """
+    try:
+        with write_through():
+            summary = import_file(
+                file_path, concurrency=max(1, min(concurrency, 8)), dry_run=is_dry_run(dry_run)
+            )
+    except OSError as e:
+        return f"Error: cannot read {file_path}: {e}"
+    return to_json(summary)
@@ -0,0 +1,144 @@
+from decimal import Decimal, InvalidOperation
+from typing import Any
+
+from nube_agent import api
+from nube_agent.api import parse_json, request, to_json
+
+MAX_PAGES = 10
+PAGE_SIZE = 200
+ROWS_PER_STORE = 20
+
+
+def _fetch(path: str, params: dict, all_pages: bool) -> tuple[list, int] | str:
+    """GET ``path`` on the current store, following pages when asked."""
+    rows: list = []
+    pages = MAX_PAGES if all_pages else 1
+    for page in range(1, pages + 1):
+        query = {**params, "page": page} if all_pages else params
+        if all_pages:
+            query.setdefault("per_page", PAGE_SIZE)
+        result = request("GET", path, params=query)
+        if isinstance(result, str):
+            # Past the last page the API answers 404 "Last page is N".
+            if page > 1 and result.startswith("API error 404"):
+                return rows, page - 1
+            return result
+        if isinstance(result, dict):
+            return [result], 1
+        rows.extend(result)
+        if len(result) < int(query.get("per_page", PAGE_SIZE)):
+            return rows, page
+    return rows, pages
+
+
+def _flatten(rows: list, unnest: str) -> list:
+    flat = []
+    for row in rows:
+        for item in row.get(unnest) or []:
+            if isinstance(item, dict):
+                flat.append({**item, "parent_id": row.get("id")})
+    return flat
+
+
+def _matches(row: dict, where: dict) -> bool:
+    return all(str(row.get(field)) == str(value) for field, value in where.items())
+
+
+def _number(value: Any) -> Decimal:
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        return Decimal(0)
+
+
+def query_stores(
+    path: str,
+    filters_json: str = "{}",
+    store_ids: str = "",
+    all_pages: bool = False,
+    unnest: str = "",
+    where_json: str = "{}",
+    aggregate: str = "list",
+) -> str:
+    """Run the same read-only query against several stores at once and merge the results.
+
+    Args:
+        path: API path to GET on every store, e.g. "/orders" or "/products".
+        filters_json: JSON object of query parameters sent to each store.
+            Example: '{"created_at_min": "2025-06-01T00:00:00-03:00", "payment_status": "paid"}'
+        store_ids: Comma-separated store IDs (default: every configured store).
+        all_pages: Follow pagination (200 per page, up to 10 pages per store).
+        unnest: Replace each row with the items of this list field, e.g. "variants"
+            to check variant stock or SKUs. Each item gets the parent row's id as parent_id.
+        where_json: JSON object of exact-match conditions on row fields, applied
+            after unnest. Example: '{"sku": "RM-001", "stock": 0}'
+        aggregate: "list" (matching rows, up to 20 per store), "count", or
+            "sum:<field>" (e.g. "sum:total"; summed per currency when rows have one).
+
+    Returns a JSON object with a result per store, totals across the stores
+    that answered, and the stores that failed with their errors.
+    """
+    if not path.startswith("/"):
+        return "Error: path must start with '/', e.g. '/orders'."
+    filters = parse_json(filters_json, "filters_json")
+    if isinstance(filters, str):
+        return filters
+    where = parse_json(where_json, "where_json")
+    if isinstance(where, str):
+        return where
+    if not isinstance(filters, dict) or not isinstance(where, dict):
+        return "Error: filters_json and where_json must be JSON objects."
+    field = aggregate.removeprefix("sum:") if aggregate.startswith("sum:") else ""
+    if aggregate not in ("list", "count") and not field:
+        return "Error: aggregate must be 'list', 'count', or 'sum:<field>'."
+
+    clients, failed = [], {}
+    for store_id in [s.strip() for s in store_ids.split(",") if s.strip()] or [None]:
+        if store_id is None:
+            clients = api.stores()
+            break
+        try:
+            clients.append(api.get_store(store_id))
+        except KeyError as e:
+            failed[store_id] = str(e.args[0])
+
+    def run(_client) -> dict:
+        fetched = _fetch(path, dict(filters), all_pages)
+        if isinstance(fetched, str):
+            raise RuntimeError(fetched)
+        rows, pages = fetched
+        if unnest:
+            rows = _flatten(rows, unnest)
+        rows = [r for r in rows if isinstance(r, dict) and _matches(r, where)]
+        summary: dict[str, Any] = {"pages": pages, "count": len(rows)}
+        if field:
+            sums: dict[str, Decimal] = {}
+            for row in rows:
+                currency = row.get("currency") or ""
+                sums[currency] = sums.get(currency, Decimal(0)) + _number(row.get(field))
+            summary["sum"] = {currency: str(value) for currency, value in sums.items()}
+        elif aggregate == "list":
+            summary["rows"] = rows[:ROWS_PER_STORE]
+            summary["truncated"] = len(rows) > ROWS_PER_STORE
+        return summary
+
+    results: dict[str, Any] = {}
+    for store_id, outcome in api.fan_out(run, clients).items():
+        if isinstance(outcome, Exception):
+            failed[store_id] = str(outcome)
+        else:
+            results[store_id] = outcome
+
+    totals: dict[str, Any] = {"count": sum(r["count"] for r in results.values())}
+    if field:
+        sums: dict[str, Decimal] = {}
+        for result in results.values():
+            for currency, value in result["sum"].items():
+                sums[currency] = sums.get(currency, Decimal(0)) + Decimal(value)
+        totals["sum"] = {currency: str(value) for currency, value in sums.items()}
+    return to_json({
+        "stores": results,
+        "total": totals,
+        "succeeded": len(results),
+        "failed": failed,
+    })
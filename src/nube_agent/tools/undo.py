@@ -0,0 +1,22 @@
+from nube_agent.api import to_json
+from nube_agent.undo import undo as undo_writes
+
+
+def undo(run_id: str = "") -> str:
+    """Revert the last operation of this conversation, or every write of a batch run or import.
+
+    Use when the user asks to undo or roll back a change. Without run_id,
+    reverts the writes of the most recent request of this conversation that
+    changed the store (which may be an earlier one, if the last changed
+    nothing). Changes made in other conversations are never reverted.
+    Edits are put back, created resources deleted, deleted resources created
+    again with a new id and closed or opened orders reopened or closed.
+    Cancelled orders cannot be restored.
+
+    Args:
+        run_id: The run id of a batch run or catalog import to undo (default: the
+            last operation).
+
+    Returns a JSON summary with the writes reverted, skipped and failed.
+    """
+    return to_json(undo_writes(run_id.strip()))
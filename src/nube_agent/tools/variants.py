@@ -1,4 +1,15 @@
-from nube_agent.api import parse_json, request, to_json
+import contextvars
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+from nube_agent.api import parse_json, request, store_language, to_json, write_through
+
+# Requests sent at once by set_variant_matrix.
+MATRIX_WORKERS = 4
+# Largest matrix set_variant_matrix will build.
+MAX_VARIANTS = 1000
+# Fields new matrix variants copy from an existing variant.
+TEMPLATE_FIELDS = ("price", "promotional_price", "weight", "width", "height", "depth")
 
 
 def list_variants(product_id: int) -> str:
@@ -115,6 +126,140 @@ def bulk_update_stock_price(product_id: int, updates_json: str) -> str:
             results.append({"error": "Missing 'variant_id' in item", "item": item})
             continue
         body = {k: v for k, v in item.items() if k != "variant_id"}
-        resp = request("PUT", f"/products/{product_id}/variants/{vid}", json_body=body)
+        with write_through():
+            resp = request("PUT", f"/products/{product_id}/variants/{vid}", json_body=body)
         results.append({"variant_id": vid, "result": resp})
     return to_json(results)
+
+
+def _text(value, lang: str) -> str:
+    if isinstance(value, dict):
+        return str(value.get(lang) or next((v for v in value.values() if v), ""))
+    return "" if value is None else str(value)
+
+
+def _concurrently(calls: list[tuple[str, str, dict | None]]) -> list:
+    """Send ``(method, path, body)`` requests at once; results in the same order."""
+    if not calls:
+        return []
+    with ThreadPoolExecutor(max_workers=min(MATRIX_WORKERS, len(calls))) as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, request, method, path, json_body=body)
+            for method, path, body in calls
+        ]
+        return [future.result() for future in futures]
+
+
+def set_variant_matrix(product_id: int, options_json: str, defaults_json: str = "") -> str:
+    """Set a product's options and create every combination as a variant, in one call.
+
+    Use this instead of the 3-step process (attributes, existing variant
+    values, new variants) to add, change or remove options. The product ends
+    up with exactly one variant per combination of the given options:
+    existing variants keep their id, price, stock and SKU and get their
+    values updated, missing combinations are created, and variants whose
+    values are no longer offered are deleted.
+
+    Args:
+        product_id: The numeric product ID.
+        options_json: JSON object of attribute name to list of values, in order
+            (at most 3 attributes). Example: '{"Talla": ["S", "M", "L"], "Color": ["Rojo"]}'
+            Existing variants get the first value of an attribute they did not have.
+            '{}' removes all options and keeps a single variant.
+        defaults_json: Optional JSON object of fields for new variants, e.g.
+            '{"price": "150.00", "stock": 5}'. Otherwise new variants copy price,
+            weight and dimensions from an existing variant and start with stock 0.
+
+    Returns a JSON summary of the variants kept, updated, created and deleted.
+    """
+    options = parse_json(options_json, "options_json")
+    if isinstance(options, str):
+        return options
+    defaults = parse_json(defaults_json or "{}", "defaults_json")
+    if isinstance(defaults, str):
+        return defaults
+    if not isinstance(options, dict) or not isinstance(defaults, dict):
+        return "Error: options_json and defaults_json must be JSON objects."
+    if len(options) > 3:
+        return "Error: a product can have at most 3 attributes."
+    names = [str(name).strip() for name in options]
+    lists = []
+    for name, values in options.items():
+        if not isinstance(values, list) or not values:
+            return f"Error: '{name}' needs a non-empty list of values."
+        values = [str(v).strip() for v in values]
+        if len({v.casefold() for v in values}) != len(values):
+            return f"Error: '{name}' has repeated values."
+        lists.append(values)
+    combos = list(itertools.product(*lists))
+    if len(combos) > MAX_VARIANTS:
+        return f"Error: {len(combos)} combinations; the limit is {MAX_VARIANTS}."
+
+    product = request("GET", f"/products/{product_id}")
+    if isinstance(product, str):
+        return product
+    lang = store_language()
+    old_names = [_text(a, lang) for a in product.get("attributes") or []]
+    variants = product.get("variants") or []
+
+    # Where each new attribute's value comes from in the old values, if anywhere.
+    folded = [n.casefold() for n in old_names]
+    sources = [folded.index(n.casefold()) if n.casefold() in folded else None for n in names]
+    wanted = {tuple(v.casefold() for v in combo): combo for combo in combos}
+    kept: dict[tuple, dict] = {}
+    updates, deletes = [], []
+    for variant in variants:
+        old = [_text(v, lang) for v in variant.get("values") or []]
+        values = tuple(
+            old[i] if i is not None and i < len(old) else lists[pos][0]
+            for pos, i in enumerate(sources)
+        )
+        key = tuple(v.casefold() for v in values)
+        if key not in wanted or key in kept:
+            deletes.append(variant)
+            continue
+        kept[key] = variant
+        combo = wanted[key]
+        if list(combo) != old:
+            updates.append((variant, combo))
+    creates = [combo for key, combo in wanted.items() if key not in kept]
+    if not kept and deletes:
+        # Keep one variant so the product is never left without any.
+        variant = deletes.pop(0)
+        kept[tuple(v.casefold() for v in creates[0])] = variant
+        updates.append((variant, creates.pop(0)))
+
+    template = next(iter(kept.values()), {})
+    base = {f: template[f] for f in TEMPLATE_FIELDS if template.get(f) is not None}
+    base = {**base, "stock": 0, **defaults}
+    result: dict = {"product_id": product_id, "attributes": names, "kept": len(kept)}
+
+    phases = [
+        ("updated", [("PUT", f"/products/{product_id}/variants/{v['id']}",
+                      {"values": [{lang: x} for x in combo]}) for v, combo in updates]),
+        ("created", [("POST", f"/products/{product_id}/variants",
+                      {**base, "values": [{lang: x} for x in combo]}) for combo in creates]),
+        ("deleted", [("DELETE", f"/products/{product_id}/variants/{v['id']}", None)
+                     for v in deletes]),
+    ]
+    # Each phase needs the one before it applied: send writes right away.
+    with write_through():
+        if names != old_names:
+            changed = request(
+                "PUT", f"/products/{product_id}",
+                json_body={"attributes": [{lang: n} for n in names]},
+            )
+            if isinstance(changed, str):
+                return to_json({**result, "error": f"Attributes not updated: {changed}"})
+        for label, calls in phases:
+            responses = _concurrently(calls)
+            errors = [
+                {"request": f"{method} {path}", "error": response}
+                for (method, path, _), response in zip(calls, responses, strict=True)
+                if isinstance(response, str)
+            ]
+            result[label] = len(calls) - len(errors)
+            if errors:
+                # Later phases depend on this one (values before creates, creates before deletes).
+                return to_json({**result, "errors": errors})
+    return to_json(result)
@@ -0,0 +1,163 @@
+"""Undo the writes of the last operation or of a batch run.
+
+Every journaled write (see ``journal.py``) keeps a snapshot of its resource
+from before the write.  ``/undo`` in the CLI and the supervisor's ``undo``
+tool revert the writes of the most recent scope with writes that were not
+undone yet (a CLI or server turn, an import), or of every item of a batch
+run or import.  Without a run id, only the caller's own session is searched: the
+scopes sharing its journal scope up to the last ``:`` (``cli:<thread>:``,
+``server:<thread>:<nonce>:``, ``batch:<run>:``), so one session's undo never
+reverts another's writes.  Each write is reverted with its inverse request:
+
+- ``PUT``: the fields it sent are put back to their previous values.
+- ``POST`` that created a product, category, coupon, page, customer,
+  variant or image: the created resource is deleted.
+- ``DELETE``: the resource is created again from its snapshot (with a new
+  id; orders and references to the old id are not restored).
+- ``POST /orders/{id}/close`` and ``/open``: the opposite action.  Other
+  order actions (``cancel``) cannot be undone and are skipped.
+
+Writes are grouped by resource: the groups are reverted concurrently and
+the writes of each group newest first, so a resource edited several times
+ends up as it was before the first edit.  Undo requests are journaled under
+an ``undo:`` scope (not undoable themselves) and each reverted write is
+marked undone, so running undo again after a partial failure only retries
+what is left.
+"""
+
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from nube_agent import api
+from nube_agent.journal import WriteJournal, get_journal, resource
+
+# Resources reverted at once.
+UNDO_WORKERS = 4
+# Collections whose POST creates a resource, by path segments.
+CREATED_COLLECTIONS = frozenset({"variants", "images"})
+INVERSE_ACTIONS = {"close": "open", "open": "close"}
+# Fields of a snapshot the API sets itself; dropped when recreating it.
+READ_ONLY_FIELDS = frozenset({"id", "created_at", "updated_at", "product_id", "image_id"})
+
+
+def _writable(value: Any) -> Any:
+    """A snapshot without its read-only fields, for creating the resource again."""
+    if isinstance(value, dict):
+        return {k: _writable(v) for k, v in value.items() if k not in READ_ONLY_FIELDS}
+    if isinstance(value, list):
+        return [_writable(v) for v in value]
+    return value
+
+
+def inverse(snapshot: dict) -> tuple[str, str, dict | None] | str:
+    """The ``(method, path, body)`` request reverting a write, or why it cannot be."""
+    method, path = snapshot["method"], snapshot["path"]
+    before, after = snapshot["before"], snapshot["after"]
+    parts = path.strip("/").split("/")
+    if method == "PUT":
+        if not isinstance(before, dict) or not isinstance(snapshot["body"], dict):
+            return "no snapshot of the resource before the change"
+        return "PUT", path, {field: before.get(field) for field in snapshot["body"]}
+    if method == "DELETE":
+        if not isinstance(before, dict):
+            return "no snapshot of the deleted resource"
+        return "POST", "/" + "/".join(parts[:-1]), _writable(before)
+    if len(parts) == 1 or (len(parts) == 3 and parts[2] in CREATED_COLLECTIONS):
+        if not isinstance(after, dict) or "id" not in after:
+            return "the id of the created resource is unknown"
+        return "DELETE", f"{path}/{after['id']}", None
+    if parts[0] == "orders" and len(parts) == 3 and parts[2] in INVERSE_ACTIONS:
+        return "POST", f"/orders/{parts[1]}/{INVERSE_ACTIONS[parts[2]]}", None
+    return f"{method} {path} cannot be undone"
+
+
+def session_prefix(scope: str | None) -> str:
+    """The session part of a journal scope: everything up to its last ``:``."""
+    return scope[: scope.rfind(":") + 1] if scope else ""
+
+
+def _target(journal: WriteJournal, store_id: str, run_id: str, session: str) -> str | None:
+    """The scope to undo: a batch run's items or an import, or the session's
+    last scope with writes."""
+    if run_id:
+        imported = f"import:{run_id}"
+        if journal.last_scope(store_id, imported) == imported:
+            return imported
+        return f"batch:{run_id}:"
+    return journal.last_scope(store_id, session)
+
+
+def plan(run_id: str = "", session: str | None = None) -> dict[str, Any] | str:
+    """The writes undo would revert in the current store, without sending anything.
+
+    ``session`` is the scope prefix to search; by default the one of the
+    current journal scope (see :func:`session_prefix`).
+    """
+    journal = api.current_store().journal or get_journal()
+    if journal is None:
+        return "Error: the write journal is off (NUBE_AGENT_JOURNAL is empty); nothing to undo."
+    store_id = api.current_store().store_id
+    if session is None:
+        session = session_prefix(api.current_journal_scope())
+    scope = _target(journal, store_id, run_id, session)
+    snapshots = journal.snapshots(store_id, scope) if scope else []
+    if not snapshots:
+        what = f"run {run_id}" if run_id else "this session" if session else "this store"
+        return f"Error: no writes to undo for {what}."
+    return {"scope": scope, "journal": journal, "snapshots": snapshots}
+
+
+def _revert(journal: WriteJournal, group: list[dict]) -> list[dict]:
+    """Revert the writes of one resource, newest first."""
+    outcomes = []
+    for snapshot in reversed(group):
+        outcome = {"write": f"{snapshot['method']} {snapshot['path']}"}
+        step = inverse(snapshot)
+        if isinstance(step, str):
+            outcomes.append({**outcome, "status": "skipped", "reason": step})
+            continue
+        method, path, body = step
+        outcome["undo"] = f"{method} {path}"
+        result = api.request(method, path, json_body=body)
+        # A created resource that is already gone needs no undo.
+        if isinstance(result, str) and not (
+            method == "DELETE" and result.startswith("API error 404")
+        ):
+            outcomes.append({**outcome, "status": "failed", "error": result})
+            continue
+        journal.mark_undone([snapshot["id"]])
+        if method == "POST" and snapshot["method"] == "DELETE" and isinstance(result, dict):
+            outcome["new_id"] = result.get("id")
+        outcomes.append({**outcome, "status": "reverted"})
+    return outcomes
+
+
+def undo(run_id: str = "", session: str | None = None) -> dict[str, Any] | str:
+    """Revert the session's last operation in the current store, or batch run ``run_id``."""
+    target = plan(run_id, session)
+    if isinstance(target, str):
+        return target
+    journal, scope = target["journal"], target["scope"]
+    groups: dict[str, list[dict]] = {}
+    for snapshot in target["snapshots"]:
+        groups.setdefault(resource(snapshot["path"]), []).append(snapshot)
+    with api.journal_scope(f"{api.UNDO_SCOPE}{scope}"), api.write_through():
+        with ThreadPoolExecutor(max_workers=min(UNDO_WORKERS, len(groups))) as pool:
+            futures = [
+                pool.submit(contextvars.copy_context().run, _revert, journal, group)
+                for group in groups.values()
+            ]
+            outcomes = [outcome for future in futures for outcome in future.result()]
+    counts = {
+        status: sum(1 for o in outcomes if o["status"] == status)
+        for status in ("reverted", "skipped", "failed")
+    }
+    return {"scope": scope, **counts, "writes": outcomes}
+
+
+def format_summary(summary: dict[str, Any]) -> str:
+    return (
+        f"{summary['reverted']} writes reverted, {summary['skipped']} skipped, "
+        f"{summary['failed']} failed ({summary['scope']})"
+    )
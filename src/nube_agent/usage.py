@@ -0,0 +1,171 @@
+"""Token and cost accounting.
+
+:class:`UsageTracker` is a LangChain callback handler that reads the
+``usage_metadata`` of every model call and attributes it to the agent that
+made it (``supervisor`` or a subagent name from ``SUBAGENTS``) and to the
+model, with the time spent in the call, so model tiers can be compared on
+latency and cost.  Each call's share of cached input tokens (provider-side
+prompt caching) is kept for a per-call report.  Tool outputs are attributed
+to the tool that produced them by size, since they become input tokens of
+the next model call.  Totals are kept per
+turn and per session for ``/usage``.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from nube_agent.telemetry import agent_name, output_text
+
+# USD per 1M tokens: (input, cached input, output).
+PRICES: dict[str, tuple[float, float, float]] = {
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+}
+
+# Rough characters-per-token ratio used to size tool outputs.
+CHARS_PER_TOKEN = 4
+# Model calls kept for the per-call cache report.
+MAX_CALLS = 200
+
+
+def model_price(model: str) -> tuple[float, float, float] | None:
+    """Per-1M-token prices for ``model`` (``provider:`` prefix and date suffix ignored)."""
+    name = model.split(":")[-1]
+    for known in sorted(PRICES, key=len, reverse=True):
+        if name == known or name.startswith(f"{known}-20"):
+            return PRICES[known]
+    return None
+
+
+def cost(model: str, input_tokens: int, cached_tokens: int, output_tokens: int) -> float:
+    """USD cost of one call; 0.0 for models without a known price."""
+    price = model_price(model)
+    if price is None:
+        return 0.0
+    fresh = max(0, input_tokens - cached_tokens)
+    return (fresh * price[0] + cached_tokens * price[1] + output_tokens * price[2]) / 1_000_000
+
+
+def cached_ratio(input_tokens: int, cached_tokens: int) -> float:
+    """Share of ``input_tokens`` served from the provider's prompt cache."""
+    return cached_tokens / input_tokens if input_tokens else 0.0
+
+
+def _empty() -> dict[str, Any]:
+    return {"calls": 0, "input": 0, "cached": 0, "output": 0, "cost": 0.0, "ms": 0.0}
+
+
+class UsageTotals:
+    """Token totals grouped by agent, by model, and by tool."""
+
+    def __init__(self) -> None:
+        self.agents: dict[str, dict[str, Any]] = {}
+        self.models: dict[str, dict[str, Any]] = {}
+        self.tools: dict[str, dict[str, int]] = {}
+        self.calls: deque[dict[str, Any]] = deque(maxlen=MAX_CALLS)
+
+    def add_model_call(
+        self,
+        agent: str,
+        model: str,
+        input_tokens: int,
+        cached: int,
+        output_tokens: int,
+        ms: float = 0.0,
+    ) -> None:
+        call_cost = cost(model, input_tokens, cached, output_tokens)
+        self.calls.append({"agent": agent, "model": model, "input": input_tokens,
+                           "cached": cached, "ratio": cached_ratio(input_tokens, cached)})
+        for bucket in (self.agents.setdefault(agent, _empty()),
+                       self.models.setdefault(model, _empty())):
+            bucket["calls"] += 1
+            bucket["input"] += input_tokens
+            bucket["cached"] += cached
+            bucket["output"] += output_tokens
+            bucket["cost"] += call_cost
+            bucket["ms"] += ms
+
+    def add_tool_output(self, tool: str, chars: int) -> None:
+        entry = self.tools.setdefault(tool, {"calls": 0, "chars": 0, "tokens": 0})
+        entry["calls"] += 1
+        entry["chars"] += chars
+        entry["tokens"] += -(-chars // CHARS_PER_TOKEN)
+
+    def total(self) -> dict[str, Any]:
+        result = _empty()
+        for bucket in self.agents.values():
+            for key in result:
+                result[key] += bucket[key]
+        return result
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "total": self.total(),
+            "agents": self.agents,
+            "models": self.models,
+            "tools": self.tools,
+        }
+
+
+class UsageTracker(BaseCallbackHandler):
+    """Collects model usage and tool-output sizes for the turn and the session.
+
+    Call :meth:`start_turn` before each user turn; ``turn`` then holds that
+    turn's totals and ``session`` keeps accumulating.
+    """
+
+    def __init__(self) -> None:
+        self.turn = UsageTotals()
+        self.session = UsageTotals()
+        self._runs: dict[Any, tuple[str, str]] = {}
+        self._started: dict[Any, float] = {}
+        self._lock = threading.Lock()
+
+    def start_turn(self) -> None:
+        with self._lock:
+            self.turn = UsageTotals()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        metadata = metadata or {}
+        model = metadata.get("ls_model_name") or (serialized or {}).get("name") or "unknown"
+        self._runs[run_id] = (agent_name(metadata), model)
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        agent, model = self._runs.pop(run_id, (agent_name(None), "unknown"))
+        started = self._started.pop(run_id, None)
+        ms = (time.perf_counter() - started) * 1000 if started is not None else 0.0
+        try:
+            usage = response.generations[0][0].message.usage_metadata or {}
+        except (AttributeError, IndexError):
+            usage = {}
+        input_tokens = usage.get("input_tokens", 0)
+        output_tokens = usage.get("output_tokens", 0)
+        cached = (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+        with self._lock:
+            for totals in (self.turn, self.session):
+                totals.add_model_call(agent, model, input_tokens, cached, output_tokens, ms)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._runs.pop(run_id, None)
+        self._started.pop(run_id, None)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._runs[run_id] = ((serialized or {}).get("name", "tool"), "")
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        tool, _ = self._runs.pop(run_id, ("tool", ""))
+        chars = len(output_text(output))
+        with self._lock:
+            for totals in (self.turn, self.session):
+                totals.add_tool_output(tool, chars)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._runs.pop(run_id, None)
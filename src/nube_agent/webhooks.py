@@ -0,0 +1,321 @@
+"""Webhook receiver that keeps the local API caches fresh.
+
+Each store's GET cache (see :class:`~nube_agent.api.ResponseCache`) only
+sees the writes made through this process; a change in the admin panel is
+read back only once the cached response expires.  ``nube-agent serve
+--webhook-url URL`` subscribes every store to the product, category, order
+and customer events at ``URL`` (the public address of the server's
+``/webhooks`` path) and caches those families for ``WEBHOOK_CACHE_TTL``
+instead of the short default.  Each delivery:
+
+- is checked against the ``x-linkedstore-hmac-sha256`` signature when
+  ``TIENDANUBE_CLIENT_SECRET`` is set;
+- drops the cached responses of the changed resource (and what is nested
+  under it) and the family's listings, and bumps the family's version, so
+  cached answers built from it are discarded too.  Other resources of the
+  family stay cached;
+- with ``--webhook-refresh``, fetches the changed resource again in the
+  background, so the next read is served locally.  Refreshes of the same
+  resource that are still queued are merged;
+- is appended to an event log (``NUBE_AGENT_WEBHOOK_LOG``) under a sequence
+  number.
+
+``GET /webhooks/events?since=N`` returns the logged events after ``N`` for
+other processes to catch up, and ``POST /webhooks/replay`` (``{"since": N}``)
+applies them again, once per resource, e.g. after the API was down while
+refreshing.  Both need the server's bearer token.  Deliveries are recorded
+as ``webhook`` spans.
+"""
+
+import asyncio
+import contextvars
+import hashlib
+import hmac
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+from urllib.parse import parse_qs
+
+from nube_agent import api, telemetry
+from nube_agent.config import TIENDANUBE_CLIENT_SECRET, WEBHOOK_LOG
+from nube_agent.server import MAX_BODY_BYTES, AgentServer, HTTPError
+
+# Events subscribed to, by the cache family they change.
+EVENTS = {
+    "products": ("product/created", "product/updated", "product/deleted"),
+    "categories": ("category/created", "category/updated", "category/deleted"),
+    "orders": (
+        "order/created", "order/updated", "order/paid", "order/packed",
+        "order/fulfilled", "order/cancelled",
+    ),
+    "customers": ("customer/created", "customer/updated", "customer/deleted"),
+}
+FAMILIES = {events[0].split("/")[0]: family for family, events in EVENTS.items()}
+SIGNATURE_HEADER = b"x-linkedstore-hmac-sha256"
+# Events kept in memory and, after compaction, in the log file.
+MAX_EVENTS = 1000
+# Resources fetched again at once after their webhooks.
+REFRESH_WORKERS = 4
+# Subscriptions created at once when registering.
+REGISTER_WORKERS = 4
+
+
+def sign(body: bytes, secret: str) -> str:
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+class EventLog:
+    """Numbered webhook events, the last ``max_events`` in memory, appended to a JSONL file."""
+
+    def __init__(self, path: str = WEBHOOK_LOG, max_events: int = MAX_EVENTS) -> None:
+        self.path = str(Path(path).expanduser()) if path else ""
+        self.max_events = max_events
+        self._events: deque[dict] = deque(maxlen=max_events)
+        self._lines = 0
+        self._lock = threading.Lock()
+        self.last_seq = 0
+        if self.path and Path(self.path).exists():
+            with open(self.path, encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self._events.append(event)
+                    self._lines += 1
+            self.last_seq = self._events[-1]["seq"] if self._events else 0
+
+    def append(self, event: dict) -> dict:
+        with self._lock:
+            self.last_seq += 1
+            event = {"seq": self.last_seq, "received": time.time(), **event}
+            self._events.append(event)
+            if self.path:
+                if self._lines >= 2 * self.max_events:
+                    self._compact()
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as fh:
+                    fh.write(json.dumps(event, ensure_ascii=False) + "\n")
+                self._lines += 1
+        return event
+
+    def _compact(self) -> None:
+        """Rewrite the file with the events still in memory (call with the lock held)."""
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            for event in self._events:
+                fh.write(json.dumps(event, ensure_ascii=False) + "\n")
+        Path(tmp).replace(self.path)
+        self._lines = len(self._events)
+
+    def since(self, seq: int = 0) -> list[dict]:
+        """Logged events after ``seq``, oldest first."""
+        with self._lock:
+            return [event for event in self._events if event["seq"] > seq]
+
+
+class WebhookReceiver:
+    """ASGI app receiving Tiendanube webhooks and applying them to the store caches.
+
+    ``secret`` (default: ``TIENDANUBE_CLIENT_SECRET``), when set, is required
+    to sign deliveries; ``token``, when set, is required as a bearer token
+    for the events and replay endpoints.
+    """
+
+    def __init__(
+        self,
+        *,
+        secret: str = TIENDANUBE_CLIENT_SECRET,
+        token: str = "",
+        log: EventLog | None = None,
+        refresh: bool = False,
+    ) -> None:
+        self.secret = secret
+        self.token = token
+        self.log = log if log is not None else EventLog()
+        self.refresh = refresh
+        self.counts = {"received": 0, "applied": 0, "ignored": 0, "rejected": 0, "refreshed": 0}
+        self._queued: set[tuple[str, str]] = set()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=REFRESH_WORKERS, thread_name_prefix="webhook")
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counts[name] += 1
+
+    # -- applying events -------------------------------------------------
+
+    def apply(self, event: dict) -> str:
+        """Invalidate (and maybe refresh) what ``event`` changed: ``applied`` or ``ignored``."""
+        started = time.perf_counter()
+        name = str(event.get("event", ""))
+        family = FAMILIES.get(name.split("/")[0])
+        resource_id = event.get("id")
+        if family is None or resource_id is None or event.get("store_id") is None:
+            self._count("ignored")
+            return "ignored"
+        try:
+            client = api.get_store(event["store_id"])
+        except KeyError:
+            self._count("ignored")
+            return "ignored"
+        path = f"/{family}/{resource_id}"
+        dropped = client.cache.invalidate(family, path)
+        refresh = (
+            self.refresh and not name.endswith("/deleted") and client.cache.ttl_for(path) > 0
+        )
+        if refresh:
+            self._schedule(client, path)
+        self._count("applied")
+        telemetry.TRACER.record(telemetry.make_span(
+            "webhook", name, started, store=client.store_id, id=resource_id,
+            dropped=dropped, refresh=refresh,
+        ))
+        return "applied"
+
+    def _schedule(self, client: api.StoreClient, path: str) -> None:
+        key = (client.store_id, path)
+        with self._lock:
+            if key in self._queued:
+                return
+            self._queued.add(key)
+        self._pool.submit(contextvars.copy_context().run, self._refresh, client, path)
+
+    def _refresh(self, client: api.StoreClient, path: str) -> None:
+        with self._lock:
+            self._queued.discard((client.store_id, path))
+        if not isinstance(client.request("GET", path), str):
+            self._count("refreshed")
+
+    def receive(self, body: bytes, signature: str = "") -> dict:
+        """Check, log and apply one delivery. Raises :class:`HTTPError` for bad ones."""
+        self._count("received")
+        if self.secret and not hmac.compare_digest(signature, sign(body, self.secret)):
+            self._count("rejected")
+            raise HTTPError(401, "Invalid webhook signature.")
+        try:
+            payload = json.loads(body)
+        except json.JSONDecodeError as e:
+            self._count("rejected")
+            raise HTTPError(400, f"Invalid JSON: {e}") from None
+        if not isinstance(payload, dict):
+            self._count("rejected")
+            raise HTTPError(400, "Body must be a JSON object.")
+        event = self.log.append({
+            "store_id": payload.get("store_id"),
+            "event": payload.get("event"),
+            "id": payload.get("id"),
+        })
+        return {"seq": event["seq"], "status": self.apply(event)}
+
+    def replay(self, since: int = 0) -> int:
+        """Apply the logged events after ``since`` again, the last one per resource."""
+        latest: dict[tuple, dict] = {}
+        for event in self.log.since(since):
+            key = (event.get("store_id"), str(event.get("event", "")).split("/")[0],
+                   event.get("id"))
+            latest.pop(key, None)
+            latest[key] = event
+        return sum(self.apply(event) == "applied" for event in latest.values())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self.counts, "last_seq": self.log.last_seq, "queued": len(self._queued)}
+
+    # -- ASGI ------------------------------------------------------------
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            return
+        try:
+            await self._dispatch(scope, receive, send)
+        except HTTPError as e:
+            await AgentServer._json(send, e.status, {"error": e.message})
+
+    async def _dispatch(self, scope, receive, send) -> None:
+        method, path = scope["method"], scope["path"].rstrip("/") or "/"
+        headers = dict(scope.get("headers") or [])
+        run = asyncio.get_running_loop().run_in_executor
+        if path == "/webhooks" and method == "POST":
+            body = await _read(receive)
+            signature = headers.get(SIGNATURE_HEADER, b"").decode("latin-1")
+            await AgentServer._json(send, 200, await run(None, self.receive, body, signature))
+            return
+        if self.token and not hmac.compare_digest(
+            headers.get(b"authorization", b""), f"Bearer {self.token}".encode()
+        ):
+            raise HTTPError(401, "Missing or invalid bearer token.")
+        if path == "/webhooks/events" and method == "GET":
+            query = parse_qs(scope.get("query_string", b"").decode())
+            since = _since(query.get("since", ["0"])[0])
+            await AgentServer._json(send, 200, {
+                "last_seq": self.log.last_seq, "events": self.log.since(since),
+            })
+        elif path == "/webhooks/replay" and method == "POST":
+            body = await _read(receive)
+            try:
+                payload = json.loads(body) if body else {}
+            except json.JSONDecodeError as e:
+                raise HTTPError(400, f"Invalid JSON: {e}") from None
+            since = _since(payload.get("since", 0) if isinstance(payload, dict) else 0)
+            await AgentServer._json(send, 200, {"replayed": await run(None, self.replay, since)})
+        else:
+            raise HTTPError(404, f"Not found: {method} {path}")
+
+
+async def _read(receive) -> bytes:
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise HTTPError(413, "Request body too large.")
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+def _since(value: Any) -> int:
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        raise HTTPError(400, "'since' must be a sequence number.") from None
+
+
+def register(url: str, families: tuple[str, ...] = tuple(EVENTS)) -> dict[str, Any]:
+    """Subscribe the current store to the events of ``families`` at ``url``.
+
+    Subscriptions that already exist are kept; returns the events registered
+    now, those already registered and any errors.
+    """
+    store_id = api.current_store().store_id
+    current = api.request("GET", "/webhooks")
+    if isinstance(current, str):
+        return {"store_id": store_id, "registered": [], "existing": [], "errors": [current]}
+    have = {hook.get("event") for hook in current if hook.get("url") == url}
+    wanted = [event for family in families for event in EVENTS[family]]
+    missing = [event for event in wanted if event not in have]
+    results = []
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(REGISTER_WORKERS, len(missing))) as pool:
+            futures = [
+                pool.submit(contextvars.copy_context().run, api.request, "POST", "/webhooks",
+                            json_body={"event": event, "url": url})
+                for event in missing
+            ]
+            results = [future.result() for future in futures]
+    sent = list(zip(missing, results, strict=True))
+    return {
+        "store_id": store_id,
+        "registered": [event for event, result in sent if not isinstance(result, str)],
+        "existing": [event for event in wanted if event in have],
+        "errors": [f"{event}: {result}" for event, result in sent if isinstance(result, str)],
+    }
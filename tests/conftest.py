@@ -1,6 +1,21 @@
 import os
 
+import pytest
+
 # Set test defaults for required environment variables
 os.environ.setdefault("OPENAI_API_KEY", "sk-test-key")
 os.environ.setdefault("TIENDANUBE_ACCESS_TOKEN", "test-token")
 os.environ.setdefault("TIENDANUBE_STORE_ID", "12345")
+# No journal, webhook log or digest files and no backoff sleeps unless a test asks for them
+os.environ.setdefault("NUBE_AGENT_JOURNAL", "")
+os.environ.setdefault("NUBE_AGENT_WEBHOOK_LOG", "")
+os.environ.setdefault("NUBE_AGENT_DIGEST_DIR", "")
+os.environ.setdefault("NUBE_AGENT_RETRY_BACKOFF", "0")
+
+
+@pytest.fixture(autouse=True)
+def _closed_circuits():
+    """Start every test with the default store's endpoint failures forgotten."""
+    from nube_agent import api
+
+    api.default_store().breakers.clear()
@@ -1,4 +1,8 @@
+import time
+
 from nube_agent.agent import build_agent
+from nube_agent.fake_model import ScriptedChatModel
+from nube_agent.prompts import load_system_prompt
 
 
 class TestBuildAgent:
@@ -7,3 +11,35 @@ class TestBuildAgent:
         # The agent should be a compiled state graph with an invoke method
         assert callable(getattr(agent, "invoke", None))
         assert callable(getattr(agent, "stream", None))
+
+
+class TestParallelDispatch:
+    def test_prompt_asks_for_parallel_tasks(self):
+        assert "IN THE SAME RESPONSE" in load_system_prompt()
+
+    def test_task_calls_in_one_message_run_concurrently(self):
+        names = ("order-manager", "catalog-manager", "marketing-manager")
+        model = ScriptedChatModel()
+        model.load({
+            "supervisor": [
+                {"tool_calls": [
+                    {"name": "task", "args": {"subagent_type": name, "description": "x"}}
+                    for name in names
+                ]},
+                {"content": "merged"},
+            ],
+            **{name: [{"content": name, "latency": 0.3}] for name in names},
+        })
+        agent = build_agent(model=model)
+
+        started = time.perf_counter()
+        result = agent.invoke(
+            {"messages": [{"role": "user", "content": "hi"}]},
+            {"configurable": {"thread_id": "parallel"}},
+        )
+        elapsed = time.perf_counter() - started
+
+        assert elapsed < 0.8  # three 0.3 s subagents one after another take 0.9 s
+        tool_results = [m.content for m in result["messages"] if m.type == "tool"]
+        assert sorted(tool_results) == sorted(names)
+        assert result["messages"][-1].content == "merged"
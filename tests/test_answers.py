@@ -0,0 +1,124 @@
+import time
+
+import respx
+from langchain_core.messages import AIMessageChunk
+
+from nube_agent import api
+from nube_agent.agent import build_agent
+from nube_agent.answers import AnswerCache, CachedAgent, normalize
+from nube_agent.config import BASE_URL
+from nube_agent.fake_model import ScriptedChatModel
+
+QUESTION = "How many orders are pending payment?"
+
+
+def _script() -> dict:
+    return {
+        "supervisor": [
+            {"tool_calls": [{"name": "task", "args": {
+                "subagent_type": "order-manager", "description": "Count pending orders"}}]},
+            {"content": "You have 2 orders pending payment."},
+        ],
+        "order-manager": [
+            {"tool_calls": [{"name": "list_orders", "args": {"payment_status": "pending"}}]},
+            {"content": "2 orders"},
+        ],
+    }
+
+
+def _ask(agent, text: str, thread: str = "t") -> str:
+    config = {"configurable": {"thread_id": thread}}
+    result = agent.invoke({"messages": [{"role": "user", "content": text}]}, config)
+    return result["messages"][-1].content
+
+
+class TestNormalize:
+    def test_drops_filler_case_and_accents(self):
+        assert normalize("Please, how many orders are PENDING payment?") == normalize(QUESTION)
+        assert normalize("¿Cuántos pedidos hay?") == normalize("cuantos pedidos")
+
+    def test_conversation_references_are_not_cached(self):
+        assert normalize("Cancel that one") is None
+        assert normalize("Mostrame eso de nuevo") is None
+        assert normalize("???") is None
+
+
+class TestAnswerCache:
+    def setup_method(self):
+        api.default_store().reset()
+
+    def test_expires(self):
+        cache = AnswerCache(ttl=0.05)
+        key = AnswerCache.key(QUESTION, "12345")
+        cache.put(key, "2 orders", {})
+        assert cache.get(key) == "2 orders"
+        time.sleep(0.06)
+        assert cache.get(key) is None
+
+    def test_write_to_family_invalidates(self):
+        store = api.default_store()
+        cache = AnswerCache(ttl=60)
+        key = AnswerCache.key(QUESTION, store.store_id)
+        cache.put(key, "2 orders", {(store.store_id, "orders"): store.cache.version("orders")})
+        store.cache.invalidate("products")
+        assert cache.get(key) == "2 orders"
+        store.cache.invalidate("orders")
+        assert cache.get(key) is None
+
+    def test_keyed_by_store(self):
+        assert AnswerCache.key(QUESTION, "1") != AnswerCache.key(QUESTION, "2")
+
+
+class TestCachedAgent:
+    def setup_method(self):
+        api.default_store().reset()
+
+    def test_build_agent_wraps(self):
+        agent = build_agent(model=ScriptedChatModel(), answer_ttl=60)
+        assert isinstance(agent, CachedAgent)
+
+    @respx.mock
+    def test_repeat_skips_model_until_write(self):
+        orders = respx.get(f"{BASE_URL}/orders").respond(200, json=[{"id": 1}, {"id": 2}])
+        respx.post(f"{BASE_URL}/orders/1/close").respond(200, json={"id": 1})
+        model = ScriptedChatModel()
+        model.load(_script())
+        agent = build_agent(model=model, answer_ttl=60)
+
+        assert _ask(agent, QUESTION) == "You have 2 orders pending payment."
+        assert _ask(agent, "how many orders are pending payment", "other") == (
+            "You have 2 orders pending payment."
+        )
+        assert orders.call_count == 1 and model.pending() == {}
+        assert agent.cache.hits == 1
+
+        api.request("POST", "/orders/1/close")
+        model.load(_script())
+        _ask(agent, QUESTION)
+        assert orders.call_count == 2 and model.pending() == {}
+
+    @respx.mock
+    def test_failed_reads_are_not_cached(self):
+        respx.get(f"{BASE_URL}/orders").respond(500, json={"description": "boom"})
+        model = ScriptedChatModel()
+        model.load(_script())
+        agent = build_agent(model=model, answer_ttl=60)
+        _ask(agent, QUESTION)
+        assert agent.cache.get(AnswerCache.key(QUESTION, api.current_store().store_id)) is None
+
+    @respx.mock
+    def test_stream_replays_and_keeps_history(self):
+        respx.get(f"{BASE_URL}/orders").respond(200, json=[])
+        model = ScriptedChatModel()
+        model.load(_script())
+        agent = build_agent(model=model, answer_ttl=60)
+        _ask(agent, QUESTION)
+
+        config = {"configurable": {"thread_id": "t"}}
+        value = {"messages": [{"role": "user", "content": QUESTION}]}
+        chunks = [chunk for chunk, _ in agent.stream(value, config, stream_mode="messages")]
+
+        assert [c.content for c in chunks] == ["You have 2 orders pending payment."]
+        assert isinstance(chunks[0], AIMessageChunk)
+        history = agent.get_state(config).values["messages"]
+        assert [m.content for m in history[-2:]] == [QUESTION, chunks[0].content]
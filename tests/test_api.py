@@ -1,7 +1,23 @@
+import json
+import threading
+import time
+
 import httpx
+import pytest
 import respx
 
-from nube_agent.api import parse_json, request, to_json
+from nube_agent import api
+from nube_agent.api import (
+    CircuitBreaker,
+    RateLimiter,
+    ResponseCache,
+    StoreClient,
+    parse_json,
+    request,
+    resource_family,
+    strip_stale_note,
+    to_json,
+)
 from nube_agent.config import BASE_URL
 
 
@@ -78,6 +94,38 @@ class TestRequest:
         assert isinstance(result, list)
         assert route.call_count == 2
 
+    @respx.mock
+    def test_retries_reads_and_puts(self):
+        route = respx.put(f"{BASE_URL}/products/1")
+        route.side_effect = [
+            httpx.ReadTimeout("timed out"), httpx.Response(502), httpx.Response(200, json={}),
+        ]
+        assert request("PUT", "/products/1", json_body={"published": True}) == {}
+        assert route.call_count == 3
+
+    @respx.mock
+    def test_post_retried_only_when_not_applied(self):
+        route = respx.post(f"{BASE_URL}/products")
+        route.side_effect = [
+            httpx.ConnectError("refused"), httpx.Response(503), httpx.Response(201, json={"id": 1}),
+        ]
+        assert request("POST", "/products", json_body={}) == {"id": 1}
+        route.side_effect = [httpx.Response(500), httpx.Response(201, json={"id": 2})]
+        assert request("POST", "/products", json_body={}).startswith("API error 500")
+        assert route.call_count == 4
+
+    @respx.mock
+    def test_retried_delete_404_is_success(self):
+        route = respx.delete(f"{BASE_URL}/products/1")
+        route.side_effect = [httpx.ReadTimeout("timed out"), httpx.Response(404, json={})]
+        assert request("DELETE", "/products/1")["status"] == "success"
+
+    @respx.mock
+    def test_writes_carry_idempotency_key(self):
+        route = respx.post(f"{BASE_URL}/products").respond(201, json={})
+        request("POST", "/products", json_body={})
+        assert len(route.calls[0].request.headers["Idempotency-Key"]) == 32
+
     @respx.mock
     def test_transport_error(self):
         url = f"{BASE_URL}/products"
@@ -85,3 +133,246 @@ class TestRequest:
         result = request("GET", "/products")
         assert isinstance(result, str)
         assert "HTTP error" in result
+
+
+class TestResponseCache:
+    def test_family(self):
+        assert resource_family("/products/1/variants") == "products"
+        assert resource_family("/store") == "store"
+
+    def test_expiry(self):
+        cache = ResponseCache(ttl=-1)
+        key = ResponseCache.key("/products", None)
+        cache.put(key, [1])
+        assert cache.get(key) is None
+
+    def test_returns_copies(self):
+        cache = ResponseCache(ttl=60)
+        key = ResponseCache.key("/products", {"page": 1})
+        cache.put(key, [{"id": 1}])
+        cache.get(key)[0]["id"] = 2
+        assert cache.get(key) == [{"id": 1}]
+
+    def test_evicts_oldest(self):
+        cache = ResponseCache(ttl=60, max_entries=2)
+        for page in (1, 2, 3):
+            cache.put(ResponseCache.key("/products", {"page": page}), page)
+        assert cache.get(ResponseCache.key("/products", {"page": 1})) is None
+        assert cache.get(ResponseCache.key("/products", {"page": 3})) == 3
+
+    @respx.mock
+    def test_get_cached_until_write(self):
+        route = respx.get(f"{BASE_URL}/products").respond(200, json=[{"id": 1}])
+        respx.get(f"{BASE_URL}/orders").respond(200, json=[])
+        respx.put(f"{BASE_URL}/products/1").respond(200, json={"id": 1})
+        with api.use_store(StoreClient("12345", "t", base_url=BASE_URL, cache_ttl=60)) as client:
+            request("GET", "/products")
+            request("GET", "/orders")
+            assert request("GET", "/products") == [{"id": 1}]
+            assert route.call_count == 1
+
+            request("PUT", "/products/1", json_body={"published": False})
+            request("GET", "/products")
+            assert route.call_count == 2
+            assert client.cache.get(ResponseCache.key("/orders", None)) == []
+
+    @respx.mock
+    def test_errors_not_cached(self):
+        route = respx.get(f"{BASE_URL}/products/9").respond(404, json={})
+        with api.use_store(StoreClient("12345", "t", base_url=BASE_URL, cache_ttl=60)):
+            request("GET", "/products/9")
+            request("GET", "/products/9")
+        assert route.call_count == 2
+
+    def test_invalidate_one_resource(self):
+        cache = ResponseCache(ttl=60)
+        paths = ("/products", "/products/1", "/products/1/variants", "/products/2", "/orders")
+        for path in paths:
+            cache.put(ResponseCache.key(path, None), path)
+        assert cache.invalidate("products", "/products/1") == 3
+        kept = [p for p in paths if cache.get(ResponseCache.key(p, None)) is not None]
+        assert kept == ["/products/2", "/orders"]
+
+    def test_ttl_per_family(self):
+        cache = ResponseCache(ttl=-1)
+        cache.ttls["products"] = 60
+        for path in ("/products/1", "/coupons/1"):
+            cache.put(ResponseCache.key(path, None), path)
+        assert cache.get(ResponseCache.key("/products/1", None)) == "/products/1"
+        assert cache.get(ResponseCache.key("/coupons/1", None)) is None
+
+    def test_versions_bump_on_write_and_clear(self):
+        cache = ResponseCache(ttl=0)
+        before = cache.version("orders")
+        cache.invalidate("products")
+        assert cache.version("orders") == before
+        cache.invalidate("orders")
+        after = cache.version("orders")
+        assert after != before
+        cache.clear()
+        assert cache.version("orders") != after
+
+    @respx.mock
+    def test_track_requests(self):
+        respx.get(f"{BASE_URL}/orders").respond(200, json=[])
+        respx.get(f"{BASE_URL}/products/9").respond(404, json={})
+        respx.post(f"{BASE_URL}/orders/1/close").respond(200, json={"id": 1})
+        with api.use_store(StoreClient("12345", "t", base_url=BASE_URL)):
+            with api.track_requests() as log:
+                request("GET", "/orders")
+                request("GET", "/products/9")
+            assert set(log.reads) == {("12345", "orders"), ("12345", "products")}
+            assert (log.writes, log.errors) == (0, 1)
+            assert api.is_current(log.reads)
+
+            request("POST", "/orders/1/close")
+            assert not api.is_current(log.reads)
+            assert log.writes == 0  # only requests made inside the block are logged
+
+
+class TestCircuitBreaker:
+    def test_opens_after_threshold_then_trial(self):
+        breaker = CircuitBreaker(threshold=2, cooldown=0.05)
+        assert not breaker.record(False)
+        assert breaker.record(False)
+        assert breaker.is_open() and breaker.retry_in() > 0
+        time.sleep(0.06)
+        assert breaker.retry_in() == 0  # the trial request
+        assert breaker.retry_in() > 0  # everyone else waits for it
+        assert breaker.record(False) and breaker.opened == 2
+        time.sleep(0.06)
+        breaker.retry_in()
+        breaker.record(True)
+        assert not breaker.is_open() and breaker.failures == 0
+
+    @respx.mock
+    def test_fails_fast_per_family(self):
+        products = respx.get(f"{BASE_URL}/products/1").mock(
+            side_effect=httpx.ConnectTimeout("timed out")
+        )
+        respx.get(f"{BASE_URL}/orders").respond(200, json=[])
+        with api.use_store(StoreClient("12345", "t", base_url=BASE_URL, retries=0)) as client:
+            for _ in range(client.breaker("products").threshold):
+                assert request("GET", "/products/1").startswith("HTTP error")
+            result = request("PUT", "/products/1", json_body={"published": False})
+            assert result.startswith("API error: the products endpoints are not responding")
+            assert products.call_count == client.breaker("products").threshold
+            assert request("GET", "/orders") == []
+
+    @respx.mock
+    def test_5xx_counts_4xx_does_not(self):
+        route = respx.get(f"{BASE_URL}/orders")
+        route.side_effect = [httpx.Response(503), httpx.Response(404), httpx.Response(503)]
+        with api.use_store(StoreClient("12345", "t", base_url=BASE_URL, retries=0)) as client:
+            for _ in range(3):
+                request("GET", "/orders")
+            assert client.breaker("orders").failures == 1
+
+    @respx.mock
+    def test_degraded_reads_are_stale(self):
+        route = respx.get(f"{BASE_URL}/products")
+        route.side_effect = [httpx.Response(200, json=[{"id": 1}])] + [
+            httpx.Response(500, json={})
+        ] * 3
+        with api.use_store(StoreClient("12345", "t", base_url=BASE_URL, retries=0)):
+            assert request("GET", "/products") == [{"id": 1}]
+            request("GET", "/products")
+            request("GET", "/products")
+            stale = request("GET", "/products")
+            assert stale == [{"id": 1}] and route.call_count == 4
+            text = to_json(request("GET", "/products"))
+        assert route.call_count == 4
+        assert "cached data from 0s ago" in text
+        assert json.loads(strip_stale_note(text)) == [{"id": 1}]
+
+    @respx.mock
+    def test_degraded_reads_off(self):
+        respx.get(f"{BASE_URL}/products").respond(500, json={})
+        client = StoreClient(
+            "12345", "t", base_url=BASE_URL, retries=0, degraded_reads=False
+        )
+        with api.use_store(client):
+            for _ in range(4):
+                result = request("GET", "/products")
+        assert isinstance(result, str)
+
+    def test_timeouts(self):
+        client = StoreClient("12345", "t", connect_timeout=2, read_timeout=7)
+        assert (client.http().timeout.connect, client.http().timeout.read) == (2, 7)
+
+
+class TestRateLimiter:
+    def test_waits_when_bucket_is_nearly_full(self):
+        limiter = RateLimiter(reserve=1)
+        limiter.update(httpx.Headers({
+            "x-rate-limit-limit": "40", "x-rate-limit-remaining": "1",
+            "x-rate-limit-reset": "1950",
+        }))
+        started = time.monotonic()
+        limiter.wait()
+        # 39 used slots drain in 1.95 s, so one slot takes 50 ms.
+        assert 0.03 < time.monotonic() - started < 0.5
+
+    def test_no_headers_no_wait(self):
+        limiter = RateLimiter()
+        limiter.update(httpx.Headers({}))
+        limiter.update(httpx.Headers({
+            "x-rate-limit-limit": "40", "x-rate-limit-remaining": "30",
+            "x-rate-limit-reset": "5000",
+        }))
+        limiter.wait()
+        assert limiter.waited == 0
+
+
+class TestStores:
+    @respx.mock
+    def test_requests_go_to_the_selected_store(self):
+        first = respx.get("https://a.test/1/products").respond(200, json=[{"id": 1}])
+        second = respx.get("https://b.test/2/products").respond(200, json=[{"id": 2}])
+        store_a = StoreClient("1", "token-a", base_url="https://a.test/1")
+        store_b = StoreClient("2", "token-b", base_url="https://b.test/2")
+        with api.use_store(store_a):
+            assert request("GET", "/products") == [{"id": 1}]
+            with api.use_store(store_b):
+                assert request("GET", "/products") == [{"id": 2}]
+        assert first.calls[0].request.headers["Authentication"] == "bearer token-a"
+        assert second.calls[0].request.headers["Authentication"] == "bearer token-b"
+        assert api.current_store() is api.default_store()
+
+    @respx.mock
+    def test_store_info_is_per_store(self):
+        respx.get("https://a.test/1/store").respond(200, json={"main_language": "pt"})
+        respx.get("https://b.test/2/store").respond(200, json={"main_language": "en"})
+        with api.use_store(StoreClient("1", "a", base_url="https://a.test/1")):
+            assert api.store_language() == "pt"
+        with api.use_store(StoreClient("2", "b", base_url="https://b.test/2")):
+            assert api.store_language() == "en"
+
+    def test_selection_is_per_thread(self):
+        store_a = StoreClient("1", "a", base_url="https://a.test/1")
+        seen = {}
+
+        def worker():
+            seen["store"] = api.current_store()
+
+        with api.use_store(store_a):
+            thread = threading.Thread(target=worker)
+            thread.start()
+            thread.join()
+            assert api.current_store() is store_a
+        assert seen["store"] is api.default_store()
+
+    def test_registry(self, tmp_path):
+        path = tmp_path / "stores.json"
+        path.write_text(json.dumps([
+            {"store_id": 77, "access_token": "t", "base_url": "https://s.test/77", "cache_ttl": 5},
+        ]))
+        (client,) = api.load_stores(path)
+        try:
+            assert api.get_store("77") is client
+            assert client.cache.ttl == 5
+            assert api.get_store(None) is api.default_store()
+            with pytest.raises(KeyError):
+                api.get_store("404")
+        finally:
+            api.remove_store("77")
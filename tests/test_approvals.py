@@ -0,0 +1,140 @@
+import pytest
+import respx
+
+from nube_agent import api, main
+from nube_agent.agent import build_agent
+from nube_agent.approvals import ApprovalPolicy, parse_rule
+from nube_agent.config import BASE_URL
+from nube_agent.fake_model import ScriptedChatModel
+from nube_agent.subagents import SUBAGENTS
+
+
+def _call(name: str, call_id: str, **args) -> dict:
+    return {"name": name, "id": call_id, "args": args}
+
+
+def _deletes(*variant_ids: int) -> list[dict]:
+    return [{"name": "delete_variant", "args": {"product_id": 1, "variant_id": v}}
+            for v in variant_ids]
+
+
+def _answers(monkeypatch, *answers: str) -> list[str]:
+    questions: list[str] = []
+    replies = iter(answers)
+
+    def fake_input(prompt: str = "") -> str:
+        questions.append(prompt)
+        return next(replies)
+
+    monkeypatch.setattr("builtins.input", fake_input)
+    return questions
+
+
+class TestApprovalPolicy:
+    def test_parse(self):
+        assert not ApprovalPolicy.parse("none").approves("delete_product")
+        assert ApprovalPolicy.parse("all").approves("delete_product")
+        rule = parse_rule("delete_variant:product_id=12")
+        assert rule == ("delete_variant", {"product_id": "12"})
+        with pytest.raises(ValueError, match="tool:arg=value"):
+            ApprovalPolicy.parse("delete_variant:product_id")
+
+    def test_rules(self):
+        policy = ApprovalPolicy.parse(
+            "close_order, delete_variant:product_id=12, cancel_order:restock=true, delete_*_image"
+        )
+        assert policy.approves("close_order", {"order_id": 1})
+        assert policy.approves("delete_variant", {"product_id": 12, "variant_id": 3})
+        assert not policy.approves("delete_variant", {"product_id": 13, "variant_id": 3})
+        assert policy.approves("cancel_order", {"order_id": 1, "restock": True})
+        assert not policy.approves("cancel_order", {"order_id": 1, "restock": False})
+        assert not policy.approves("delete_product", {"product_id": 12})
+
+    def test_answer_kept_per_call(self):
+        class Request:
+            tool_call = {"name": "delete_page", "id": "c1", "args": {"page_id": 1}}
+
+        policy = ApprovalPolicy()
+        assert policy.should_ask(Request())
+        policy.add("delete_page")
+        # Already asked about: the resumed run must see the same answer.
+        assert policy.should_ask(Request())
+        Request.tool_call = {**Request.tool_call, "id": "c2"}
+        assert not policy.should_ask(Request())
+
+    def test_tool_predicate_kept(self):
+        class Request:
+            tool_call = {"name": "import_catalog", "id": "c1", "args": {"file_path": "a.csv"}}
+
+        catalog = next(s for s in SUBAGENTS if s["name"] == "catalog-manager")
+        config = ApprovalPolicy().interrupt_on(catalog["interrupt_on"])["import_catalog"]
+        assert not config["when"](Request())
+        for value in (False, 0, "0", "no", "off", ""):
+            Request.tool_call = {**Request.tool_call, "args": {"dry_run": value}}
+            assert config["when"](Request())
+        Request.tool_call = {**Request.tool_call, "id": "c2", "args": {"dry_run": False}}
+        approved = ApprovalPolicy.parse("import_catalog").interrupt_on(catalog["interrupt_on"])
+        assert not approved["import_catalog"]["when"](Request())
+
+
+class TestPromptDecisions:
+    def test_one_question_for_a_batch(self, monkeypatch):
+        questions = _answers(monkeypatch, "y")
+        decisions = main._prompt_decisions(_deletes(1, 2, 3))
+        assert decisions == [{"type": "approve"}] * 3 and len(questions) == 1
+
+    def test_review_by_tool_then_one_by_one(self, monkeypatch):
+        actions = [*_deletes(1, 2), {"name": "delete_product", "args": {"product_id": 1}}]
+        questions = _answers(monkeypatch, "r", "r", "y", "n", "n")
+        decisions = main._prompt_decisions(actions)
+        assert [d["type"] for d in decisions] == ["approve", "reject", "reject"]
+        assert len(questions) == 5
+
+    def test_always_adds_a_rule(self, monkeypatch):
+        policy = ApprovalPolicy.parse("delete_image")
+        actions = [*_deletes(1, 2), {"name": "delete_image", "args": {"image_id": 5}}]
+        questions = _answers(monkeypatch, "a")
+        assert main._prompt_decisions(actions, policy) == [{"type": "approve"}] * 3
+        assert len(questions) == 1 and policy.rules == ["delete_image", "delete_variant"]
+        assert main._prompt_decisions(_deletes(3), policy) == [{"type": "approve"}]
+
+
+class TestApprovalsInAgent:
+    def setup_method(self):
+        api.default_store().reset()
+
+    def _agent(self, approvals: ApprovalPolicy):
+        model = ScriptedChatModel()
+        model.load({
+            "supervisor": [
+                {"tool_calls": [_call("task", "t1", subagent_type="catalog-manager",
+                                      description="Delete variants 1, 2 and 3 of product 1")]},
+                {"content": "done"},
+            ],
+            "catalog-manager": [
+                {"tool_calls": [_call("delete_variant", f"d{v}", product_id=1, variant_id=v)
+                                for v in (1, 2, 3)]},
+                {"content": "deleted"},
+            ],
+        })
+        return build_agent(model=model, approvals=approvals)
+
+    @respx.mock
+    def test_rule_skips_the_interrupt(self):
+        route = respx.delete(url__regex=rf"{BASE_URL}/products/1/variants/\d").respond(200, json={})
+        agent = self._agent(ApprovalPolicy.parse("delete_variant:product_id=1"))
+        config = {"configurable": {"thread_id": "t"}}
+        agent.invoke({"messages": [{"role": "user", "content": "go"}]}, config)
+        assert not agent.get_state(config).interrupts and route.call_count == 3
+
+    @respx.mock
+    def test_batch_resumed_once(self, monkeypatch):
+        route = respx.delete(url__regex=rf"{BASE_URL}/products/1/variants/\d").respond(200, json={})
+        agent = self._agent(ApprovalPolicy())
+        config = {"configurable": {"thread_id": "t"}}
+        agent.invoke({"messages": [{"role": "user", "content": "go"}]}, config)
+        assert not route.called
+        questions = _answers(monkeypatch, "y")
+        assert main.handle_interrupts(agent, config)
+        assert len(questions) == 1 and route.call_count == 3
+        assert not agent.get_state(config).interrupts
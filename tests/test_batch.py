@@ -0,0 +1,182 @@
+import io
+import json
+
+import httpx
+import respx
+
+from nube_agent import api
+from nube_agent.agent import build_agent
+from nube_agent.batch import approves, parse_items, run_batch, run_tool
+from nube_agent.config import BASE_URL
+from nube_agent.fake_model import ScriptedChatModel
+from nube_agent.journal import WriteJournal
+
+
+def _cancel_script(order_reply: str) -> dict:
+    return {
+        "supervisor": [
+            {"tool_calls": [{"name": "task", "args": {
+                "subagent_type": "order-manager", "description": "Cancel order 7"}}]},
+            {"content": order_reply},
+        ],
+        "order-manager": [
+            {"tool_calls": [{"name": "cancel_order", "args": {"order_id": 7}}]},
+            {"content": order_reply},
+        ],
+    }
+
+
+class TestApprovalPolicy:
+    def test_policies(self):
+        assert approves("all", "delete_product")
+        assert not approves("none", "delete_product")
+        assert approves("cancel_order, delete_image", "delete_image")
+        assert not approves("cancel_order", "delete_product")
+        assert approves("delete_variant:product_id=1", "delete_variant", {"product_id": 1})
+        assert not approves("delete_variant:product_id=1", "delete_variant", {"product_id": 2})
+
+
+class TestParseItems:
+    def test_formats(self):
+        lines = [
+            "# comment",
+            "",
+            "list my products",
+            '{"id": "a", "tool": "get_order", "args": {"order_id": 1}}',
+            '{"prompt": 3}',
+            '{"tool": "drop_database"}',
+            "{not json",
+        ]
+        items = list(parse_items(lines))
+        assert [i["index"] for i in items] == [1, 2, 3, 4, 5]
+        assert items[0] == {"prompt": "list my products", "index": 1, "id": "1"}
+        assert items[1]["id"] == "a" and "error" not in items[1]
+        assert "needs a 'prompt' or a 'tool'" in items[2]["error"]
+        assert "unknown tool" in items[3]["error"]
+        assert items[4]["error"].startswith("Invalid JSON")
+
+    def test_duplicate_ids(self):
+        items = list(parse_items(['{"id": "a", "prompt": "x"}', '{"id": "a", "prompt": "y"}',
+                                  '{"id": "2", "prompt": "z"}']))
+        assert "error" not in items[0]
+        assert items[1]["error"] == "Error: duplicate id 'a' (first used by item 1)."
+        assert "error" not in items[2]
+
+
+class TestRunTool:
+    @respx.mock
+    def test_calls_tool(self):
+        respx.get(f"{BASE_URL}/orders/1").respond(200, json={"id": 1})
+        result = run_tool({"tool": "get_order", "args": {"order_id": 1}}, "none")
+        assert result["status"] == "ok"
+        assert json.loads(result["output"]) == {"id": 1}
+
+    def test_gated_tool_rejected(self):
+        result = run_tool({"tool": "cancel_order", "args": {"order_id": 7}}, "none")
+        assert result["status"] == "rejected"
+        assert result["decisions"][0]["decision"] == "reject"
+
+    def test_only_real_imports_gated(self, tmp_path):
+        args = {"file_path": str(tmp_path / "missing.csv")}
+        dry = run_tool({"tool": "import_catalog", "args": args}, "none")
+        assert dry["output"].startswith("Error: cannot read") and not dry["decisions"]
+        for value in (False, "0", "off"):
+            real = run_tool({"tool": "import_catalog", "args": {**args, "dry_run": value}}, "none")
+            assert real["status"] == "rejected"
+
+    def test_bad_arguments(self):
+        result = run_tool({"tool": "get_order", "args": {"nope": 1}}, "none")
+        assert result["status"] == "error"
+
+    @respx.mock
+    def test_api_error(self):
+        respx.get(f"{BASE_URL}/orders/1").respond(404, json={"description": "Not Found"})
+        result = run_tool({"tool": "get_order", "args": {"order_id": 1}}, "none")
+        assert result["status"] == "error"
+
+
+class TestRunBatch:
+    @respx.mock
+    def test_results_in_input_order(self):
+        for i in range(1, 6):
+            respx.get(f"{BASE_URL}/orders/{i}").respond(200, json={"id": i})
+        lines = [json.dumps({"tool": "get_order", "args": {"order_id": i}}) for i in range(1, 6)]
+        out = io.StringIO()
+        summary = run_batch(parse_items(lines + ["{bad"]), out, concurrency=3)
+        results = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert [r["index"] for r in results] == [1, 2, 3, 4, 5, 6]
+        assert summary["items"] == 6
+        assert summary["ok"] == 5 and summary["error"] == 1
+        assert summary["items_per_s"] > 0
+
+    @respx.mock
+    def test_items_run_on_their_store(self):
+        respx.get("https://s.test/5/orders/1").respond(200, json={"id": 5})
+        api.register_store(api.StoreClient("5", "t", base_url="https://s.test/5"))
+        lines = [
+            '{"tool": "get_order", "args": {"order_id": 1}, "store_id": "5"}',
+            '{"tool": "get_order", "args": {"order_id": 1}, "store_id": "6"}',
+        ]
+        out = io.StringIO()
+        try:
+            run_batch(parse_items(lines), out)
+        finally:
+            api.remove_store("5")
+        first, second = (json.loads(line) for line in out.getvalue().splitlines())
+        assert first["store_id"] == "5" and json.loads(first["output"]) == {"id": 5}
+        assert second["status"] == "error" and "Unknown store" in second["output"]
+
+    @respx.mock
+    def test_resumed_run_skips_done_writes(self, tmp_path):
+        route = respx.post(f"{BASE_URL}/orders/7/close")
+        route.side_effect = [httpx.Response(200, json={"id": 7}), httpx.Response(500)]
+        lines = ['{"id": "close-7", "tool": "close_order", "args": {"order_id": 7}}']
+        store = api.default_store()
+        store.journal = WriteJournal(tmp_path / "journal.sqlite")
+        try:
+            first = run_batch(parse_items(lines), io.StringIO(), run_id="r1")
+            out = io.StringIO()
+            second = run_batch(parse_items(lines), out, run_id="r1")
+        finally:
+            store.journal = None
+        assert first["ok"] == second["ok"] == 1 and second["run_id"] == "r1"
+        assert route.call_count == 1
+        assert json.loads(json.loads(out.getvalue())["output"]) == {"id": 7}
+
+    @respx.mock
+    def test_prompt_approved_by_policy(self):
+        route = respx.post(f"{BASE_URL}/orders/7/cancel").respond(200, json={"id": 7})
+        model = ScriptedChatModel()
+        model.load(_cancel_script("Order 7 cancelled."))
+        out = io.StringIO()
+        run_batch(parse_items(["Cancel order 7"]), out, agent=build_agent(model=model),
+                  policy="cancel_order")
+        result = json.loads(out.getvalue())
+        assert route.called
+        assert result["status"] == "ok"
+        assert result["output"] == "Order 7 cancelled."
+        assert result["decisions"] == [
+            {"tool": "cancel_order", "args": {"order_id": 7}, "decision": "approve"}
+        ]
+
+    @respx.mock
+    def test_prompt_rejected_by_policy(self):
+        route = respx.post(f"{BASE_URL}/orders/7/cancel").respond(200, json={"id": 7})
+        model = ScriptedChatModel()
+        model.load(_cancel_script("Cancellation was rejected."))
+        out = io.StringIO()
+        run_batch(parse_items(["Cancel order 7"]), out, agent=build_agent(model=model))
+        result = json.loads(out.getvalue())
+        assert not route.called
+        assert result["status"] == "rejected"
+        assert result["decisions"][0]["decision"] == "reject"
+
+    def test_prompt_still_pending_is_an_error(self, monkeypatch):
+        monkeypatch.setattr("nube_agent.batch.MAX_RESUMES", 0)
+        model = ScriptedChatModel()
+        model.load(_cancel_script("Order 7 cancelled."))
+        out = io.StringIO()
+        summary = run_batch(parse_items(["Cancel order 7"]), out, agent=build_agent(model=model))
+        result = json.loads(out.getvalue())
+        assert result["status"] == "error" and summary["error"] == 1
+        assert result["output"].startswith("Error: still waiting for approval")
@@ -0,0 +1,158 @@
+import io
+import json
+
+import pytest
+
+from nube_agent.api import StoreClient, use_store
+from nube_agent.catalog_import import (
+    CatalogIndex,
+    Checkpoint,
+    group_products,
+    import_file,
+    import_rows,
+    parse_row,
+    plan,
+    read_rows,
+)
+from nube_agent.standin import StandinServer, StoreData
+from nube_agent.tools.products import import_catalog
+
+CSV = """\
+handle,name,attributes,values,sku,price,stock
+remera,Remera,Talla|Color,S|Rojo,RB-S-R,4500.00,10
+remera,,,M|Rojo,RB-M-R,4500,8
+gorra,Gorra,,,GO-1,1200,
+"""
+
+
+@pytest.fixture
+def server():
+    data = StoreData(products=3, variants_per_product=2, orders=0, customers=0)
+    with StandinServer(data, rate_limit=10**6) as srv:
+        with use_store(StoreClient("1", "test-token", base_url=srv.base_url)):
+            yield srv
+
+
+def _rows(text: str, fmt: str = "csv") -> list:
+    return list(read_rows(io.StringIO(text), fmt))
+
+
+def _variants(data: StoreData) -> dict[str, dict]:
+    return {v["sku"]: v for variants in data.nested["variants"].values()
+            for v in variants.values()}
+
+
+class TestParse:
+    def test_csv_groups_by_handle(self):
+        groups = list(group_products(_rows(CSV)))
+        assert [g["key"] for g in groups] == ["remera", "gorra"]
+        assert groups[0]["attributes"] == ["Talla", "Color"]
+        assert [values for _, values, _ in groups[0]["variants"]] == [["S", "Rojo"], ["M", "Rojo"]]
+        assert groups[1]["variants"][0][2] == {"sku": "GO-1", "price": "1200"}
+
+    def test_jsonl_lists_and_unlimited_stock(self):
+        line = '{"sku": "A", "name": "A", "attributes": ["Talla"], "values": ["L"], "stock": null}'
+        [group] = group_products(_rows(line, "jsonl"))
+        assert group["variants"] == [(1, ["L"], {"sku": "A", "stock": None})]
+
+    def test_field_rules(self):
+        assert parse_row({"price": "1"}) == "Error: missing sku."
+        assert "price must be a number" in parse_row({"sku": "A", "price": "abc"})
+        for value in ("NaN", "sNaN", "inf", "-Infinity"):
+            assert "price must be a number" in parse_row({"sku": "A", "price": value})
+        assert "whole number" in parse_row({"sku": "A", "stock": "1.5"})
+        assert "at most 3" in parse_row({"sku": "A", "attributes": "a|b|c|d"})
+        assert "true or false" in parse_row({"sku": "A", "published": "maybe"})
+
+    def test_bad_row_invalidates_its_product(self):
+        text = "handle,name,sku,price\nx,X,X-1,10\nx,,X-2,abc\ny,Y,X-1,5\n"
+        groups = list(group_products(_rows(text)))
+        assert "price must be a number" in groups[0]["errors"][0]
+        assert "duplicate sku" in groups[1]["errors"][0]
+
+
+class TestPlan:
+    def _index(self) -> CatalogIndex:
+        index = CatalogIndex("es")
+        index.add({"id": 1, "name": {"es": "Remera"}, "published": True,
+                   "handle": {"es": "remera"}, "attributes": [{"es": "Talla"}],
+                   "variants": [{"id": 10, "sku": "R-S", "price": "100.00", "stock": 5,
+                                 "values": [{"es": "S"}]}]})
+        return index
+
+    def _group(self, text: str) -> dict:
+        return next(group_products(_rows("handle,name,attributes,values,sku,price,stock\n" + text)))
+
+    def test_diff_by_sku(self):
+        writes = plan(self._group("remera,,,,R-S,100,7\nremera,,,M,R-M,100,3\n"), self._index())
+        assert writes == [
+            ("PUT", "/products/1/variants/10", {"stock": 7}, "updated_variants"),
+            ("POST", "/products/1/variants",
+             {"sku": "R-M", "price": "100", "stock": 3, "values": [{"es": "M"}]},
+             "created_variants"),
+        ]
+
+    def test_unchanged(self):
+        assert plan(self._group("remera,Remera,,,R-S,100.0,5\n"), self._index()) == []
+
+    def test_values_must_match_attributes(self):
+        result = plan(self._group("remera,,,M|Rojo,R-M,100,3\n"), self._index())
+        assert "2 values for 1 attributes" in result
+
+    def test_attribute_change_rejected(self):
+        result = plan(self._group("remera,,Color,Rojo,R-S,100,5\n"), self._index())
+        assert "differ from" in result
+
+    def test_new_product_needs_name(self):
+        assert "needs a name" in plan(self._group("nuevo,,,,N-1,10,1\n"), self._index())
+
+
+class TestImport:
+    def test_creates_then_updates(self, server, tmp_path):
+        path = tmp_path / "catalog.csv"
+        path.write_text(CSV, encoding="utf-8")
+        summary = import_file(str(path), concurrency=2)
+        assert summary["created_products"] == 2 and summary["created_variants"] == 3
+        assert summary["failed"] == summary["invalid"] == 0
+        variants = _variants(server.data)
+        assert variants["RB-M-R"]["values"] == [{"es": "M"}, {"es": "Rojo"}]
+        assert variants["GO-1"]["price"] == "1200"
+        assert not (tmp_path / "catalog.csv.checkpoint.jsonl").exists()
+
+        path.write_text(CSV.replace("RB-M-R,4500,8", "RB-M-R,4500,2"), encoding="utf-8")
+        summary = import_file(str(path))
+        assert summary["created_products"] == 0
+        assert summary["updated_variants"] == 1 and summary["unchanged"] == 2
+        assert _variants(server.data)["RB-M-R"]["stock"] == 2
+
+    def test_existing_skus_update_standin_products(self, server):
+        sku = next(iter(_variants(server.data)))
+        summary = import_rows(_rows(f"sku,price\n{sku},999\n"))
+        assert summary["updated_variants"] == 1
+        assert _variants(server.data)[sku]["price"] == "999"
+
+    def test_dry_run_writes_nothing(self, server, tmp_path):
+        path = tmp_path / "catalog.csv"
+        path.write_text(CSV, encoding="utf-8")
+        before = server.requests
+        summary = json.loads(import_catalog(str(path)))
+        assert summary["dry_run"] and summary["created_products"] == 2
+        assert "GO-1" not in _variants(server.data)
+        assert server.requests - before == 2  # store info and one page of products
+
+    def test_resumes_from_checkpoint(self, server, tmp_path):
+        checkpoint = Checkpoint(tmp_path / "progress.jsonl", "1")
+        checkpoint.mark("remera")
+        summary = import_rows(_rows(CSV), checkpoint=Checkpoint(checkpoint.path, "1"))
+        assert summary["resumed"] == 1 and summary["created_products"] == 1
+        assert "RB-S-R" not in _variants(server.data)
+        assert not checkpoint.path.exists()
+
+    def test_failures_keep_checkpoint(self, server, tmp_path):
+        text = CSV + "bad,Bad,Talla,S,B-1,10,1\nbad,,,S|M,B-2,10,1\n"
+        checkpoint = Checkpoint(tmp_path / "progress.jsonl", "1")
+        summary = import_rows(_rows(text), checkpoint=checkpoint)
+        assert summary["created_products"] == 2 and summary["invalid"] == 1
+        assert summary["errors"][0]["key"] == "bad"
+        assert Checkpoint(checkpoint.path, "1").done == {"remera", "gorra"}
+        assert Checkpoint(checkpoint.path, "2").done == set()
@@ -0,0 +1,110 @@
+import json
+
+import respx
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import ToolMessage
+
+from nube_agent import api
+from nube_agent.agent import build_agent
+from nube_agent.api import WriteBuffer, buffer_writes, request, write_through
+from nube_agent.config import BASE_URL
+from nube_agent.fake_model import ScriptedChatModel
+
+
+class ToolResultRecorder(BaseCallbackHandler):
+    def __init__(self) -> None:
+        self.seen: list[ToolMessage] = []
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self.seen.extend(m for m in messages[0] if isinstance(m, ToolMessage))
+
+
+def _call(name: str, call_id: str, **args) -> dict:
+    return {"name": name, "id": call_id, "args": args}
+
+
+class TestWriteBuffer:
+    def setup_method(self):
+        api.default_store().reset()
+
+    @respx.mock
+    def test_merges_puts_per_resource(self):
+        put = respx.put(f"{BASE_URL}/products/1").respond(200, json={"id": 1})
+        buffer = WriteBuffer()
+        with buffer_writes(buffer, "a"):
+            queued = request("PUT", "/products/1", json_body={"name": {"es": "Remera"}})
+        assert queued["status"] == "queued"
+        with buffer_writes(buffer, "b"):
+            request("PUT", "/products/1", json_body={"name": {"pt": "Camiseta"}, "published": True})
+        assert not put.called
+
+        assert buffer.flush() == {"a": {"id": 1}, "b": {"id": 1}}
+        assert put.call_count == 1 and buffer.merged == 1
+        assert json.loads(put.calls[0].request.content) == {
+            "name": {"es": "Remera", "pt": "Camiseta"}, "published": True,
+        }
+
+    def test_conflicting_values_refused(self):
+        buffer = WriteBuffer()
+        with buffer_writes(buffer, "a"):
+            request("PUT", "/products/1", json_body={"name": {"es": "Remera"}})
+        with buffer_writes(buffer, "b"):
+            result = request("PUT", "/products/1", json_body={"name": {"es": "Gorra"}})
+        assert result.startswith("Error: conflicting update") and "'name.es'" in result
+
+    @respx.mock
+    def test_related_request_flushes_first(self):
+        put = respx.put(f"{BASE_URL}/products/1").respond(200, json={"id": 1})
+        other = respx.put(f"{BASE_URL}/categories/2").respond(200, json={"id": 2})
+        respx.post(f"{BASE_URL}/products/1/variants").mock(
+            side_effect=lambda _: respx.MockResponse(201, json={"put_first": put.called})
+        )
+        buffer = WriteBuffer()
+        with buffer_writes(buffer, "a"):
+            request("PUT", "/products/1", json_body={"attributes": [{"es": "Talla"}]})
+            request("PUT", "/categories/2", json_body={"name": {"es": "Ropa"}})
+            assert request("POST", "/products/1/variants", json_body={}) == {"put_first": True}
+        assert not other.called and buffer.pending() == 1
+
+    @respx.mock
+    def test_write_through(self):
+        put = respx.put(f"{BASE_URL}/products/1").respond(200, json={"id": 1})
+        with buffer_writes(WriteBuffer(), "a"), write_through():
+            assert request("PUT", "/products/1", json_body={"published": False}) == {"id": 1}
+        assert put.called
+
+
+class TestCoalesceWritesMiddleware:
+    def setup_method(self):
+        api.default_store().reset()
+
+    @respx.mock
+    def test_one_request_per_step_and_real_results(self):
+        put = respx.put(f"{BASE_URL}/products/1").respond(200, json={"id": 1, "published": True})
+        model = ScriptedChatModel()
+        model.load({
+            "supervisor": [
+                {"tool_calls": [_call("task", "t1", subagent_type="catalog-manager",
+                                      description="Rename product 1 and publish it")]},
+                {"content": "done"},
+            ],
+            "catalog-manager": [
+                {"tool_calls": [
+                    _call("update_product", "u1", product_id=1,
+                          updates_json='{"name": {"es": "Remera"}}'),
+                    _call("update_product", "u2", product_id=1,
+                          updates_json='{"published": true}'),
+                ]},
+                {"content": "updated"},
+            ],
+        })
+        recorder = ToolResultRecorder()
+        config = {"configurable": {"thread_id": "t"}, "callbacks": [recorder]}
+        build_agent(model=model).invoke({"messages": [{"role": "user", "content": "go"}]}, config)
+
+        assert put.call_count == 1
+        assert json.loads(put.calls[0].request.content) == {
+            "name": {"es": "Remera"}, "published": True,
+        }
+        updates = [m for m in recorder.seen if m.name == "update_product"]
+        assert [json.loads(m.content) for m in updates] == [{"id": 1, "published": True}] * 2
@@ -0,0 +1,123 @@
+import json
+from datetime import date, datetime
+
+import pytest
+import respx
+
+from nube_agent import digest
+from nube_agent.api import StoreClient, use_store
+from nube_agent.config import BASE_URL
+from nube_agent.digest import (
+    DigestScheduler,
+    DigestStore,
+    compute,
+    current,
+    format_lines,
+    parse_time,
+    refresh_all,
+    yesterday,
+)
+from nube_agent.standin import StandinServer, StoreData
+from nube_agent.tools.digest import get_daily_digest
+
+# Orders and checkouts of the stand-in store are created from 2025-01-01 on.
+DAY = date(2025, 1, 1)
+
+
+@pytest.fixture
+def data():
+    data = StoreData(products=6, variants_per_product=3, orders=24, customers=5, checkouts=8)
+    with StandinServer(data, rate_limit=10**6) as srv:
+        with use_store(StoreClient("1", "t", base_url=srv.base_url)):
+            yield data
+
+
+def _on_day(rows, day: date) -> list[dict]:
+    window = digest._window(day)
+    return [r for r in rows
+            if window["created_at_min"] <= r["created_at"] <= window["created_at_max"]]
+
+
+class TestCompute:
+    def test_sections(self, data):
+        orders = list(data.collections["orders"].values())
+        result = compute(DAY, low_stock=10)
+        assert result["store_id"] == "1" and result["day"] == "2025-01-01"
+
+        paid = [o for o in _on_day(orders, DAY)
+                if o["payment_status"] == "paid" and o["status"] != "cancelled"]
+        assert result["sales"]["orders"] == len(paid)
+        assert float(result["sales"]["total"]["ARS"]) == sum(float(o["total"]) for o in paid)
+
+        to_ship = [o for o in orders if o["status"] == "open" and o["payment_status"] == "paid"
+                   and o["shipping_status"] in ("unpacked", "unfulfilled")]
+        assert result["to_ship"]["orders"] == len(to_ship)
+        assert [o["id"] for o in result["to_ship"]["oldest"]] == [
+            o["id"] for o in sorted(to_ship, key=lambda o: o["created_at"])
+        ][:digest.DIGEST_ROWS]
+
+        low = [v for variants in data.nested["variants"].values() for v in variants.values()
+               if v["stock"] is not None and v["stock"] <= 10]
+        assert result["low_stock"]["variants"] == len(low)
+        stocks = [row["stock"] for row in result["low_stock"]["lowest"]]
+        assert stocks == sorted(stocks)
+
+        checkouts = _on_day(list(data.collections["checkouts"].values()), DAY)
+        assert result["abandoned"]["checkouts"] == len(checkouts)
+        assert len(format_lines(result)) >= 4
+
+    @respx.mock
+    def test_failed_section_kept_apart(self):
+        respx.get(url__regex=rf"{BASE_URL}/(orders|products)").respond(200, json=[])
+        respx.get(f"{BASE_URL}/checkouts").respond(500, json={"message": "down"})
+        respx.get(f"{BASE_URL}/store").respond(200, json={"main_language": "es"})
+        result = compute(DAY)
+        assert "error" in result["abandoned"] and "error" not in result["sales"]
+        assert any(line.startswith("Abandoned carts: error") for line in format_lines(result))
+
+
+class TestDigestStore:
+    def test_saved_and_reused(self, data, tmp_path):
+        digests = DigestStore(str(tmp_path))
+        first = current(digests=digests)
+        assert first["day"] == yesterday().isoformat()
+        assert json.loads((tmp_path / "1.json").read_text()) == first
+
+        data.collections["orders"].clear()
+        assert DigestStore(str(tmp_path)).get("1") == first
+        assert current(digests=digests) is first
+        assert current(refresh=True, digests=digests)["to_ship"]["orders"] == 0
+
+    def test_old_digest_recomputed(self, data):
+        digests = DigestStore("")
+        digests.put({**compute(DAY), "store_id": "1"})
+        assert current(digests=digests)["day"] == yesterday().isoformat()
+
+    def test_refresh_all(self):
+        digests = DigestStore("")
+        with (
+            StandinServer(StoreData(products=2, orders=2), rate_limit=10**6) as first,
+            StandinServer(StoreData(products=3, orders=4), rate_limit=10**6) as second,
+        ):
+            clients = [StoreClient("1", "t", base_url=first.base_url),
+                       StoreClient("2", "t", base_url=second.base_url)]
+            results = refresh_all(clients, digests=digests)
+        assert set(results) == {"1", "2"} and digests.get("2")["store_id"] == "2"
+
+    def test_tool(self, data, monkeypatch):
+        monkeypatch.setattr(digest, "DIGESTS", DigestStore(""))
+        result = json.loads(get_daily_digest())
+        assert set(digest.SECTIONS) <= set(result)
+
+
+class TestSchedule:
+    def test_parse_time(self):
+        assert parse_time("07:30") == (7, 30)
+        for bad in ("7", "24:00", "07:60", "aa:bb"):
+            with pytest.raises(ValueError, match="HH:MM"):
+                parse_time(bad)
+
+    def test_next_run(self):
+        scheduler = DigestScheduler("07:00", digests=DigestStore(""))
+        assert scheduler.next_run(datetime(2025, 3, 1, 6, 0)) == datetime(2025, 3, 1, 7, 0)
+        assert scheduler.next_run(datetime(2025, 3, 1, 7, 0)) == datetime(2025, 3, 2, 7, 0)
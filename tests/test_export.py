@@ -0,0 +1,126 @@
+import csv
+import json
+
+import pytest
+import respx
+
+from nube_agent import api
+from nube_agent.api import StoreClient, use_store
+from nube_agent.config import BASE_URL
+from nube_agent.export import (
+    PAGE_SIZE,
+    Progress,
+    cell,
+    export_resource,
+    export_store,
+    fetch_pages,
+)
+from nube_agent.standin import StandinServer, StoreData
+from nube_agent.tools.export import export_data
+
+
+@pytest.fixture
+def server():
+    data = StoreData(products=450, variants_per_product=2, orders=30, customers=12, checkouts=5)
+    with StandinServer(data, rate_limit=10**6) as srv:
+        with use_store(StoreClient("1", "test-token", base_url=srv.base_url)):
+            yield srv
+
+
+def _read(path) -> list[dict]:
+    with open(path, encoding="utf-8", newline="") as fh:
+        return list(csv.DictReader(fh))
+
+
+def _products(start: int, count: int) -> list[dict]:
+    return [{"id": i, "name": {"es": f"P{i}"}, "variants": [{"id": i * 10, "sku": f"S{i}"}]}
+            for i in range(start, start + count)]
+
+
+class TestCell:
+    def test_values(self):
+        assert cell(None) == ""
+        assert cell(True) == "true"
+        assert cell(["S", "Rojo"]) == '["S", "Rojo"]'
+        assert cell(12) == "12"
+
+
+class TestFetchPages:
+    def test_in_order_until_short_page(self, server):
+        pages = list(fetch_pages("/products", {}, prefetch=3))
+        assert [page for page, _ in pages] == [1, 2, 3]
+        assert [len(rows) for _, rows in pages] == [PAGE_SIZE, PAGE_SIZE, 50]
+
+
+class TestExport:
+    def test_flattens_products_and_orders(self, server, tmp_path):
+        summary = export_store(["products", "orders", "customers"], tmp_path)
+        counts = {r["resource"]: r["rows"] for r in summary["resources"]}
+        assert counts == {"products": 900, "orders": 60, "customers": 12}
+
+        products = _read(tmp_path / "products.csv")
+        assert len(products) == 900
+        assert len({row["sku"] for row in products}) == 900
+        assert json.loads(products[0]["values"]) == ["S"]
+        assert products[0]["name"].startswith("Remera")
+
+        orders = _read(tmp_path / "orders.csv")
+        first = server.data.collections["orders"][int(orders[0]["order_id"])]
+        assert [row["sku"] for row in orders[:2]] == [line["sku"] for line in first["products"]]
+
+    def test_finished_resources_are_skipped(self, server, tmp_path):
+        export_store(["customers"], tmp_path)
+        before = server.requests
+        summary = export_store(["customers"], tmp_path)
+        assert summary["resources"][0]["resumed"] and server.requests == before
+        restarted = export_store(["customers"], tmp_path, restart=True)
+        assert not restarted["resources"][0]["resumed"]
+        assert len(_read(tmp_path / "customers.csv")) == 12
+
+    @respx.mock
+    def test_resumes_after_failed_page(self, tmp_path):
+        api.default_store().reset()
+        respx.get(f"{BASE_URL}/store").respond(200, json={"main_language": "es"})
+        route = respx.get(f"{BASE_URL}/products")
+        route.side_effect = [
+            respx.MockResponse(200, json=_products(0, PAGE_SIZE)),
+            # Still failing after the client's retries.
+            *[respx.MockResponse(500, json={"description": "boom"}) for _ in range(3)],
+        ]
+        failed = export_resource("products", tmp_path, prefetch=1, progress=Progress(tmp_path))
+        assert "API error 500" in failed["error"] and failed["rows"] == PAGE_SIZE
+
+        route.side_effect = [respx.MockResponse(200, json=_products(PAGE_SIZE, 3))]
+        resumed = export_store(["products"], tmp_path, prefetch=1)["resources"][0]
+        assert resumed["resumed"] and resumed["rows"] == PAGE_SIZE + 3
+        assert route.calls[-1].request.url.params["page"] == "2"
+        rows = _read(tmp_path / "products.csv")
+        assert [int(r["product_id"]) for r in rows] == list(range(PAGE_SIZE + 3))
+
+    def test_other_files_are_not_replaced(self, server, tmp_path):
+        (tmp_path / "customers.csv").write_text("keep me\n", encoding="utf-8")
+        (tmp_path / "orders").mkdir()
+        (tmp_path / "orders" / "notes.txt").write_text("keep me", encoding="utf-8")
+        summary = export_store(["customers"], tmp_path)
+        assert "not an export" in summary["resources"][0]["error"]
+        assert (tmp_path / "customers.csv").read_text(encoding="utf-8") == "keep me\n"
+        summary = export_store(["orders"], tmp_path, fmt="parquet")
+        assert "not written by an export" in summary["resources"][0]["error"]
+        assert (tmp_path / "orders" / "notes.txt").exists()
+
+    def test_parquet(self, server, tmp_path):
+        pq = pytest.importorskip("pyarrow.parquet")
+        export_store(["products"], tmp_path, fmt="parquet")
+        table = pq.read_table(tmp_path / "products")
+        assert table.num_rows == 900
+
+
+class TestTool:
+    def test_validates_arguments(self):
+        assert export_data("products,refunds").startswith("Error: unknown resource refunds")
+        assert export_data(fmt="xlsx").startswith("Error: fmt")
+
+    def test_writes_files(self, server, tmp_path):
+        summary = json.loads(export_data("checkouts", output_dir=str(tmp_path)))
+        assert summary["resources"][0]["rows"] == 5
+        assert (tmp_path / "checkouts.csv").exists()
@@ -0,0 +1,92 @@
+import json
+
+import respx
+
+from nube_agent.agent import build_agent, load_model, resolve_model
+from nube_agent.config import BASE_URL
+from nube_agent.fake_model import ScriptedChatModel, ScriptRecorder
+
+SCRIPT = {
+    "responses": {
+        "supervisor": [
+            {
+                "tool_calls": [
+                    {
+                        "name": "task",
+                        "args": {"subagent_type": "catalog-manager", "description": "List"},
+                    }
+                ]
+            },
+            {"content": "You have 1 product."},
+        ],
+        "catalog-manager": [
+            {"tool_calls": [{"name": "list_products", "args": {}}]},
+            {"content": "Remera"},
+        ],
+    }
+}
+
+
+class TestScriptedChatModel:
+    def test_queues_per_agent(self):
+        model = ScriptedChatModel()
+        model.load({"supervisor": [{"content": "hi"}], "catalog-manager": [{"content": "x"}]})
+        assert model.invoke("hello").content == "hi"
+        assert model.pending() == {"catalog-manager": 1}
+
+    def test_exhausted(self):
+        model = ScriptedChatModel()
+        assert "no more responses" in model.invoke("hello").content
+
+    def test_tool_calls_get_ids(self):
+        model = ScriptedChatModel()
+        model.load({"supervisor": [{"tool_calls": [{"name": "get_store_info"}]}]})
+        call = model.invoke("hello").tool_calls[0]
+        assert call["name"] == "get_store_info"
+        assert call["id"]
+
+    def test_from_conversation_file(self, tmp_path):
+        path = tmp_path / "conv.json"
+        path.write_text(json.dumps({"turns": [SCRIPT, SCRIPT]}))
+        model = ScriptedChatModel.from_file(path)
+        assert model.pending() == {"supervisor": 4, "catalog-manager": 4}
+
+
+class TestLoadModel:
+    def test_passthrough(self):
+        assert load_model("anthropic:claude-sonnet-4-5") == "anthropic:claude-sonnet-4-5"
+
+    def test_openai_reports_usage(self):
+        model = load_model("openai:gpt-4o")
+        assert model.model_name == "gpt-4o"
+        assert model.stream_usage is True
+
+    def test_fake(self, tmp_path):
+        path = tmp_path / "script.json"
+        path.write_text(json.dumps(SCRIPT))
+        assert isinstance(load_model(f"fake:{path}"), ScriptedChatModel)
+
+    def test_resolve(self):
+        model = ScriptedChatModel()
+        assert resolve_model(model) is model
+        assert resolve_model("openai:gpt-4o").stream_usage is True
+        assert resolve_model("anthropic:claude-sonnet-4-5").model == "claude-sonnet-4-5"
+
+
+class TestEndToEnd:
+    @respx.mock
+    def test_turn_through_subagent_and_record(self):
+        route = respx.get(f"{BASE_URL}/products").respond(200, json=[{"id": 1}])
+        model = ScriptedChatModel()
+        model.load(SCRIPT["responses"])
+        recorder = ScriptRecorder()
+        agent = build_agent(model=model)
+        config = {"configurable": {"thread_id": "t"}, "callbacks": [recorder]}
+
+        result = agent.invoke({"messages": [{"role": "user", "content": "hi"}]}, config=config)
+
+        assert result["messages"][-1].content == "You have 1 product."
+        assert route.called
+        assert model.pending() == {}
+        assert recorder.responses["catalog-manager"][0]["tool_calls"][0]["name"] == "list_products"
+        assert recorder.responses["supervisor"][-1] == {"content": "You have 1 product."}
@@ -0,0 +1,137 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pytest
+import respx
+
+from nube_agent import api
+from nube_agent.api import StoreClient, journal_scope, request
+from nube_agent.config import BASE_URL
+from nube_agent.journal import WriteJournal, idempotency_key, resource
+
+
+@pytest.fixture
+def client(tmp_path):
+    journal = WriteJournal(tmp_path / "journal.sqlite")
+    with api.use_store(StoreClient("12345", "t", base_url=BASE_URL, journal=journal)) as c:
+        yield c
+    journal.close()
+
+
+class TestKeys:
+    def test_resource(self):
+        assert resource("/orders/1/close") == "/orders/1"
+        assert resource("/coupons") == "/coupons"
+
+    def test_key_depends_on_scope_and_body(self):
+        key = idempotency_key("s", "1", "POST", "/coupons", {"code": "A"})
+        assert key == idempotency_key("s", "1", "POST", "/coupons", {"code": "A"})
+        assert key != idempotency_key("t", "1", "POST", "/coupons", {"code": "A"})
+        assert key != idempotency_key("s", "1", "POST", "/coupons", {"code": "B"})
+
+
+class TestJournaledWrites:
+    @respx.mock
+    def test_resumed_scope_is_replayed(self, client):
+        route = respx.post(f"{BASE_URL}/coupons").respond(201, json={"id": 1})
+        with journal_scope("turn-1"):
+            assert request("POST", "/coupons", json_body={"code": "A"}) == {"id": 1}
+        with journal_scope("turn-1"):
+            assert request("POST", "/coupons", json_body={"code": "A"}) == {"id": 1}
+        assert route.call_count == 1
+        with journal_scope("turn-2"):
+            request("POST", "/coupons", json_body={"code": "A"})
+        assert route.call_count == 2
+        keys = {call.request.headers["Idempotency-Key"] for call in route.calls}
+        assert len(keys) == 2
+
+    @respx.mock
+    def test_replay_while_half_open_frees_trial(self, client):
+        route = respx.post(f"{BASE_URL}/coupons").respond(201, json={"id": 1})
+        with journal_scope("turn-1"):
+            request("POST", "/coupons", json_body={"code": "A"})
+        breaker = client.breaker("coupons")
+        breaker.cooldown = 0
+        for _ in range(breaker.threshold):
+            breaker.record(False)
+        with journal_scope("turn-1"):
+            assert request("POST", "/coupons", json_body={"code": "A"}) == {"id": 1}
+        with journal_scope("turn-2"):
+            assert request("POST", "/coupons", json_body={"code": "A"}) == {"id": 1}
+        assert route.call_count == 2 and not breaker.is_open()
+
+    @respx.mock
+    def test_repeat_in_one_run_is_sent(self, client):
+        route = respx.post(f"{BASE_URL}/coupons").respond(201, json={"id": 1})
+        with journal_scope("turn-1"):
+            request("POST", "/coupons", json_body={"code": "A"})
+            request("POST", "/coupons", json_body={"code": "A"})
+        assert route.call_count == 2
+        keys = {call.request.headers["Idempotency-Key"] for call in route.calls}
+        assert len(keys) == 2
+        with journal_scope("turn-1"):
+            request("POST", "/coupons", json_body={"code": "A"})
+            request("POST", "/coupons", json_body={"code": "A"})
+        assert route.call_count == 2
+
+    @respx.mock
+    def test_concurrent_repeats_are_sent(self, client):
+        route = respx.post(f"{BASE_URL}/coupons").respond(201, json={"id": 1})
+        with journal_scope("turn-1"):
+            ctx = contextvars.copy_context()
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                list(pool.map(
+                    lambda _: ctx.copy().run(request, "POST", "/coupons", json_body={"code": "A"}),
+                    range(4),
+                ))
+        keys = {call.request.headers["Idempotency-Key"] for call in route.calls}
+        assert route.call_count == 4 and len(keys) == 4
+
+    @respx.mock
+    def test_write_after_other_write_is_sent(self, client):
+        route = respx.put(f"{BASE_URL}/products/1/variants/2").respond(200, json={})
+        respx.get(f"{BASE_URL}/products/1/variants/2").respond(200, json={"stock": 5})
+        with journal_scope("turn"):
+            for stock in (5, 10, 5):
+                request("PUT", "/products/1/variants/2", json_body={"stock": stock})
+        assert route.call_count == 3
+        with journal_scope("turn"):
+            for stock in (5, 10, 5):
+                request("PUT", "/products/1/variants/2", json_body={"stock": stock})
+        assert route.call_count == 3
+
+    @respx.mock
+    def test_ambiguous_post_asks_before_resending(self, client):
+        route = respx.post(f"{BASE_URL}/products")
+        route.side_effect = [httpx.ReadTimeout("timed out"), httpx.Response(201, json={"id": 9})]
+        with journal_scope("turn"):
+            first = request("POST", "/products", json_body={"name": "Remera"})
+            assert "may have been applied" in first and route.call_count == 1
+            second = request("POST", "/products", json_body={"name": "Remera"})
+            assert second.startswith("Error: an earlier attempt") and route.call_count == 1
+            assert request("POST", "/products", json_body={"name": "Remera"}) == {"id": 9}
+        assert [e["status"] for e in client.journal.entries("turn")] == ["done"]
+
+    @respx.mock
+    def test_failed_writes_are_resent(self, client):
+        route = respx.post(f"{BASE_URL}/coupons")
+        route.side_effect = [httpx.Response(422, json={}), httpx.Response(201, json={"id": 1})]
+        with journal_scope("turn"):
+            request("POST", "/coupons", json_body={"code": "A"})
+            assert request("POST", "/coupons", json_body={"code": "A"}) == {"id": 1}
+
+    @respx.mock
+    def test_unscoped_writes_are_not_journaled(self, client):
+        route = respx.post(f"{BASE_URL}/coupons").respond(201, json={"id": 1})
+        request("POST", "/coupons", json_body={"code": "A"})
+        request("POST", "/coupons", json_body={"code": "A"})
+        assert route.call_count == 2 and client.journal.entries() == []
+
+    def test_old_entries_dropped(self, tmp_path):
+        path = tmp_path / "journal.sqlite"
+        journal = WriteJournal(path)
+        journal.begin("k", "s", "1", "POST", "/coupons")
+        journal.close()
+        assert WriteJournal(path).entries() != []
+        assert WriteJournal(path, retention_days=-1).entries() == []
@@ -0,0 +1,89 @@
+import respx
+
+from nube_agent import api as api_mod
+from nube_agent.config import BASE_URL
+from nube_agent.listings import LISTINGS, fetch_rows, fetch_store, localized, table_lines
+
+STORE_RESPONSE = {"main_language": "es", "country": "AR"}
+
+
+class TestLocalized:
+    def setup_method(self):
+        api_mod.default_store().reset()
+
+    @respx.mock
+    def test_store_language(self):
+        respx.get(f"{BASE_URL}/store").respond(200, json=STORE_RESPONSE)
+        assert localized({"pt": "Camiseta", "es": "Remera"}) == "Remera"
+
+    @respx.mock
+    def test_falls_back_to_first_value(self):
+        respx.get(f"{BASE_URL}/store").respond(200, json=STORE_RESPONSE)
+        assert localized({"pt": "Camiseta"}) == "Camiseta"
+
+    def test_plain_value(self):
+        assert localized("Remera") == "Remera"
+        assert localized(None) == ""
+
+
+class TestTableLines:
+    def test_header_and_rows(self):
+        columns = [("ID", lambda r: r["id"]), ("Name", lambda r: r["name"])]
+        lines = table_lines([{"id": 1, "name": "Remera"}], columns, 80)
+        assert lines[0].split() == ["ID", "Name"]
+        assert lines[2].split() == ["1", "Remera"]
+
+    def test_shrinks_to_width(self):
+        columns = [("ID", lambda r: r["id"]), ("Name", lambda r: r["name"])]
+        lines = table_lines([{"id": 1, "name": "x" * 100}], columns, 30)
+        assert all(len(line) <= 30 for line in lines)
+        assert lines[2].endswith("…")
+
+
+class TestFetchRows:
+    def setup_method(self):
+        api_mod.default_store().reset()
+
+    @respx.mock
+    def test_products_page(self):
+        products = [{"id": 1, "name": {"es": "Remera"}, "variants": [{"stock": 2}]}]
+        route = respx.get(f"{BASE_URL}/products").respond(200, json=products)
+        rows = fetch_rows("/products", page=2)
+        assert rows[0]["id"] == 1
+        assert route.calls[0].request.url.params["page"] == "2"
+
+    @respx.mock
+    def test_past_last_page_is_empty(self):
+        respx.get(f"{BASE_URL}/orders").respond(404, json={"description": "Last page is 1"})
+        assert fetch_rows("/orders", page=2) == []
+
+    @respx.mock
+    def test_error_string(self):
+        respx.get(f"{BASE_URL}/customers").respond(403, json={"description": "Forbidden"})
+        result = fetch_rows("/customers")
+        assert isinstance(result, str)
+        assert "403" in result
+
+    @respx.mock
+    def test_variants_uses_product_id(self):
+        respx.get(f"{BASE_URL}/products/7/variants").respond(200, json=[{"id": 70}])
+        assert fetch_rows("/variants", arg="7")[0]["id"] == 70
+
+    @respx.mock
+    def test_product_columns(self):
+        respx.get(f"{BASE_URL}/store").respond(200, json=STORE_RESPONSE)
+        product = {
+            "id": 1,
+            "name": {"es": "Remera"},
+            "published": True,
+            "variants": [{"price": "10.00", "stock": 2}, {"price": "10.00", "stock": 3}],
+        }
+        cells = [get(product) for _, get in LISTINGS["/products"]["columns"]]
+        assert cells == [1, "Remera", "10.00", "5", "yes"]
+
+
+class TestFetchStore:
+    @respx.mock
+    def test_returns_dict(self):
+        respx.get(f"{BASE_URL}/store").respond(200, json={"name": {"es": "Mi Tienda"}})
+        assert fetch_store()["name"]["es"] == "Mi Tienda"
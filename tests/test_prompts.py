@@ -0,0 +1,91 @@
+from typing import Any
+
+from langchain.agents.middleware.types import ModelRequest
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import SystemMessage
+from langchain_openai import ChatOpenAI
+
+from nube_agent.agent import build_agent
+from nube_agent.fake_model import ScriptedChatModel
+from nube_agent.prompts import StablePromptMiddleware, stable_system_message
+from nube_agent.telemetry import agent_name
+
+BOUND: list[list[str]] = []
+
+
+class ToolRecordingModel(ScriptedChatModel):
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "ToolRecordingModel":
+        BOUND.append([getattr(t, "name", None) or t.get("name") for t in tools])
+        return self
+
+
+class PromptRecorder(BaseCallbackHandler):
+    def __init__(self) -> None:
+        self.prompts: list[tuple[str, list]] = []
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        self.prompts.append((agent_name(metadata), messages[0][0].content))
+
+
+def _run() -> tuple[list, list]:
+    BOUND.clear()
+    model = ToolRecordingModel()
+    model.load({
+        "supervisor": [
+            {"tool_calls": [{"name": "task", "args": {
+                "subagent_type": "order-manager", "description": "List orders"}}]},
+            {"content": "ok"},
+        ],
+        "order-manager": [{"content": "no orders"}],
+    })
+    recorder = PromptRecorder()
+    config = {"configurable": {"thread_id": "t"}, "callbacks": [recorder]}
+    build_agent(model=model).invoke({"messages": [{"role": "user", "content": "hi"}]}, config)
+    return recorder.prompts, list(BOUND)
+
+
+class TestStableSystemMessage:
+    def test_dynamic_sections_last(self):
+        message = SystemMessage(content=[
+            {"type": "text", "text": "You are..."},
+            {"type": "text", "text": "\n\n## Skills System\n- a"},
+            {"type": "text", "text": "\n\n## `task`"},
+        ])
+        texts = [b["text"] for b in stable_system_message(message).content]
+        assert texts == ["You are...", "\n\n## `task`", "\n\n## Skills System\n- a"]
+
+    def test_plain_prompt_untouched(self):
+        message = SystemMessage(content="You are...")
+        assert stable_system_message(message) is message
+
+
+class TestStablePromptMiddleware:
+    def test_openai_calls_get_cache_key(self):
+        request = ModelRequest(model=ChatOpenAI(model="gpt-4o", api_key="sk-test"), messages=[])
+        ordered = StablePromptMiddleware("order-manager").order(request)
+        assert ordered.model_settings == {"prompt_cache_key": "nube-agent:order-manager"}
+
+    def test_other_models_unchanged(self):
+        request = ModelRequest(model=ScriptedChatModel(), messages=[])
+        assert StablePromptMiddleware("supervisor").order(request).model_settings == {}
+
+    def test_skills_sorted(self):
+        skills = [{"name": "b"}, {"name": "a"}]
+        update = StablePromptMiddleware("x").before_agent({"skills_metadata": skills}, None)
+        assert [s["name"] for s in update["skills_metadata"]] == ["a", "b"]
+        assert StablePromptMiddleware("x").before_agent({}, None) is None
+
+
+class TestPromptPrefix:
+    def test_identical_across_builds(self):
+        first, first_tools = _run()
+        second, second_tools = _run()
+        assert first == second and first_tools == second_tools
+        assert all(tools == sorted(tools) for tools in first_tools)
+
+    def test_static_sections_first(self):
+        prompts, _ = _run()
+        for agent in ("supervisor", "order-manager"):
+            blocks = next(content for name, content in prompts if name == agent)
+            assert "## Skills System" in blocks[-1]["text"]
+            assert not any("## Skills System" in b["text"] for b in blocks[:-1])
@@ -0,0 +1,169 @@
+import json
+from pathlib import Path
+
+import respx
+from langgraph.types import Command
+
+from nube_agent.agent import build_agent
+from nube_agent.config import BASE_URL
+from nube_agent.fake_model import ScriptedChatModel
+from nube_agent.router import (
+    COMMAND_DOMAINS,
+    HISTORY_TURNS,
+    RoutedAgent,
+    Router,
+    description_keywords,
+    words,
+)
+
+PROMPTS = Path(__file__).parent.parent / "benchmarks" / "routing" / "prompts.jsonl"
+
+
+def _config(thread: str) -> dict:
+    return {"configurable": {"thread_id": thread}}
+
+
+def _user(text: str) -> dict:
+    return {"messages": [{"role": "user", "content": text}]}
+
+
+class TestRouter:
+    def test_words_drop_accents(self):
+        assert words("¿Cuántas VENTAS tuve?") == ["cuantas", "ventas", "tuve"]
+
+    def test_description_keywords(self):
+        description = "Manages X. Use when the user asks about coupons, discounts, or carts."
+        assert description_keywords(description) == ("coupon", "discount", "cart")
+
+    def test_single_domain_routes(self):
+        router = Router()
+        assert router.classify("Cancel order 1261") == "order-manager"
+        assert router.classify("Mostrame los productos sin stock") == "catalog-manager"
+        assert router.classify("Crie um cupom de desconto") == "marketing-manager"
+
+    def test_ambiguous_falls_back(self):
+        router = Router()
+        assert router.classify("Show me the orders of customer 8") is None
+        assert router.classify("Thanks!") is None
+
+    def test_store_questions_go_to_supervisor(self):
+        assert Router().classify("How many orders do I have across all my stores?") is None
+
+    def test_history_routes_follow_ups(self):
+        router = Router()
+        router.note_command("/orders", "a")
+        assert router.route("the second one", "b") is None
+        for _ in range(HISTORY_TURNS):
+            assert router.route("the second one", "a") == "order-manager"
+        assert router.route("the second one", "a") is None
+
+    def test_non_listing_commands_ignored(self):
+        router = Router()
+        router.note_command("/usage")
+        assert router.route("the second one") is None
+
+    def test_labelled_prompts_never_misroute(self):
+        router = Router()
+        for line in PROMPTS.read_text(encoding="utf-8").splitlines():
+            case = json.loads(line)
+            decision = router.classify(case["prompt"], COMMAND_DOMAINS.get(case.get("history")))
+            assert decision in (None, case["expected"]), case["prompt"]
+
+
+class TestRoutedAgent:
+    def test_build_agent_wraps(self):
+        agent = build_agent(model=ScriptedChatModel(), router=True)
+        assert isinstance(agent, RoutedAgent)
+        assert set(agent.subagents) == {
+            "catalog-manager", "order-manager", "customer-manager",
+            "marketing-manager", "content-manager",
+        }
+
+    def test_same_middleware_as_supervised_subagents(self, monkeypatch):
+        import deepagents.middleware.subagents
+        import langchain.agents
+
+        stacks: dict[str, list[list[str]]] = {}
+
+        def recording(create_agent):
+            def create(model, *, middleware=(), name=None, **kwargs):
+                stacks.setdefault(name, []).append([type(m).__name__ for m in middleware])
+                return create_agent(model, middleware=middleware, name=name, **kwargs)
+
+            return create
+
+        monkeypatch.setattr(deepagents.middleware.subagents, "create_agent",
+                            recording(deepagents.middleware.subagents.create_agent))
+        monkeypatch.setattr(langchain.agents, "create_agent",
+                            recording(langchain.agents.create_agent))
+        agent = build_agent(model=ScriptedChatModel(), router=True)
+        for name in agent.subagents:
+            supervised, routed = stacks[name]
+            assert supervised == routed
+
+    def test_routed_turn_skips_supervisor(self):
+        model = ScriptedChatModel()
+        model.load({"catalog-manager": [{"content": "You have 3 products."}]})
+        agent = build_agent(model=model, router=True)
+
+        result = agent.invoke(_user("List my products"), _config("t"))
+
+        assert result["messages"][-1].content == "You have 3 products."
+        assert model.pending() == {}
+        assert agent.routed == 1
+        history = agent.get_state(_config("t")).values["messages"]
+        assert [m.content for m in history] == ["List my products", "You have 3 products."]
+
+    def test_routed_turn_sees_conversation(self):
+        model = ScriptedChatModel()
+        model.load({
+            "supervisor": [{"content": "Hi! How can I help?"}],
+            "order-manager": [{"content": "Done."}],
+        })
+        agent = build_agent(model=model, router=True)
+        agent.invoke(_user("Hola"), _config("t"))
+        seen = []
+        original = agent.subagents["order-manager"]
+
+        class Spy:
+            def __getattr__(self, name):
+                return getattr(original, name)
+
+            def invoke(self, value, config, **kwargs):
+                seen.extend(m.content for m in value["messages"])
+                return original.invoke(value, config, **kwargs)
+
+        agent.subagents["order-manager"] = Spy()
+        agent.invoke(_user("Close order 300"), _config("t"))
+        assert seen == ["Hola", "Hi! How can I help?", "Close order 300"]
+
+    def test_ambiguous_turn_uses_supervisor(self):
+        model = ScriptedChatModel()
+        model.load({"supervisor": [{"content": "Which one?"}]})
+        agent = build_agent(model=model, router=True)
+        result = agent.invoke(_user("Do the same for the other one"), _config("t"))
+        assert result["messages"][-1].content == "Which one?"
+        assert agent.routed == 0
+
+    @respx.mock
+    def test_approval_on_routed_turn(self):
+        route = respx.post(f"{BASE_URL}/orders/7/cancel").respond(200, json={"id": 7})
+        model = ScriptedChatModel()
+        model.load({"order-manager": [
+            {"tool_calls": [{"name": "cancel_order", "args": {"order_id": 7}}]},
+            {"content": "Order 7 cancelled."},
+        ]})
+        agent = build_agent(model=model, router=True)
+        config = _config("t")
+
+        agent.invoke(_user("Cancel order 7"), config)
+        interrupts = agent.get_state(config).interrupts
+        assert interrupts and not route.called
+
+        resume = {intr.id: {"decisions": [{"type": "approve"}]} for intr in interrupts}
+        chunks = list(agent.stream(Command(resume=resume), config, stream_mode="messages"))
+
+        assert chunks and route.called
+        assert not agent.get_state(config).interrupts
+        history = agent.get_state(config).values["messages"]
+        assert [m.content for m in history] == ["Cancel order 7", "Order 7 cancelled."]
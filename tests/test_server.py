@@ -0,0 +1,227 @@
+import asyncio
+import json
+import time
+
+import httpx
+import respx
+
+from nube_agent import api
+from nube_agent.agent import build_agent
+from nube_agent.config import BASE_URL
+from nube_agent.fake_model import ScriptedChatModel
+from nube_agent.journal import WriteJournal
+from nube_agent.server import AgentServer
+
+CANCEL_SCRIPT = {
+    "supervisor": [
+        {"tool_calls": [{"name": "task", "args": {
+            "subagent_type": "order-manager", "description": "Cancel order 7"}}]},
+        {"content": "Order 7 cancelled."},
+    ],
+    "order-manager": [
+        {"tool_calls": [{"name": "cancel_order", "args": {"order_id": 7}}]},
+        {"content": "Cancelled."},
+    ],
+}
+
+
+def _events(text: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def _call(app, *requests):
+    """Send requests to the ASGI app in order and return the responses."""
+
+    async def go():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return [await client.request(method, url, **kw) for method, url, kw in requests]
+
+    return asyncio.run(go())
+
+
+def _server(responses: dict, **kwargs) -> AgentServer:
+    model = ScriptedChatModel()
+    model.load(responses)
+    return AgentServer(build_agent(model=model), **kwargs)
+
+
+class TestSessions:
+    def test_health_and_create(self):
+        app = _server({})
+        health, created, dup, info = _call(
+            app,
+            ("GET", "/health", {}),
+            ("POST", "/sessions", {"json": {"thread_id": "staff-1"}}),
+            ("POST", "/sessions", {"json": {"thread_id": "staff-1"}}),
+            ("GET", "/sessions/staff-1", {}),
+        )
+        assert health.json() == {"status": "ok", "sessions": 0}
+        assert created.status_code == 201
+        assert dup.status_code == 409
+        assert info.json()["pending"] == []
+
+    def test_store_selection(self):
+        app = _server({})
+        ok, unknown = _call(
+            app,
+            ("POST", "/sessions", {"json": {"thread_id": "a"}}),
+            ("POST", "/sessions", {"json": {"thread_id": "b", "store_id": "999"}}),
+        )
+        assert ok.json()["store_id"] == api.default_store().store_id
+        assert unknown.status_code == 400
+
+    @respx.mock
+    def test_sessions_use_their_own_store(self):
+        respx.get("https://a.test/1/store").respond(200, json={"id": 1})
+        respx.get("https://b.test/2/store").respond(200, json={"id": 2})
+        api.register_store(api.StoreClient("1", "a", base_url="https://a.test/1"))
+        api.register_store(api.StoreClient("2", "b", base_url="https://b.test/2"))
+        call = {"tool_calls": [{"name": "get_store_info", "args": {}}]}
+        app = _server({"supervisor": [call, {"content": "one"}, call, {"content": "two"}]})
+        try:
+            _, _, first, second = _call(
+                app,
+                ("POST", "/sessions", {"json": {"thread_id": "a", "store_id": "1"}}),
+                ("POST", "/sessions", {"json": {"thread_id": "b", "store_id": "2"}}),
+                ("POST", "/sessions/a/messages", {"json": {"content": "store?"}}),
+                ("POST", "/sessions/b/messages", {"json": {"content": "store?"}}),
+            )
+            state_a = app.agent.get_state({"configurable": {"thread_id": "a"}})
+            state_b = app.agent.get_state({"configurable": {"thread_id": "b"}})
+            assert state_a.values["messages"][-2].content == '{"id": 1}'
+            assert state_b.values["messages"][-2].content == '{"id": 2}'
+            assert set(app.stats()["stores"]) == {"1", "2"}
+        finally:
+            api.remove_store("1")
+            api.remove_store("2")
+
+    def test_unknown_session(self):
+        (resp,) = _call(
+            _server({}), ("POST", "/sessions/nope/messages", {"json": {"content": "x"}})
+        )
+        assert resp.status_code == 404
+
+    def test_token_required(self):
+        app = _server({}, token="secret")
+        denied, allowed = _call(
+            app,
+            ("POST", "/sessions", {}),
+            ("POST", "/sessions", {"headers": {"Authorization": "Bearer secret"}}),
+        )
+        assert denied.status_code == 401
+        assert allowed.status_code == 201
+
+    def test_delete(self):
+        app = _server({})
+        _call(app, ("POST", "/sessions", {"json": {"thread_id": "a"}}),
+              ("DELETE", "/sessions/a", {}))
+        assert app.sessions == {}
+
+    def test_bad_body(self):
+        app = _server({})
+        _, resp = _call(
+            app,
+            ("POST", "/sessions", {"json": {"thread_id": "a"}}),
+            ("POST", "/sessions/a/messages", {"content": b"{nope"}),
+        )
+        assert resp.status_code == 400
+
+
+class TestStreaming:
+    def test_message_streams_tokens(self):
+        app = _server({"supervisor": [{"content": "Hola!"}]})
+        _, resp = _call(
+            app,
+            ("POST", "/sessions", {"json": {"thread_id": "a"}}),
+            ("POST", "/sessions/a/messages", {"json": {"content": "hi"}}),
+        )
+        assert resp.headers["content-type"] == "text/event-stream"
+        events = _events(resp.text)
+        assert ("token", {"text": "Hola!"}) in events
+        assert events[-1][0] == "done"
+        assert events[-1][1]["pending"] == 0
+
+    @respx.mock
+    def test_approval_over_the_wire(self):
+        route = respx.post(f"{BASE_URL}/orders/7/cancel").respond(200, json={"id": 7})
+        app = _server(CANCEL_SCRIPT)
+        _, first = _call(
+            app,
+            ("POST", "/sessions", {"json": {"thread_id": "a"}}),
+            ("POST", "/sessions/a/messages", {"json": {"content": "cancel order 7"}}),
+        )
+        interrupts = [data for event, data in _events(first.text) if event == "interrupt"]
+        assert len(interrupts) == 1
+        assert interrupts[0]["actions"][0]["name"] == "cancel_order"
+        assert not route.called
+
+        bad, second = _call(
+            app,
+            ("POST", "/sessions/a/decisions", {"json": {"decisions": {"nope": []}}}),
+            ("POST", "/sessions/a/decisions", {"json": {"decisions": [{"type": "approve"}]}}),
+        )
+        assert bad.status_code == 400
+        assert route.called
+        events = _events(second.text)
+        assert ("token", {"text": "Order 7 cancelled."}) in events
+        assert events[-1][1]["pending"] == 0
+
+    @respx.mock
+    def test_recreated_session_sends_repeated_write(self, tmp_path):
+        route = respx.post(f"{BASE_URL}/coupons").respond(201, json={"id": 1})
+        create = {"tool_calls": [{"name": "task", "args": {
+            "subagent_type": "marketing-manager", "description": "Create coupon X"}}]}
+        coupon = {"tool_calls": [{"name": "create_coupon", "args": {
+            "code": "X", "coupon_type": "shipping"}}]}
+        app = _server({
+            "supervisor": [create, {"content": "Done."}] * 2,
+            "marketing-manager": [coupon, {"content": "Created."}] * 2,
+        })
+        journal = WriteJournal(tmp_path / "journal.sqlite")
+        store = api.default_store()
+        store.journal = journal
+        try:
+            _call(
+                app,
+                ("POST", "/sessions", {"json": {"thread_id": "a"}}),
+                ("POST", "/sessions/a/messages", {"json": {"content": "coupon X"}}),
+                ("DELETE", "/sessions/a", {}),
+                ("POST", "/sessions", {"json": {"thread_id": "a"}}),
+                ("POST", "/sessions/a/messages", {"json": {"content": "coupon X"}}),
+            )
+        finally:
+            store.journal = None
+            journal.close()
+        assert route.call_count == 2
+
+    def test_decisions_without_pending(self):
+        app = _server({})
+        _, resp = _call(
+            app,
+            ("POST", "/sessions", {"json": {"thread_id": "a"}}),
+            ("POST", "/sessions/a/decisions", {"json": {"decisions": [{"type": "approve"}]}}),
+        )
+        assert resp.status_code == 409
+
+    def test_concurrent_sessions(self):
+        app = _server({"supervisor": [{"content": "ok", "latency": 0.2}] * 4})
+
+        async def go():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                for i in range(4):
+                    await client.post("/sessions", json={"thread_id": f"s{i}"})
+                return await asyncio.gather(*(
+                    client.post(f"/sessions/s{i}/messages", json={"content": "hi"})
+                    for i in range(4)
+                ))
+
+        started = time.perf_counter()
+        responses = asyncio.run(go())
+        assert time.perf_counter() - started < 0.6
+        assert all(_events(r.text)[-1][0] == "done" for r in responses)
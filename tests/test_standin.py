@@ -0,0 +1,96 @@
+import json
+
+import httpx
+import pytest
+
+from nube_agent.api import StoreClient, use_store
+from nube_agent.standin import RateLimiter, StandinServer, StoreData, route
+from nube_agent.tools.orders import cancel_order
+from nube_agent.tools.products import list_products
+from nube_agent.tools.variants import create_variant, list_variants
+
+HEADERS = {"Authentication": "bearer test-token"}
+
+
+@pytest.fixture
+def server():
+    data = StoreData(products=30, variants_per_product=2, orders=15, customers=5)
+    with StandinServer(data) as srv:
+        with use_store(StoreClient("1", "test-token", base_url=srv.base_url)):
+            yield srv
+
+
+class TestStoreData:
+    def test_sizes(self):
+        data = StoreData(products=4, variants_per_product=3, orders=6, customers=2)
+        assert len(data.collections["products"]) == 4
+        assert len(data.collections["orders"]) == 6
+        assert all(len(v) == 3 for v in data.nested["variants"].values())
+
+    def test_deterministic(self):
+        first = StoreData(products=5, seed=7)
+        second = StoreData(products=5, seed=7)
+        assert first.nested == second.nested
+
+
+class TestRoute:
+    def test_pagination_headers(self):
+        data = StoreData(products=25)
+        status, body, headers = route(data, "GET", "/products", {"per_page": "10"}, {})
+        assert status == 200
+        assert len(body) == 10
+        assert headers["x-total-count"] == "25"
+        assert 'rel="next"' in headers["Link"]
+
+    def test_past_last_page(self):
+        data = StoreData(products=5)
+        status, body, _ = route(data, "GET", "/products", {"page": "3", "per_page": "5"}, {})
+        assert status == 404
+        assert body["description"] == "Last page is 1"
+
+    def test_order_filters(self):
+        data = StoreData(orders=12)
+        _, body, _ = route(data, "GET", "/orders", {"status": "cancelled"}, {})
+        assert body and all(o["status"] == "cancelled" for o in body)
+
+
+class TestRateLimiter:
+    def test_bucket_fills(self):
+        limiter = RateLimiter(capacity=2, leak_rate=0.0)
+        assert limiter.acquire()[0]
+        assert limiter.acquire()[0]
+        allowed, remaining, _ = limiter.acquire()
+        assert not allowed
+        assert remaining == 0
+
+
+class TestServer:
+    def test_tools_against_server(self, server):
+        products = json.loads(list_products(per_page=50))
+        assert len(products) == 30
+        product_id = products[0]["id"]
+        assert len(json.loads(list_variants(product_id))) == 2
+
+    def test_variant_values_validated(self, server):
+        product_id = json.loads(list_products())[0]["id"]
+        result = create_variant(product_id, '{"price": "10.00"}')
+        assert "API error 422" in result
+
+    def test_order_actions(self, server):
+        order_id = next(iter(server.data.collections["orders"]))
+        result = json.loads(cancel_order(order_id))
+        assert result["status"] == "cancelled"
+
+    def test_requires_token(self, server):
+        resp = httpx.get(f"{server.base_url}/products")
+        assert resp.status_code == 401
+
+    def test_rate_limit_headers(self):
+        with StandinServer(rate_limit=1, leak_rate=0.001) as srv:
+            first = httpx.get(f"{srv.base_url}/store", headers=HEADERS)
+            second = httpx.get(f"{srv.base_url}/store", headers=HEADERS)
+        assert first.status_code == 200
+        assert first.headers["x-rate-limit-limit"] == "1"
+        assert second.status_code == 429
+        assert second.headers["x-rate-limit-remaining"] == "0"
+        assert "Retry-After" in second.headers
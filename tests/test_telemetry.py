@@ -0,0 +1,132 @@
+import json
+
+import pytest
+import respx
+
+from nube_agent import telemetry
+from nube_agent.agent import build_agent
+from nube_agent.api import request
+from nube_agent.config import BASE_URL
+from nube_agent.fake_model import ScriptedChatModel
+
+
+@pytest.fixture(autouse=True)
+def clean_tracer():
+    telemetry.TRACER.clear()
+    yield
+    telemetry.TRACER.clear()
+
+
+class TestPathTemplate:
+    def test_numeric_segments(self):
+        assert telemetry.path_template("/products/1/variants/22") == "/products/{id}/variants/{id}"
+
+    def test_no_ids(self):
+        assert telemetry.path_template("/store") == "/store"
+
+
+class TestHistogram:
+    def test_summary(self):
+        hist = telemetry.Histogram()
+        for ms in range(1, 101):
+            hist.add(float(ms), error=ms == 100)
+        stats = hist.summary()
+        assert stats["count"] == 100
+        assert stats["errors"] == 1
+        assert stats["p50_ms"] == 51
+        assert stats["max_ms"] == 100
+
+    def test_buckets(self):
+        hist = telemetry.Histogram()
+        hist.add(0.5)
+        hist.add(45000)
+        assert hist.buckets[0] == 1
+        assert hist.buckets[-1] == 1
+
+
+class TestRequestSpans:
+    @respx.mock
+    def test_records_http_span(self):
+        respx.get(f"{BASE_URL}/products/7").respond(200, json={"id": 7})
+        request("GET", "/products/7")
+        span = telemetry.TRACER.spans[-1]
+        assert span["name"] == "GET /products/{id}"
+        assert span["attrs"]["status_code"] == 200
+        assert span["attrs"]["bytes"] > 0
+        assert span["attrs"]["retries"] == 0
+
+    @respx.mock
+    def test_error_status(self):
+        respx.get(f"{BASE_URL}/products/7").respond(404, json={})
+        request("GET", "/products/7")
+        hist = telemetry.TRACER.snapshot()[("http", "GET /products/{id}")]
+        assert hist.errors == 1
+
+
+class TestExport:
+    def test_jsonl_and_otlp(self, tmp_path):
+        telemetry.TRACER.record(telemetry.make_span("tool", "list_products", 0.0, agent="x"))
+        path = tmp_path / "spans.jsonl"
+        assert telemetry.TRACER.export(str(path), "otlp") == 1
+        payload = json.loads(path.read_text().splitlines()[0])
+        span = payload["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+        assert span["name"] == "list_products"
+        assert len(span["traceId"]) == 32
+        assert json.loads(telemetry.format_span(telemetry.TRACER.spans[0]))["kind"] == "tool"
+
+    def test_streaming_export(self, tmp_path):
+        path = tmp_path / "trace.jsonl"
+        tracer = telemetry.Tracer(str(path))
+        tracer.record(telemetry.make_span("http", "GET /store", 0.0))
+        tracer.record(telemetry.make_span("http", "GET /store", 0.0))
+        assert len(path.read_text().splitlines()) == 2
+
+
+class TestCallbackHandler:
+    @respx.mock
+    def test_links_tool_model_and_http_spans(self):
+        respx.get(f"{BASE_URL}/products").respond(200, json=[])
+        model = ScriptedChatModel()
+        model.load({
+            "supervisor": [
+                {"tool_calls": [{"name": "task", "args": {
+                    "subagent_type": "catalog-manager", "description": "List"}}]},
+                {"content": "done"},
+            ],
+            "catalog-manager": [
+                {"tool_calls": [{"name": "list_products", "args": {}}]},
+                {"content": "none"},
+            ],
+        })
+        config = {
+            "configurable": {"thread_id": "t"},
+            "callbacks": [telemetry.TelemetryCallbackHandler()],
+        }
+        build_agent(model=model).invoke(
+            {"messages": [{"role": "user", "content": "hi"}]}, config=config
+        )
+
+        spans = {(s["kind"], s["name"]): s for s in telemetry.TRACER.spans}
+        tool = spans[("tool", "list_products")]
+        http = spans[("http", "GET /products")]
+        assert tool["attrs"]["agent"] == "catalog-manager"
+        assert http["parent_id"] == tool["span_id"]
+        assert ("model", "supervisor") in spans
+        assert len({s["trace_id"] for s in telemetry.TRACER.spans}) == 1
+
+    def test_model_span_cached_ratio(self):
+        usage = {"input_tokens": 2000, "output_tokens": 10, "total_tokens": 2010,
+                 "input_token_details": {"cache_read": 1500}}
+        model = ScriptedChatModel()
+        model.load({"supervisor": [{"content": "hi", "usage": usage}]})
+        config = {
+            "configurable": {"thread_id": "t"},
+            "callbacks": [telemetry.TelemetryCallbackHandler()],
+        }
+        build_agent(model=model).invoke(
+            {"messages": [{"role": "user", "content": "hi"}]}, config=config
+        )
+
+        span = next(s for s in telemetry.TRACER.spans if s["kind"] == "model")
+        assert span["attrs"]["cached_tokens"] == 1500
+        assert span["attrs"]["cached_ratio"] == 0.75
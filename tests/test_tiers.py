@@ -0,0 +1,131 @@
+import respx
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from nube_agent import telemetry
+from nube_agent.agent import build_agent
+from nube_agent.config import BASE_URL
+from nube_agent.fake_model import ScriptedChatModel
+from nube_agent.subagents import SUBAGENTS
+from nube_agent.tiers import LARGE, SMALL, ModelTierMiddleware, subagent_specs, write_tools
+from nube_agent.usage import UsageTracker
+
+
+def _delegate(subagent: str) -> list[dict]:
+    return [
+        {"tool_calls": [{"name": "task", "args": {
+            "subagent_type": subagent, "description": "do it"}}]},
+        {"content": "done"},
+    ]
+
+
+def _run(small: ScriptedChatModel, large: ScriptedChatModel) -> UsageTracker:
+    tracker = UsageTracker()
+    config = {"configurable": {"thread_id": "t"}, "callbacks": [tracker]}
+    build_agent(model=large, small_model=small).invoke(
+        {"messages": [{"role": "user", "content": "hi"}]}, config=config
+    )
+    return tracker
+
+
+def _models() -> tuple[ScriptedChatModel, ScriptedChatModel]:
+    return ScriptedChatModel(model_name="small"), ScriptedChatModel(model_name="large")
+
+
+class TestSpecs:
+    def test_write_tools(self):
+        catalog = next(s for s in SUBAGENTS if s["name"] == "catalog-manager")
+        writes = write_tools(catalog)
+        assert "update_variant" in writes and "bulk_update_stock_price" in writes
+        assert "list_products" not in writes and "get_variant" not in writes
+
+    def test_models_follow_tier(self):
+        specs = {s["name"]: s for s in subagent_specs("L", "S")}
+        assert specs["catalog-manager"]["model"] == "L"
+        assert specs["order-manager"]["model"] == "S"
+        assert "tier" not in specs["order-manager"]
+        assert isinstance(specs["order-manager"]["middleware"][-1], ModelTierMiddleware)
+
+    def test_choose(self):
+        tiers = ModelTierMiddleware("x", "S", "L", tier=LARGE, writes=frozenset({"update"}))
+        task = HumanMessage("go")
+        write = AIMessage("", tool_calls=[{"name": "update", "args": {}, "id": "1"}])
+        failed = ToolMessage("API error 404: Not Found", tool_call_id="1")
+        assert tiers.choose([task]) == SMALL
+        assert tiers.choose([task, write]) == LARGE
+        assert tiers.choose([task, failed]) == LARGE
+
+
+class TestTiers:
+    @respx.mock
+    def test_reads_stay_on_small_model(self):
+        respx.get(f"{BASE_URL}/products").respond(200, json=[{"id": 1}])
+        small, large = _models()
+        small.load({"catalog-manager": [
+            {"tool_calls": [{"name": "list_products", "args": {}}]},
+            {"content": "one product"},
+        ]})
+        large.load({"supervisor": _delegate("catalog-manager")})
+
+        tracker = _run(small, large)
+
+        assert small.pending() == {} and large.pending() == {}
+        assert tracker.turn.models["small"]["calls"] == 2
+        assert tracker.turn.models["large"]["calls"] == 2  # supervisor only
+
+    @respx.mock
+    def test_catalog_write_escalates_before_writing(self):
+        route = respx.put(f"{BASE_URL}/products/1/variants/2").respond(200, json={"id": 2})
+        call = {"name": "update_variant",
+                "args": {"product_id": 1, "variant_id": 2, "updates_json": '{"stock": 5}'}}
+        small, large = _models()
+        small.load({"catalog-manager": [{"tool_calls": [call]}]})
+        large.load({
+            "supervisor": _delegate("catalog-manager"),
+            "catalog-manager": [{"tool_calls": [call]}, {"content": "updated"}],
+        })
+        telemetry.TRACER.clear()
+
+        _run(small, large)
+
+        assert small.pending() == {} and large.pending() == {}
+        assert route.call_count == 1
+        escalations = [s for s in telemetry.TRACER.spans if s["kind"] == "tier"]
+        assert [s["attrs"]["reason"] for s in escalations] == ["write update_variant"]
+
+    @respx.mock
+    def test_small_tier_writes_stay_small(self):
+        respx.put(f"{BASE_URL}/orders/7").respond(200, json={"id": 7})
+        small, large = _models()
+        small.load({"order-manager": [
+            {"tool_calls": [{"name": "update_order", "args": {
+                "order_id": 7, "updates_json": '{"owner_note": "x"}'}}]},
+            {"content": "noted"},
+        ]})
+        large.load({"supervisor": _delegate("order-manager")})
+        _run(small, large)
+        assert small.pending() == {} and large.pending() == {}
+
+    @respx.mock
+    def test_failed_tool_call_escalates(self):
+        respx.get(f"{BASE_URL}/orders/9").respond(404, json={"description": "Not Found"})
+        small, large = _models()
+        small.load({"order-manager": [{"tool_calls": [{"name": "get_order",
+                                                       "args": {"order_id": 9}}]}]})
+        large.load({
+            "supervisor": _delegate("order-manager"),
+            "order-manager": [{"content": "Order 9 does not exist."}],
+        })
+        tracker = _run(small, large)
+        assert small.pending() == {} and large.pending() == {}
+        assert tracker.turn.agents["order-manager"]["calls"] == 2
+
+    def test_unknown_tool_retried_on_large_model(self):
+        small, large = _models()
+        small.load({"order-manager": [{"tool_calls": [{"name": "refund_order", "args": {}}]}]})
+        large.load({
+            "supervisor": _delegate("order-manager"),
+            "order-manager": [{"content": "Refunds are not supported."}],
+        })
+        tracker = _run(small, large)
+        assert small.pending() == {} and large.pending() == {}
+        assert tracker.turn.models["small"]["calls"] == 1
@@ -42,7 +42,7 @@ class TestGetPage:
 
 class TestCreatePage:
     def setup_method(self):
-        api_mod._store_info.cache_clear()
+        api_mod.default_store().reset()
 
     @respx.mock
     def test_create(self):
@@ -66,7 +66,7 @@ class TestCreatePage:
 
 class TestUpdatePage:
     def setup_method(self):
-        api_mod._store_info.cache_clear()
+        api_mod.default_store().reset()
 
     @respx.mock
     def test_update(self):
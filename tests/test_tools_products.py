@@ -40,7 +40,7 @@ class TestGetProduct:
 
 class TestCreateProduct:
     def setup_method(self):
-        api_mod._store_info.cache_clear()
+        api_mod.default_store().reset()
 
     @respx.mock
     def test_simple_create(self):
@@ -0,0 +1,75 @@
+import json
+from decimal import Decimal
+
+import pytest
+import respx
+
+from nube_agent import api
+from nube_agent.standin import StandinServer, StoreData
+from nube_agent.tools.stores import query_stores
+
+
+@pytest.fixture
+def two_stores():
+    servers = [
+        StandinServer(StoreData(products=5, orders=250, seed=1)).start(),
+        StandinServer(StoreData(products=5, orders=30, seed=2)).start(),
+    ]
+    clients = [
+        api.register_store(api.StoreClient(store_id, "t", base_url=server.base_url))
+        for store_id, server in zip(("101", "102"), servers)
+    ]
+    yield servers
+    for client in clients:
+        api.remove_store(client.store_id)
+    for server in servers:
+        server.stop()
+
+
+class TestQueryStores:
+    def test_count_all_pages(self, two_stores):
+        data = json.loads(query_stores("/orders", store_ids="101,102", all_pages=True,
+                                       aggregate="count"))
+        assert data["stores"]["101"] == {"pages": 2, "count": 250}
+        assert data["stores"]["102"]["count"] == 30
+        assert data["total"]["count"] == 280
+        assert data["failed"] == {}
+
+    def test_sum_per_currency(self, two_stores):
+        data = json.loads(query_stores("/orders", store_ids="101,102", all_pages=True,
+                                       aggregate="sum:total"))
+        expected = sum(
+            Decimal(o["total"])
+            for server in two_stores for o in server.data.collections["orders"].values()
+        )
+        assert Decimal(data["total"]["sum"]["ARS"]) == expected
+
+    def test_unnest_and_where(self, two_stores):
+        product_id, variants = next(iter(two_stores[1].data.nested["variants"].items()))
+        sku = next(iter(variants.values()))["sku"]
+        data = json.loads(query_stores(
+            "/products", store_ids="101,102", unnest="variants",
+            where_json=json.dumps({"sku": sku}),
+        ))
+        rows = data["stores"]["102"]["rows"]
+        assert [r["sku"] for r in rows] == [sku]
+        assert rows[0]["parent_id"] == product_id
+
+    def test_partial_failures(self, two_stores):
+        with respx.mock(assert_all_mocked=False) as mock:
+            mock.route(host="127.0.0.1").pass_through()
+            api.register_store(api.StoreClient("103", "t", base_url="https://down.test/103"))
+            mock.get("https://down.test/103/orders").respond(401, json={"error": "bad token"})
+            try:
+                data = json.loads(query_stores("/orders", store_ids="101,103,999",
+                                               aggregate="count"))
+            finally:
+                api.remove_store("103")
+        assert data["succeeded"] == 1
+        assert set(data["failed"]) == {"103", "999"}
+        assert "401" in data["failed"]["103"]
+
+    def test_validation(self):
+        assert query_stores("orders").startswith("Error:")
+        assert query_stores("/orders", filters_json="{").startswith("Invalid JSON")
+        assert query_stores("/orders", aggregate="avg").startswith("Error:")
@@ -1,14 +1,18 @@
 import json
 
+import pytest
 import respx
 
+from nube_agent.api import StoreClient, use_store
 from nube_agent.config import BASE_URL
+from nube_agent.standin import StandinServer, StoreData
 from nube_agent.tools.variants import (
     bulk_update_stock_price,
     create_variant,
     delete_variant,
     get_variant,
     list_variants,
+    set_variant_matrix,
     update_variant,
 )
 
@@ -87,3 +91,67 @@ class TestBulkUpdateStockPrice:
     def test_missing_variant_id(self):
         result = json.loads(bulk_update_stock_price(1, '[{"price": "99"}]'))
         assert result[0]["error"] == "Missing 'variant_id' in item"
+
+
+@pytest.fixture
+def store():
+    data = StoreData(products=1, variants_per_product=2, orders=0, customers=0)
+    with StandinServer(data, rate_limit=10**6) as srv:
+        with use_store(StoreClient("1", "test-token", base_url=srv.base_url)):
+            yield data
+
+
+def _matrix(data: StoreData, product_id: int) -> tuple[list, list]:
+    product = data.collections["products"][product_id]
+    variants = data.nested["variants"][product_id].values()
+    return ([a["es"] for a in product["attributes"]],
+            sorted(tuple(v["es"] for v in variant["values"]) for variant in variants))
+
+
+class TestSetVariantMatrix:
+    def test_adds_attribute_and_combinations(self, store):
+        pid = next(iter(store.collections["products"]))
+        before = {v["id"]: v for v in store.nested["variants"][pid].values()}
+        result = json.loads(set_variant_matrix(
+            pid, json.dumps({"Talla": ["S", "M", "L"], "Color": ["Rojo", "Azul"]})))
+        assert result == {"product_id": pid, "attributes": ["Talla", "Color"], "kept": 2,
+                          "updated": 2, "created": 4, "deleted": 0}
+        attributes, combos = _matrix(store, pid)
+        assert attributes == ["Talla", "Color"] and len(combos) == 6
+        after = store.nested["variants"][pid]
+        assert set(before) <= set(after)
+        new = [v for vid, v in after.items() if vid not in before]
+        assert all(v["stock"] == 0 and v["price"] == before[min(before)]["price"] for v in new)
+
+    def test_removes_values_and_attributes(self, store):
+        pid = next(iter(store.collections["products"]))
+        set_variant_matrix(pid, json.dumps({"Talla": ["S", "M"], "Color": ["Rojo", "Azul"]}))
+        result = json.loads(set_variant_matrix(pid, json.dumps({"Color": ["Azul"]})))
+        assert result["kept"] == 1 and result["deleted"] == 3 and result["created"] == 0
+        assert _matrix(store, pid) == (["Color"], [("Azul",)])
+
+    def test_unchanged_matrix_writes_nothing(self, store):
+        pid = next(iter(store.collections["products"]))
+        _, combos = _matrix(store, pid)
+        options = {"Talla": [c[0] for c in combos]}
+        result = json.loads(set_variant_matrix(pid, json.dumps(options)))
+        assert (result["updated"], result["created"], result["deleted"]) == (0, 0, 0)
+
+    def test_rejects_bad_options(self):
+        assert "at most 3" in set_variant_matrix(1, json.dumps({k: ["x"] for k in "abcd"}))
+        assert "repeated" in set_variant_matrix(1, '{"Talla": ["S", "s"]}')
+        assert "non-empty" in set_variant_matrix(1, '{"Talla": []}')
+        assert "Invalid JSON" in set_variant_matrix(1, "{")
+
+    @respx.mock
+    def test_stops_when_creates_fail(self):
+        respx.get(f"{BASE_URL}/store").respond(200, json={"main_language": "es"})
+        respx.get(f"{BASE_URL}/products/1").respond(200, json={
+            "id": 1, "attributes": [{"es": "Talla"}],
+            "variants": [{"id": 10, "values": [{"es": "S"}]}, {"id": 11, "values": [{"es": "M"}]}],
+        })
+        respx.post(f"{BASE_URL}/products/1/variants").respond(422, json={"description": "bad"})
+        delete = respx.delete(f"{BASE_URL}/products/1/variants/11").respond(200, json={})
+        result = json.loads(set_variant_matrix(1, '{"Talla": ["S", "L"]}'))
+        assert result["created"] == 0 and len(result["errors"]) == 1
+        assert "deleted" not in result and not delete.called
@@ -0,0 +1,138 @@
+import json
+
+import pytest
+
+from nube_agent import batch
+from nube_agent.api import StoreClient, journal_scope, request, use_store
+from nube_agent.journal import WriteJournal
+from nube_agent.standin import StandinServer, StoreData
+from nube_agent.tools.undo import undo as undo_tool
+from nube_agent.undo import inverse, plan, undo
+
+
+@pytest.fixture
+def store(tmp_path):
+    data = StoreData(products=2, variants_per_product=2, orders=2, customers=2)
+    journal = WriteJournal(tmp_path / "journal.sqlite")
+    with StandinServer(data, rate_limit=10**6) as srv:
+        with use_store(StoreClient("1", "t", base_url=srv.base_url, journal=journal)):
+            yield data
+    journal.close()
+
+
+def _ids(data: StoreData, collection: str) -> list[int]:
+    return sorted(data.collections[collection])
+
+
+class TestInverse:
+    def test_put_restores_sent_fields(self):
+        snapshot = {"method": "PUT", "path": "/products/1", "body": {"published": False},
+                    "before": {"id": 1, "published": True, "name": {"es": "Remera"}},
+                    "after": {}}
+        assert inverse(snapshot) == ("PUT", "/products/1", {"published": True})
+
+    def test_delete_recreates_without_read_only_fields(self):
+        snapshot = {"method": "DELETE", "path": "/products/1/variants/2", "body": None,
+                    "before": {"id": 2, "product_id": 1, "price": "10.00"}, "after": {}}
+        assert inverse(snapshot) == ("POST", "/products/1/variants", {"price": "10.00"})
+
+    def test_create_and_order_actions(self):
+        created = {"method": "POST", "path": "/coupons", "body": {}, "before": None,
+                   "after": {"id": 7}}
+        assert inverse(created) == ("DELETE", "/coupons/7", None)
+        closed = {**created, "path": "/orders/3/close"}
+        assert inverse(closed) == ("POST", "/orders/3/open", None)
+        assert "cannot be undone" in inverse({**created, "path": "/orders/3/cancel"})
+
+    def test_missing_snapshot(self):
+        snapshot = {"method": "PUT", "path": "/products/1", "body": {"published": False},
+                    "before": None, "after": {}}
+        assert isinstance(inverse(snapshot), str)
+
+
+class TestUndo:
+    def test_reverts_last_scope(self, store):
+        product_id, other_id = _ids(store, "products")
+        variant_id = sorted(store.nested["variants"][product_id])[0]
+        old_name = store.collections["products"][product_id]["name"]
+        coupons = _ids(store, "coupons")
+        with journal_scope("turn-1"):
+            request("PUT", f"/products/{other_id}", json_body={"published": False})
+        with journal_scope("turn-2"):
+            request("PUT", f"/products/{product_id}", json_body={"name": {"es": "Nueva"}})
+            request("PUT", f"/products/{product_id}", json_body={"name": {"es": "Otra"}})
+            request("DELETE", f"/products/{product_id}/variants/{variant_id}")
+            request("POST", "/coupons", json_body={"code": "NUEVO", "type": "percentage"})
+
+        summary = undo()
+        assert summary["scope"] == "turn-2"
+        assert (summary["reverted"], summary["skipped"], summary["failed"]) == (4, 0, 0)
+        assert store.collections["products"][product_id]["name"] == old_name
+        assert _ids(store, "coupons") == coupons
+        variants = store.nested["variants"][product_id].values()
+        assert len(variants) == 2 and variant_id not in store.nested["variants"][product_id]
+        assert store.collections["products"][other_id]["published"] is False
+
+        # The next undo goes back one more operation; undo writes are not undoable.
+        assert undo()["scope"] == "turn-1"
+        assert store.collections["products"][other_id]["published"] is True
+        assert plan().startswith("Error: no writes to undo")
+
+    def test_order_actions(self, store):
+        first, second = _ids(store, "orders")
+        with journal_scope("turn"):
+            request("POST", f"/orders/{first}/close")
+            request("POST", f"/orders/{second}/cancel", json_body={"reason": "other"})
+        summary = undo()
+        assert (summary["reverted"], summary["skipped"]) == (1, 1)
+        assert store.collections["orders"][first]["status"] == "open"
+        assert store.collections["orders"][second]["status"] == "cancelled"
+
+    def test_batch_run(self, store):
+        first, second = _ids(store, "coupons")[:2]
+        before = store.collections["coupons"][second]["value"]
+        with journal_scope("batch:r1:a"):
+            request("PUT", f"/coupons/{first}", json_body={"valid": False})
+        with journal_scope("batch:r1:b"):
+            request("PUT", f"/coupons/{second}", json_body={"value": "99.00"})
+        with journal_scope("turn"):
+            request("POST", "/coupons", json_body={"code": "OTRO", "type": "shipping"})
+
+        output = batch.run_tool({"tool": "undo", "args": {"run_id": "r1"}}, "undo")
+        assert output["status"] == "ok"
+        summary = json.loads(output["output"])
+        assert summary["scope"] == "batch:r1:" and summary["reverted"] == 2
+        assert store.collections["coupons"][second]["value"] == before
+        assert undo()["scope"] == "turn"
+
+    def test_sessions_undo_their_own_writes(self, store):
+        first, second = _ids(store, "coupons")[:2]
+        with journal_scope("server:a:n1:0"):
+            request("PUT", f"/coupons/{first}", json_body={"value": "11.00"})
+        with journal_scope("server:b:n2:0"):
+            request("PUT", f"/coupons/{second}", json_body={"value": "22.00"})
+        with journal_scope("server:a:n1:1"):
+            summary = json.loads(undo_tool())
+        assert summary["scope"] == "server:a:n1:0" and summary["reverted"] == 1
+        assert store.collections["coupons"][second]["value"] == "22.00"
+        with journal_scope("server:a:n1:2"):
+            assert undo_tool() == "Error: no writes to undo for this session."
+        assert undo(session="server:b:n2:")["scope"] == "server:b:n2:0"
+
+    def test_import_run(self, store):
+        coupon = _ids(store, "coupons")[0]
+        with journal_scope("import:abc123"):
+            request("PUT", f"/coupons/{coupon}", json_body={"valid": False})
+        assert undo("abc123", session="cli:t:")["scope"] == "import:abc123"
+
+    def test_partial_failure_is_retried(self, store):
+        product_id = _ids(store, "products")[0]
+        with journal_scope("turn"):
+            request("PUT", f"/products/{product_id}", json_body={"published": False})
+        del store.collections["products"][product_id]
+        assert undo()["failed"] == 1
+        assert plan()["scope"] == "turn"
+
+    def test_without_journal(self):
+        with use_store(StoreClient("1", "t")):
+            assert undo_tool().startswith("Error: the write journal is off")
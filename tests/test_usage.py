@@ -0,0 +1,87 @@
+import pytest
+import respx
+
+from nube_agent.agent import build_agent
+from nube_agent.config import BASE_URL
+from nube_agent.fake_model import ScriptedChatModel
+from nube_agent.usage import UsageTotals, UsageTracker, cached_ratio, cost, model_price
+
+USAGE = {
+    "input_tokens": 1000,
+    "output_tokens": 100,
+    "total_tokens": 1100,
+    "input_token_details": {"cache_read": 400},
+}
+
+
+class TestPricing:
+    def test_known_models(self):
+        assert model_price("openai:gpt-4o") == (2.50, 1.25, 10.00)
+        assert model_price("gpt-4o-mini-2024-07-18") == (0.15, 0.075, 0.60)
+
+    def test_unknown_model(self):
+        assert model_price("scripted") is None
+        assert cost("scripted", 1000, 0, 100) == 0.0
+
+    def test_cached_tokens_are_cheaper(self):
+        assert cost("gpt-4o", 1000, 400, 100) == pytest.approx(
+            (600 * 2.50 + 400 * 1.25 + 100 * 10.00) / 1_000_000
+        )
+
+
+class TestUsageTotals:
+    def test_total_and_tools(self):
+        totals = UsageTotals()
+        totals.add_model_call("supervisor", "gpt-4o", 100, 0, 10)
+        totals.add_model_call("order-manager", "gpt-4o", 200, 50, 20)
+        totals.add_tool_output("list_orders", 9)
+        assert totals.total()["input"] == 300
+        assert totals.models["gpt-4o"]["calls"] == 2
+        assert totals.tools["list_orders"] == {"calls": 1, "chars": 9, "tokens": 3}
+
+    def test_model_time(self):
+        totals = UsageTotals()
+        totals.add_model_call("order-manager", "gpt-4o-mini", 100, 0, 10, ms=30.0)
+        totals.add_model_call("order-manager", "gpt-4o-mini", 100, 0, 10, ms=50.0)
+        assert totals.models["gpt-4o-mini"]["ms"] == 80.0
+
+    def test_cached_ratio_per_call(self):
+        totals = UsageTotals()
+        totals.add_model_call("supervisor", "gpt-4o", 2000, 0, 10)
+        totals.add_model_call("supervisor", "gpt-4o", 2000, 1536, 10)
+        assert [c["ratio"] for c in totals.calls] == [0.0, 0.768]
+        assert cached_ratio(0, 0) == 0.0
+
+
+class TestUsageTracker:
+    @respx.mock
+    def test_attributes_usage_to_agents_and_tools(self):
+        respx.get(f"{BASE_URL}/orders").respond(200, json=[{"id": 1}])
+        model = ScriptedChatModel()
+        model.load({
+            "supervisor": [
+                {"tool_calls": [{"name": "task", "args": {
+                    "subagent_type": "order-manager", "description": "List"}}], "usage": USAGE},
+                {"content": "done", "usage": USAGE},
+            ],
+            "order-manager": [
+                {"tool_calls": [{"name": "list_orders", "args": {}}], "usage": USAGE},
+                {"content": "one order", "usage": USAGE},
+            ],
+        })
+        tracker = UsageTracker()
+        config = {"configurable": {"thread_id": "t"}, "callbacks": [tracker]}
+        tracker.start_turn()
+        build_agent(model=model).invoke(
+            {"messages": [{"role": "user", "content": "hi"}]}, config=config
+        )
+
+        assert tracker.turn.agents["supervisor"]["calls"] == 2
+        assert tracker.turn.agents["order-manager"]["input"] == 2000
+        assert tracker.turn.agents["order-manager"]["cached"] == 800
+        assert tracker.turn.tools["list_orders"]["chars"] == len('[{"id": 1}]')
+        assert tracker.turn.tools["task"]["chars"] == len("one order")
+
+        tracker.start_turn()
+        assert tracker.turn.total()["calls"] == 0
+        assert tracker.session.total()["calls"] == 4
@@ -0,0 +1,124 @@
+import json
+import time
+
+import respx
+
+from nube_agent import api
+from nube_agent.api import ResponseCache, StoreClient, request
+from nube_agent.config import BASE_URL
+from nube_agent.server import AgentServer
+from nube_agent.webhooks import EVENTS, SIGNATURE_HEADER, EventLog, WebhookReceiver, register, sign
+from tests.test_server import _call
+
+
+def _delivery(event: str, resource_id: int, store_id: str = "", secret: str = "") -> dict:
+    store_id = store_id or api.default_store().store_id
+    body = json.dumps({"store_id": store_id, "event": event, "id": resource_id}).encode()
+    headers = {SIGNATURE_HEADER.decode(): sign(body, secret)} if secret else {}
+    return {"content": body, "headers": headers}
+
+
+def _cached(path: str):
+    return api.default_store().cache.get(ResponseCache.key(path, None))
+
+
+class TestReceiver:
+    def setup_method(self):
+        store = api.default_store()
+        store.reset()
+        store.cache.ttl = 60
+        for path in ("/products", "/products/1", "/products/2", "/orders/1"):
+            store.cache.put(ResponseCache.key(path, None), {"path": path})
+
+    def teardown_method(self):
+        api.default_store().reset()
+        api.default_store().cache.ttl = 0
+
+    def test_invalidates_the_resource_and_listings(self):
+        receiver = WebhookReceiver(secret="")
+        (response,) = _call(receiver, ("POST", "/webhooks", _delivery("product/updated", 1)))
+        assert response.json() == {"seq": 1, "status": "applied"}
+        assert _cached("/products/1") is None and _cached("/products") is None
+        assert _cached("/products/2") and _cached("/orders/1")
+
+    def test_signature(self):
+        receiver = WebhookReceiver(secret="s3cret")
+        forged = _delivery("product/updated", 1, secret="other")
+        good = _delivery("order/paid", 1, secret="s3cret")
+        bad, ok = _call(receiver, ("POST", "/webhooks", forged), ("POST", "/webhooks", good))
+        assert bad.status_code == 401 and _cached("/products/1")
+        assert ok.status_code == 200 and _cached("/orders/1") is None
+        assert receiver.stats()["rejected"] == 1
+
+    def test_unknown_events_and_stores_ignored(self):
+        receiver = WebhookReceiver(secret="")
+        responses = _call(
+            receiver,
+            ("POST", "/webhooks", _delivery("app/uninstalled", 1)),
+            ("POST", "/webhooks", _delivery("product/updated", 1, store_id="999")),
+        )
+        assert [r.json()["status"] for r in responses] == ["ignored", "ignored"]
+        assert _cached("/products/1")
+
+    @respx.mock
+    def test_refresh(self):
+        route = respx.get(f"{BASE_URL}/products/1").respond(200, json={"id": 1, "fresh": True})
+        receiver = WebhookReceiver(secret="", refresh=True)
+        _call(receiver, ("POST", "/webhooks", _delivery("product/updated", 1)))
+        for _ in range(100):
+            if receiver.stats()["refreshed"]:
+                break
+            time.sleep(0.01)
+        assert route.call_count == 1
+        assert request("GET", "/products/1") == {"id": 1, "fresh": True}
+        assert route.call_count == 1
+
+    def test_events_and_replay(self, tmp_path):
+        log = EventLog(str(tmp_path / "webhooks.jsonl"))
+        receiver = WebhookReceiver(secret="", token="tok", log=log)
+        auth = {"Authorization": "Bearer tok"}
+        _call(
+            receiver,
+            ("POST", "/webhooks", _delivery("product/updated", 1)),
+            ("POST", "/webhooks", _delivery("product/updated", 1)),
+            ("POST", "/webhooks", _delivery("order/paid", 1)),
+        )
+        denied, events = _call(
+            receiver,
+            ("GET", "/webhooks/events", {}),
+            ("GET", "/webhooks/events?since=1", {"headers": auth}),
+        )
+        assert denied.status_code == 401
+        assert [e["seq"] for e in events.json()["events"]] == [2, 3]
+
+        api.default_store().cache.put(ResponseCache.key("/products/1", None), {})
+        (replayed,) = _call(receiver, ("POST", "/webhooks/replay", {"json": {}, "headers": auth}))
+        assert replayed.json() == {"replayed": 2} and _cached("/products/1") is None
+        assert EventLog(log.path).last_seq == 3
+
+    def test_mounted_in_server(self):
+        app = AgentServer(agent=None, token="tok", webhooks=WebhookReceiver(secret=""))
+        delivered, stats = _call(
+            app,
+            ("POST", "/webhooks", _delivery("product/deleted", 2)),
+            ("GET", "/stats", {"headers": {"Authorization": "Bearer tok"}}),
+        )
+        assert delivered.json()["status"] == "applied" and _cached("/products/2") is None
+        assert stats.json()["webhooks"]["applied"] == 1
+
+
+class TestRegister:
+    @respx.mock
+    def test_registers_missing_events(self):
+        url = "https://agent.example.com/webhooks"
+        respx.get(f"{BASE_URL}/webhooks").respond(200, json=[
+            {"id": 1, "event": "product/updated", "url": url},
+            {"id": 2, "event": "order/paid", "url": "https://elsewhere.example.com"},
+        ])
+        post = respx.post(f"{BASE_URL}/webhooks").respond(201, json={"id": 3})
+        with api.use_store(StoreClient(api.default_store().store_id, "t", base_url=BASE_URL)):
+            summary = register(url, ("products", "orders"))
+        assert summary["existing"] == ["product/updated"] and not summary["errors"]
+        assert len(summary["registered"]) == len(EVENTS["products"]) + len(EVENTS["orders"]) - 1
+        sent = {json.loads(call.request.content)["event"] for call in post.calls}
+        assert "order/paid" in sent and "product/updated" not in sent